@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+"""
+IMU 擷取管線效能基準
+以合成數據與錄製數據（imu_data_20250813_143629.csv）透過假串口測量：
+    parse   每秒解析行數          IMUDataParser.parse_arduino_line
+    frame   每秒分行/解析位元組    IMUDataParser.feed（read_serial_data 的處理步驟）
+    binary  HiPNUC 二進位封包每秒解碼樣本數與每樣本位元組（HI91/HI92/HI92+HI81）  HiPNUCParser.feed
+    store   每秒儲存樣本數        IMUGUI.on_data_received
+    render  每秒離屏繪圖幀數（各繪圖後端） IMUGUI.update_plot
+    export  每秒匯出列數          IMUGUI.write_csv
+    handoff 把時間範圍交給行程內分析的每秒列數（唯讀視圖 / 經 CSV 匯出再載入）  IMUGUI.selected_data
+    codec   緊湊編碼的往返驗證、每樣本位元組數與編碼速度（imu_codec / imu_spill）
+    monitor signal_monitor 擷取/FFT  TeensyADCGUIMonitor.collect_data（透過 teensy_sim，需要顯示環境）
+    reconnect 模擬 USB 拔插，偵測掉線與重新插上到恢復收集的時間  IMUGUI 自動重連（透過 hi04m3_sim）
+    startup 新行程的匯入時間（python -X importtime）、視窗出現與圖表可用的時間  imu_gui / signal_monitor
+結果寫成 JSON，可用 --compare 與先前的結果比較（每筆記錄帶 higher_is_better，
+大小 bytes/sample 與時間 ms 越小越好，其餘速率越大越好）。
+同樣的項目也可由 pytest 執行：pytest tests/test_benchmark.py --benchmark（預設略過）。
+
+用法：
+    python benchmark.py                       # 完整測試
+    python benchmark.py --quick               # 縮小規模（快速檢查）
+    python benchmark.py --only parse,frame    # 只跑部分項目
+    python benchmark.py --compare bench_results_old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+
+from imu_buffer import CHANNELS, CHANNEL_INDEX
+from hi04m3_sim import format_arduino_line, format_hi91_frame, format_hi92_frame, format_hi81_frame
+from imu_plot import available_backends
+
+RATES = [100, 500, 1000]
+BUFFER_SIZES = [10_000, 1_000_000]
+QUICK_BUFFER_SIZES = [10_000, 100_000]
+DISPLAY_SIZES = [1_000, 10_000, 50_000]
+MONITOR_SIZES = [10_000, 100_000, 1_000_000]
+READ_INTERVAL = 0.01       # 讀取線程大約每 10 ms 讀一次串口
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imu_data_20250813_143629.csv')
+STARTUP_REPEATS = 3
+RECONNECT_TRIALS = 10
+UNPLUG_SECONDS = 0.3
+# 越小越好的單位（大小、耗時）；其餘為速率，越大越好
+LOWER_IS_BETTER = {'bytes/sample', 'ms'}
+
+# 在新行程建立視窗：印出「視窗出現」與「圖表建立完成」距離開始匯入的毫秒數
+STARTUP_SCRIPTS = {
+    'imu_gui': """
+import sys, time
+t0 = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+import imu_gui
+app = QApplication(sys.argv[:1])
+gui = imu_gui.IMUGUI()
+gui.show()
+app.processEvents()
+t1 = time.perf_counter()
+while gui.renderer is None and time.perf_counter() - t1 < 10:
+    app.processEvents()
+    time.sleep(0.002)
+print((t1 - t0) * 1000, (time.perf_counter() - t0) * 1000)
+gui.acquisition.stop()
+""",
+    'signal_monitor': """
+import time
+t0 = time.perf_counter()
+import signal_monitor
+app = signal_monitor.TeensyADCGUIMonitor()
+app.root.update()
+t1 = time.perf_counter()
+while app.fig is None and time.perf_counter() - t1 < 10:
+    app.root.update()
+    time.sleep(0.002)
+print((t1 - t0) * 1000, (time.perf_counter() - t0) * 1000)
+app.on_closing()
+""",
+}
+
+
+# =========================
+# 測試數據
+# =========================
+def recorded_rows(n, rate):
+    """重複錄製數據到 n 筆，時間戳改為指定頻率的間隔"""
+    rows = np.loadtxt(SAMPLE_CSV, delimiter=',', skiprows=1)
+    rows = np.resize(rows, (n, len(CHANNELS)))
+    rows[:, CHANNEL_INDEX['timestamp']] = rows[0, 0] + np.arange(n) * (1000.0 / rate)
+    rows[:, CHANNEL_INDEX['fps']] = rate
+    return rows
+
+
+def synthetic_rows(n, rate, seed=0):
+    """隨機漫步的合成九軸數據"""
+    rng = np.random.default_rng(seed)
+    rows = np.zeros((n, len(CHANNELS)))
+    c = CHANNEL_INDEX
+    rows[:, c['timestamp']] = np.arange(n) * (1000.0 / rate)
+    rows[:, c['temperature']] = 30.0
+    rows[:, c['fps']] = rate
+    rows[:, c['acc_x']:c['yaw'] + 1] = np.cumsum(rng.normal(0, 0.01, (n, 12)), axis=0)
+    rows[:, c['acc_z']] += 1.0
+    return rows
+
+
+def parse_importtime(stderr, module):
+    """解析 -X importtime 的輸出，回傳 (module 累計匯入時間 us, [(直接匯入的模組, 累計 us)])"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2   # 每層縮排兩格
+        entries.append((depth, name.strip(), int(cumulative)))
+    for i, (depth, name, cumulative) in enumerate(entries):
+        if depth == 0 and name == module:
+            deps = []
+            for d, dep, us in reversed(entries[:i]):
+                if d == 0:
+                    break
+                if d == 1:
+                    deps.append((dep, us))
+            return cumulative, sorted(deps, key=lambda dep: -dep[1])
+    raise ValueError(f"-X importtime 輸出中沒有 {module}")
+
+
+def make_stream(rows):
+    return ("\n".join(format_arduino_line(r) for r in rows) + "\n").encode('utf-8')
+
+
+class FakeSerial:
+    """模擬 pyserial.Serial：每次 in_waiting 回報一個讀取間隔的數據量"""
+
+    def __init__(self, data, chunk_size):
+        self._data = data
+        self._pos = 0
+        self.chunk_size = chunk_size
+        self.is_open = True
+        self.written = b''
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk_size, len(self._data) - self._pos)
+
+    def read(self, size=1):
+        chunk = self._data[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+# =========================
+# 基準測試
+# =========================
+class BenchmarkSuite:
+    def __init__(self, quick=False):
+        self.quick = quick
+        self.results = []
+        self._gui = None
+
+    def record(self, name, params, value, unit):
+        self.results.append({'name': name, 'params': params, 'value': value, 'unit': unit,
+                             'higher_is_better': unit not in LOWER_IS_BETTER})
+        param_text = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:<8} {param_text:<44} {value:>14,.1f} {unit}")
+
+    @property
+    def gui(self):
+        """延遲建立離屏的 IMUGUI（只有 store/render/export 需要 Qt）"""
+        if self._gui is None:
+            from PyQt5.QtWidgets import QApplication
+            import imu_gui
+            self._app = QApplication.instance() or QApplication(sys.argv[:1])
+            self._gui = imu_gui.IMUGUI()
+        return self._gui
+
+    def close(self):
+        if self._gui is not None:
+            self._gui.update_timer.stop()
+            self._gui.acquisition.stop()
+
+    def bench_parse(self):
+        from imu_gui import IMUDataParser
+        n = 5_000 if self.quick else 50_000
+        for source, rows in (('recorded', recorded_rows(n, 1000)), ('synthetic', synthetic_rows(n, 1000))):
+            lines = [format_arduino_line(r) for r in rows]
+            parser = IMUDataParser()
+            t0 = time.perf_counter()
+            for line in lines:
+                parser.parse_arduino_line(line)
+            elapsed = time.perf_counter() - t0
+            self.record('parse', {'source': source}, n / elapsed, 'lines/s')
+
+    def bench_frame(self):
+        from imu_gui import IMUDataParser
+        from imu_metrics import PipelineMetrics
+        seconds = 2 if self.quick else 10
+        for rate in RATES:
+            data = make_stream(recorded_rows(rate * seconds, rate))
+            chunk = max(int(len(data) / (rate * seconds) * rate * READ_INTERVAL), 1)
+            port = FakeSerial(data, chunk)
+            metrics = PipelineMetrics(enabled=True)
+            parser = IMUDataParser(metrics)
+            t0 = time.perf_counter()
+            while port.in_waiting:
+                parser.feed(port.read(port.in_waiting))
+            elapsed = time.perf_counter() - t0
+            frame_s = metrics.time_ns['frame'] / 1e9
+            self.record('frame', {'rate_hz': rate, 'stage': 'split'}, len(data) / frame_s, 'bytes/s')
+            self.record('frame', {'rate_hz': rate, 'stage': 'split+parse'}, len(data) / elapsed, 'bytes/s')
+
+    def bench_binary(self):
+        """二進位封包解碼；每樣本位元組決定同一鮑率能傳的最高頻率"""
+        from imu_hipnuc import HiPNUCParser
+        seconds = 2 if self.quick else 10
+        rate = max(RATES)
+        rows = recorded_rows(rate * seconds, rate)
+        text_bytes = len(make_stream(rows)) / len(rows)
+        self.record('binary', {'packets': 'text'}, text_bytes, 'bytes/sample')
+        encoders = {
+            'HI91': lambda r, t: format_hi91_frame(r),
+            'HI92': lambda r, t: format_hi92_frame(r),
+            'HI92+HI81': lambda r, t: format_hi92_frame(r) + format_hi81_frame(r, t),
+        }
+        for name, encode in encoders.items():
+            data = b''.join(encode(r, i / rate) for i, r in enumerate(rows))
+            chunk = max(int(len(data) / len(rows) * rate * READ_INTERVAL), 1)
+            parser = HiPNUCParser()
+            t0 = time.perf_counter()
+            for i in range(0, len(data), chunk):
+                parser.feed(data[i:i + chunk])
+                parser.take_ins()
+            elapsed = time.perf_counter() - t0
+            self.record('binary', {'packets': name}, len(data) / len(rows), 'bytes/sample')
+            self.record('binary', {'packets': name, 'rate_hz': rate}, len(rows) / elapsed, 'samples/s')
+
+    def bench_store(self):
+        gui = self.gui
+        seconds = 5 if self.quick else 30
+        for size in (QUICK_BUFFER_SIZES if self.quick else BUFFER_SIZES):
+            prefill = synthetic_rows(size, 1000)
+            for rate in RATES:
+                rows = synthetic_rows(rate * seconds, rate, seed=1)
+                per_read = max(int(rate * READ_INTERVAL), 1)
+                batches = [rows[i:i + per_read] for i in range(0, len(rows), per_read)]
+                gui.clear_data()
+                gui.collected_data.append(prefill)
+                gui.collecting = True
+                t0 = time.perf_counter()
+                for batch in batches:
+                    gui.on_data_received(batch)
+                elapsed = time.perf_counter() - t0
+                gui.collecting = False
+                self.record('store', {'rate_hz': rate, 'buffer': size}, len(rows) / elapsed, 'samples/s')
+        gui.clear_data()
+
+    def bench_render(self):
+        """各繪圖後端在不同顯示點數下的幀率（每個面板的可見點數）；每幀先加入新數據，曲線會捲動"""
+        gui = self.gui
+        frames = 30 if self.quick else 100
+        batch = 1000 // 30    # 1000 Hz 擷取、30 FPS 顯示時每幀新增的筆數
+        gui.update_timer.stop()   # 只計入這裡呼叫的幀
+        gui.show()                # 視窗可見時 Qt 才會真正重繪
+        gui.show_accel.setChecked(True)
+        gui.show_gyro.setChecked(True)
+        gui.show_euler.setChecked(True)
+        for backend in available_backends():
+            gui.backend_cb.setCurrentText(backend)
+            for size in DISPLAY_SIZES:
+                gui.clear_data()
+                gui.max_points_spin.setValue(size)
+                gui.data_buffer.max_len = size
+                rows = synthetic_rows(size + frames * batch, 1000)
+                gui.data_buffer.append(rows[:size])
+                gui.update_plot()  # 第一幀含字型等初始化，不計入
+                self._app.processEvents()
+                t0 = time.perf_counter()
+                for i in range(size, len(rows), batch):
+                    gui.data_buffer.append(rows[i:i + batch])
+                    gui.update_plot()
+                    self._app.processEvents()   # pyqtgraph 在重繪事件中才真正繪製
+                elapsed = time.perf_counter() - t0
+                self.record('render', {'backend': backend, 'points': size, 'panels': 3},
+                            frames / elapsed, 'frames/s')
+        gui.backend_cb.setCurrentIndex(0)
+        gui.clear_data()
+        gui.hide()
+        gui.update_timer.start()
+
+    def bench_export(self):
+        gui = self.gui
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in (QUICK_BUFFER_SIZES if self.quick else BUFFER_SIZES):
+                gui.clear_data()
+                gui.collected_data.append(synthetic_rows(size, 1000))
+                filename = os.path.join(tmp, 'export.csv')
+                t0 = time.perf_counter()
+                gui.write_csv(filename)
+                elapsed = time.perf_counter() - t0
+                self.record('export', {'buffer': size}, size / elapsed, 'rows/s')
+        gui.clear_data()
+
+    def bench_handoff(self):
+        """選取中間一半的時間範圍交給分析：selected_data（不複製）與 write_csv + load_imu_capture"""
+        from imu_loader import load_imu_capture
+        gui = self.gui
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in (QUICK_BUFFER_SIZES if self.quick else BUFFER_SIZES):
+                gui.clear_data()
+                gui.collected_data.append(synthetic_rows(size, 1000))
+                gui.collecting = True
+                ts = gui.collected_data.view()[:, 0]
+                t0, t1 = ts[size // 4], ts[size * 3 // 4]
+                rows = size // 2
+                repeats = 1000
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    data = gui.selected_data(t0, t1)
+                elapsed = time.perf_counter() - start
+                assert len(data) == rows
+                self.record('handoff', {'buffer': size, 'method': 'view'}, rows * repeats / elapsed, 'rows/s')
+                filename = os.path.join(tmp, 'handoff.csv')
+                start = time.perf_counter()
+                gui.write_csv(filename)
+                data = load_imu_capture(filename, use_cache=False)
+                data = data[(data[:, 0] >= t0) & (data[:, 0] < t1)]
+                elapsed = time.perf_counter() - start
+                self.record('handoff', {'buffer': size, 'method': 'csv'}, rows / elapsed, 'rows/s')
+                gui.collecting = False
+        gui.clear_data()
+
+    def bench_channels(self):
+        """1 kHz 下只訂閱加速度與訂閱全部欄位的解析、儲存、匯出吞吐量"""
+        gui = self.gui
+        seconds = 5 if self.quick else 30
+        rate = 1000
+        data = make_stream(recorded_rows(rate * seconds, rate))
+        chunk = max(int(len(data) / seconds * READ_INTERVAL), 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, fields in (('accel', ['accel']), ('all', None)):
+                gui.set_fields(fields)
+                gui.clear_data()
+                port = FakeSerial(data, chunk)
+                batches = []
+                t0 = time.perf_counter()
+                while port.in_waiting:
+                    batch = gui.parser.feed(port.read(port.in_waiting))
+                    if batch is not None:
+                        batches.append(batch)
+                parse_s = time.perf_counter() - t0
+                n = sum(len(b) for b in batches)
+                gui.collecting = True
+                t0 = time.perf_counter()
+                for batch in batches:
+                    gui.on_data_received(batch)
+                store_s = time.perf_counter() - t0
+                gui.collecting = False
+                filename = os.path.join(tmp, 'export.csv')
+                t0 = time.perf_counter()
+                gui.write_csv(filename)
+                export_s = time.perf_counter() - t0
+                for stage, elapsed in (('parse', parse_s), ('store', store_s), ('export', export_s)):
+                    self.record('channels', {'fields': label, 'stage': stage}, n / elapsed, 'samples/s')
+        gui.set_fields(None)
+        gui.clear_data()
+
+    def bench_filter(self):
+        """九軸 1 kHz、每批 10 ms 的串流濾波吞吐量（scipy sosfilt 與 numpy 實作）"""
+        import imu_filter
+        seconds = 5 if self.quick else 30
+        rate = 1000
+        rows = synthetic_rows(rate * seconds, rate)[:, 4:13]
+        per_read = max(int(rate * READ_INTERVAL), 1)
+        backends = [('numpy', None)]
+        if imu_filter.load_sosfilt() is not None:
+            backends.insert(0, ('scipy', imu_filter.sosfilt))
+        specs = [('lowpass4', dict(kind='lowpass', fc=20.0, order=4)),
+                 ('bandpass2', dict(kind='bandpass', fc=(1.0, 50.0), order=2)),
+                 ('notch', dict(kind='notch', fc=60.0)),
+                 ('moving_average', dict(kind='moving_average', fc=20.0))]
+        saved = imu_filter.sosfilt
+        try:
+            for backend, sosfilt in backends:
+                imu_filter.sosfilt = sosfilt
+                for name, spec in specs:
+                    if backend == 'numpy' and spec['kind'] == 'moving_average' and len(backends) > 1:
+                        continue   # 移動平均不經過 sosfilt
+                    filt = imu_filter.make_filter(n_channels=9, fs=rate, **spec)
+                    t0 = time.perf_counter()
+                    for i in range(0, len(rows), per_read):
+                        filt.process(rows[i:i + per_read])
+                    elapsed = time.perf_counter() - t0
+                    self.record('filter', {'filter': name, 'backend': backend}, len(rows) / elapsed,
+                                'samples/s')
+        finally:
+            imu_filter.sosfilt = saved
+
+    def bench_codec(self):
+        import csv
+        import io
+        from imu_codec import CompactCodec
+        from imu_spill import encode_block, decode_block
+        n = 20_000 if self.quick else 200_000
+        block_rows = 16384
+        # 合成數據四捨五入到韌體輸出精度（不在格點上的欄位會原樣保存，量不到量化的效果）
+        synthetic = CompactCodec().quantize(synthetic_rows(n, 1000))
+        for source, rows in (('recorded', recorded_rows(n, 1000)), ('synthetic', synthetic)):
+            # 往返正確性由 tests/test_codec.py 檢查，這裡只量測速度與大小
+            codec = CompactCodec()
+            sizes = {'float64': rows.nbytes}
+            for name, encode, decode in (('lossless', encode_block, decode_block),
+                                         ('compact', codec.encode, codec.decode),
+                                         ('compact_raw', CompactCodec(compress=False).encode, codec.decode)):
+                t0 = time.perf_counter()
+                encoded = [encode(rows[i:i + block_rows]) for i in range(0, n, block_rows)]
+                elapsed = time.perf_counter() - t0
+                self.record('codec', {'source': source, 'encoding': name, 'metric': 'encode'},
+                            n / elapsed, 'samples/s')
+                t0 = time.perf_counter()
+                for i, data in zip(range(0, n, block_rows), encoded):
+                    decode(data, min(block_rows, n - i), rows.shape[1])
+                self.record('codec', {'source': source, 'encoding': name, 'metric': 'decode'},
+                            n / (time.perf_counter() - t0), 'samples/s')
+                sizes[name] = sum(len(data) for data in encoded)
+            text = io.StringIO()
+            csv.writer(text).writerows(rows.tolist())
+            sizes['csv'] = len(text.getvalue().encode('utf-8'))
+            for name, size in sizes.items():
+                self.record('codec', {'source': source, 'encoding': name, 'metric': 'size'},
+                            size / n, 'bytes/sample')
+
+    def bench_monitor(self):
+        import tkinter as tk
+        import serial
+        import signal_monitor
+        from teensy_sim import TeensyADCSimulator
+        try:
+            app = signal_monitor.TeensyADCGUIMonitor()
+        except tk.TclError as e:
+            print(f"monitor  略過：無法建立 Tk 視窗 ({e})")
+            return
+        app.root.withdraw()
+        try:
+            for n in (MONITOR_SIZES[:2] if self.quick else MONITOR_SIZES):
+                sim = TeensyADCSimulator(num_samples=n, sample_rate=100000, noise=0.01).start()
+                # 直接開啟串口，略過 connect_to_teensy 等待開發板重啟的 2 秒
+                app.ser = serial.Serial(sim.port_name, 115200, timeout=10)
+                app.connected = True
+                t0 = time.perf_counter()
+                app.collect_data()
+                elapsed = time.perf_counter() - t0
+                app.root.update()
+                self.record('monitor', {'samples': n, 'stage': 'capture'}, n / elapsed, 'samples/s')
+                t0 = time.perf_counter()
+                app.update_plot()
+                elapsed = time.perf_counter() - t0
+                self.record('monitor', {'samples': n, 'stage': 'plot+fft'}, n / elapsed, 'samples/s')
+                app.ser.close()
+                sim.stop()
+        finally:
+            app.root.destroy()
+
+    def _pump(self, seconds, until):
+        """處理 Qt 事件直到 until() 成立，回傳是否成立"""
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self._app.processEvents()
+            if until():
+                return True
+            time.sleep(0.001)
+        return False
+
+    def bench_reconnect(self):
+        """拔除後多久偵測到掉線、重新插上後多久恢復收集（含重送 ONTIME 與裝置開始輸出），取中位數"""
+        from hi04m3_sim import HI04M3Simulator
+        from imu_reconnect import PortIdentity, ReconnectSupervisor
+        from imu_rate import ontime_command
+        gui = self.gui
+        baud = 115200
+        with tempfile.TemporaryDirectory() as tmp:
+            link = os.path.join(tmp, 'ttyIMU')
+            sim = HI04M3Simulator(link=link).start()
+            try:
+                # 不經 connect_serial（會跳出對話框），直接開啟並送出 1 kHz 設定
+                gui.clear_data()
+                gui.serial_port = gui.open_serial(link, baud)
+                gui.connection = (link, baud)
+                gui.supervisor = ReconnectSupervisor(PortIdentity.of(link), lambda device: gui.open_serial(device, baud))
+                gui.reconnect_cb.setChecked(True)
+                gui.device_config, _ = ontime_command(1000.0)
+                gui.serial_port.write(gui.device_config.encode('utf-8'))
+                gui.start_device()
+                gui.collecting = True
+                self._pump(2.0, lambda: len(gui.collected_data) > 100)
+                detect, resume = [], []
+                for _ in range(3 if self.quick else RECONNECT_TRIALS):
+                    t0 = time.perf_counter()
+                    sim.unplug()
+                    if not self._pump(5.0, lambda: gui.reconnect_future is not None):
+                        raise AssertionError("沒有偵測到掉線")
+                    detect.append(time.perf_counter() - t0)
+                    time.sleep(UNPLUG_SECONDS)
+                    t0 = time.perf_counter()
+                    sim.replug()
+                    if not self._pump(5.0, lambda: gui.pending_gap is None):
+                        raise AssertionError("重新插上後沒有恢復收集")
+                    resume.append(time.perf_counter() - t0)
+                    self._pump(0.2, lambda: False)
+                gaps = gui.connection_gaps
+                if len(gaps) != len(detect) or any(gap['resumed_ts'] is None for gap in gaps):
+                    raise AssertionError(f"掉線紀錄不完整: {gaps}")
+                self.record('reconnect', {'stage': 'detect', 'unplug_ms': UNPLUG_SECONDS * 1000},
+                            float(np.median(detect)) * 1000, 'ms')
+                self.record('reconnect', {'stage': 'resume', 'unplug_ms': UNPLUG_SECONDS * 1000},
+                            float(np.median(resume)) * 1000, 'ms')
+                self.record('reconnect', {'stage': 'resume_max', 'unplug_ms': UNPLUG_SECONDS * 1000},
+                            max(resume) * 1000, 'ms')
+            finally:
+                gui.collecting = False
+                gui.cancel_reconnect()
+                gui.stop_device()
+                if gui.serial_port is not None:
+                    gui.serial_port.close()
+                gui.serial_port = None
+                sim.stop()
+                gui.clear_data()
+
+    def bench_startup(self):
+        """在新行程測量啟動時間（取多次中的最小值，排除磁碟快取等干擾）"""
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        repeats = 1 if self.quick else STARTUP_REPEATS
+        for module, script in STARTUP_SCRIPTS.items():
+            best, deps = None, []
+            for _ in range(repeats):
+                proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                                      cwd=cwd, capture_output=True, text=True)
+                total, top = parse_importtime(proc.stderr, module)
+                if best is None or total < best:
+                    best, deps = total, top
+            self.record('startup', {'module': module, 'stage': 'import'}, best / 1000.0, 'ms')
+            print("         " + ", ".join(f"{name} {us / 1000.0:.0f}" for name, us in deps[:5]))
+
+            times = []
+            for _ in range(repeats):
+                proc = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    break
+                times.append([float(value) for value in proc.stdout.split()[-2:]])
+            if not times:
+                print(f"startup  略過 {module} 視窗：{proc.stderr.strip().splitlines()[-1]}")
+                continue
+            window, ready = min(times)
+            self.record('startup', {'module': module, 'stage': 'window'}, window, 'ms')
+            self.record('startup', {'module': module, 'stage': 'plot_ready'}, ready, 'ms')
+
+
+BENCHMARKS = ['parse', 'frame', 'binary', 'store', 'render', 'export', 'handoff', 'channels', 'filter', 'codec',
+              'monitor', 'reconnect', 'startup']
+
+
+def result_key(result):
+    return (result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def improvement(result, old):
+    """相對於 old 的改善倍數（> 1 為變好）；越小越好的項目取倒數，沒有可比的數值時回傳 None"""
+    higher = result.get('higher_is_better', result['unit'] not in LOWER_IS_BETTER)
+    new_value, old_value = result['value'], old['value']
+    if higher:
+        return new_value / old_value if old_value else None
+    return old_value / new_value if new_value else None
+
+
+def compare(results, baseline_file):
+    """與先前的結果比較，印出改善倍數（> 1 為變好，< 1 為退步）"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    print(f"\n與 {baseline_file} 比較（> 1 為改善）：")
+    ratios = []
+    for r in results:
+        old = baseline.get(result_key(r))
+        ratio = None if old is None else improvement(r, old)
+        if ratio is None:
+            continue
+        ratios.append((r, ratio))
+        param_text = " ".join(f"{k}={v}" for k, v in r['params'].items())
+        print(f"{r['name']:<8} {param_text:<44} {ratio:6.2f}x")
+    return ratios
+
+
+def main():
+    ap = argparse.ArgumentParser(description="IMU 擷取管線效能基準")
+    ap.add_argument('--quick', action='store_true', help="縮小數據量")
+    ap.add_argument('--only', default=",".join(BENCHMARKS), help="逗號分隔的項目")
+    ap.add_argument('--output', default=None, help="結果 JSON 檔名")
+    ap.add_argument('--compare', default=None, help="要比較的先前結果 JSON")
+    args = ap.parse_args()
+
+    suite = BenchmarkSuite(quick=args.quick)
+    try:
+        for name in args.only.split(','):
+            getattr(suite, f"bench_{name.strip()}")()
+    finally:
+        suite.close()
+
+    output = args.output or f"bench_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'quick': args.quick,
+            },
+            'results': suite.results,
+        }, f, indent=2)
+    print(f"\n結果已寫入 {output}")
+
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
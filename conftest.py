@@ -0,0 +1,26 @@
+"""
+pytest 共用設定：模組為扁平的頂層檔案，測試自 tests/ 匯入；Qt 以離屏模式執行
+"""
+
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true',
+                     help="執行 tests/test_benchmark.py 中的效能基準（較慢，預設略過）")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "benchmark: 效能基準項目，需要 --benchmark")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    import pytest
+    skip = pytest.mark.skip(reason="需要 --benchmark")
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+HI04M3 感測器模擬器（Linux pty）
+開啟一對虛擬終端，模擬 HI04M3 回應 UNLOGALL / LOG HI91|HI92|HI81 ONTIME x / SERIALCONFIG 指令，
+並以設定的頻率輸出 Teensy 文字格式或帶 CRC16 的 HI91/HI92/HI81 二進位封包（可混合）。
+可注入 CRC 錯誤、位元組遺失與輸出抖動，讓 imu_gui.py / test.py 不接硬體也能做壓力測試；
+unplug() / replug()（或 --unplug-every）模擬 USB 拔插：pty 關閉後換一個新的 pty，--link 指向新路徑。
+
+用法：
+    python hi04m3_sim.py                          # 文字格式，等待 LOG HI91 ONTIME 指令
+    python hi04m3_sim.py --rate 1000 --link /tmp/ttyIMU
+    python hi04m3_sim.py --format binary --crc-error 0.01 --drop 0.001 --jitter 5
+    python hi04m3_sim.py --format binary --rate 1000 --packets HI92,HI81
+    python hi04m3_sim.py --replay imu_data_20250813_143629.csv --throttle
+    python hi04m3_sim.py --link /tmp/ttyIMU --unplug-every 10 --unplug-ms 300
+GUI 的 Port 欄位輸入印出的 /dev/pts/N（或 --link 路徑）即可連線。
+"""
+
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+from imu_buffer import CHANNELS, CHANNEL_INDEX
+
+SYNC = b'\x5a\xa5'
+HI91_TAG = 0x91
+HI92_TAG = 0x92
+HI81_TAG = 0x81
+# tag, status, temp, pressure, system_time, acc[3], gyr[3], mag[3], roll, pitch, yaw, quat[4]
+HI91_STRUCT = struct.Struct('<BHbfI3f3f3f3f4f')
+# tag, status, temperature, rev, air_pressure, reserved, gyr_b[3], acc_b[3], mag_b[3], roll, pitch, yaw, quat[4]
+HI92_STRUCT = struct.Struct('<BHbHhh3h3h3hiii4h')
+# tag, status, ins_status, gpst_wn, gpst_tow, reserved, gyr_b[3], acc_b[3], mag_b[3], air_pressure, reserved1,
+# temperature, utc y/m/d/h/min, utc_msec, roll, pitch, yaw, quat[4], ins_lon, ins_lat, ins_msl,
+# pdop, hdop, solq_pos, nv_pos, solq_heading, nv_heading, diff_age, undulation, ant_status,
+# vel_enu[3], acc_enu[3], gnss_lon, gnss_lat, gnss_msl, reserved2[2]
+HI81_STRUCT = struct.Struct('<BHBHIH3h3h3hhhb5BHhhH4hiiiBBBBBBBhB3h3hiii2B')
+PACKET_TAGS = {'HI91': HI91_TAG, 'HI92': HI92_TAG, 'HI81': HI81_TAG}
+GRAVITY = 9.8
+R2D = 57.2957795130823
+# 模擬 INS 的起點（台北）
+INS_ORIGIN = (25.0330, 121.5654, 10.0)
+
+
+def crc16(data, crc=0):
+    """HiPNUC CRC16-CCITT (多項式 0x1021，與 hipnuc_dec.c 相同)"""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def build_frame(payload):
+    """加上同步碼、長度與 CRC：5A A5 len(2) crc(2) payload"""
+    header = SYNC + struct.pack('<H', len(payload))
+    crc = crc16(payload, crc16(header))
+    return header + struct.pack('<H', crc) + payload
+
+
+def format_arduino_line(row):
+    """依韌體 (mian921600.ino) 的 printf 格式輸出一行文字"""
+    c = CHANNEL_INDEX
+    return (f"ts={int(row[c['timestamp']])} ms  T={int(row[c['temperature']])}C  "
+            f"EUL(deg)={row[c['roll']]:.2f},{row[c['pitch']]:.2f},{row[c['yaw']]:.2f}  "
+            f"ACC(g)={row[c['acc_x']]:.3f},{row[c['acc_y']]:.3f},{row[c['acc_z']]:.3f}  "
+            f"GYR(dps)={row[c['gyr_x']]:.2f},{row[c['gyr_y']]:.2f},{row[c['gyr_z']]:.2f}  "
+            f"MAG(uT)={row[c['mag_x']]:.2f},{row[c['mag_y']]:.2f},{row[c['mag_z']]:.2f}  "
+            f"P={row[c['pressure']]:.2f}  FPS(inst)={row[c['fps']]:.1f}")
+
+
+def format_hi91_frame(row):
+    c = CHANNEL_INDEX
+    payload = HI91_STRUCT.pack(
+        HI91_TAG, 0, int(row[c['temperature']]), row[c['pressure']],
+        int(row[c['timestamp']]) & 0xFFFFFFFF,
+        row[c['acc_x']], row[c['acc_y']], row[c['acc_z']],
+        row[c['gyr_x']], row[c['gyr_y']], row[c['gyr_z']],
+        row[c['mag_x']], row[c['mag_y']], row[c['mag_z']],
+        row[c['roll']], row[c['pitch']], row[c['yaw']],
+        1.0, 0.0, 0.0, 0.0)
+    return build_frame(payload)
+
+
+def _int16(values, scale):
+    return [int(max(min(round(v / scale), 32767), -32768)) for v in values]
+
+
+def format_hi92_frame(row):
+    """HI92：整數 IMU，比例與 hipnuc_dump_packet 相同（加速度 m/s²，由 g 換算）"""
+    c = CHANNEL_INDEX
+    acc = [row[c[name]] * GRAVITY for name in ('acc_x', 'acc_y', 'acc_z')]
+    gyr = [row[c[name]] for name in ('gyr_x', 'gyr_y', 'gyr_z')]
+    mag = [row[c[name]] for name in ('mag_x', 'mag_y', 'mag_z')]
+    payload = HI92_STRUCT.pack(
+        HI92_TAG, 0, int(row[c['temperature']]), 0, int(round(row[c['pressure']])), 0,
+        *_int16(gyr, 0.001 * R2D), *_int16(acc, 0.0048828), *_int16(mag, 0.030517),
+        *(int(round(row[c[name]] * 1000)) for name in ('roll', 'pitch', 'yaw')),
+        10000, 0, 0, 0)
+    return build_frame(payload)
+
+
+def format_hi81_frame(row, t):
+    """HI81：以固定速度向東北移動的 INS 解"""
+    c = CHANNEL_INDEX
+    lat0, lon0, msl0 = INS_ORIGIN
+    vel = (1.0, 0.5, 0.0)   # ENU m/s
+    lat = lat0 + vel[1] * t / 111320.0
+    lon = lon0 + vel[0] * t / (111320.0 * math.cos(math.radians(lat0)))
+    tow = int(row[c['timestamp']]) & 0xFFFFFFFF
+    payload = HI81_STRUCT.pack(
+        HI81_TAG, 0, 2, 2300, tow, 0,
+        *_int16([row[c[n]] for n in ('gyr_x', 'gyr_y', 'gyr_z')], 0.001 * R2D),
+        *_int16([row[c[n]] * GRAVITY for n in ('acc_x', 'acc_y', 'acc_z')], 0.0048828),
+        *_int16([row[c[n]] for n in ('mag_x', 'mag_y', 'mag_z')], 0.030517),
+        int(round(row[c['pressure']])), 0, int(row[c['temperature']]),
+        25, 1, 1, 0, 0, int(t * 1000) % 60000,
+        *_int16([row[c['roll']], row[c['pitch']]], 0.01), int(round(row[c['yaw']] % 360 / 0.01)) & 0xFFFF,
+        10000, 0, 0, 0,
+        int(round(lon * 1e7)), int(round(lat * 1e7)), int(round(msl0 * 1e3)),
+        12, 8, 5, 18, 4, 16, 1, 1700, 0,
+        *_int16(vel, 0.01), 0, 0, 0,
+        int(round(lon * 1e7)), int(round(lat * 1e7)), int(round(msl0 * 1e3)), 0, 0)
+    return build_frame(payload)
+
+
+class MotionSource:
+    """合成的感測器數據：緩慢旋轉 + 振動 + 雜訊"""
+
+    def __init__(self, seed=0):
+        self._rng = np.random.default_rng(seed)
+
+    def row(self, t):
+        c = CHANNEL_INDEX
+        row = np.zeros(len(CHANNELS))
+        row[c['temperature']] = 30
+        yaw = (t * 20.0) % 360 - 180
+        vib = 0.05 * math.sin(2 * math.pi * 37.0 * t)
+        row[c['acc_x']:c['acc_z'] + 1] = [vib, 0.0, 1.0] + self._rng.normal(0, 0.005, 3)
+        row[c['gyr_x']:c['gyr_z'] + 1] = [0.0, 0.0, 20.0] + self._rng.normal(0, 0.2, 3)
+        heading = math.radians(yaw)
+        row[c['mag_x']:c['mag_z'] + 1] = [30 * math.cos(heading), -30 * math.sin(heading), -20.0]
+        row[c['roll']:c['yaw'] + 1] = [0.0, 0.0, yaw]
+        return row
+
+
+class ReplaySource:
+    """循環重播匯出的 CSV"""
+
+    def __init__(self, filename):
+        self._rows = np.loadtxt(filename, delimiter=',', skiprows=1, ndmin=2)
+        self._i = 0
+
+    def row(self, t):
+        row = self._rows[self._i].copy()
+        self._i = (self._i + 1) % len(self._rows)
+        return row
+
+
+class HI04M3Simulator:
+    """在 pty 主端模擬感測器；port_name 是給 GUI 開啟的從端路徑"""
+
+    def __init__(self, fmt='ascii', rate=0.0, source=None, crc_error=0.0, drop=0.0,
+                 jitter_ms=0.0, throttle=False, baud=115200, seed=0, packets=('HI91',), link=None):
+        self.format = fmt
+        self._power_on = (rate, tuple(packets))   # 重新插上時恢復的開機設定
+        self.rate = rate            # 0 表示尚未啟動輸出（等 LOG 指令）
+        # 已 LOG 的封包 -> 每幾個取樣時脈輸出一次（取樣時脈為最短的 ONTIME 間隔）
+        self.packets = {name: 1 for name in packets} if rate > 0 else {}
+        self._intervals = {name: 1.0 / rate for name in self.packets}
+        self.source = source or MotionSource(seed)
+        self.crc_error = crc_error  # 每幀發生 CRC 錯誤的機率
+        self.drop = drop            # 每幀遺失一個位元組的機率
+        self.jitter_ms = jitter_ms
+        self.throttle = throttle    # 依波特率限制輸出位元組數
+        self.baud = baud
+        self._random = random.Random(seed)
+        self.link = link            # 指向目前 pty 的符號連結（模擬固定的裝置名稱）
+        self._lock = threading.Lock()
+        self.plugged = False
+        self._open_pty()
+        self._running = False
+        self._thread = None
+        self._start_time = time.monotonic()
+        self._sent = 0              # 自 LOG 指令以來送出的樣本數
+        self._rate_origin = time.monotonic()
+        self.stats = {'samples': 0, 'bytes': 0, 'overflow_bytes': 0,
+                      'crc_errors': 0, 'dropped_bytes': 0, 'commands': 0, 'unplugs': 0}
+
+    # ---- 拔插 ----
+    def _open_pty(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port_name = os.ttyname(self.slave)
+        self._command_buf = b''
+        if self.link:
+            tmp = self.link + ".tmp"
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            os.symlink(self.port_name, tmp)
+            os.replace(tmp, self.link)
+        self.plugged = True
+
+    def _close_pty(self):
+        self.plugged = False
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def unplug(self):
+        """模擬 USB 拔除：關閉 pty，主機端讀取會發生 I/O 錯誤，符號連結消失"""
+        with self._lock:
+            if self.plugged:
+                self._close_pty()
+                self.stats['unplugs'] += 1
+
+    def replug(self):
+        """模擬重新插上：建立新的 pty（路徑通常不同），輸出設定回到開機狀態（需重新 LOG）"""
+        with self._lock:
+            if self.plugged:
+                return
+            self._open_pty()
+            rate, packets = self._power_on
+            self.packets = {name: 1 for name in packets} if rate > 0 else {}
+            self._intervals = {name: 1.0 / rate for name in self.packets}
+            self._start_time = time.monotonic()
+            self._set_rate(rate)
+
+    # ---- 指令處理 ----
+    def _handle_command(self, line):
+        self.stats['commands'] += 1
+        parts = line.split()
+        if not parts:
+            return
+        cmd = parts[0].upper()
+        if cmd == 'UNLOGALL':
+            self._intervals = {}
+            self.packets = {}
+            self._set_rate(0.0)
+        elif (cmd == 'LOG' and len(parts) >= 4 and parts[2].upper() == 'ONTIME'
+              and parts[1].upper() in PACKET_TAGS):
+            interval = float(parts[3])
+            if interval > 0:
+                self._intervals[parts[1].upper()] = interval
+            else:
+                self._intervals.pop(parts[1].upper(), None)
+            self._schedule()
+        elif cmd == 'SERIALCONFIG' and len(parts) >= 2:
+            self.baud = int(parts[1])
+        else:
+            self._write(b"ERR\r\n")
+            return
+        self._write(b"OK\r\n")
+
+    def _schedule(self):
+        """以最短的 ONTIME 為取樣時脈，其他封包每 N 個時脈輸出一次"""
+        if not self._intervals:
+            self.packets = {}
+            self._set_rate(0.0)
+            return
+        base = min(self._intervals.values())
+        self.packets = {name: max(int(round(interval / base)), 1) for name, interval in self._intervals.items()}
+        self._set_rate(1.0 / base)
+
+    def _set_rate(self, rate):
+        self.rate = rate
+        self._sent = 0
+        self._rate_origin = time.monotonic()
+
+    def _poll_commands(self):
+        try:
+            data = os.read(self.master, 4096)
+        except (BlockingIOError, OSError):
+            return
+        self._command_buf += data
+        while b'\n' in self._command_buf:
+            line, self._command_buf = self._command_buf.split(b'\n', 1)
+            self._handle_command(line.decode('ascii', errors='ignore').strip())
+
+    # ---- 輸出 ----
+    def _write(self, data):
+        try:
+            n = os.write(self.master, data)
+        except BlockingIOError:
+            n = 0
+        except OSError:
+            return
+        self.stats['bytes'] += n
+        # pty 緩衝區滿（主機端讀太慢）時多出的位元組被丟棄，相當於 OS 串口緩衝溢位
+        self.stats['overflow_bytes'] += len(data) - n
+
+    def _encode(self, row, t=0.0):
+        if self.format == 'binary':
+            parts = []
+            for name, every in self.packets.items():
+                if self._sent % every:
+                    continue
+                if name == 'HI91':
+                    parts.append(format_hi91_frame(row))
+                elif name == 'HI92':
+                    parts.append(format_hi92_frame(row))
+                else:
+                    parts.append(format_hi81_frame(row, t))
+            frame = bytearray(b''.join(parts))
+            if not frame:
+                return b''
+        else:
+            frame = bytearray((format_arduino_line(row) + "\n").encode('ascii'))
+        if self.crc_error and self._random.random() < self.crc_error:
+            # 翻轉內容中的一個位元：二進位為 CRC 錯誤，文字則成為亂碼行
+            i = self._random.randrange(6 if self.format == 'binary' else 0, len(frame) - 1)
+            frame[i] ^= 0x10
+            self.stats['crc_errors'] += 1
+        if self.drop and self._random.random() < self.drop:
+            del frame[self._random.randrange(len(frame))]
+            self.stats['dropped_bytes'] += 1
+        return bytes(frame)
+
+    def _emit_due(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        due = int((now - self._rate_origin) * self.rate) - self._sent
+        if due <= 0:
+            return
+        chunks = []
+        for _ in range(due):
+            t = self._rate_origin + self._sent / self.rate - self._start_time
+            row = self.source.row(t)
+            row[CHANNEL_INDEX['timestamp']] = int(t * 1000)
+            row[CHANNEL_INDEX['fps']] = self.rate
+            chunks.append(self._encode(row, t))
+            self._sent += 1
+        data = b''.join(chunks)
+        if self.jitter_ms:
+            time.sleep(self._random.uniform(0, self.jitter_ms) / 1000.0)
+        self._write(data)
+        self.stats['samples'] += due
+        if self.throttle:
+            # 模擬 8N1 串列線路：每位元組 10 bit
+            time.sleep(len(data) * 10.0 / self.baud)
+
+    def run(self):
+        self._running = True
+        while self._running:
+            with self._lock:
+                if self.plugged:
+                    self._poll_commands()
+                    self._emit_due()
+            time.sleep(0.001)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        if self.plugged:
+            self._close_pty()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="HI04M3 pty 模擬器")
+    ap.add_argument('--format', choices=['ascii', 'binary'], default='ascii',
+                    help="ascii: Teensy 文字行；binary: HiPNUC 原始封包")
+    ap.add_argument('--packets', default='HI91', help="binary 格式以 --rate 啟動時輸出的封包，例如 HI92,HI81")
+    ap.add_argument('--rate', type=float, default=0.0, help="啟動即輸出的頻率 Hz（預設等 LOG 指令）")
+    ap.add_argument('--replay', default=None, help="重播匯出的 CSV")
+    ap.add_argument('--crc-error', type=float, default=0.0, help="每幀 CRC 錯誤機率")
+    ap.add_argument('--drop', type=float, default=0.0, help="每幀遺失一個位元組的機率")
+    ap.add_argument('--jitter', type=float, default=0.0, help="輸出抖動上限 (ms)")
+    ap.add_argument('--throttle', action='store_true', help="依波特率限制輸出速度")
+    ap.add_argument('--baud', type=int, default=921600)
+    ap.add_argument('--link', default=None, help="建立指向 pty 的符號連結")
+    ap.add_argument('--unplug-every', type=float, default=0.0, help="每隔幾秒模擬一次 USB 拔插")
+    ap.add_argument('--unplug-ms', type=float, default=300.0, help="拔除的時間 (ms)")
+    args = ap.parse_args()
+
+    source = ReplaySource(args.replay) if args.replay else None
+    sim = HI04M3Simulator(args.format, args.rate, source, args.crc_error, args.drop,
+                          args.jitter, args.throttle, args.baud,
+                          packets=[name.strip().upper() for name in args.packets.split(',')],
+                          link=args.link)
+    port = args.link or sim.port_name
+    print(f"HI04M3 模擬器已就緒: {port}  格式={args.format}")
+    sim.start()
+    try:
+        last = dict(sim.stats)
+        next_unplug = time.monotonic() + args.unplug_every
+        while True:
+            time.sleep(1.0)
+            if args.unplug_every and time.monotonic() >= next_unplug:
+                sim.unplug()
+                time.sleep(args.unplug_ms / 1000.0)
+                sim.replug()
+                next_unplug = time.monotonic() + args.unplug_every
+                print(f"模擬拔插 {args.unplug_ms:.0f} ms，新的 pty: {sim.port_name}")
+            s = dict(sim.stats)
+            print(f"rate={sim.rate:.0f}Hz baud={sim.baud} 樣本/秒={s['samples'] - last['samples']} "
+                  f"B/s={s['bytes'] - last['bytes']} 溢位={s['overflow_bytes']}B "
+                  f"CRC錯誤={s['crc_errors']} 遺失={s['dropped_bytes']}B")
+            last = s
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
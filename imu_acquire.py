@@ -0,0 +1,529 @@
+"""
+asyncio 擷取核心（imu_gui.py 與 signal_monitor.py 共用）
+一個背景線程執行 asyncio 事件迴圈，多個串口裝置共用；每個裝置一個讀取任務與一個處理任務：
+    讀取 -> 有界緩衝 -> 處理 -> sink（送到 Qt / Tk 主線程）
+sink 為每個消費者維護一個有界的 IngestQueue，滿了時依策略等待（不丟數據）、丟棄最舊或合併；
+等待期間讀到的數據在讀取緩衝中合併成較大的批次，緩衝也滿了才暫停讀取。跨線程的訊息數量與記憶體都有上限。
+停止時取消任務並等待結束，不再依賴 sleep 等待線程自行退出。
+BatchPlugins 讓使用者的分析函式在獨立線程處理每批數據（唯讀視圖，不複製），不佔用事件迴圈與主線程。
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+
+import serial
+
+
+class AcquisitionLoop:
+    """在背景線程執行的 asyncio 事件迴圈"""
+
+    def __init__(self, name='imu-acquire'):
+        self.name = name
+        self.loop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self.loop = loop
+            ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def submit(self, coro):
+        """從其他線程排程協程，回傳 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout=2.0):
+        """取消所有任務、等待結束後停止事件迴圈；線程在 timeout 內結束時回傳 True"""
+        if not self.running:
+            return True
+
+        async def shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(shutdown()).result(timeout)
+        except concurrent.futures.TimeoutError:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+
+class AsyncSerial:
+    """pyserial 串口的非阻塞讀取
+
+    POSIX 上以 add_reader 等待可讀；沒有 fileno 的串口（Windows COM、測試用假串口）輪詢 in_waiting。
+    observe(in_waiting) 在每次讀取前以 OS 緩衝中累積的位元組數呼叫（量測積壓用）。
+    """
+
+    def __init__(self, port, poll_interval=0.002, observe=None):
+        self.port = port
+        self.poll_interval = poll_interval
+        self.observe = observe
+        self._fd = self._fileno(port)
+        self._buffer = b''
+
+    @staticmethod
+    def _fileno(port):
+        try:
+            return port.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    async def _wait_readable(self):
+        if self._fd is not None:
+            loop = asyncio.get_running_loop()
+            ready = loop.create_future()
+            try:
+                loop.add_reader(self._fd, lambda: ready.done() or ready.set_result(None))
+            except NotImplementedError:   # 不支援 add_reader 的事件迴圈
+                self._fd = None
+            else:
+                try:
+                    # 逾時後重新檢查，串口被關閉時不會永遠等待
+                    await asyncio.wait_for(ready, 0.1)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    loop.remove_reader(self._fd)
+                return
+        await asyncio.sleep(self.poll_interval)
+
+    async def read(self):
+        """等待並回傳目前可讀的全部位元組"""
+        port = self.port
+        woke = False
+        while True:
+            in_waiting = port.in_waiting
+            if in_waiting:
+                if self.observe is not None:
+                    self.observe(in_waiting)
+                return port.read(in_waiting)
+            if woke:
+                # 可讀卻沒有數據（例如對端掛斷）：退回輪詢，避免空轉
+                await asyncio.sleep(self.poll_interval)
+            await self._wait_readable()
+            woke = self._fd is not None
+
+    async def readlines(self):
+        """等待並回傳目前所有完整的行（bytes，不含換行）"""
+        while b'\n' not in self._buffer:
+            self._buffer += await self.read()
+        *lines, self._buffer = self._buffer.split(b'\n')
+        return lines
+
+    async def readline(self):
+        """讀取一行（bytes，不含換行）；其餘已讀取的數據留在內部緩衝"""
+        while b'\n' not in self._buffer:
+            self._buffer += await self.read()
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line
+
+
+class SerialDevice:
+    """一個串口裝置的擷取管線
+
+    讀取任務持續把位元組累積到有界緩衝（max_buffer 位元組）；處理任務每次取走全部累積的數據，
+    以 process(raw, host_ns) 轉成要交付的參數 tuple（None 表示沒有），再 await sink.deliver(args)。
+    下游忙碌時數據在緩衝中合併成較大的批次，而不是停止讀取（OS 串口緩衝只有數 KB，停讀就會掉資料）；
+    緩衝滿了才暫停讀取。host_ns 為最後一次讀到數據時的 time.monotonic_ns()，對應批次的最後一筆。
+    on_error(e) 處理串口錯誤（預設印出），之後稍候重試；串口關閉時任務結束。
+    有 on_lost 時，連續 lost_after 秒只有錯誤、讀不到數據即視為裝置遺失（USB 拔除）：
+    先交付已讀到的數據，再於事件迴圈線程呼叫 on_lost(e)，任務結束。
+    observe_serial 傳給 AsyncSerial，每次讀取前以串口的 in_waiting 呼叫。
+    """
+
+    def __init__(self, port, process, sink, max_buffer=4 * 1024 * 1024, on_error=None,
+                 on_lost=None, lost_after=0.1, observe_serial=None):
+        self.port = port
+        self.process = process
+        self.sink = sink
+        self.max_buffer = max_buffer
+        self.on_error = on_error or (lambda e: print(f"串口通訊警告: {e}"))
+        self.on_lost = on_lost
+        self.lost_after = lost_after
+        self.observe_serial = observe_serial
+        self._acquisition = None
+        self._task = None
+
+    def start(self, acquisition):
+        self._acquisition = acquisition
+
+        async def create():
+            return asyncio.create_task(self._run())
+
+        self._task = acquisition.submit(create()).result()
+        return self
+
+    def stop(self, timeout=2.0):
+        """取消讀取與處理任務並等待結束（於事件迴圈以外的線程呼叫）"""
+        task, self._task = self._task, None
+        if task is None or not self._acquisition.running:
+            return
+
+        async def cancel():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        try:
+            self._acquisition.submit(cancel()).result(timeout)
+        except concurrent.futures.TimeoutError:
+            pass
+
+    async def _run(self):
+        self._pending = bytearray()
+        self._host_ns = 0
+        self._ready = asyncio.Event()      # 緩衝中有數據
+        self._drained = asyncio.Event()    # 處理任務已取走緩衝
+        self._closing = False
+        tasks = [asyncio.create_task(self._read()), asyncio.create_task(self._work())]
+        try:
+            lost = await tasks[0]
+            if lost is not None:
+                # 裝置遺失：等處理任務交付最後讀到的數據，記錄才不會少一段
+                self._closing = True
+                self._ready.set()
+                await tasks[1]
+                self.on_lost(lost)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _read(self):
+        """讀取直到串口關閉（回傳 None）或裝置遺失（回傳最後的錯誤）"""
+        port = AsyncSerial(self.port, observe=self.observe_serial)
+        failing_since = None
+        while self.port.is_open:
+            try:
+                raw = await port.read()
+            except (serial.SerialException, OSError) as e:
+                if not self.port.is_open:
+                    break
+                now = time.monotonic()
+                if self.on_lost is None or failing_since is None:
+                    self.on_error(e)   # 偵測掉線時，同一段連續錯誤只回報第一次
+                failing_since = failing_since or now
+                if self.on_lost is not None and now - failing_since >= self.lost_after:
+                    return e
+                await asyncio.sleep(0.01)
+                continue
+            failing_since = None
+            self._pending += raw
+            self._host_ns = time.monotonic_ns()
+            self._ready.set()
+            if len(self._pending) >= self.max_buffer:
+                # 緩衝已滿：暫停讀取，直到處理任務取走數據
+                self._drained.clear()
+                await self._drained.wait()
+
+    async def _work(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            raw, host_ns = bytes(self._pending), self._host_ns
+            self._pending.clear()
+            self._drained.set()
+            if raw:
+                try:
+                    args = self.process(raw, host_ns)
+                except Exception as e:
+                    print(f"讀取串口錯誤: {e}")
+                    args = None
+                if args is not None:
+                    await self.sink.deliver(args)
+            if self._closing and not self._pending:
+                return
+
+
+def merge_items(old, new):
+    """coalesce 策略預設的合併方式：逐欄位串接 (N, 欄位數) 陣列；任一方為 None 的欄位結果為 None"""
+    import numpy as np   # 只有合併時才需要；signal_monitor 啟動時不載入 numpy
+    return tuple(None if a is None or b is None else np.concatenate((a, b)) for a, b in zip(old, new))
+
+
+class IngestQueue:
+    """讀取端與一個消費者之間的有界佇列（事件迴圈線程放入，主線程取出）
+
+    佇列滿時依 policy 處理：
+        block        put() 等待消費者取走，不丟數據（背壓傳回讀取端的緩衝）
+        drop_oldest  丟棄最舊的項目，適合只看最新數據的顯示
+        coalesce     與最後一個項目合併（merge(old, new)），不丟數據但減少項目數
+    """
+
+    POLICIES = ('block', 'drop_oldest', 'coalesce')
+
+    def __init__(self, maxlen=16, policy='block', merge=merge_items, poll_interval=0.002):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的佇列策略: {policy}")
+        self.maxlen = maxlen
+        self.policy = policy
+        self.merge = merge
+        self.poll_interval = poll_interval
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.put_count = 0
+        self.dropped = 0          # drop_oldest 丟棄的項目數
+        self.coalesced = 0        # coalesce 合併的項目數
+        self.peak = 0             # 佇列長度最高值
+        self.blocked_ns = 0       # block 策略等待的累計時間
+
+    def __len__(self):
+        return len(self._items)
+
+    async def put(self, item):
+        if self.policy == 'block' and len(self._items) >= self.maxlen:
+            t0 = time.perf_counter_ns()
+            while len(self._items) >= self.maxlen and self.policy == 'block':
+                await asyncio.sleep(self.poll_interval)
+            self.blocked_ns += time.perf_counter_ns() - t0
+        with self._lock:
+            items = self._items
+            self.put_count += 1
+            if len(items) >= self.maxlen and self.policy == 'coalesce':
+                items[-1] = self.merge(items[-1], item)
+                self.coalesced += 1
+                return
+            items.append(item)
+            if len(items) > self.maxlen and self.policy == 'drop_oldest':
+                items.popleft()
+                self.dropped += 1
+            if len(items) > self.peak:
+                self.peak = len(items)
+
+    def get_all(self):
+        """取出目前所有項目"""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
+
+    def stats(self):
+        return {'policy': self.policy, 'depth': len(self._items), 'maxlen': self.maxlen,
+                'put': self.put_count, 'dropped': self.dropped, 'coalesced': self.coalesced,
+                'peak': self.peak, 'blocked_ms': self.blocked_ns / 1e6}
+
+
+class BatchPlugins:
+    """對每批新數據執行使用者分析函式的外掛執行器
+
+    submit() 可由事件迴圈線程直接呼叫：批次以唯讀視圖放入有界佇列（不複製），滿了就丟最舊的批次，
+    分析再慢也不會拖慢擷取。外掛在專用的工作線程依序呼叫 fn(batch, columns)，
+    回傳值不為 None 時交給 on_result(name, result)（例如以 sink.post 送回主線程）；例外只計數並交給 on_error。
+    """
+
+    def __init__(self, maxlen=64, on_result=None, on_error=None):
+        self.on_result = on_result
+        self.on_error = on_error
+        self._plugins = {}
+        self._queue = collections.deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self._plugins)
+
+    def add(self, fn, name=None):
+        """加入外掛 fn(batch, columns)，回傳其名稱；第一次加入時啟動工作線程"""
+        name = name or getattr(fn, '__name__', repr(fn))
+        self._plugins = {**self._plugins, name: fn}
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='imu-plugins', daemon=True)
+                self._thread.start()
+        return name
+
+    def remove(self, name):
+        self._plugins = {key: fn for key, fn in self._plugins.items() if key != name}
+
+    def submit(self, batch, columns=None):
+        """排入一批數據 (N, 欄位數)；沒有外掛時不做任何事"""
+        if not self._plugins:
+            return
+        view = batch.view()
+        view.flags.writeable = False
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((view, columns))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._queue:
+                    self._cond.wait(0.5)
+                if self._stopping:
+                    return
+                batch, columns = self._queue.popleft()
+            for name, fn in self._plugins.items():
+                try:
+                    result = fn(batch, columns)
+                except Exception as e:
+                    self.errors += 1
+                    if self.on_error is not None:
+                        self.on_error(name, e)
+                    continue
+                if result is not None and self.on_result is not None:
+                    self.on_result(name, result)
+            self.processed += 1
+
+    def stats(self):
+        return {'plugins': list(self._plugins), 'depth': len(self._queue), 'processed': self.processed,
+                'dropped': self.dropped, 'errors': self.errors}
+
+    def stop(self, timeout=2.0):
+        """停止工作線程（未處理的批次捨棄）"""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._queue.clear()
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+
+
+_QtBridge = None
+
+
+def _qt_bridge():
+    """建立（一次）在 GUI 線程接收喚醒的 QObject 類別；只在使用 QtSink 時才匯入 PyQt5"""
+    global _QtBridge
+    if _QtBridge is None:
+        from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+        class Bridge(QObject):
+            wake = pyqtSignal()
+
+            def __init__(self, drain):
+                super().__init__()
+                self._drain = drain
+                self.wake.connect(self.on_wake)
+
+            @pyqtSlot()
+            def on_wake(self):
+                self._drain()
+
+        _QtBridge = Bridge
+    return _QtBridge
+
+
+class _MainThreadSink:
+    """Qt / Tk sink 的共同部分
+
+    每個消費者一個 IngestQueue；deliver() 把項目放進所有佇列，主線程 drain() 時依序交給各消費者。
+    只在佇列由空轉為非空時喚醒主線程一次，Qt 的信號佇列不會隨負載無限成長。
+    post() 排程一般的主線程呼叫（不經佇列策略）。
+    """
+
+    def __init__(self):
+        self.consumers = []       # [(callback, IngestQueue)]
+        self._posts = collections.deque()
+        self._scheduled = False
+
+    def add_consumer(self, callback, queue=None):
+        """加入消費者 callback(*item)，回傳其佇列"""
+        queue = queue if queue is not None else IngestQueue()
+        self.consumers = self.consumers + [(callback, queue)]
+        return queue
+
+    @property
+    def pending(self):
+        return max((len(queue) for _, queue in self.consumers), default=0)
+
+    async def deliver(self, item):
+        for _, queue in self.consumers:
+            await queue.put(item)
+            self._schedule()
+
+    def post(self, fn, *args):
+        """從任何線程排程主線程上的呼叫"""
+        self._posts.append((fn, args))
+        self._schedule()
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self._wake()
+
+    def drain(self):
+        """在主線程處理所有排程的呼叫與佇列中的項目"""
+        self._scheduled = False
+        posts = self._posts
+        while posts:
+            fn, args = posts.popleft()
+            fn(*args)
+        for callback, queue in self.consumers:
+            for item in queue.get_all():
+                try:
+                    callback(*item)
+                except Exception as e:
+                    print(f"處理數據錯誤: {e}")
+
+
+class QtSink(_MainThreadSink):
+    """以 Qt 佇列信號喚醒 GUI 線程處理（須在 GUI 線程建立）"""
+
+    def __init__(self):
+        super().__init__()
+        self._bridge = _qt_bridge()(self.drain)
+
+    def _wake(self):
+        self._bridge.wake.emit()
+
+
+class TkSink(_MainThreadSink):
+    """Tk 不可跨線程呼叫：由 Tk 主迴圈以 after() 定時處理"""
+
+    def __init__(self, root, interval_ms=10):
+        super().__init__()
+        self.root = root
+        self.interval_ms = interval_ms
+        self._after_id = root.after(interval_ms, self._tick)
+
+    def _wake(self):
+        pass    # 由定時的 _tick 處理
+
+    def _tick(self):
+        try:
+            self.drain()
+        finally:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def close(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
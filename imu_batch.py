@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+擷取檔批次分析
+以多個行程平行處理一批擷取檔（imu_data_*.csv、AD9106_data_*.csv），每個檔案分段串流讀取，
+記憶體只需容納一段；各檔的結果彙整成一張摘要表（CSV，一檔一列）。
+
+分析項目（--analyses，以逗號分隔）：
+    gaps      樣本數、長度、採樣頻率、跳號段數與估計遺失樣本數
+    stats     各欄位平均、標準差、最小、最大
+    spectrum  各欄位 Welch 功率譜的峰值頻率與 RMS
+    events    加速度幅值觸發事件數（--event-level，單位 g）
+
+用法：
+    python imu_batch.py "captures/*.csv" -o summary.csv
+    python imu_batch.py "captures/**/*.csv" -j 8 --analyses gaps,spectrum --chunk-rows 50000
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from imu_buffer import ColumnStats, SENSOR_CHANNELS
+from imu_library import GapCounter
+from imu_loader import iter_csv_chunks
+from imu_spectrum import WelchPSD
+from imu_trigger import Trigger, TriggerEngine
+
+DEFAULT_ANALYSES = ['gaps', 'stats', 'spectrum', 'events']
+
+
+def analysis_channels(header):
+    """要分析的欄位：IMU 擷取取九軸（有的才算），其他擷取（電壓、INS）取時間戳以外的欄位"""
+    channels = [name for name in SENSOR_CHANNELS if name in header]
+    return channels or list(header[1:])
+
+
+def estimate_rate(ts):
+    """由時間戳 (ms) 間隔中位數估計採樣頻率，無法估計時回傳 None"""
+    if len(ts) < 2:
+        return None
+    step = np.median(np.diff(ts))
+    return 1000.0 / step if step > 0 else None
+
+
+class GapsAnalysis:
+    def __init__(self, header, channels, rate, options):
+        self.counter = GapCounter(rate)
+
+    def update(self, block):
+        self.counter.update(block[:, 0])
+
+    def result(self):
+        counter = self.counter
+        return {'duration_s': counter.duration, 'rate_hz': counter.rate,
+                'gaps': counter.gaps, 'missing': counter.missing}
+
+
+class StatsAnalysis:
+    def __init__(self, header, channels, rate, options):
+        self.channels = channels
+        self.index = [header.index(name) for name in channels]
+        self.stats = ColumnStats()
+
+    def update(self, block):
+        self.stats.update(block[:, self.index])
+
+    def result(self):
+        stats = self.stats.result()
+        if stats is None:
+            return {}
+        row = {}
+        for i, name in enumerate(self.channels):
+            for key in ('mean', 'std', 'min', 'max'):
+                row[f"{name}_{key}"] = float(stats[key][i])
+        return row
+
+
+class SpectrumAnalysis:
+    def __init__(self, header, channels, rate, options):
+        self.channels = channels
+        self.index = [header.index(name) for name in channels]
+        nfft = int(min(options.nfft, 2 ** int(round(np.log2(max(rate or 1, 64))))))   # 幀長不超過約 1 秒
+        self.psd = WelchPSD(len(channels), rate, nfft) if rate else None
+
+    def update(self, block):
+        if self.psd is not None:
+            self.psd.push(block[:, self.index])
+
+    def result(self):
+        result = self.psd.result() if self.psd is not None else None
+        if result is None:
+            return {}
+        freqs, psd = result
+        df = freqs[1] - freqs[0]
+        row = {}
+        for i, name in enumerate(self.channels):
+            # 峰值頻率略過直流項；RMS 為功率譜積分（不含直流）
+            k = int(np.argmax(psd[i, 1:])) + 1
+            row[f"{name}_peak_hz"] = float(freqs[k])
+            row[f"{name}_rms"] = float(np.sqrt(np.sum(psd[i, 1:]) * df))
+        return row
+
+
+class EventsAnalysis:
+    def __init__(self, header, channels, rate, options):
+        self.engine = None
+        self.count = 0
+        self.first_ts = None
+        if rate and 'acc_x' in header:
+            trigger = Trigger('magnitude', options.event_level, group='acc', columns=header)
+            self.engine = TriggerEngine([trigger], rate, pre_ms=0, post_ms=options.event_ms, columns=header)
+
+    def update(self, block):
+        if self.engine is None:
+            return
+        finished = self.engine.process(block)
+        if finished:
+            if self.first_ts is None:
+                self.first_ts = float(finished[0].trigger_timestamp)
+            self.count += len(finished)
+            self.engine.events.clear()    # 只需計數，不保留事件數據
+
+    def result(self):
+        if self.engine is None:
+            return {}
+        # 檔案結尾時仍在擷取中的事件也算一次
+        count = self.count + int(self.engine.capturing)
+        return {'events': count, 'first_event_ts': self.first_ts}
+
+
+ANALYSES = {
+    'gaps': GapsAnalysis,
+    'stats': StatsAnalysis,
+    'spectrum': SpectrumAnalysis,
+    'events': EventsAnalysis,
+}
+
+
+def analyze_file(path, analyses=DEFAULT_ANALYSES, options=None):
+    """分段讀取單一擷取檔並執行分析，回傳摘要列 (dict)；錯誤記錄在 'error' 欄"""
+    options = options or parse_args([])
+    row = {'file': path}
+    t0 = time.perf_counter()
+    try:
+        header, chunks = iter_csv_chunks(path, options.chunk_rows)
+        row['columns'] = len(header)
+        samples = 0
+        workers = None
+        for block in chunks:
+            if workers is None:
+                # 以第一段估計採樣頻率，決定 FFT 長度與觸發視窗
+                rate = estimate_rate(block[:, 0])
+                channels = analysis_channels(header)
+                workers = [ANALYSES[name](header, channels, rate, options) for name in analyses]
+            for worker in workers:
+                worker.update(block)
+            samples += len(block)
+        row['samples'] = samples
+        for worker in workers or []:
+            row.update(worker.result())
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        row['error'] = str(e)
+    row['elapsed_s'] = round(time.perf_counter() - t0, 4)
+    return row
+
+
+def expand_paths(patterns):
+    """展開 glob（支援 **），去除重複並排序"""
+    paths = set()
+    for pattern in patterns:
+        matched = glob.glob(pattern, recursive=True)
+        paths.update(p for p in (matched or [pattern]) if os.path.isfile(p) and p.endswith('.csv'))
+    return sorted(paths)
+
+
+def run_batch(paths, analyses=DEFAULT_ANALYSES, options=None, jobs=None, progress=None):
+    """平行分析 paths，依完成順序回傳摘要列；jobs=1 時在本行程依序執行
+
+    每個檔案各自送出一個工作，大小不一的檔案也能平均分配到各行程。
+    """
+    options = options or parse_args([])
+    jobs = jobs or os.cpu_count() or 1
+    rows = []
+    if jobs == 1 or len(paths) <= 1:
+        for path in paths:
+            rows.append(analyze_file(path, analyses, options))
+            if progress:
+                progress(len(rows), len(paths), rows[-1])
+        return rows
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        futures = [pool.submit(analyze_file, path, analyses, options) for path in paths]
+        for future in as_completed(futures):
+            rows.append(future.result())
+            if progress:
+                progress(len(rows), len(paths), rows[-1])
+    return rows
+
+
+def write_summary(rows, filename):
+    """寫成 CSV；欄位為所有列的聯集（file 在最前，依首次出現的順序）"""
+    fields = []
+    for row in rows:
+        fields.extend(key for key in row if key not in fields)
+    rows = sorted(rows, key=lambda row: row['file'])
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="擷取檔批次分析")
+    parser.add_argument('patterns', nargs='*', help='擷取檔或 glob（請加引號，支援 **）')
+    parser.add_argument('-o', '--output', default='batch_summary.csv', help='摘要表 CSV')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='行程數（預設為 CPU 核心數）')
+    parser.add_argument('--analyses', default=",".join(DEFAULT_ANALYSES),
+                        help=f"分析項目（{', '.join(ANALYSES)}）")
+    parser.add_argument('--chunk-rows', type=int, default=100000, help='每段讀取的行數')
+    parser.add_argument('--nfft', type=int, default=1024, help='Welch 幀長上限')
+    parser.add_argument('--event-level', type=float, default=2.0, help='事件觸發的加速度幅值 (g)')
+    parser.add_argument('--event-ms', type=float, default=500.0, help='事件長度 (ms)，期間不重複觸發')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options = parse_args(argv)
+    analyses = [name.strip() for name in options.analyses.split(',') if name.strip()]
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        print(f"未知的分析項目: {', '.join(unknown)}")
+        return 2
+    paths = expand_paths(options.patterns)
+    if not paths:
+        print("沒有符合的擷取檔")
+        return 1
+
+    def progress(done, total, row):
+        status = f"錯誤: {row['error']}" if 'error' in row else f"{row.get('samples', 0)} 筆"
+        print(f"[{done}/{total}] {row['file']}  {status}  {row['elapsed_s']:.2f}s")
+
+    t0 = time.perf_counter()
+    rows = run_batch(paths, analyses, options, options.jobs, progress)
+    elapsed = time.perf_counter() - t0
+    write_summary(rows, options.output)
+    samples = sum(row.get('samples', 0) for row in rows)
+    failed = sum('error' in row for row in rows)
+    print(f"{len(rows)} 個檔案、{samples} 筆，{elapsed:.2f}s（{samples / elapsed:,.0f} 筆/s），"
+          f"失敗 {failed}；摘要: {options.output}")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,300 @@
+"""
+IMU 欄位式數據緩衝
+以 numpy 二維陣列 (樣本數 x 欄位數) 儲存數據，欄位順序與 CSV 匯出一致
+"""
+
+import numpy as np
+
+# CSV 匯出欄位順序（與 imu_data_*.csv 相同）
+CHANNELS = ['timestamp', 'temperature', 'pressure', 'fps',
+            'acc_x', 'acc_y', 'acc_z',
+            'gyr_x', 'gyr_y', 'gyr_z',
+            'mag_x', 'mag_y', 'mag_z',
+            'roll', 'pitch', 'yaw']
+CHANNEL_INDEX = {name: i for i, name in enumerate(CHANNELS)}
+
+# parse_arduino_line 的鍵 -> 欄位
+SCALAR_FIELDS = ['timestamp', 'temperature', 'pressure', 'fps']
+VECTOR_FIELDS = {
+    'accel': ['acc_x', 'acc_y', 'acc_z'],
+    'gyro': ['gyr_x', 'gyr_y', 'gyr_z'],
+    'mag': ['mag_x', 'mag_y', 'mag_z'],
+    'euler': ['roll', 'pitch', 'yaw'],
+}
+
+# 感測器九軸（加速度、角速度、磁力計）
+SENSOR_CHANNELS = VECTOR_FIELDS['accel'] + VECTOR_FIELDS['gyro'] + VECTOR_FIELDS['mag']
+
+# 可訂閱的欄位群組（parse_arduino_line 的鍵）；timestamp 一律保留
+FIELD_GROUPS = SCALAR_FIELDS + list(VECTOR_FIELDS)
+
+
+def channel_layout(fields=None):
+    """訂閱 fields 群組時的欄位列表，順序與 CHANNELS 相同；None 表示全部"""
+    if fields is None:
+        return list(CHANNELS)
+    unknown = set(fields) - set(FIELD_GROUPS)
+    if unknown:
+        raise ValueError(f"未知的欄位群組: {sorted(unknown)}")
+    names = set(['timestamp'])
+    for key in fields:
+        names.update(VECTOR_FIELDS.get(key, [key]))
+    return [name for name in CHANNELS if name in names]
+
+
+def select_columns(block, source, target):
+    """把欄位為 source 的區塊轉成 target 欄位；source 沒有的欄位為缺值 NaN（匯出為空欄位）"""
+    if list(source) == list(target):
+        return block
+    index = {name: i for i, name in enumerate(source)}
+    out = np.full((len(block), len(target)), np.nan)
+    for i, name in enumerate(target):
+        if name in index:
+            out[:, i] = block[:, index[name]]
+    return out
+
+
+def samples_to_array(samples, columns=CHANNELS):
+    """把 parse_arduino_line 產生的 dict 列表轉成 (N, 欄位數) 陣列
+
+    與原本逐筆寫 CSV 時相同：缺少的單值欄位為 0，缺少的三軸群組為缺值 NaN（匯出為空欄位）。
+    """
+    index = CHANNEL_INDEX if columns is CHANNELS else {name: i for i, name in enumerate(columns)}
+    block = np.zeros((len(samples), len(columns)))
+    for names in VECTOR_FIELDS.values():
+        if names[0] in index:
+            block[:, index[names[0]]:index[names[0]] + 3] = np.nan
+    for row, data in zip(block, samples):
+        for key, value in data.items():
+            names = VECTOR_FIELDS.get(key)
+            if names is None:
+                if key in index:
+                    row[index[key]] = value
+            elif names[0] in index:
+                start = index[names[0]]
+                row[start:start + 3] = value
+    return block
+
+
+class ColumnStats:
+    """逐區塊累計各欄位的筆數、最小、最大、平均與標準差（寫檔時順便計算，不需再掃一次）
+    缺值 NaN 不計入該欄位的統計"""
+
+    def __init__(self):
+        self.count = 0
+        self.valid = self.total = self.total_sq = self.lo = self.hi = None
+
+    def update(self, block):
+        if not len(block):
+            return
+        if self.total is None:
+            self.total = np.zeros(block.shape[1])
+            self.total_sq = np.zeros(block.shape[1])
+            self.lo = np.full(block.shape[1], np.inf)
+            self.hi = np.full(block.shape[1], -np.inf)
+            self.valid = np.zeros(block.shape[1], dtype=np.int64)
+        self.count += len(block)
+        missing = np.isnan(block)
+        if missing.any():
+            self.valid += len(block) - missing.sum(axis=0)
+            values = np.where(missing, 0.0, block)
+            np.minimum(self.lo, np.where(missing, np.inf, block).min(axis=0), out=self.lo)
+            np.maximum(self.hi, np.where(missing, -np.inf, block).max(axis=0), out=self.hi)
+        else:
+            self.valid += len(block)
+            values = block
+            np.minimum(self.lo, block.min(axis=0), out=self.lo)
+            np.maximum(self.hi, block.max(axis=0), out=self.hi)
+        self.total += values.sum(axis=0)
+        self.total_sq += np.square(values).sum(axis=0)
+
+    def result(self):
+        """回傳 {'count', 'min', 'max', 'mean', 'std'}；沒有數據時回傳 None"""
+        if self.count == 0:
+            return None
+        none = self.valid == 0        # 整欄都是缺值
+        valid = np.maximum(self.valid, 1)
+        mean = np.where(none, np.nan, self.total / valid)
+        std = np.sqrt(np.maximum(self.total_sq / valid - mean ** 2, 0.0))
+        return {'count': self.count, 'min': np.where(none, np.nan, self.lo), 'max': np.where(none, np.nan, self.hi),
+                'mean': mean, 'std': std}
+
+
+def csv_rows(block):
+    """(N, 欄位數) 陣列 -> csv.writer 的列；缺值 NaN 寫成空欄位（imu_loader 讀回時為 NaN）"""
+    missing = np.isnan(block)
+    if not missing.any():
+        return block.tolist()
+    rows = block.astype(object)
+    rows[missing] = ''
+    return rows.tolist()
+
+
+def readonly(data):
+    """回傳 data 的唯讀視圖（共用記憶體，不複製）"""
+    view = data.view()
+    view.flags.writeable = False
+    return view
+
+
+def ts_increasing(ts, previous=None):
+    """ts 是否不遞減；previous 為之前最後一筆的時間戳（None 表示沒有）"""
+    if not len(ts):
+        return True
+    if previous is not None and ts[0] < previous:
+        return False
+    return bool(np.all(ts[1:] >= ts[:-1]))
+
+
+def time_slice(data, t0=None, t1=None, ts_column=0, increasing=None):
+    """時間戳落在 [t0, t1) (ms) 的列，None 表示不限
+
+    時間戳不遞減時以二分搜尋取得視圖；否則（例如檔案含多段擷取、ts 溢位未展開）
+    以遮罩選取，依原順序回傳複本。increasing 為已知的單調性，None 時檢查一次。
+    """
+    ts = data[:, ts_column]
+    if increasing is None:
+        increasing = ts_increasing(ts)
+    if not increasing:
+        mask = np.ones(len(ts), dtype=bool)
+        if t0 is not None:
+            mask &= ts >= t0
+        if t1 is not None:
+            mask &= ts < t1
+        return data[mask]
+    start = 0 if t0 is None else int(np.searchsorted(ts, t0, side='left'))
+    stop = len(data) if t1 is None else int(np.searchsorted(ts, t1, side='left'))
+    return data[start:max(start, stop)]
+
+
+def to_dataframe(data, columns):
+    """以 pandas.DataFrame 包裝 (N, 欄位數) 陣列，不複製（pandas 為選用套件）"""
+    try:
+        import pandas
+    except ImportError:
+        raise RuntimeError("未安裝 pandas（pip install pandas）") from None
+    return pandas.DataFrame(data, columns=list(columns), copy=False)
+
+
+def column_stats(store):
+    """逐區塊計算各欄位統計（適用於任何有 iter_blocks() 的儲存）"""
+    stats = ColumnStats()
+    for block in store.iter_blocks():
+        stats.update(block)
+    return stats.result()
+
+
+class IMUColumnBuffer:
+    """可成長的欄位式緩衝區
+
+    max_len 不為 None 時只保留最新 max_len 筆（環狀語意），
+    壓縮搬移只在底層陣列用滿時才做，平均成本為 O(1)。
+    columns 為欄位名稱（只訂閱部分欄位時只配置這些欄位）。
+    """
+
+    def __init__(self, capacity=4096, max_len=None, n_channels=None, columns=None):
+        if columns is None and n_channels in (None, len(CHANNELS)):
+            columns = CHANNELS
+        self.columns = None if columns is None else list(columns)
+        if n_channels is None:
+            n_channels = len(self.columns)
+        self.max_len = max_len
+        self._data = np.empty((max(capacity, 1), n_channels))
+        self._start = 0
+        self._end = 0
+        self.ts_increasing = True   # 第一欄（時間戳）是否不遞減；丟棄舊數據後仍保守地維持原值
+
+    @classmethod
+    def from_array(cls, data, columns=None):
+        """包裝既有的 (N, n_channels) 陣列（可為唯讀 memmap）而不複製；附加時才另配置空間"""
+        buf = cls(capacity=1, n_channels=data.shape[1], columns=columns)
+        buf._data = data
+        buf._end = len(data)
+        buf.ts_increasing = ts_increasing(data[:, 0]) if data.shape[1] else True
+        return buf
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def n_channels(self):
+        return self._data.shape[1]
+
+    def append(self, block):
+        """附加一批樣本 (N, n_channels)"""
+        n = len(block)
+        if n == 0:
+            return
+        if self.ts_increasing and block.shape[1]:
+            self.ts_increasing = ts_increasing(block[:, 0], self._data[self._end - 1, 0] if len(self) else None)
+        if self.max_len is not None and n > self.max_len:
+            block = block[-self.max_len:]
+            n = len(block)
+        if self._end + n > len(self._data):
+            self._make_room(n)
+        self._data[self._end:self._end + n] = block
+        self._end += n
+        if self.max_len is not None and len(self) > self.max_len:
+            self._start = self._end - self.max_len
+
+    def _make_room(self, n):
+        size = len(self)
+        needed = size + n
+        if needed * 2 <= len(self._data):
+            # 空間足夠，只需把有效數據搬回開頭
+            self._data[:size] = self._data[self._start:self._end]
+        else:
+            new_data = np.empty((max(len(self._data) * 2, needed * 2), self.n_channels))
+            new_data[:size] = self._data[self._start:self._end]
+            self._data = new_data
+        self._start = 0
+        self._end = size
+
+    def view(self):
+        """回傳目前數據的視圖（不複製）"""
+        return self._data[self._start:self._end]
+
+    def tail(self, n):
+        """最新 n 筆數據的視圖"""
+        return self._data[max(self._start, self._end - n):self._end]
+
+    def column(self, name):
+        return self.view()[:, self.columns.index(name)]
+
+    def read(self, start, stop):
+        """讀取 [start, stop) 範圍的樣本"""
+        return self.view()[start:stop]
+
+    def iter_blocks(self, block_rows=65536):
+        """依序分段回傳全部數據（與 SpillingColumnStore 相同的介面）"""
+        data = self.view()
+        for i in range(0, len(data), block_rows):
+            yield data[i:i + block_rows]
+
+    def snapshot(self, start=None, stop=None):
+        """[start, stop) 範圍的唯讀視圖，供行程內分析直接使用（不複製）
+
+        視圖與緩衝區共用記憶體，只在下一次 append() / clear() 之前有效：
+        之後底層陣列可能被搬移或覆寫。需要保留時請 .copy()。
+        """
+        return readonly(self.view()[start:stop])
+
+    def select_time(self, t0=None, t1=None):
+        """時間戳在 [t0, t1) (ms) 的唯讀視圖（第一欄為時間戳），有效期同 snapshot()；
+        時間戳不遞減時才是視圖，否則為依原順序選取的複本"""
+        return readonly(time_slice(self.view(), t0, t1, increasing=self.ts_increasing))
+
+    def dataframe(self, start=None, stop=None):
+        """以 pandas.DataFrame 包裝 snapshot(start, stop)，欄位名稱為 columns，不複製"""
+        return to_dataframe(self.snapshot(start, stop), self.columns or range(self.n_channels))
+
+    def discard(self, n):
+        """丟棄最舊的 n 筆"""
+        self._start = min(self._start + n, self._end)
+
+    def clear(self):
+        if not self._data.flags.writeable:
+            self._data = np.empty((4096, self.n_channels))
+        self._start = 0
+        self._end = 0
+        self.ts_increasing = True
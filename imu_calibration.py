@@ -0,0 +1,182 @@
+"""
+IMU 感測器校正
+陀螺儀零偏、加速度計比例/偏移、磁力計硬鐵/軟鐵校正
+係數依裝置（序號或串口名稱）存成 JSON，即時流程中以每組感測器一個仿射轉換套用到整批數據
+"""
+
+import json
+import os
+
+import numpy as np
+
+from imu_buffer import CHANNEL_INDEX, SENSOR_CHANNELS
+
+# 九軸在 (N, 16) 陣列中是連續欄位：acc_x..mag_z
+SENSOR_START = CHANNEL_INDEX['acc_x']
+SENSOR_STOP = CHANNEL_INDEX['mag_z'] + 1
+
+DEFAULT_CALIBRATION_FILE = "imu_calibration.json"
+
+
+def estimate_gyro_bias(gyro, max_std=1.0):
+    """由靜止時段的角速度 (N, 3) 估計零偏；標準差過大表示並非靜止"""
+    gyro = np.asarray(gyro, dtype=float)
+    if len(gyro) < 10:
+        raise ValueError("靜止數據不足")
+    std = gyro.std(axis=0)
+    if np.any(std > max_std):
+        raise ValueError(f"裝置未保持靜止 (std={std.round(3).tolist()} dps)")
+    return gyro.mean(axis=0)
+
+
+def fit_ellipsoid(points, radius=None):
+    """以最小平方法擬合橢球 (N, 3)
+
+    回傳 (offset, matrix)，使 matrix @ (p - offset) 落在半徑 radius 的球面上；
+    radius 為 None 時使用擬合橢球的平均半徑（磁場強度）。
+    """
+    p = np.asarray(points, dtype=float)
+    if len(p) < 9:
+        raise ValueError("擬合橢球至少需要 9 個點")
+    x, y, z = p[:, 0], p[:, 1], p[:, 2]
+    # Ax² + By² + Cz² + 2Dxy + 2Exz + 2Fyz + 2Gx + 2Hy + 2Iz = 1
+    design = np.column_stack([x * x, y * y, z * z, 2 * x * y, 2 * x * z, 2 * y * z,
+                              2 * x, 2 * y, 2 * z])
+    v, *_ = np.linalg.lstsq(design, np.ones(len(p)), rcond=None)
+    q = np.array([[v[0], v[3], v[4]],
+                  [v[3], v[1], v[5]],
+                  [v[4], v[5], v[2]]])
+    offset = -np.linalg.solve(q, v[6:9])
+    scale = 1.0 + offset @ q @ offset
+    shape = q / scale
+    eigval, eigvec = np.linalg.eigh(shape)
+    if np.any(eigval <= 0):
+        raise ValueError("數據不足以擬合橢球，請涵蓋更多旋轉方向")
+    axes = 1.0 / np.sqrt(eigval)
+    if radius is None:
+        radius = float(np.cbrt(np.prod(axes)))
+    # 對稱平方根：校正只做縮放，不引入額外旋轉
+    matrix = eigvec @ np.diag(np.sqrt(eigval) * radius) @ eigvec.T
+    return offset, matrix
+
+
+def fit_accel(accel):
+    """由多個靜止姿態的加速度 (N, 3) 估計偏移與各軸比例（重力 = 1 g）"""
+    a = np.asarray(accel, dtype=float)
+    if len(a) < 6:
+        raise ValueError("加速度校正至少需要 6 個姿態")
+    x, y, z = a[:, 0], a[:, 1], a[:, 2]
+    # 軸對齊橢球：Ax² + By² + Cz² + 2Gx + 2Hy + 2Iz = 1
+    design = np.column_stack([x * x, y * y, z * z, 2 * x, 2 * y, 2 * z])
+    v, *_ = np.linalg.lstsq(design, np.ones(len(a)), rcond=None)
+    diag = v[:3]
+    if np.any(diag <= 0):
+        raise ValueError("姿態分佈不足以估計加速度校正")
+    offset = -v[3:6] / diag
+    scale = 1.0 + np.sum(diag * offset ** 2)
+    return offset, np.diag(np.sqrt(diag / scale))
+
+
+class SensorCalibration:
+    """單一裝置的校正係數
+
+    校正後 = A @ (原始 - offset)，加速度、角速度、磁力計各一個 3x3 區塊。
+    apply() 將每個區塊預先展開成 batch @ A.T - b，每組一次矩陣乘法處理整批；
+    各組分開計算，某一組缺值 (NaN) 不會影響其他組。
+    """
+
+    def __init__(self, gyro_bias=None, accel_offset=None, accel_matrix=None,
+                 mag_offset=None, mag_matrix=None):
+        self.gyro_bias = np.zeros(3) if gyro_bias is None else np.asarray(gyro_bias, dtype=float)
+        self.accel_offset = np.zeros(3) if accel_offset is None else np.asarray(accel_offset, dtype=float)
+        self.accel_matrix = np.eye(3) if accel_matrix is None else np.asarray(accel_matrix, dtype=float)
+        self.mag_offset = np.zeros(3) if mag_offset is None else np.asarray(mag_offset, dtype=float)
+        self.mag_matrix = np.eye(3) if mag_matrix is None else np.asarray(mag_matrix, dtype=float)
+        self._build()
+
+    def _build(self):
+        # (九軸中的起始位置, A.T, offset @ A.T, offset, (A.T)⁻¹)
+        self._blocks = []
+        for start, matrix, offset in ((0, self.accel_matrix, self.accel_offset),
+                                      (3, np.eye(3), self.gyro_bias),
+                                      (6, self.mag_matrix, self.mag_offset)):
+            transform = np.ascontiguousarray(matrix.T)
+            self._blocks.append((start, transform, offset @ transform, offset,
+                                 np.linalg.inv(transform)))
+
+    def apply(self, batch, columns=None):
+        """原地校正一批 (N, 16) 數據的九軸欄位
+
+        columns 為 batch 的欄位名稱（只訂閱部分欄位時）；只取有訂閱的軸。
+        """
+        for start, transform, bias, _, _ in self._blocks:
+            if columns is None:
+                cols = slice(SENSOR_START + start, SENSOR_START + start + 3)
+                batch[:, cols] = batch[:, cols] @ transform - bias
+                continue
+            cols, axes = [], []
+            for axis, name in enumerate(SENSOR_CHANNELS[start:start + 3]):
+                if name in columns:
+                    cols.append(columns.index(name))
+                    axes.append(axis)
+            if cols:
+                batch[:, cols] = batch[:, cols] @ transform[np.ix_(axes, axes)] - bias[axes]
+        return batch
+
+    def remove(self, sensor):
+        """由已校正的九軸 (N, 9) 還原原始值"""
+        raw = np.empty_like(sensor, dtype=float)
+        for start, _, _, offset, inverse in self._blocks:
+            raw[:, start:start + 3] = sensor[:, start:start + 3] @ inverse + offset
+        return raw
+
+    def to_dict(self):
+        return {
+            'gyro_bias': self.gyro_bias.tolist(),
+            'accel_offset': self.accel_offset.tolist(),
+            'accel_matrix': self.accel_matrix.tolist(),
+            'mag_offset': self.mag_offset.tolist(),
+            'mag_matrix': self.mag_matrix.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{k: d[k] for k in ('gyro_bias', 'accel_offset', 'accel_matrix',
+                                       'mag_offset', 'mag_matrix') if k in d})
+
+
+class CalibrationStore:
+    """以 JSON 檔保存各裝置的校正係數，鍵為 USB 序號或串口名稱"""
+
+    def __init__(self, path=DEFAULT_CALIBRATION_FILE):
+        self.path = path
+        self._devices = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._devices = json.load(f)
+
+    @staticmethod
+    def device_key(port, ports=None):
+        """優先使用 USB 序號，讓同一顆感測器換串口後仍能找到係數"""
+        if ports is None:
+            import serial.tools.list_ports
+            ports = serial.tools.list_ports.comports()
+        for p in ports:
+            if p.device == port and getattr(p, 'serial_number', None):
+                return f"SN:{p.serial_number}"
+        return port
+
+    def get(self, key):
+        if key in self._devices:
+            return SensorCalibration.from_dict(self._devices[key])
+        return None
+
+    def put(self, key, calibration):
+        self._devices[key] = calibration.to_dict()
+        self.save()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._devices, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,137 @@
+"""
+IMU 樣本緊湊編碼
+HI04M3 相鄰樣本高度相關：溫度固定、氣壓為 0、時間戳等間隔。
+    timestamp       delta-of-delta，以最小的整數型別儲存
+    固定/少變化欄位  run-length 編碼
+    感測器浮點數     依韌體輸出精度量化（acc 3 位小數，gyr/mag/euler 2 位）存成 int16/int32
+只有整個欄位都落在該精度格點上（round(x*scale)/scale == x）才量化；校正後的數值、
+由主機時間推算或重連後平移的 ts 等不在格點上的欄位以 float64 原樣保存。解碼結果與原始值完全相同。
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+from imu_buffer import CHANNELS
+
+# 韌體 printf 的小數位數（mian921600.ino）
+PRECISION = {
+    'timestamp': 0, 'temperature': 0, 'pressure': 2, 'fps': 1,
+    'acc_x': 3, 'acc_y': 3, 'acc_z': 3,
+    'gyr_x': 2, 'gyr_y': 2, 'gyr_z': 2,
+    'mag_x': 2, 'mag_y': 2, 'mag_z': 2,
+    'roll': 2, 'pitch': 2, 'yaw': 2,
+}
+
+KIND_CONST, KIND_RLE, KIND_QUANT, KIND_DOD, KIND_RAW = range(5)
+_INT_TYPES = [np.dtype('<i1'), np.dtype('<i2'), np.dtype('<i4'), np.dtype('<i8')]
+_HEADER = struct.Struct('<BB')
+
+
+def _int_type(values):
+    """能容納 values 的最小整數型別代碼"""
+    if not len(values):
+        return 0
+    lo, hi = int(values.min()), int(values.max())
+    for code, dtype in enumerate(_INT_TYPES):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return code
+    return len(_INT_TYPES) - 1
+
+
+class CompactCodec:
+    """依欄位精度編碼 (N, 欄位數) 區塊；介面與 imu_spill.encode_block/decode_block 相同"""
+
+    def __init__(self, channels=CHANNELS, compress=True):
+        self.channels = list(channels)
+        self.compress = compress
+        # 沒有已知精度的欄位以 float64 原樣保存
+        self.scales = [10.0 ** PRECISION[name] if name in PRECISION else None for name in self.channels]
+        self._ts_column = self.channels.index('timestamp') if 'timestamp' in self.channels else None
+
+    def quantize(self, block):
+        """回傳四捨五入到韌體精度的浮點值（韌體輸出的數值本來就在這些格點上）"""
+        out = np.array(block, dtype=float)
+        for i, scale in enumerate(self.scales):
+            if scale is not None:
+                out[:, i] = np.round(out[:, i] * scale) / scale
+        return out
+
+    def encode(self, block):
+        parts = []
+        for i, scale in enumerate(self.scales):
+            parts.append(self._encode_column(block[:, i], scale, i == self._ts_column))
+        data = b''.join(parts)
+        if self.compress:
+            return b'q' + zlib.compress(data, 1)
+        return b'Q' + data
+
+    def _encode_column(self, x, scale, is_timestamp):
+        if scale is None or not np.all(np.isfinite(x)):
+            return _HEADER.pack(KIND_RAW, 0) + x.astype('<f8').tobytes()
+        q = np.round(x * scale)
+        # 不在精度格點上（量化會改變數值）或超出 int64 時原樣保存
+        if np.abs(q).max(initial=0) >= 2 ** 62 or not np.array_equal(q / scale, x):
+            return _HEADER.pack(KIND_RAW, 0) + x.astype('<f8').tobytes()
+        q = q.astype(np.int64)
+        n = len(q)
+        if n and np.all(q == q[0]):
+            return _HEADER.pack(KIND_CONST, 0) + struct.pack('<q', q[0])
+        change = np.flatnonzero(np.diff(q)) + 1
+        runs = len(change) + 1
+        if runs * 8 <= n:
+            starts = np.concatenate(([0], change))
+            lengths = np.diff(np.concatenate((starts, [n]))).astype('<u4')
+            values = q[starts]
+            code = _int_type(values)
+            return (_HEADER.pack(KIND_RLE, code) + struct.pack('<I', runs)
+                    + values.astype(_INT_TYPES[code]).tobytes() + lengths.tobytes())
+        if is_timestamp and n >= 2:
+            delta = np.diff(q)
+            dod = np.diff(delta)
+            code = _int_type(dod)
+            return (_HEADER.pack(KIND_DOD, code) + struct.pack('<qq', q[0], delta[0])
+                    + dod.astype(_INT_TYPES[code]).tobytes())
+        code = max(_int_type(q), 1)   # 至少 int16
+        return _HEADER.pack(KIND_QUANT, code) + q.astype(_INT_TYPES[code]).tobytes()
+
+    def decode(self, data, n_rows, n_channels):
+        if data[:1] == b'q':
+            raw = zlib.decompress(data[1:])
+        else:
+            raw = data[1:]
+        out = np.empty((n_rows, n_channels))
+        pos = 0
+        for i, scale in enumerate(self.scales):
+            kind, code = _HEADER.unpack_from(raw, pos)
+            pos += _HEADER.size
+            dtype = _INT_TYPES[code]
+            if kind == KIND_RAW:
+                out[:, i] = np.frombuffer(raw, '<f8', n_rows, pos)
+                pos += 8 * n_rows
+                continue
+            if kind == KIND_CONST:
+                q = np.full(n_rows, struct.unpack_from('<q', raw, pos)[0], dtype=np.int64)
+                pos += 8
+            elif kind == KIND_RLE:
+                runs = struct.unpack_from('<I', raw, pos)[0]
+                pos += 4
+                values = np.frombuffer(raw, dtype, runs, pos)
+                pos += dtype.itemsize * runs
+                lengths = np.frombuffer(raw, '<u4', runs, pos)
+                pos += 4 * runs
+                q = np.repeat(values.astype(np.int64), lengths)
+            elif kind == KIND_DOD:
+                first, delta0 = struct.unpack_from('<qq', raw, pos)
+                pos += 16
+                dod = np.frombuffer(raw, dtype, n_rows - 2, pos).astype(np.int64)
+                pos += dtype.itemsize * (n_rows - 2)
+                delta = np.concatenate(([delta0], delta0 + np.cumsum(dod)))
+                q = np.concatenate(([first], first + np.cumsum(delta)))
+            else:
+                q = np.frombuffer(raw, dtype, n_rows, pos).astype(np.int64)
+                pos += dtype.itemsize * n_rows
+            out[:, i] = q / scale
+        return out
@@ -0,0 +1,236 @@
+"""
+串流數位濾波
+二階節 (SOS/biquad) 低通、高通、帶通、陷波與移動平均，每批一次處理所有欄位，
+批次之間保留濾波器狀態（等同 scipy.signal.sosfilt 帶 zi）。
+係數以 RBJ biquad 公式設計（巴特沃斯分節 Q 值），不需要 scipy；
+有安裝 scipy 時以 sosfilt 執行遞迴，否則用 numpy 逐樣本計算（對欄位向量化）；
+scipy 匯入約需 1 秒，延到第一次濾波時才載入，不拖慢程式啟動。
+"""
+
+import math
+
+import numpy as np
+
+_NOT_LOADED = object()
+sosfilt = _NOT_LOADED
+
+
+def load_sosfilt():
+    """第一次呼叫時匯入 scipy.signal.sosfilt；沒有安裝時回傳 None（使用 numpy 實作）"""
+    global sosfilt
+    if sosfilt is _NOT_LOADED:
+        try:
+            from scipy.signal import sosfilt as scipy_sosfilt
+        except ImportError:
+            scipy_sosfilt = None
+        sosfilt = scipy_sosfilt
+    return sosfilt
+
+FILTER_KINDS = ['lowpass', 'highpass', 'bandpass', 'notch', 'moving_average']
+
+
+def biquad(kind, fc, fs, q=1 / math.sqrt(2)):
+    """單一二階節係數 [b0, b1, b2, 1, a1, a2]（RBJ Audio EQ Cookbook）"""
+    if not 0 < fc < fs / 2:
+        raise ValueError(f"截止頻率須介於 0 與 {fs / 2:g} Hz")
+    w0 = 2 * math.pi * fc / fs
+    cos_w0 = math.cos(w0)
+    alpha = math.sin(w0) / (2 * q)
+    if kind == 'lowpass':
+        b = [(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]
+    elif kind == 'highpass':
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    elif kind == 'bandpass':
+        b = [alpha, 0.0, -alpha]            # 中心增益 0 dB
+    elif kind == 'notch':
+        b = [1.0, -2 * cos_w0, 1.0]
+    else:
+        raise ValueError(f"未知的濾波類型: {kind}")
+    a0 = 1 + alpha
+    return np.array([b[0] / a0, b[1] / a0, b[2] / a0, 1.0, -2 * cos_w0 / a0, (1 - alpha) / a0])
+
+
+def butterworth_q(order):
+    """偶數階巴特沃斯濾波器各二階節的 Q 值"""
+    if order < 2 or order % 2:
+        raise ValueError("階數須為 2 以上的偶數")
+    n = order
+    return [1 / (2 * math.cos((2 * k + 1) * math.pi / (2 * n))) for k in range(n // 2)]
+
+
+def design_sos(kind, fc, fs, order=2, q=None):
+    """設計 (節數, 6) 的 SOS 係數
+
+    lowpass/highpass  fc 為截止頻率，order 階巴特沃斯
+    bandpass          fc 為 (低, 高)：高通 + 低通串接；單一 fc 時為 Q 值帶通
+    notch             fc 為陷波頻率，q 預設 30
+    """
+    if kind in ('lowpass', 'highpass'):
+        return np.array([biquad(kind, fc, fs, qk) for qk in butterworth_q(order)])
+    if kind == 'bandpass':
+        if np.ndim(fc):
+            low, high = fc
+            if not low < high:
+                raise ValueError("帶通的低截止頻率須小於高截止頻率")
+            return np.vstack((design_sos('highpass', low, fs, order),
+                              design_sos('lowpass', high, fs, order)))
+        return biquad('bandpass', fc, fs, q or 1 / math.sqrt(2))[None, :]
+    if kind == 'notch':
+        return biquad('notch', fc, fs, q or 30.0)[None, :]
+    raise ValueError(f"未知的濾波類型: {kind}")
+
+
+class SOSFilter:
+    """多欄位串流 SOS 濾波器（直接 II 型轉置）"""
+
+    def __init__(self, sos, n_channels):
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=float))
+        self.n_channels = n_channels
+        self.reset()
+
+    def reset(self):
+        # scipy 的 zi 形狀：(節數, 2, 欄位數)
+        self._zi = None
+
+    def _steady_state(self, x0):
+        """以第一筆為直流輸入的穩態狀態，避免開頭的暫態"""
+        zi = np.empty((len(self.sos), 2, self.n_channels))
+        x = x0
+        for k, (b0, b1, b2, _, a1, a2) in enumerate(self.sos):
+            gain = (b0 + b1 + b2) / (1 + a1 + a2)
+            y = gain * x
+            zi[k, 1] = b2 * x - a2 * y
+            zi[k, 0] = b1 * x - a1 * y + zi[k, 1]
+            x = y
+        return zi
+
+    def process(self, x):
+        """濾波一批 (N, 欄位數) 數據，回傳新陣列"""
+        x = np.asarray(x, dtype=float)
+        if not len(x):
+            return x.copy()
+        if self._zi is None:
+            self._zi = self._steady_state(x[0])
+        run = load_sosfilt()
+        if run is not None:
+            y, self._zi = run(self.sos, x, axis=0, zi=self._zi)
+            return y
+        y = x.copy()
+        zi = self._zi
+        for k, (b0, b1, b2, _, a1, a2) in enumerate(self.sos):
+            z0, z1 = zi[k, 0].copy(), zi[k, 1].copy()
+            section = y
+            out = np.empty_like(section)
+            for i in range(len(section)):
+                xi = section[i]
+                yi = b0 * xi + z0
+                z0 = b1 * xi - a1 * yi + z1
+                z1 = b2 * xi - a2 * yi
+                out[i] = yi
+            zi[k, 0], zi[k, 1] = z0, z1
+            y = out
+        return y
+
+
+class MovingAverage:
+    """多欄位串流移動平均（以累加和計算，保留前一批最後 n-1 筆）"""
+
+    def __init__(self, n, n_channels):
+        if n < 1:
+            raise ValueError("移動平均長度須 >= 1")
+        self.n = int(n)
+        self.n_channels = n_channels
+        self.reset()
+
+    def reset(self):
+        self._history = None
+
+    def process(self, x):
+        x = np.asarray(x, dtype=float)
+        if not len(x):
+            return x.copy()
+        if self._history is None:
+            # 開頭以第一筆補滿，等同穩態
+            self._history = np.repeat(x[:1], self.n - 1, axis=0)
+        full = np.vstack((self._history, x))
+        csum = np.cumsum(full, axis=0)
+        csum = np.vstack((np.zeros((1, full.shape[1])), csum))
+        y = (csum[self.n:] - csum[:-self.n]) / self.n
+        self._history = full[len(full) - (self.n - 1):] if self.n > 1 else full[:0]
+        return y
+
+
+def make_filter(kind, n_channels, fs, fc=None, order=2, q=None, length=None):
+    """依類型建立串流濾波器"""
+    if kind == 'moving_average':
+        if length is None:
+            # 長度 fs/fc 時第一個零點落在 fc
+            length = max(int(round(fs / fc)), 1) if fc else 5
+        return MovingAverage(length, n_channels)
+    return SOSFilter(design_sos(kind, fc, fs, order, q), n_channels)
+
+
+class FilterBank:
+    """依欄位套用不同濾波器；process() 回傳整批的濾波版本（未設定的欄位為原值）"""
+
+    def __init__(self):
+        self._filters = {}    # 名稱 -> (欄位索引列表, 濾波器)
+        self._last = {}       # 名稱 -> 各欄位最後一筆有效值（缺值以它代入濾波器）
+
+    def __len__(self):
+        return len(self._filters)
+
+    # 修改時整個換掉字典，讀取線程 process() 中不會遇到迭代途中被修改
+    def set(self, name, columns, filt):
+        """設定（或取代）名稱為 name 的濾波器，套用在 columns 欄位"""
+        filters = dict(self._filters)
+        filters[name] = (list(columns), filt)
+        self._filters = filters
+
+    def remove(self, name):
+        filters = dict(self._filters)
+        filters.pop(name, None)
+        self._filters = filters
+
+    def clear(self):
+        self._filters = {}
+
+    @property
+    def columns(self):
+        """有濾波的欄位索引"""
+        return sorted({c for columns, _ in self._filters.values() for c in columns})
+
+    def reset(self):
+        for _, filt in self._filters.values():
+            filt.reset()
+        self._last = {}
+
+    def process(self, batch):
+        """缺值 NaN 以前一筆有效值代入濾波器（NaN 會永久留在 IIR 狀態中），輸出在該處仍為 NaN"""
+        out = batch.copy()
+        missing = np.isnan(batch)
+        has_missing = missing.any()
+        for name, (columns, filt) in self._filters.items():
+            x = batch[:, columns]
+            if has_missing:
+                x = self._hold(name, x)
+            elif len(x):
+                self._last[name] = x[-1]
+            out[:, columns] = filt.process(x)
+        if has_missing:
+            out[missing] = np.nan
+        return out
+
+    def _hold(self, name, x):
+        """把 x 中的 NaN 換成同一欄位前一筆有效值；開頭沒有有效值時用 0"""
+        valid = ~np.isnan(x)
+        rows = np.where(valid, np.arange(len(x))[:, None], -1)
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        filled = x[np.maximum(rows, 0), np.arange(x.shape[1])]
+        last = self._last.get(name)
+        if last is None or len(last) != x.shape[1]:
+            last = np.zeros(x.shape[1])
+        filled = np.where(rows < 0, last, filled)
+        if len(filled):
+            self._last[name] = filled[-1]
+        return filled
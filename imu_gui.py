@@ -1,50 +1,95 @@
 import sys
 import time
-import threading
+import asyncio
 import serial
 import serial.tools.list_ports
 import re
 import csv
+import os
+import sqlite3
+import importlib
 from datetime import datetime
+import numpy as np
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
                            QPushButton, QComboBox, QLabel, QMessageBox, QFileDialog,
-                           QSpinBox, QCheckBox)
-from PyQt5.QtCore import QTimer, pyqtSignal, QObject
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
+                           QSpinBox, QCheckBox, QDoubleSpinBox, QSlider, QMenu, QDialog,
+                           QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView)
+from PyQt5.QtCore import QTimer, Qt
+from imu_buffer import (IMUColumnBuffer, CHANNELS, SENSOR_CHANNELS, FIELD_GROUPS, VECTOR_FIELDS,
+                        samples_to_array, column_stats, channel_layout, select_columns, to_dataframe, csv_rows)
+from imu_spill import SpillingColumnStore
+from imu_codec import CompactCodec
+from imu_spectrum import RollingSpectrogram
+from imu_calibration import (CalibrationStore, SensorCalibration, estimate_gyro_bias,
+                             fit_ellipsoid, fit_accel)
+from imu_trigger import Trigger, TriggerEngine
+from imu_stream import IMUStreamServer, DEFAULT_PORT
+from imu_metrics import PipelineMetrics, MetricsLogger, format_snapshot
+from imu_loader import host_clock, imu_channels, load_capture
+from imu_timebase import TimeBase
+from imu_resample import StreamingResampler
+from imu_filter import FilterBank, make_filter
+from imu_plot import Panel, FrameTimer, available_backends, make_renderer, preload_backend
+from imu_acquire import AcquisitionLoop, SerialDevice, QtSink, IngestQueue, BatchPlugins
+from imu_rate import RatePlan, RatePlanner, parse_rate, ontime_command
+from imu_library import CaptureLibrary, SessionRecorder, KIND_IMU, KIND_INS
+from imu_hipnuc import HiPNUCParser, INS_CHANNELS
+from imu_reconnect import PortIdentity, ReconnectSupervisor
 
 # =========================
 # 數據解析類
 # =========================
-class DataEmitter(QObject):
-    data_received = pyqtSignal(dict)
-
 class IMUDataParser:
-    def __init__(self):
-        self.data_emitter = DataEmitter()
+    # 解析格式: ts=1234 ms  T=25C  EUL(deg)=1.23,4.56,7.89  ACC(g)=0.123,0.456,0.789  GYR(dps)=12.3,45.6,78.9  MAG(uT)=1.2,3.4,5.6  P=1013.25  FPS(inst)=100.0
+    PATTERNS = {
+        'timestamp': re.compile(r'ts=(\d+)'),
+        'temperature': re.compile(r'T=(-?\d+)C'),
+        'euler': re.compile(r'EUL\(deg\)=([-\d.]+),([-\d.]+),([-\d.]+)'),
+        'accel': re.compile(r'ACC\(g\)=([-\d.]+),([-\d.]+),([-\d.]+)'),
+        'gyro': re.compile(r'GYR\(dps\)=([-\d.]+),([-\d.]+),([-\d.]+)'),
+        'mag': re.compile(r'MAG\(uT\)=([-\d.]+),([-\d.]+),([-\d.]+)'),
+        'pressure': re.compile(r'P=([-\d.]+)'),
+        'fps': re.compile(r'FPS\(inst\)=([-\d.]+)')
+    }
+    
+    def __init__(self, metrics=None, fields=None):
+        self.metrics = metrics if metrics is not None else PipelineMetrics()
+        self.pending = ""  # 上次讀取留下的不完整行
+        self.set_fields(fields)
+        
+    def reset(self):
+        self.pending = ""
+        
+    def take_ins(self):
+        """文字格式沒有 INS 數據（與 HiPNUCParser 介面一致）"""
+        return None
+        
+    def take_secondary(self):
+        """文字格式只有一種 IMU 數據（與 HiPNUCParser 介面一致）"""
+        return None
+        
+    def set_fields(self, fields=None):
+        """設定要解析的欄位群組（None 為全部）；未訂閱的欄位不做比對"""
+        columns = channel_layout(fields)
+        patterns = {key: pattern for key, pattern in self.PATTERNS.items()
+                    if fields is None or key == 'timestamp' or key in fields}
+        # 以單一指派切換，讀取線程不會看到欄位與樣式不一致的狀態
+        self._layout = (patterns, columns)
+        
+    @property
+    def columns(self):
+        return self._layout[1]
         
-    def parse_arduino_line(self, line):
+    def parse_arduino_line(self, line, patterns=None):
         """解析Arduino輸出的文本數據"""
         try:
-            # 解析格式: ts=1234 ms  T=25C  EUL(deg)=1.23,4.56,7.89  ACC(g)=0.123,0.456,0.789  GYR(dps)=12.3,45.6,78.9  MAG(uT)=1.2,3.4,5.6  P=1013.25  FPS(inst)=100.0
-            
-            # 使用正則表達式提取數據
-            patterns = {
-                'timestamp': r'ts=(\d+)',
-                'temperature': r'T=(-?\d+)C',
-                'euler': r'EUL\(deg\)=([-\d.]+),([-\d.]+),([-\d.]+)',
-                'accel': r'ACC\(g\)=([-\d.]+),([-\d.]+),([-\d.]+)',
-                'gyro': r'GYR\(dps\)=([-\d.]+),([-\d.]+),([-\d.]+)',
-                'mag': r'MAG\(uT\)=([-\d.]+),([-\d.]+),([-\d.]+)',
-                'pressure': r'P=([-\d.]+)',
-                'fps': r'FPS\(inst\)=([-\d.]+)'
-            }
+            if patterns is None:
+                patterns = self._layout[0]
             
             data = {}
             
             for key, pattern in patterns.items():
-                match = re.search(pattern, line)
+                match = pattern.search(line)
                 if match:
                     if key in ['euler', 'accel', 'gyro', 'mag']:
                         # 三軸數據
@@ -59,42 +104,160 @@ class IMUDataParser:
             print(f"解析錯誤: {e}")
             return None
 
+    def feed(self, raw_data, host_ns=None):
+        """把串口讀到的位元組分行並解析，回傳 (N, 欄位數) 陣列，沒有完整數據行時回傳 None
+        （文字格式自帶 ts，host_ns 只為與 HiPNUCParser 介面一致）"""
+        metrics = self.metrics
+        # 只讀一次開關：量測途中切換除錯面板時，同一次處理內的 t0/t1 仍一致
+        enabled = metrics.enabled
+        patterns, columns = self._layout
+        if enabled:
+            t0 = time.perf_counter_ns()
+        text_data = raw_data.decode('utf-8', errors='ignore')
+        buffer = self.pending + text_data
+        
+        # 按行處理
+        lines = buffer.split('\n')
+        self.pending = lines[-1]  # 保留最後不完整的行
+        
+        if enabled:
+            t1 = time.perf_counter_ns()
+            metrics.add_time('frame', t1 - t0)
+            metrics.count('bytes_in', len(raw_data))
+            metrics.count('lines_framed', len(lines) - 1)
+        
+        samples = []
+        failures = 0
+        for line in lines[:-1]:
+            line = line.strip()
+            if line and 'ts=' in line:  # 只處理包含時間戳的數據行
+                data = self.parse_arduino_line(line, patterns)
+                if data:
+                    samples.append(data)
+                else:
+                    failures += 1
+        if enabled:
+            metrics.count('parse_failures', failures)
+        if not samples:
+            return None
+        batch = samples_to_array(samples, columns)
+        if enabled:
+            metrics.add_time('parse', time.perf_counter_ns() - t1)
+            metrics.count('samples_parsed', len(samples))
+        return batch
+
 # =========================
 # GUI 主程式
 # =========================
 class IMUGUI(QWidget):
-    def __init__(self):
+    def __init__(self, fields=None):
         super().__init__()
         self.setWindowTitle("HI04M3 Data Collector")
         self.serial_port = None
         self.collecting = False
-        self.data_buffer = []
-        self.stop_reader = False
-        self.parser = IMUDataParser()
-        self.collected_data = []  # 用於儲存所有數據（1000Hz）
-        self.display_data = []   # 用於顯示的數據（50Hz或其他顯示頻率）
+        self.metrics = PipelineMetrics()  # 管線量測（預設關閉，關閉時不產生成本）
+        # 欄位訂閱：只解析、儲存、匯出訂閱的欄位群組（None 為全部）
+        self.parser = IMUDataParser(self.metrics, fields)
+        self.fields = fields
+        self.columns = self.parser.columns
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+        # 顯示分頻、繪圖更新間隔、FFT 長度、顯示點數與佇列長度依輸入頻率規劃（預設100Hz -> 50Hz顯示）；
+        # 讀取線程量測實際輸入頻率，改變時自動重新規劃
+        self.rate_plan = RatePlan(100.0)
+        self.rate_planner = RatePlanner()
+        self.rate_planner.plan = self.rate_plan   # 擷取線程尚未啟動
+        self.current_display_divider = self.rate_plan.display_divider
+        self.current_sample_rate = self.rate_plan.rate
+        self.data_buffer = IMUColumnBuffer(max_len=self.rate_plan.max_points, columns=self.columns)  # 用於顯示的數據（50Hz或其他顯示頻率）
+        self.collected_data = IMUColumnBuffer(columns=self.columns)  # 用於儲存所有數據（1000Hz）
+        self.filtered_buffer = IMUColumnBuffer(max_len=self.rate_plan.max_points, columns=self.columns)  # 與顯示數據對齊的濾波結果
+        self.ins_data = IMUColumnBuffer(columns=INS_CHANNELS)  # HI81 INS 數據（二進位格式時）
+        # 同時 LOG HI91 與 HI92 時，另一種封包（各自的時間基準）獨立記錄，匯出為 <檔名>_<封包>.csv
+        self.secondary_data = IMUColumnBuffer(columns=self.columns)
+        self.secondary_name = None
         self.display_counter = 0  # 用於控制顯示頻率
-        self.current_display_divider = 2  # 預設100Hz -> 50Hz顯示
         
-        # 連接信號
-        self.parser.data_emitter.data_received.connect(self.on_data_received)
+        # 頻譜圖（已訂閱的加速度、角速度、磁力計軸）
+        self.spectrum_names = [name for name in SENSOR_CHANNELS if name in self.column_index]
+        self.spectrum_channels = [self.column_index[name] for name in self.spectrum_names]
+        self.spectrogram = self.make_spectrogram()
+        
+        # 感測器校正（依裝置載入，於讀取線程套用）
+        self.calibration_store = CalibrationStore()
+        self.calibration = None
+        self.calibration_enabled = False
+        self.device_key = None
+        self.library = None   # 擷取庫（第一次匯出或瀏覽時開啟）
+        self.connection = (None, None)   # 最近一次連線的 (串口, 鮑率)，中斷後匯出仍記錄
+        
+        # 掉線自動重新連線：擷取事件迴圈偵測到裝置遺失後，以 USB VID/PID/序號找回裝置並以原鮑率重新開啟
+        self.supervisor = None
+        self.reconnect_future = None
+        self.device_config = None     # 最近一次送出的 LOG ... ONTIME 設定，重新連線後重送
+        self.connection_gaps = []     # 收集期間的掉線紀錄，匯出為 <檔名>_gaps.csv
+        self.pending_gap = None       # 尚未恢復數據的掉線紀錄
+        # 重新上電的感測器 ts 從 0 附近重新開始：重新連線後把 ts 平移到掉線前最後一筆之後，記錄的 ts 保持遞增
+        # （讀取線程狀態：_last_ts_out 為最近輸出的 (ts, host_ns)）
+        self._ts_offset = 0.0
+        self._last_ts_out = None
+        self._rebase_ts = False
+        self._calibration_columns = None if self.columns == CHANNELS else self.columns
+        
+        # 觸發事件擷取
+        self.trigger_engine = None
+        
+        # 即時重新取樣到均勻網格（None 表示不取樣），於讀取線程執行
+        self.resampler = None
+        
+        # 濾波器組（讀取線程執行）；filter_specs 記錄介面設定，採樣頻率改變時重建
+        self.filter_bank = FilterBank()
+        self.filter_specs = {}
+        
+        # 本機串流服務
+        self.stream_server = None
+        
+        self.metrics_logger = None
+        self._last_ts = None
+        
+        # 感測器 ts 與主機時間對齊（讀取線程逐批配對）
+        self.timebase = TimeBase()
+        # 開啟的檔案不使用即時的 timebase：主機時間取自檔案的 host_time 欄位 (ts, 秒)，沒有時為 None
+        self.loaded_file = None
+        self.file_clock = None
+        
+        # 擷取：共用的 asyncio 事件迴圈在背景線程讀取與處理，每次串口讀取產生一批 (N, 欄位數) 樣本，
+        # 連同濾波結果（沒有設定濾波時為 None）經有界佇列交給記錄端與顯示端：
+        # 記錄端不丟數據（滿了讓讀取端累積成較大的批次），顯示端過載時丟棄最舊或合併
+        self.acquisition = AcquisitionLoop().start()
+        self.sink = QtSink()
+        self.record_queue = self.sink.add_consumer(self.record_batch,
+                                                   IngestQueue(self.rate_plan.record_queue, 'block'))
+        self.display_queue = self.sink.add_consumer(self.display_batch,
+                                                    IngestQueue(self.rate_plan.display_queue, 'drop_oldest'))
+        # 行程內分析外掛：每批數據以唯讀視圖交給外掛線程，回傳值送回主線程存於 plugin_results
+        self.plugins = BatchPlugins(on_result=lambda name, result: self.sink.post(self.plugin_result, name, result),
+                                    on_error=self.plugin_error)
+        self.plugin_results = {}
+        self.plugin_errors = {}
+        self.device = None
         
         self.init_ui()
         
         # 使用QTimer來更新繪圖，避免在線程中直接更新GUI
         self.update_timer = QTimer()
         self.update_timer.timeout.connect(self.update_plot)
-        self.update_timer.start(100)  # 100ms更新一次
+        self.update_timer.start(self.rate_plan.refresh_ms)  # 預設100ms更新一次
         
-        # 背景讀取線程
-        self.reader_thread = threading.Thread(target=self.read_serial_data, daemon=True)
-        self.reader_thread.start()
+        # 量測快照：更新除錯面板並寫入記錄檔
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(self.update_metrics)
     
     def init_ui(self):
         # --- COM & Baud 選擇 ---
         top_layout = QHBoxLayout()
         self.port_cb = QComboBox()
-        self.refresh_ports()
+        self.port_cb.setEditable(True)  # 可直接輸入路徑，例如模擬器的 /dev/pts/N
+        self.refresh_ports()  # 背景列舉，完成後才填入選單
         refresh_btn = QPushButton("刷新")
         refresh_btn.clicked.connect(self.refresh_ports)
         
@@ -108,6 +271,8 @@ class IMUGUI(QWidget):
 
         self.connect_btn.clicked.connect(self.connect_serial)
         self.disconnect_btn.clicked.connect(self.disconnect_serial)
+        self.reconnect_cb = QCheckBox("自動重連")
+        self.reconnect_cb.setChecked(True)
 
         top_layout.addWidget(QLabel("Port:"))
         top_layout.addWidget(self.port_cb)
@@ -116,6 +281,7 @@ class IMUGUI(QWidget):
         top_layout.addWidget(self.baud_cb)
         top_layout.addWidget(self.connect_btn)
         top_layout.addWidget(self.disconnect_btn)
+        top_layout.addWidget(self.reconnect_cb)
 
         # --- 控制按鈕 ---
         ctrl_layout = QHBoxLayout()
@@ -123,23 +289,45 @@ class IMUGUI(QWidget):
         self.pause_btn = QPushButton("暫停")
         self.clear_btn = QPushButton("清除數據")
         self.export_btn = QPushButton("匯出CSV")
+        self.open_btn = QPushButton("開啟檔案")
+        self.library_btn = QPushButton("擷取庫...")
+        
+        # 長時間模式：記憶體上限，較舊數據壓縮寫入磁碟
+        self.long_session_cb = QCheckBox("長時間模式")
+        self.long_session_cb.toggled.connect(self.rebuild_store)
+        # 緊湊編碼：在韌體輸出精度上的欄位量化後以區塊保存（其他欄位原樣保存，不損失數值）
+        self.compact_cb = QCheckBox("緊湊編碼")
+        self.compact_cb.toggled.connect(self.rebuild_store)
+        self.memory_budget_spin = QSpinBox()
+        self.memory_budget_spin.setRange(16, 16384)
+        self.memory_budget_spin.setValue(256)
+        self.memory_budget_spin.setSuffix(" MB")
+        self.stats_btn = QPushButton("統計")
+        self.stats_btn.clicked.connect(self.show_stats)
         
         # 採樣頻率選擇
         self.freq_cb = QComboBox()
+        self.freq_cb.setEditable(True)  # 可輸入任意頻率，例如 250 或 333Hz
         self.freq_cb.addItems(["100Hz (預設)", "200Hz", "500Hz", "1000Hz"])
         self.freq_cb.setCurrentIndex(0)  # 預設100Hz
         self.apply_freq_btn = QPushButton("套用頻率")
+        # 串口數據格式：Teensy 文字行或 HiPNUC 二進位封包（可混合 HI91/HI92/HI81）
+        self.protocol_cb = QComboBox()
+        self.protocol_cb.addItems(["文字", "二進位 HI91", "二進位 HI92", "二進位 HI91+HI81", "二進位 HI92+HI81"])
+        self.protocol_cb.currentIndexChanged.connect(self.set_protocol)
         
         self.start_btn.clicked.connect(self.start_collecting)
         self.pause_btn.clicked.connect(self.pause_collecting)
         self.clear_btn.clicked.connect(self.clear_data)
         self.export_btn.clicked.connect(self.export_data)
+        self.open_btn.clicked.connect(self.open_file)
+        self.library_btn.clicked.connect(self.show_library)
         self.apply_freq_btn.clicked.connect(self.apply_sampling_frequency)
         
         # 數據顯示限制
         self.max_points_spin = QSpinBox()
-        self.max_points_spin.setRange(100, 10000)
-        self.max_points_spin.setValue(10000)
+        self.max_points_spin.setRange(100, 100000)
+        self.max_points_spin.setValue(self.rate_plan.max_points)
         
         # 顯示選項
         self.show_accel = QCheckBox("加速度")
@@ -148,9 +336,39 @@ class IMUGUI(QWidget):
         self.show_accel.setChecked(True)
         self.show_gyro.setChecked(True)
         
+        # 頻譜圖選項
+        self.show_spectrum = QCheckBox("頻譜圖")
+        self.show_spectrum.toggled.connect(self.toggle_spectrum)
+        self.spectrum_channel_cb = QComboBox()
+        self.spectrum_channel_cb.addItems(self.spectrum_names)
+        
+        # 欄位訂閱選單（收集中不可變更）
+        self.fields_btn = QPushButton("欄位...")
+        fields_menu = QMenu(self.fields_btn)
+        self.field_actions = {}
+        for key in FIELD_GROUPS[1:]:
+            action = fields_menu.addAction(key)
+            action.setCheckable(True)
+            action.setChecked(self.fields is None or key in self.fields)
+            action.toggled.connect(self.apply_field_selection)
+            self.field_actions[key] = action
+        self.fields_btn.setMenu(fields_menu)
+        
+        # 繪圖後端（pyqtgraph 未安裝時只有 matplotlib）
+        self.backend_cb = QComboBox()
+        self.backend_cb.addItems(available_backends())
+        self.backend_cb.currentTextChanged.connect(self.set_backend)
+        self.frame_timer = FrameTimer()
+        
+        # 重新取樣：即時（儲存與顯示均勻網格）或只在匯出時
+        self.resample_cb = QComboBox()
+        self.resample_cb.addItems(["不重新取樣", "即時-線性", "即時-三次", "匯出-線性", "匯出-三次"])
+        self.resample_cb.currentIndexChanged.connect(self.configure_resampler)
+        
         ctrl_layout.addWidget(QLabel("採樣頻率:"))
         ctrl_layout.addWidget(self.freq_cb)
         ctrl_layout.addWidget(self.apply_freq_btn)
+        ctrl_layout.addWidget(self.protocol_cb)
         ctrl_layout.addWidget(self.start_btn)
         ctrl_layout.addWidget(self.pause_btn)
         ctrl_layout.addWidget(self.clear_btn)
@@ -159,37 +377,219 @@ class IMUGUI(QWidget):
         ctrl_layout.addWidget(self.show_accel)
         ctrl_layout.addWidget(self.show_gyro)
         ctrl_layout.addWidget(self.show_euler)
+        ctrl_layout.addWidget(self.show_spectrum)
+        ctrl_layout.addWidget(self.spectrum_channel_cb)
+        ctrl_layout.addWidget(self.fields_btn)
+        ctrl_layout.addWidget(self.backend_cb)
+        ctrl_layout.addWidget(self.resample_cb)
+        ctrl_layout.addWidget(self.long_session_cb)
+        ctrl_layout.addWidget(self.memory_budget_spin)
+        ctrl_layout.addWidget(self.compact_cb)
+        ctrl_layout.addWidget(self.stats_btn)
         ctrl_layout.addWidget(self.export_btn)
+        ctrl_layout.addWidget(self.open_btn)
+        ctrl_layout.addWidget(self.library_btn)
+
+        # --- 校正 ---
+        calib_layout = QHBoxLayout()
+        self.apply_calib_cb = QCheckBox("套用校正")
+        self.apply_calib_cb.toggled.connect(self.toggle_calibration)
+        self.gyro_calib_btn = QPushButton("陀螺零偏(靜止2秒)")
+        self.accel_calib_btn = QPushButton("加速度校正(多姿態)")
+        self.mag_calib_btn = QPushButton("磁力計校正(旋轉)")
+        self.gyro_calib_btn.clicked.connect(self.calibrate_gyro)
+        self.accel_calib_btn.clicked.connect(self.calibrate_accel)
+        self.mag_calib_btn.clicked.connect(self.calibrate_mag)
+        self.calib_label = QLabel("校正: 無")
+        calib_layout.addWidget(self.apply_calib_cb)
+        calib_layout.addWidget(self.gyro_calib_btn)
+        calib_layout.addWidget(self.accel_calib_btn)
+        calib_layout.addWidget(self.mag_calib_btn)
+        calib_layout.addWidget(self.calib_label)
+        calib_layout.addStretch(1)
+
+        # --- 觸發擷取 ---
+        trigger_layout = QHBoxLayout()
+        self.trigger_cb = QCheckBox("觸發擷取")
+        self.trigger_type_cb = QComboBox()
+        self.trigger_type_cb.addItems(["加速度幅值", "角速度幅值", "通道門檻", "通道斜率"])
+        self.trigger_channel_cb = QComboBox()
+        self.trigger_channel_cb.addItems(self.columns[1:])
+        self.trigger_direction_cb = QComboBox()
+        self.trigger_direction_cb.addItems([">=", "<="])
+        self.trigger_level_spin = QDoubleSpinBox()
+        self.trigger_level_spin.setRange(-10000, 10000)
+        self.trigger_level_spin.setDecimals(3)
+        self.trigger_level_spin.setValue(2.0)
+        self.pre_ms_spin = QSpinBox()
+        self.pre_ms_spin.setRange(0, 10000)
+        self.pre_ms_spin.setValue(200)
+        self.post_ms_spin = QSpinBox()
+        self.post_ms_spin.setRange(1, 60000)
+        self.post_ms_spin.setValue(800)
+        self.events_only_cb = QCheckBox("僅保存事件")
+        self.event_label = QLabel("事件: 0")
+        self.export_events_btn = QPushButton("匯出事件")
+        self.export_events_btn.clicked.connect(self.export_events)
+        self.trigger_cb.toggled.connect(self.configure_trigger)
+        self.trigger_type_cb.currentIndexChanged.connect(self.configure_trigger)
+        self.trigger_channel_cb.currentIndexChanged.connect(self.configure_trigger)
+        self.trigger_direction_cb.currentIndexChanged.connect(self.configure_trigger)
+        self.trigger_level_spin.valueChanged.connect(self.configure_trigger)
+        self.pre_ms_spin.valueChanged.connect(self.configure_trigger)
+        self.post_ms_spin.valueChanged.connect(self.configure_trigger)
+        trigger_layout.addWidget(self.trigger_cb)
+        trigger_layout.addWidget(self.trigger_type_cb)
+        trigger_layout.addWidget(self.trigger_channel_cb)
+        trigger_layout.addWidget(QLabel("門檻:"))
+        trigger_layout.addWidget(self.trigger_direction_cb)
+        trigger_layout.addWidget(self.trigger_level_spin)
+        trigger_layout.addWidget(QLabel("前(ms):"))
+        trigger_layout.addWidget(self.pre_ms_spin)
+        trigger_layout.addWidget(QLabel("後(ms):"))
+        trigger_layout.addWidget(self.post_ms_spin)
+        trigger_layout.addWidget(self.events_only_cb)
+        trigger_layout.addWidget(self.event_label)
+        trigger_layout.addWidget(self.export_events_btn)
+        trigger_layout.addStretch(1)
+
+        # --- 濾波 ---
+        filter_layout = QHBoxLayout()
+        self.filter_group_cb = QComboBox()
+        self.filter_group_cb.addItems(['accel', 'gyro', 'mag', 'euler'])
+        self.filter_kind_cb = QComboBox()
+        self.filter_kind_cb.addItems(["低通", "高通", "帶通", "陷波", "移動平均"])
+        self.filter_fc_spin = QDoubleSpinBox()
+        self.filter_fc_spin.setRange(0.01, 5000)
+        self.filter_fc_spin.setValue(10.0)
+        self.filter_fc_spin.setSuffix(" Hz")
+        self.filter_fc2_spin = QDoubleSpinBox()
+        self.filter_fc2_spin.setRange(0.01, 5000)
+        self.filter_fc2_spin.setValue(50.0)
+        self.filter_fc2_spin.setSuffix(" Hz")
+        self.filter_order_spin = QSpinBox()
+        self.filter_order_spin.setRange(2, 8)
+        self.filter_order_spin.setSingleStep(2)
+        self.filter_order_spin.setValue(2)
+        self.filter_apply_btn = QPushButton("套用濾波")
+        self.filter_apply_btn.clicked.connect(self.apply_filter)
+        self.filter_clear_btn = QPushButton("清除濾波")
+        self.filter_clear_btn.clicked.connect(self.clear_filters)
+        self.filter_label = QLabel("濾波: 無")
+        filter_layout.addWidget(QLabel("濾波:"))
+        filter_layout.addWidget(self.filter_group_cb)
+        filter_layout.addWidget(self.filter_kind_cb)
+        filter_layout.addWidget(QLabel("截止:"))
+        filter_layout.addWidget(self.filter_fc_spin)
+        filter_layout.addWidget(QLabel("上限:"))
+        filter_layout.addWidget(self.filter_fc2_spin)
+        filter_layout.addWidget(QLabel("階數:"))
+        filter_layout.addWidget(self.filter_order_spin)
+        filter_layout.addWidget(self.filter_apply_btn)
+        filter_layout.addWidget(self.filter_clear_btn)
+        filter_layout.addWidget(self.filter_label)
+        filter_layout.addStretch(1)
 
         # --- 狀態顯示 ---
         status_layout = QHBoxLayout()
         self.status_label = QLabel("狀態: 未連線")
         self.data_count_label = QLabel("數據點: 0")
+        self.stream_cb = QCheckBox("本機串流")
+        self.stream_cb.toggled.connect(self.toggle_stream)
+        self.stream_port_spin = QSpinBox()
+        self.stream_port_spin.setRange(1024, 65535)
+        self.stream_port_spin.setValue(DEFAULT_PORT)
+        self.stream_label = QLabel("")
+        # 主機時間：圖表以校正後的實際時間為橫軸，匯出時附加 host_time 欄位
+        self.host_time_cb = QCheckBox("主機時間")
+        self.clock_label = QLabel("")
+        # 歷史瀏覽：未收集時拖動檢視已收集/已開啟的數據
+        self.history_slider = QSlider(Qt.Horizontal)
+        self.history_slider.setEnabled(False)
+        self.history_slider.valueChanged.connect(self.show_history)
         status_layout.addWidget(self.status_label)
         status_layout.addWidget(self.data_count_label)
+        status_layout.addWidget(QLabel("瀏覽:"))
+        status_layout.addWidget(self.history_slider, 1)
+        status_layout.addWidget(self.host_time_cb)
+        status_layout.addWidget(self.clock_label)
+        self.frame_label = QLabel("")
+        status_layout.addWidget(self.frame_label)
+        # 顯示佇列的過載策略與各佇列計數
+        self.display_policy_cb = QComboBox()
+        self.display_policy_cb.addItems(["顯示: 丟棄最舊", "顯示: 合併", "顯示: 不丟棄"])
+        self.display_policy_cb.currentIndexChanged.connect(self.set_display_policy)
+        self.queue_label = QLabel("")
+        self.rate_label = QLabel("")
+        self.packet_label = QLabel("")
+        status_layout.addWidget(self.rate_label)
+        status_layout.addWidget(self.display_policy_cb)
+        status_layout.addWidget(self.queue_label)
+        status_layout.addWidget(self.packet_label)
+        status_layout.addWidget(self.stream_cb)
+        status_layout.addWidget(self.stream_port_spin)
+        status_layout.addWidget(self.stream_label)
+        
+        # --- 除錯面板（管線量測） ---
+        self.metrics_cb = QCheckBox("除錯量測")
+        self.metrics_cb.toggled.connect(self.toggle_metrics)
+        self.metrics_log_btn = QPushButton("記錄量測...")
+        self.metrics_log_btn.setCheckable(True)
+        self.metrics_log_btn.toggled.connect(self.toggle_metrics_log)
+        status_layout.addWidget(self.metrics_cb)
+        status_layout.addWidget(self.metrics_log_btn)
+        self.metrics_label = QLabel("")
+        self.metrics_label.setStyleSheet("font-family: monospace;")
+        self.metrics_label.setVisible(False)
 
-        # --- 畫布 ---
-        self.figure = Figure(figsize=(12, 8))
-        self.canvas = FigureCanvas(self.figure)
+        # --- 畫布（可切換後端） ---
+        # 繪圖套件匯入約需半秒：視窗先顯示佔位標籤，背景匯入完成（或第一次需要繪圖）時才建立畫布
+        self.renderer = None
+        self.plot_placeholder = QLabel("載入繪圖元件...")
+        self.plot_placeholder.setAlignment(Qt.AlignCenter)
+        
+        # --- 頻譜圖畫布（以影像更新，不重畫線條）；第一次開啟頻譜圖時才建立 ---
+        self.spec_figure = None
+        self.spec_canvas = None
 
         # --- 主佈局 ---
         layout = QVBoxLayout()
         layout.addLayout(top_layout)
         layout.addLayout(ctrl_layout)
+        layout.addLayout(calib_layout)
+        layout.addLayout(trigger_layout)
+        layout.addLayout(filter_layout)
         layout.addLayout(status_layout)
-        layout.addWidget(self.canvas)
+        layout.addWidget(self.metrics_label)
+        layout.addWidget(self.plot_placeholder, 1)
         self.setLayout(layout)
         
-        # 初始繪圖
-        self.init_plot()
+        # 初始繪圖：在事件迴圈的工作線程預先匯入繪圖後端
+        self.acquisition.submit(self.preload_plotting())
+
+    async def preload_plotting(self):
+        await asyncio.to_thread(preload_backend, self.backend_cb.currentText())
+        self.sink.post(self.init_plot)
 
     def refresh_ports(self):
+        """列舉串口（部分系統需數百毫秒），在事件迴圈的工作線程執行，不阻塞視窗"""
+        self.acquisition.submit(self.list_ports())
+
+    async def list_ports(self):
+        ports = await asyncio.to_thread(serial.tools.list_ports.comports)
+        self.sink.post(self.set_ports, [p.device for p in ports])
+
+    def set_ports(self, ports):
+        """更新端口選單；保留使用者手動輸入或仍然存在的端口"""
+        current = self.port_cb.currentText()
+        listed = [self.port_cb.itemText(i) for i in range(self.port_cb.count())]
         self.port_cb.clear()
-        ports = [p.device for p in serial.tools.list_ports.comports()]
         if ports:
             self.port_cb.addItems(ports)
         else:
             self.port_cb.addItem("無可用端口")
+        if current in ports or (current and current not in listed):
+            self.port_cb.setCurrentText(current)
 
     def connect_serial(self):
         port = self.port_cb.currentText()
@@ -199,19 +599,23 @@ class IMUGUI(QWidget):
             
         baud = int(self.baud_cb.currentText())
         try:
+            self.cancel_reconnect()
+            self.stop_device()
             if self.serial_port and self.serial_port.is_open:
                 self.serial_port.close()
             
-            self.serial_port = serial.Serial(
-                port, 
-                baudrate=baud, 
-                timeout=0.1,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                bytesize=serial.EIGHTBITS
-            )
-            self.serial_port.reset_input_buffer()
+            self.serial_port = self.open_serial(port, baud)
+            self.parser.reset()
+            self.timebase.reset()
+            self.on_acquisition_loop(self.rate_planner.reset)
+            self._ts_offset = 0.0
+            self._last_ts_out = None
+            self.start_device()
+            self.connection = (port, baud)
+            self.device_config = None
+            self.supervisor = ReconnectSupervisor(PortIdentity.of(port), lambda device: self.open_serial(device, baud))
             self.status_label.setText(f"狀態: 已連線至 {port} @ {baud}")
+            self.load_calibration(port)
             self.connect_btn.setEnabled(False)
             self.disconnect_btn.setEnabled(True)
             self.apply_freq_btn.setEnabled(True)
@@ -220,8 +624,116 @@ class IMUGUI(QWidget):
             QMessageBox.critical(self, "錯誤", f"無法連線 {port}：\n{e}")
             self.status_label.setText("狀態: 連線失敗")
 
+    @staticmethod
+    def open_serial(port, baud):
+        serial_port = serial.Serial(
+            port, 
+            baudrate=baud, 
+            timeout=0.1,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            bytesize=serial.EIGHTBITS
+        )
+        serial_port.reset_input_buffer()
+        return serial_port
+
+    def start_device(self):
+        """在擷取事件迴圈上開始讀取目前的串口"""
+        self.stop_device()
+        self.device = SerialDevice(self.serial_port, self.process_raw, self.sink,
+                                   on_error=self.on_serial_error,
+                                   on_lost=self.on_serial_lost,
+                                   observe_serial=self.observe_serial).start(self.acquisition)
+
+    def observe_serial(self, in_waiting):
+        """擷取線程每次讀取前回報 OS 串口緩衝中的位元組數"""
+        if self.metrics.enabled:
+            self.metrics.observe_serial(in_waiting)
+
+    def stop_device(self):
+        """停止讀取並等待讀取任務結束（之後才能安全關閉串口）"""
+        if self.device is not None:
+            self.device.stop()
+            self.device = None
+
+    def on_serial_lost(self, e):
+        """擷取事件迴圈偵測到裝置遺失（已交付遺失前讀到的數據），轉到主線程處理"""
+        self.sink.post(self.serial_lost, self.serial_port, e, time.monotonic())
+
+    def serial_lost(self, port, e, lost_at):
+        if port is not self.serial_port:
+            return   # 已中斷或改連其他串口
+        self.stop_device()
+        try:
+            self.serial_port.close()
+        except (serial.SerialException, OSError):
+            pass
+        if self.collecting:
+            self.pending_gap = {'lost_ts': None, 'resumed_ts': None, 'lost_time': time.time(),
+                                'recovery_ms': None, 'device': None}
+            self.connection_gaps.append(self.pending_gap)
+        if not self.reconnect_cb.isChecked():
+            self.disconnect_serial()
+            self.status_label.setText(f"狀態: 裝置遺失 ({e})")
+            return
+        self.status_label.setText(f"狀態: 裝置遺失，重新連線中... ({self.supervisor.identity})")
+        self.reconnect_future = self.acquisition.submit(self.reconnect(lost_at))
+
+    async def reconnect(self, lost_at):
+        """在擷取事件迴圈上找回裝置、以原鮑率開啟並重送輸出設定"""
+        port = await self.supervisor.recover(lost_at)
+        if port is None:
+            self.sink.post(self.reconnect_failed)
+            return
+        if self.device_config:
+            # 重新上電的裝置回到預設輸出，重送最近一次的 LOG ... ONTIME
+            port.write(self.device_config.encode('utf-8'))
+            port.flush()
+        self.sink.post(self.serial_recovered, port, time.monotonic() - lost_at)
+
+    def serial_recovered(self, port, recovery):
+        if self.reconnect_future is None:
+            port.close()   # 重新連線期間已按下中斷
+            return
+        self.reconnect_future = None
+        self.serial_port = port
+        # 掉線前的殘留狀態不能延續到重新上電的裝置：重新取樣器的尾端、濾波器狀態與量測的頻率都重新開始
+        self.parser.reset()
+        self.timebase.reset()
+        self.on_acquisition_loop(self.rate_planner.reset)
+        self.filter_bank.reset()
+        self.configure_resampler()
+        self._rebase_ts = True
+        self.start_device()
+        device, baud = self.supervisor.identity.device, self.connection[1]
+        self.connection = (device, baud)
+        if self.pending_gap is not None:
+            # 遺失前的數據此時都已交給記錄端；恢復後的第一筆由 record_batch 填入
+            self.pending_gap.update(lost_ts=self.last_collected_ts(), recovery_ms=round(recovery * 1000, 1),
+                                    device=device)
+        self.status_label.setText(f"狀態: 已重新連線至 {device} @ {baud}（{recovery * 1000:.0f} ms）")
+
+    def reconnect_failed(self):
+        error = self.supervisor.last_error
+        self.disconnect_serial()
+        self.status_label.setText(f"狀態: 重新連線逾時{f' ({error})' if error else ''}")
+
+    def cancel_reconnect(self):
+        future, self.reconnect_future = self.reconnect_future, None
+        if future is not None:
+            future.cancel()
+        if self.pending_gap is not None:
+            if self.pending_gap['lost_ts'] is None:
+                self.pending_gap['lost_ts'] = self.last_collected_ts()
+            self.pending_gap = None
+
+    def last_collected_ts(self):
+        return float(self.collected_data.tail(1)[0, 0]) if len(self.collected_data) else None
+
     def disconnect_serial(self):
         self.collecting = False
+        self.cancel_reconnect()
+        self.stop_device()
         if self.serial_port and self.serial_port.is_open:
             try:
                 self.serial_port.close()
@@ -239,47 +751,134 @@ class IMUGUI(QWidget):
             QMessageBox.warning(self, "警告", "請先連線串口")
             return
         
-        freq_text = self.freq_cb.currentText()
-        
-        # 根據選擇的頻率設定對應的ONTIME值和顯示分頻
-        if "100Hz" in freq_text:
-            ontime = "0.01"
-            display_divider = 2  # 100Hz -> 50Hz顯示
-            freq_name = "100Hz"
-        elif "200Hz" in freq_text:
-            ontime = "0.005"
-            display_divider = 4  # 200Hz -> 50Hz顯示
-            freq_name = "200Hz"
-        elif "500Hz" in freq_text:
-            ontime = "0.002"
-            display_divider = 10  # 500Hz -> 50Hz顯示
-            freq_name = "500Hz"
-        elif "1000Hz" in freq_text:
-            ontime = "0.001"
-            display_divider = 20  # 1000Hz -> 50Hz顯示
-            freq_name = "1000Hz"
-        else:
+        try:
+            command, rate = ontime_command(parse_rate(self.freq_cb.currentText()), self.protocol_packets())
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", str(e))
             return
         
         try:
-            # 發送對應的指令
-            command = f"UNLOGALL\r\nLOG HI91 ONTIME {ontime}\r\n"
+            # 發送對應的指令；輸出間隔以毫秒為單位，實際頻率可能與輸入的略有不同
             self.serial_port.write(command.encode('utf-8'))
             self.serial_port.flush()
+            self.device_config = command
             
-            # 更新顯示分頻器
-            self.current_display_divider = display_divider
+            # 顯示分頻等參數等量測到實際輸入頻率後才重新規劃
+            self.on_acquisition_loop(self.rate_planner.request, rate)
+            if isinstance(self.parser, HiPNUCParser):
+                # HI92 沒有時間戳：第一批以輸出間隔排列，之後依收到的時間量測
+                self.parser.interval_ms = 1000.0 / rate
             
-            QMessageBox.information(self, "頻率設定", f"已設定採樣頻率為 {freq_name}\n指令: LOG HI91 ONTIME {ontime}")
-            self.status_label.setText(f"狀態: 已設定 {freq_name} 採樣頻率")
+            commands = ", ".join(command.splitlines()[1:])
+            QMessageBox.information(self, "頻率設定", f"已設定採樣頻率為 {rate:g}Hz\n指令: {commands}")
+            self.status_label.setText(f"狀態: 已設定 {rate:g}Hz 採樣頻率")
         except Exception as e:
             QMessageBox.critical(self, "錯誤", f"設定頻率失敗：\n{e}")
 
+    def protocol_packets(self):
+        """目前格式要 LOG 的封包；文字格式由韌體轉成文字行，LOG HI91"""
+        text = self.protocol_cb.currentText()
+        return tuple(text.split()[1].split('+')) if text.startswith("二進位") else ('HI91',)
+
+    def set_protocol(self, *args):
+        """切換串口數據格式（以單一指派替換解析器，擷取線程下一次讀取即使用新的解析器）"""
+        if self.protocol_cb.currentIndex() == 0:
+            parser = IMUDataParser(self.metrics, self.fields)
+        else:
+            parser = HiPNUCParser(self.metrics, self.fields, 1000.0 / self.current_sample_rate)
+        self.parser = parser
+        self.packet_label.setText("")
+
+    def load_calibration(self, port):
+        """依裝置載入已保存的校正係數"""
+        self.device_key = CalibrationStore.device_key(port)
+        self.calibration = self.calibration_store.get(self.device_key)
+        if self.calibration is not None:
+            self.calib_label.setText(f"校正: 已載入 ({self.device_key})")
+        else:
+            self.calib_label.setText(f"校正: 無 ({self.device_key})")
+
+    def toggle_calibration(self, checked):
+        self.calibration_enabled = checked
+
+    def raw_sensor_data(self, n=None, group=None):
+        """取得估計校正用的原始九軸數據；套用校正時收集的數據無法可靠還原"""
+        if group is not None and VECTOR_FIELDS[group][0] not in self.column_index:
+            QMessageBox.warning(self, "警告", f"請先在「欄位」中訂閱 {group}")
+            return None
+        if self.calibration_enabled:
+            QMessageBox.warning(self, "警告", "請先取消「套用校正」，清除數據後重新收集原始數據")
+            return None
+        store = self.collected_data
+        data = store.read(0, len(store)) if n is None else store.tail(n)
+        if not len(data):
+            QMessageBox.warning(self, "警告", "沒有數據可以校正")
+            return None
+        sensor = select_columns(data, self.columns, SENSOR_CHANNELS)
+        if group is not None:
+            # 缺少該群組的數據行（缺值 NaN）不參與估計
+            cols = [SENSOR_CHANNELS.index(name) for name in VECTOR_FIELDS[group]]
+            sensor = sensor[~np.isnan(sensor[:, cols]).any(axis=1)]
+        return sensor
+
+    def save_calibration(self, **coefficients):
+        """合併新估計的係數並保存"""
+        current = self.calibration.to_dict() if self.calibration else {}
+        current.update({k: np.asarray(v).tolist() for k, v in coefficients.items()})
+        self.calibration = SensorCalibration.from_dict(current)
+        key = self.device_key or self.port_cb.currentText()
+        self.calibration_store.put(key, self.calibration)
+        self.calib_label.setText(f"校正: 已更新 ({key})")
+
+    def calibrate_gyro(self):
+        """以最近 2 秒靜止數據估計陀螺儀零偏"""
+        sensor = self.raw_sensor_data(int(2 * self.current_sample_rate), 'gyro')
+        if sensor is None:
+            return
+        try:
+            bias = estimate_gyro_bias(sensor[:, 3:6])
+        except ValueError as e:
+            QMessageBox.warning(self, "校正失敗", str(e))
+            return
+        self.save_calibration(gyro_bias=bias)
+        QMessageBox.information(self, "校正", f"陀螺零偏 (dps): {np.round(bias, 3).tolist()}")
+
+    def calibrate_accel(self):
+        """以多個靜止姿態的數據估計加速度計偏移與比例"""
+        sensor = self.raw_sensor_data(group='accel')
+        if sensor is None:
+            return
+        try:
+            offset, matrix = fit_accel(sensor[:, 0:3])
+        except (ValueError, np.linalg.LinAlgError) as e:
+            QMessageBox.warning(self, "校正失敗", str(e))
+            return
+        self.save_calibration(accel_offset=offset, accel_matrix=matrix)
+        QMessageBox.information(self, "校正", f"加速度偏移 (g): {np.round(offset, 4).tolist()}\n"
+                                f"比例: {np.round(np.diag(matrix), 4).tolist()}")
+
+    def calibrate_mag(self):
+        """以全方位旋轉的數據擬合磁力計硬鐵/軟鐵橢球"""
+        sensor = self.raw_sensor_data(group='mag')
+        if sensor is None:
+            return
+        try:
+            offset, matrix = fit_ellipsoid(sensor[:, 6:9])
+        except (ValueError, np.linalg.LinAlgError) as e:
+            QMessageBox.warning(self, "校正失敗", str(e))
+            return
+        self.save_calibration(mag_offset=offset, mag_matrix=matrix)
+        QMessageBox.information(self, "校正", f"硬鐵偏移 (uT): {np.round(offset, 2).tolist()}")
+
     def start_collecting(self):
         if not self.serial_port or not self.serial_port.is_open:
             QMessageBox.warning(self, "警告", "請先連線串口")
             return
         self.collecting = True
+        self.loaded_file = None   # 之後的數據來自裝置
+        self.file_clock = None
+        self.history_slider.setEnabled(False)
+        self.fields_btn.setEnabled(False)
         self.start_btn.setText("收集中...")
         self.start_btn.setEnabled(False)
         self.pause_btn.setEnabled(True)
@@ -289,141 +888,701 @@ class IMUGUI(QWidget):
         self.start_btn.setText("開始收集")
         self.start_btn.setEnabled(True)
         self.pause_btn.setEnabled(False)
+        self.fields_btn.setEnabled(True)
+        self.update_history_range()
         
     def clear_data(self):
         self.data_buffer.clear()
         self.collected_data.clear()
-        self.display_data.clear()
         self.display_counter = 0
+        self.spectrogram.reset()
+        self.display_queue.reset_counters()
+        self.record_queue.reset_counters()
+        if self.trigger_engine is not None:
+            self.trigger_engine.reset()
+        self.configure_resampler()
+        self.filtered_buffer.clear()
+        self.filter_bank.reset()
+        self.ins_data.clear()
+        self.secondary_data.clear()
+        self.connection_gaps = []
+        self.pending_gap = None
+        self.loaded_file = None
+        self.file_clock = None
+        self.event_label.setText("事件: 0")
         self.data_count_label.setText("數據點: 0")
+        self.update_history_range()
         # 清除圖表
-        self.figure.clear()
-        self.canvas.draw()
+        if self.renderer is not None:
+            self.renderer.clear()
         self.update_plot()
 
-    def on_data_received(self, data):
-        """處理接收到的數據"""
+    def on_data_received(self, batch, filtered=None):
+        """處理接收到的一批數據 (N, 欄位數)；filtered 為讀取線程算好的濾波結果"""
+        self.record_batch(batch, filtered)
+        self.display_batch(batch, filtered)
+
+    def display_batch(self, batch, filtered=None):
+        """顯示端：頻譜與降頻後的顯示緩衝（經 display_queue，過載時可丟棄或合併）"""
+        if batch.shape[1] != len(self.columns) or not self.collecting:
+            return  # 切換訂閱前已在佇列中的批次
+        # 頻譜以完整採樣頻率計算
+        if self.spectrum_channels:
+            self.spectrogram.push(batch[:, self.spectrum_channels])
+        
+        # 根據當前設定的分頻器控制顯示頻率：每 divider 筆取一筆
+        divider = self.current_display_divider
+        counter = min(self.display_counter, divider - 1)
+        self.data_buffer.max_len = self.max_points_spin.value()  # 限制顯示緩衝區大小
+        self.data_buffer.append(batch[divider - counter - 1::divider])
+        if filtered is not None:
+            self.filtered_buffer.max_len = self.data_buffer.max_len
+            self.filtered_buffer.append(filtered[divider - counter - 1::divider])
+        self.display_counter = (counter + len(batch)) % divider
+
+    def record_batch(self, batch, filtered=None):
+        """記錄端：完整數據與觸發事件（經 record_queue，不丟數據）"""
+        if batch.shape[1] != len(self.columns):
+            return  # 切換訂閱前已在佇列中的批次
+        metrics = self.metrics
+        if metrics.enabled:
+            t0 = time.perf_counter_ns()
+            metrics.count('batches_received')
         if self.collecting:
-            # 所有數據都存到collected_data（完整採樣頻率）
-            self.collected_data.append(data)
+            # 所有數據都存到collected_data（完整採樣頻率），僅保存事件時則略過
+            if self.trigger_engine is None or not self.events_only_cb.isChecked():
+                self.collected_data.append(batch)
+            gap = self.pending_gap
+            if gap is not None and gap['recovery_ms'] is not None:
+                gap['resumed_ts'] = float(batch[0, 0])
+                self.pending_gap = None
             
-            # 根據當前設定的分頻器控制顯示頻率
-            self.display_counter += 1
-            if self.display_counter >= self.current_display_divider:
-                self.data_buffer.append(data)
-                self.display_data.append(data)
-                self.display_counter = 0
-                
-                # 限制顯示緩衝區大小
-                max_points = self.max_points_spin.value()
-                if len(self.data_buffer) > max_points:
-                    self.data_buffer = self.data_buffer[-max_points:]
+            if self.trigger_engine is not None and self.trigger_engine.process(batch):
+                self.event_label.setText(f"事件: {len(self.trigger_engine.events)}")
+            
+            self.update_count_label()
             
-            self.data_count_label.setText(f"數據點: {len(self.collected_data)} (顯示: {len(self.data_buffer)})")
+            if metrics.enabled:
+                metrics.count('samples_stored', len(batch))
+        if metrics.enabled:
+            # 時間戳間隔超過中位數 1.5 倍視為上游（感測器/OS 緩衝）掉資料
+            ts = batch[:, 0]
+            if self._last_ts is not None:
+                ts = np.concatenate(([self._last_ts], ts))
+            if len(ts) > 2:
+                dt = np.diff(ts)
+                step = np.median(dt)
+                if step > 0:
+                    metrics.count('ts_gaps', int(np.count_nonzero(dt > step * 1.5)))
+            self._last_ts = batch[-1, 0]
+            metrics.add_time('store', time.perf_counter_ns() - t0)
 
-    def read_serial_data(self):
-        """背景線程讀取串口數據"""
-        buffer = ""
-        while not self.stop_reader:
-            if self.serial_port and self.serial_port.is_open:
-                try:
-                    if self.serial_port.in_waiting > 0:
-                        # 讀取可用數據
-                        raw_data = self.serial_port.read(self.serial_port.in_waiting)
-                        text_data = raw_data.decode('utf-8', errors='ignore')
-                        buffer += text_data
-                        
-                        # 按行處理
-                        lines = buffer.split('\n')
-                        buffer = lines[-1]  # 保留最後不完整的行
-                        
-                        for line in lines[:-1]:
-                            line = line.strip()
-                            if line and 'ts=' in line:  # 只處理包含時間戳的數據行
-                                data = self.parser.parse_arduino_line(line)
-                                if data:
-                                    self.parser.data_emitter.data_received.emit(data)
-                except (serial.SerialException, OSError, PermissionError) as e:
-                    # 忽略常見的串口錯誤，避免終端輸出錯誤訊息
-                    if "ClearCommError" not in str(e):
-                        print(f"串口通訊警告: {e}")
-                    time.sleep(0.01)
-                except Exception as e:
-                    print(f"讀取串口錯誤: {e}")
-                    time.sleep(0.1)
+    def record_ins(self, ins):
+        """HI81 INS 數據與 IMU 數據一起記錄（獨立的欄位式儲存）"""
+        if self.collecting:
+            self.ins_data.append(ins)
+
+    def record_secondary(self, name, block):
+        """另一種 IMU 封包的數據，不與主要的 IMU 數據混在一起"""
+        if self.collecting:
+            self.secondary_name = name
+            self.secondary_data.append(block)
+
+    def configure_trigger(self, *args):
+        """依介面設定重建觸發引擎（已擷取的事件保留）"""
+        if not self.trigger_cb.isChecked():
+            self.trigger_engine = None
+            return
+        level = self.trigger_level_spin.value()
+        kind = self.trigger_type_cb.currentIndex()
+        direction = 'above' if self.trigger_direction_cb.currentIndex() == 0 else 'below'
+        columns = self.columns
+        events = self.trigger_engine.events if self.trigger_engine is not None else []
+        try:
+            if kind == 0:
+                trigger = Trigger('magnitude', level, group='acc', columns=columns,
+                                  direction=direction)
+            elif kind == 1:
+                trigger = Trigger('magnitude', level, group='gyr', columns=columns,
+                                  direction=direction)
+            elif kind == 2:
+                trigger = Trigger('threshold', level, channel=self.trigger_channel_cb.currentText(),
+                                  columns=columns, direction=direction)
             else:
-                time.sleep(0.1)
+                trigger = Trigger('slope', level, channel=self.trigger_channel_cb.currentText(),
+                                  columns=columns, direction=direction)
+        except ValueError as e:
+            # 觸發所需的欄位未訂閱
+            self.trigger_engine = None
+            self.event_label.setText(str(e))
+            return
+        self.trigger_engine = TriggerEngine([trigger], self.current_sample_rate,
+                                            self.pre_ms_spin.value(), self.post_ms_spin.value(),
+                                            columns)
+        self.trigger_engine.events = events
+        self.event_label.setText(f"事件: {len(events)}")
 
-    def init_plot(self):
-        """初始化繪圖"""
-        self.figure.clear()
+    def resample_setting(self):
+        """回傳 (是否即時, 內插方式)，不重新取樣時為 None"""
+        index = self.resample_cb.currentIndex()
+        if index == 0:
+            return None
+        return index <= 2, 'linear' if index % 2 else 'cubic'
+
+    def configure_resampler(self, *args):
+        """依介面設定建立即時重新取樣器（目標為目前的採樣頻率）"""
+        setting = self.resample_setting()
+        if setting is not None and setting[0]:
+            self.resampler = StreamingResampler(self.current_sample_rate, setting[1])
+        else:
+            self.resampler = None
+
+    def apply_filter(self):
+        """把目前的濾波設定套用到選擇的欄位群組（取代該群組原本的濾波）"""
+        group = self.filter_group_cb.currentText()
+        kinds = ['lowpass', 'highpass', 'bandpass', 'notch', 'moving_average']
+        kind = kinds[self.filter_kind_cb.currentIndex()]
+        fc = self.filter_fc_spin.value()
+        if kind == 'bandpass':
+            fc = (fc, self.filter_fc2_spin.value())
+        spec = {'kind': kind, 'fc': fc, 'order': self.filter_order_spin.value()}
+        try:
+            self.make_group_filter(group, spec)
+        except (ValueError, KeyError) as e:
+            QMessageBox.warning(self, "濾波設定錯誤", str(e))
+            return
+        self.filter_specs[group] = spec
+        self.rebuild_filters()
+
+    def make_group_filter(self, group, spec):
+        """依設定建立一個群組的濾波器；群組未訂閱時丟出 KeyError"""
+        names = VECTOR_FIELDS[group]
+        if names[0] not in self.column_index:
+            raise KeyError(f"未訂閱 {group}")
+        columns = [self.column_index[name] for name in names]
+        return columns, make_filter(spec['kind'], len(columns), self.current_sample_rate,
+                                    spec['fc'], spec['order'])
+
+    def rebuild_filters(self):
+        """依 filter_specs、目前欄位與採樣頻率重建濾波器組（整個替換，讀取線程不需加鎖）"""
+        bank = FilterBank()
+        active = []
+        for group, spec in self.filter_specs.items():
+            try:
+                columns, filt = self.make_group_filter(group, spec)
+            except (ValueError, KeyError):
+                continue  # 新的採樣頻率或欄位下無效的設定略過
+            bank.set(group, columns, filt)
+            fc = spec['fc']
+            fc_text = f"{fc[0]:g}-{fc[1]:g}" if isinstance(fc, tuple) else f"{fc:g}"
+            active.append(f"{group} {spec['kind']} {fc_text}Hz")
+        self.filter_bank = bank
+        self.filtered_buffer = IMUColumnBuffer(max_len=self.max_points_spin.value(), columns=self.columns)
+        self.filter_label.setText("濾波: " + ("; ".join(active) if active else "無"))
+
+    def clear_filters(self):
+        self.filter_specs = {}
+        self.rebuild_filters()
+
+    def export_events(self):
+        """每個事件各自匯出成一個CSV文件"""
+        if self.trigger_engine is None or not self.trigger_engine.events:
+            QMessageBox.warning(self, "警告", "沒有事件可以匯出")
+            return
+        directory = QFileDialog.getExistingDirectory(self, "選擇事件匯出資料夾")
+        if not directory:
+            return
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        try:
+            for i, event in enumerate(self.trigger_engine.events):
+                event.save_csv(f"{directory}/imu_event_{stamp}_{i:03d}_ts{int(event.trigger_timestamp)}.csv")
+            QMessageBox.information(self, "成功", f"已匯出 {len(self.trigger_engine.events)} 個事件至 {directory}")
+        except Exception as e:
+            QMessageBox.critical(self, "錯誤", f"匯出失敗：\n{e}")
+
+    def toggle_metrics(self, checked):
+        """開關管線量測與除錯面板"""
+        self.metrics.reset()
+        self._last_ts = None
+        self.metrics.enabled = checked
+        self.metrics_label.setVisible(checked)
+        if checked:
+            self.metrics.snapshot()  # 建立速率計算的基準
+            self.metrics_timer.start(1000)
+        else:
+            self.metrics_timer.stop()
+            self.metrics_log_btn.setChecked(False)
+
+    def toggle_metrics_log(self, checked):
+        """定期把量測快照寫入 JSON Lines 或 CSV 檔"""
+        if checked:
+            filename, _ = QFileDialog.getSaveFileName(
+                self, "量測記錄檔",
+                f"imu_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                "JSON Lines (*.jsonl);;CSV Files (*.csv)"
+            )
+            if not filename:
+                self.metrics_log_btn.setChecked(False)
+                return
+            self.metrics_logger = MetricsLogger(filename)
+            self.metrics_cb.setChecked(True)
+        elif self.metrics_logger is not None:
+            self.metrics_logger.close()
+            self.metrics_logger = None
+
+    def update_metrics(self):
+        snap = self.metrics.snapshot()
+        self.metrics_label.setText(format_snapshot(snap))
+        if self.metrics_logger is not None:
+            self.metrics_logger.write(snap)
+
+    def toggle_stream(self, checked):
+        """啟動/停止本機串流服務"""
+        if checked:
+            server = IMUStreamServer(port=self.stream_port_spin.value(), columns=self.columns)
+            try:
+                server.start()
+            except OSError as e:
+                QMessageBox.critical(self, "錯誤", f"無法啟動串流服務：\n{e}")
+                self.stream_cb.setChecked(False)
+                return
+            self.stream_server = server
+            self.stream_port_spin.setEnabled(False)
+        else:
+            server, self.stream_server = self.stream_server, None
+            if server is not None:
+                server.stop()
+            self.stream_port_spin.setEnabled(True)
+            self.stream_label.setText("")
+
+    def update_count_label(self):
+        text = f"數據點: {len(self.collected_data)} (顯示: {len(self.data_buffer)})"
+        store = self.collected_data
+        if isinstance(store, SpillingColumnStore):
+            text += f" 記憶體: {store.memory_bytes / 2**20:.1f} MB"
+            if store.path is not None:
+                text += f" 磁碟: {store.disk_bytes / 2**20:.1f} MB"
+        self.data_count_label.setText(text)
+
+    def rebuild_store(self, *args):
+        """依長時間模式/緊湊編碼切換儲存方式，已收集的數據搬到新的儲存"""
+        old = self.collected_data
+        long_session = self.long_session_cb.isChecked()
+        compact = self.compact_cb.isChecked()
+        budget = self.memory_budget_spin.value() * 1024 * 1024
+        columns = self.columns
+        if compact:
+            codec = CompactCodec(columns)
+            # 只在記憶體時，未編碼的最新數據只保留少量
+            self.collected_data = SpillingColumnStore(
+                memory_budget=budget if long_session else 8 * 1024 * 1024,
+                encoder=codec.encode, decoder=codec.decode, in_memory=not long_session,
+                columns=columns)
+        elif long_session:
+            self.collected_data = SpillingColumnStore(memory_budget=budget, columns=columns)
+        else:
+            self.collected_data = IMUColumnBuffer(columns=columns)
+        for block in old.iter_blocks():
+            self.collected_data.append(select_columns(block, old.columns, columns))
+        if isinstance(old, SpillingColumnStore):
+            old.close()
+        self.memory_budget_spin.setEnabled(not long_session)
+        self.update_count_label()
+
+    def apply_field_selection(self, *args):
+        """依欄位選單重設訂閱"""
+        fields = [key for key, action in self.field_actions.items() if action.isChecked()]
+        self.set_fields(None if len(fields) == len(self.field_actions) else fields)
+
+    def set_fields(self, fields):
+        """切換欄位訂閱：解析器、儲存、顯示、頻譜與觸發都改用新的欄位"""
+        self.parser.set_fields(fields)
+        self.fields = fields
+        self.columns = self.parser.columns
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+        self._calibration_columns = None if self.columns == CHANNELS else self.columns
+        self.rebuild_store()
+        self.data_buffer = IMUColumnBuffer(max_len=self.max_points_spin.value(), columns=self.columns)
+        self.display_counter = 0
         
-    def update_plot(self):
-        """更新繪圖"""
-        if not self.data_buffer:
+        self.spectrum_names = [name for name in SENSOR_CHANNELS if name in self.column_index]
+        self.spectrum_channels = [self.column_index[name] for name in self.spectrum_names]
+        self.spectrum_channel_cb.clear()
+        self.spectrum_channel_cb.addItems(self.spectrum_names)
+        self.set_sample_rate(self.current_sample_rate)
+        
+        channel = self.trigger_channel_cb.currentText()
+        self.trigger_channel_cb.blockSignals(True)
+        self.trigger_channel_cb.clear()
+        self.trigger_channel_cb.addItems(self.columns[1:])
+        self.trigger_channel_cb.setCurrentText(channel)
+        self.trigger_channel_cb.blockSignals(False)
+        self.configure_trigger()
+        self.update_history_range()
+
+    def open_file(self):
+        """開啟匯出的 IMU CSV，以與即時數據相同的繪圖流程瀏覽"""
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "開啟CSV文件", "", "CSV Files (*.csv)")
+        if filename:
+            self.load_file(filename)
+
+    def load_file(self, filename):
+        try:
+            header, raw = load_capture(filename)
+            data = select_columns(imu_channels(header, raw, filename), CHANNELS, self.columns)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "錯誤", f"讀取失敗：\n{e}")
             return
-            
-        self.figure.clear()
+        if self.collecting:
+            self.pause_collecting()
+        self.clear_data()
+        self.loaded_file = filename
+        self.file_clock = host_clock(header, raw)
+        if isinstance(self.collected_data, SpillingColumnStore):
+            for i in range(0, len(data), 65536):
+                self.collected_data.append(data[i:i + 65536])
+        else:
+            # 快取檔以 memmap 開啟，不複製數據
+            self.collected_data = IMUColumnBuffer.from_array(data, self.columns)
+        # 由時間戳 (ms) 推算採樣頻率
+        if len(data) > 1:
+            step = np.median(np.diff(data[:min(len(data), 10000), 0]))
+            if step > 0:
+                self.set_sample_rate(1000.0 / step)
+        self.update_count_label()
+        self.update_history_range()
+        self.show_history(self.history_slider.value())
+        self.setWindowTitle(f"HI04M3 Data Collector - {filename}")
+
+    def history_window(self):
+        """瀏覽視窗涵蓋的原始樣本數（與即時顯示相同的點數與分頻）"""
+        return self.max_points_spin.value() * self.current_display_divider
+
+    def update_history_range(self):
+        total = len(self.collected_data)
+        self.history_slider.setRange(0, max(total - self.history_window(), 0))
+        self.history_slider.setValue(self.history_slider.maximum())
+        self.history_slider.setEnabled(not self.collecting and total > 0)
+
+    def show_history(self, position):
+        """把 [position, position + 視窗) 的數據分頻後放入顯示緩衝區"""
+        if self.collecting or not len(self.collected_data):
+            return
+        rows = self.collected_data.read(position, position + self.history_window())
+        self.filtered_buffer.clear()
+        self.data_buffer.clear()
+        self.data_buffer.max_len = self.max_points_spin.value()
+        self.data_buffer.append(rows[::self.current_display_divider])
+
+    def show_stats(self):
+        """顯示全部數據（含磁碟層）的各欄位統計"""
+        stats = column_stats(self.collected_data)
+        if stats is None:
+            QMessageBox.warning(self, "警告", "沒有數據")
+            return
+        lines = [f"共 {stats['count']} 筆", f"{'欄位':<8}{'平均':>12}{'標準差':>12}{'最小':>12}{'最大':>12}"]
+        for i, name in enumerate(self.columns):
+            lines.append(f"{name:<10}{stats['mean'][i]:>12.4f}{stats['std'][i]:>12.4f}"
+                         f"{stats['min'][i]:>12.4f}{stats['max'][i]:>12.4f}")
+        box = QMessageBox(self)
+        box.setWindowTitle("統計")
+        box.setStyleSheet("QLabel { font-family: monospace; }")
+        box.setText("\n".join(lines))
+        box.exec_()
+
+    def process_raw(self, raw_data, host_ns):
+        """在擷取事件迴圈處理一次串口讀取：解析、時間對齊、校正、重新取樣、濾波與串流；
+        回傳交給 on_data_received 的 (batch, filtered)，沒有完整樣本時回傳 None"""
+        metrics = self.metrics
+        parser = self.parser
+        batch = parser.feed(raw_data, host_ns)
+        ins = parser.take_ins()
+        if ins is not None:
+            self.sink.post(self.record_ins, ins)
+        secondary = parser.take_secondary()
+        if secondary is not None:
+            self.sink.post(self.record_secondary, *secondary)
+        if batch is None:
+            return None
+        # 展開 32 位元 ts 溢位，並以本批最後一筆與主機時間配對
+        timebase = self.timebase
+        ts = timebase.unwrap(batch[:, 0])
+        if self._rebase_ts:
+            self._rebase_ts = False
+            self._ts_offset = self.resume_offset(ts, host_ns)
+        batch[:, 0] = ts + self._ts_offset if self._ts_offset else ts
+        timebase.observe(batch[-1, 0], host_ns)
+        self._last_ts_out = (batch[-1, 0], host_ns)
+        plan = self.rate_planner.update(batch[:, 0])
+        if plan is not None:
+            self.sink.post(self.apply_rate_plan, plan)
+        calibration = self.calibration
+        if self.calibration_enabled and calibration is not None:
+            calibration.apply(batch, self._calibration_columns)
+        resampler = self.resampler
+        if resampler is not None:
+            batch = resampler.push(batch)
+            if not len(batch):
+                return None
+        bank = self.filter_bank
+        filtered = bank.process(batch) if len(bank) else None
+        server = self.stream_server
+        columns = self.columns
+        if server is not None and batch.shape[1] == len(columns):   # 切換訂閱前解析的批次不發佈
+            server.publish(batch, columns)
+        plugins = self.plugins
+        if len(plugins):
+            plugins.submit(batch, self.columns)
+        if metrics.enabled:
+            metrics.count('batches_emitted')
+        return batch, filtered
+
+    # 行程內分析 API（主線程呼叫，例如嵌入的 IPython 主控台）：回傳唯讀視圖而不經 CSV，
+    # 視圖與緩衝區共用記憶體，只在下一批數據寫入前有效，需要保留時請 .copy()
+
+    def visible_data(self):
+        """目前曲線顯示的數據（分頻後的顯示緩衝區）"""
+        return self.data_buffer.snapshot()
+
+    def selected_data(self, t0=None, t1=None):
+        """全部數據中時間戳在 [t0, t1) (ms) 的部分；都不指定時為瀏覽中的歷史視窗（收集中為全部）
+        涵蓋磁碟層時為解碼後的複本"""
+        if t0 is None and t1 is None and not self.collecting:
+            position = self.history_slider.value()
+            return self.collected_data.snapshot(position, position + self.history_window())
+        return self.collected_data.select_time(t0, t1)
+
+    def dataframe(self, data=None):
+        """以 pandas.DataFrame 包裝 data（預設為 visible_data()），不複製"""
+        return to_dataframe(self.visible_data() if data is None else data, self.columns)
+
+    def add_batch_hook(self, fn, name=None):
+        """註冊對每批新數據執行的分析函式 fn(batch, columns)，在外掛線程執行；回傳名稱"""
+        return self.plugins.add(fn, name)
+
+    def plugin_result(self, name, result):
+        self.plugin_results[name] = result
+
+    def plugin_error(self, name, e):
+        # 外掛線程呼叫；每個外掛只印第一次錯誤，之後只記錄最近的錯誤並計數（plugins.stats()）
+        if name not in self.plugin_errors:
+            print(f"外掛 {name} 錯誤: {e!r}")
+        self.plugin_errors[name] = e
+
+    def resume_offset(self, ts, host_ns):
+        """重新連線後第一批的 ts 平移量：ts 仍接續掉線前（裝置沒有重新上電）時維持原平移量，
+        否則把這批排在最後一筆之後，間隔為主機時間經過的時間（至少一個採樣間隔）"""
+        last = self._last_ts_out
+        if last is None or ts[0] + self._ts_offset > last[0]:
+            return self._ts_offset
+        step = 1000.0 / self.current_sample_rate
+        elapsed = (host_ns - last[1]) / 1e6 - (ts[-1] - ts[0])
+        return last[0] + max(elapsed, step) - ts[0]
+
+    def on_serial_error(self, e):
+        # 忽略常見的串口錯誤，避免終端輸出錯誤訊息
+        if "ClearCommError" not in str(e):
+            print(f"串口通訊警告: {e}")
+        if self.metrics.enabled:
+            self.metrics.count('serial_errors')
+
+    def init_plot(self):
+        """建立曲線畫布並替換佔位標籤（只做一次；背景匯入完成或第一次繪圖時呼叫）"""
+        if self.renderer is not None:
+            return
+        self.renderer = make_renderer(self.backend_cb.currentText())
+        self.layout().replaceWidget(self.plot_placeholder, self.renderer.widget)
+        self.plot_placeholder.deleteLater()
+        self.renderer.clear()
         
-        plot_count = sum([self.show_accel.isChecked(), 
-                         self.show_gyro.isChecked(), 
-                         self.show_euler.isChecked()])
+    def set_backend(self, name):
+        """切換曲線繪圖後端，替換版面中的畫布"""
+        if self.renderer is None or name == self.renderer.name:
+            return   # 畫布尚未建立時，init_plot 會使用選單目前的後端
+        try:
+            renderer = make_renderer(name)
+        except RuntimeError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
+        layout = self.layout()
+        layout.replaceWidget(self.renderer.widget, renderer.widget)
+        self.renderer.widget.deleteLater()
+        self.renderer = renderer
+        self.frame_timer = FrameTimer()
+        self.update_plot()
         
-        if plot_count == 0:
+    def init_spectrum_plot(self):
+        """初始化頻譜圖影像（畫布尚未建立時略過）"""
+        if self.spec_figure is None:
             return
-            
-        subplot_idx = 1
+        self.spec_figure.clear()
+        self.spec_ax = self.spec_figure.add_subplot(1, 1, 1)
+        spec = self.spectrogram
+        self.spec_image = self.spec_ax.imshow(
+            spec.image(0), aspect='auto', origin='lower', cmap='viridis',
+            extent=[-spec.time_span, 0, 0, spec.sample_rate / 2], vmin=-100, vmax=0)
+        self.spec_ax.set_xlabel("Time (s)")
+        self.spec_ax.set_ylabel("Frequency (Hz)")
+        self.spec_figure.colorbar(self.spec_image, ax=self.spec_ax, label="dB")
+        self.spec_figure.tight_layout()
+        self.spec_canvas.draw()
+        
+    def make_spectrogram(self):
+        plan = self.rate_plan
+        return RollingSpectrogram(max(len(self.spectrum_channels), 1), plan.rate,
+                                  nfft=plan.nfft, hop=plan.hop, history=plan.spectrum_history)
+
+    def on_acquisition_loop(self, func, *args):
+        """在擷取事件迴圈上執行 func（量測與 rate_planner 只由擷取線程寫入）；迴圈已停止時直接執行"""
+        if self.acquisition.running:
+            self.acquisition.loop.call_soon_threadsafe(func, *args)
+        else:
+            func(*args)
+
+    def set_sample_rate(self, sample_rate):
+        """由 GUI 決定採樣頻率（開啟檔案、切換欄位）：擷取線程的量測改與新規劃比較"""
+        plan = RatePlan(sample_rate)
+        self.on_acquisition_loop(self.rate_planner.adopt, plan)
+        self.apply_rate_plan(plan)
+
+    def apply_rate_plan(self, plan):
+        """採樣頻率改變時重新規劃顯示分頻、更新間隔、顯示點數、佇列長度與頻譜計算"""
+        self.rate_plan = plan
+        self.current_sample_rate = plan.rate
+        self.current_display_divider = plan.display_divider
+        self.update_timer.setInterval(plan.refresh_ms)
+        # 顯示與濾波緩衝跟著 max_points_spin（display_batch 每批套用）
+        self.max_points_spin.setValue(plan.max_points)
+        self.record_queue.maxlen = plan.record_queue
+        self.display_queue.maxlen = plan.display_queue
+        self.spectrogram = self.make_spectrogram()
+        self.init_spectrum_plot()
+        self.configure_trigger()
+        self.configure_resampler()
+        self.rebuild_filters()
+        
+    def toggle_spectrum(self, checked):
+        if checked and self.spec_canvas is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+            self.spec_figure = Figure(figsize=(12, 3))
+            self.spec_canvas = FigureCanvas(self.spec_figure)
+            self.spec_canvas.setMinimumHeight(200)
+            self.layout().addWidget(self.spec_canvas)
+            self.init_spectrum_plot()
+        if self.spec_canvas is not None:
+            self.spec_canvas.setVisible(checked)
         
-        # 準備時間軸（使用索引）
-        x_data = list(range(len(self.data_buffer)))
+    def update_spectrum_plot(self):
+        """只更新頻譜影像數據，不重建座標軸"""
+        channel = self.spectrum_channel_cb.currentIndex()
+        img = self.spectrogram.image(channel)
+        self.spec_image.set_data(img)
+        peak = np.nanmax(img) if not np.isnan(img).all() else 0.0   # 含缺值的幀為 NaN
+        self.spec_image.set_clim(peak - 80, peak)
+        self.spec_ax.set_title(f"Spectrogram - {self.spectrum_channel_cb.currentText()}")
+        self.spec_canvas.draw_idle()
+        
+    def set_display_policy(self, index):
+        self.display_queue.policy = ('drop_oldest', 'coalesce', 'block')[index]
+
+    def update_rate_label(self):
+        plan = self.rate_plan
+        measured = self.rate_planner.meter.rate
+        text = f"輸入: {measured:.1f} Hz" if measured else "輸入: -"
+        self.rate_label.setText(f"{text} | 規劃 {plan.rate:g} Hz 顯示 1/{plan.display_divider}"
+                                f" 更新 {plan.refresh_ms} ms FFT {plan.nfft}")
+
+    def update_queue_label(self):
+        if isinstance(self.parser, HiPNUCParser):
+            text = f"{self.parser.format_counts()} | INS {len(self.ins_data)}"
+            if len(self.secondary_data):
+                text += f" | {self.secondary_name} {len(self.secondary_data)}"
+            self.packet_label.setText(text)
+        display, record = self.display_queue, self.record_queue
+        self.queue_label.setText(
+            f"顯示佇列: 丟棄 {display.dropped} 合併 {display.coalesced} 峰值 {display.peak}/{display.maxlen}"
+            f" | 記錄佇列: 峰值 {record.peak}/{record.maxlen} 等待 {record.blocked_ns / 1e6:.0f} ms")
+
+    def update_plot(self):
+        """更新繪圖"""
+        self.update_queue_label()
+        self.update_rate_label()
+        metrics = self.metrics
+        if metrics.enabled:
+            t0 = time.perf_counter_ns()
+        drawn = self.draw_plots()
+        if metrics.enabled and drawn:
+            metrics.add_time('render', time.perf_counter_ns() - t0)
+            metrics.count('frames_rendered')
         
-        if self.show_accel.isChecked() and any('accel' in d for d in self.data_buffer):
-            ax = self.figure.add_subplot(plot_count, 1, subplot_idx)
-            acc_x = [d.get('accel', [0,0,0])[0] for d in self.data_buffer]
-            acc_y = [d.get('accel', [0,0,0])[1] for d in self.data_buffer]
-            acc_z = [d.get('accel', [0,0,0])[2] for d in self.data_buffer]
+    def draw_plots(self):
+        """重畫圖表，有實際繪製時回傳 True"""
+        if self.stream_server is not None:
+            self.stream_label.setText(f"訂閱者: {self.stream_server.client_count}")
             
-            ax.plot(x_data, acc_x, 'r-', label='Acc X', linewidth=1)
-            ax.plot(x_data, acc_y, 'g-', label='Acc Y', linewidth=1)
-            ax.plot(x_data, acc_z, 'b-', label='Acc Z', linewidth=1)
-            ax.legend(loc='upper right')  # 固定在右上角
-            ax.set_title("Acceleration (g)")
-            ax.grid(True, alpha=0.3)
-            subplot_idx += 1
-
-        if self.show_gyro.isChecked() and any('gyro' in d for d in self.data_buffer):
-            ax = self.figure.add_subplot(plot_count, 1, subplot_idx)
-            gyr_x = [d.get('gyro', [0,0,0])[0] for d in self.data_buffer]
-            gyr_y = [d.get('gyro', [0,0,0])[1] for d in self.data_buffer]
-            gyr_z = [d.get('gyro', [0,0,0])[2] for d in self.data_buffer]
+        if self.show_spectrum.isChecked() and self.spectrogram.frame_count:
+            self.update_spectrum_plot()
             
-            ax.plot(x_data, gyr_x, 'r-', label='Gyr X', linewidth=1)
-            ax.plot(x_data, gyr_y, 'g-', label='Gyr Y', linewidth=1)
-            ax.plot(x_data, gyr_z, 'b-', label='Gyr Z', linewidth=1)
-            ax.legend(loc='upper right')  # 固定在右上角
-            ax.set_title("Angular Velocity (°/s)")
-            ax.grid(True, alpha=0.3)
-            subplot_idx += 1
+        if self.timebase.ready:
+            self.clock_label.setText(f"漂移: {self.timebase.drift_ppm:+.1f} ppm")
             
-        if self.show_euler.isChecked() and any('euler' in d for d in self.data_buffer):
-            ax = self.figure.add_subplot(plot_count, 1, subplot_idx)
-            roll = [d.get('euler', [0,0,0])[0] for d in self.data_buffer]
-            pitch = [d.get('euler', [0,0,0])[1] for d in self.data_buffer]
-            yaw = [d.get('euler', [0,0,0])[2] for d in self.data_buffer]
+        if not len(self.data_buffer):
+            return False
             
-            ax.plot(x_data, roll, 'r-', label='Roll', linewidth=1)
-            ax.plot(x_data, pitch, 'g-', label='Pitch', linewidth=1)
-            ax.plot(x_data, yaw, 'b-', label='Yaw', linewidth=1)
-            ax.legend(loc='upper right')  # 固定在右上角
-            ax.set_title("Euler Angles (°)")
-            ax.grid(True, alpha=0.3)
+        index = self.column_index
+        groups = [(self.show_accel, 'acc_x', "Acceleration (g)", ('Acc X', 'Acc Y', 'Acc Z')),
+                  (self.show_gyro, 'gyr_x', "Angular Velocity (°/s)", ('Gyr X', 'Gyr Y', 'Gyr Z')),
+                  (self.show_euler, 'roll', "Euler Angles (°)", ('Roll', 'Pitch', 'Yaw'))]
+        groups = [(index[first], title, labels) for cb, first, title, labels in groups
+                  if cb.isChecked() and first in index]
+        
+        if not groups:
+            return False
+            
+        if self.renderer is None:
+            self.init_plot()   # 背景匯入尚未完成：第一次需要繪圖時直接建立
+        t0 = time.perf_counter()
+        data = self.data_buffer.view()
+        
+        # 準備時間軸：索引，或相對最新一筆的主機時間（秒）
+        if self.host_time_cb.isChecked():
+            ts = data[:, index['timestamp']]
+            clock = self.host_clock()
+            if clock is not None:
+                x_data = clock(ts)
+                x_data -= x_data[-1]
+            else:
+                x_data = (ts - ts[-1]) / 1000.0  # 沒有主機時間的檔案：以感測器時間代替
+        else:
+            x_data = np.arange(len(data))
+        
+        panels, series, overlays = [], [], []
+        for start, title, labels in groups:
+            overlay = self.filtered_overlay(x_data, start)
+            panels.append(Panel(title, labels,
+                                overlay_labels=[f'{label} (filt)' for label in labels] if overlay else ()))
+            series.append([data[:, start + k] for k in range(3)])  # 欄位視圖，不複製
+            overlays.append(overlay)
+        self.renderer.set_panels(panels)
+        self.renderer.draw(x_data, series, overlays)
+        
+        self.frame_timer.measure(t0)
+        self.frame_label.setText(self.frame_timer.text())
+        return True
 
-        self.figure.tight_layout()
-        self.canvas.draw()
+    def filtered_overlay(self, x_data, start):
+        """start 起三軸的濾波結果 (x, [y...])，與顯示數據以最新一筆對齊；沒有濾波時為 None"""
+        fdata = self.filtered_buffer.view()
+        if not len(fdata) or start not in self.filter_bank.columns:
+            return None
+        n = min(len(fdata), len(x_data))
+        return x_data[-n:], [fdata[-n:, start + k] for k in range(3)]
 
     def export_data(self):
         """匯出數據到CSV文件"""
-        if not self.collected_data:
+        if not len(self.collected_data):
             QMessageBox.warning(self, "警告", "沒有數據可以匯出")
             return
             
@@ -435,71 +1594,198 @@ class IMUGUI(QWidget):
         
         if filename:
             try:
-                with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                    fieldnames = ['timestamp', 'temperature', 'pressure', 'fps',
-                                'acc_x', 'acc_y', 'acc_z',
-                                'gyr_x', 'gyr_y', 'gyr_z',
-                                'mag_x', 'mag_y', 'mag_z',
-                                'roll', 'pitch', 'yaw']
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    
-                    for data in self.collected_data:
-                        row = {
-                            'timestamp': data.get('timestamp', 0),
-                            'temperature': data.get('temperature', 0),
-                            'pressure': data.get('pressure', 0),
-                            'fps': data.get('fps', 0)
-                        }
-                        
-                        # 加速度
-                        if 'accel' in data:
-                            row.update({
-                                'acc_x': data['accel'][0],
-                                'acc_y': data['accel'][1],
-                                'acc_z': data['accel'][2]
-                            })
-                        
-                        # 角速度
-                        if 'gyro' in data:
-                            row.update({
-                                'gyr_x': data['gyro'][0],
-                                'gyr_y': data['gyro'][1],
-                                'gyr_z': data['gyro'][2]
-                            })
-                            
-                        # 磁力計
-                        if 'mag' in data:
-                            row.update({
-                                'mag_x': data['mag'][0],
-                                'mag_y': data['mag'][1],
-                                'mag_z': data['mag'][2]
-                            })
-                            
-                        # 歐拉角
-                        if 'euler' in data:
-                            row.update({
-                                'roll': data['euler'][0],
-                                'pitch': data['euler'][1],
-                                'yaw': data['euler'][2]
-                            })
-                        
-                        writer.writerow(row)
-                
-                QMessageBox.information(self, "成功", f"數據已儲存至 {filename}\n共 {len(self.collected_data)} 筆數據")
+                recorder = self.write_csv(filename)
+                self.record_session(filename, recorder)
+                message = f"數據已儲存至 {filename}\n共 {len(self.collected_data)} 筆數據"
+                if len(self.ins_data):
+                    ins_filename = self.write_ins_csv(filename)
+                    message += f"\nINS 數據 {len(self.ins_data)} 筆: {ins_filename}"
+                if len(self.secondary_data):
+                    secondary_filename = self.write_secondary_csv(filename)
+                    message += f"\n{self.secondary_name} 數據 {len(self.secondary_data)} 筆: {secondary_filename}"
+                if self.connection_gaps:
+                    gaps_filename = self.write_gaps_csv(filename)
+                    message += f"\n掉線 {len(self.connection_gaps)} 次: {gaps_filename}"
+                QMessageBox.information(self, "成功", message)
             except Exception as e:
                 QMessageBox.critical(self, "錯誤", f"儲存失敗：\n{e}")
 
+    def host_clock(self):
+        """ts (ms) -> 牆上時間 (epoch 秒) 的換算：開啟的檔案依其 host_time 欄位內插，
+        即時數據使用 timebase；兩者都沒有時回傳 None"""
+        if self.loaded_file is not None:
+            if self.file_clock is None:
+                return None
+            file_ts, file_host = self.file_clock
+            return lambda ts: np.interp(ts, file_ts, file_host)
+        return self.timebase.to_wall if self.timebase.ready else None
+
+    def write_csv(self, filename):
+        """把全部收集的數據寫成CSV；勾選主機時間時附加每筆的牆上時間 (epoch 秒)
+        回傳寫檔時順便累計統計的 SessionRecorder"""
+        clock = self.host_clock() if self.host_time_cb.isChecked() else None
+        setting = self.resample_setting()
+        resampler = None
+        if setting is not None and not setting[0]:
+            resampler = StreamingResampler(self.current_sample_rate, setting[1])
+        columns = self.collected_data.columns
+        recorder = SessionRecorder(columns, self.current_sample_rate)
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(columns + ['host_time'] if clock else columns)
+            for block in self.collected_data.iter_blocks():
+                if resampler is not None:
+                    block = resampler.push(block)
+                recorder.update(block)
+                if clock:
+                    block = np.column_stack((block, clock(block[:, 0])))
+                writer.writerows(csv_rows(block))
+        return recorder
+
+    def write_ins_csv(self, filename):
+        """INS 數據寫在 IMU 檔旁（<檔名>_ins.csv），並以同一個 session 時間加入擷取庫"""
+        ins_filename = os.path.splitext(filename)[0] + "_ins.csv"
+        recorder = SessionRecorder(INS_CHANNELS)
+        with open(ins_filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(INS_CHANNELS)
+            for block in self.ins_data.iter_blocks():
+                recorder.update(block)
+                writer.writerows(csv_rows(block))
+        self.record_session(ins_filename, recorder, KIND_INS)
+        return ins_filename
+
+    def write_secondary_csv(self, filename):
+        """另一種 IMU 封包的數據寫在 IMU 檔旁（<檔名>_hi92.csv 等），並加入擷取庫"""
+        secondary_filename = f"{os.path.splitext(filename)[0]}_{self.secondary_name.lower()}.csv"
+        columns = self.secondary_data.columns
+        recorder = SessionRecorder(columns)
+        with open(secondary_filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(columns)
+            for block in self.secondary_data.iter_blocks():
+                recorder.update(block)
+                writer.writerows(csv_rows(block))
+        self.record_session(secondary_filename, recorder)
+        return secondary_filename
+
+    def write_gaps_csv(self, filename):
+        """掉線紀錄寫在 IMU 檔旁（<檔名>_gaps.csv）：遺失前最後一筆與恢復後第一筆的感測器 ts、
+        掉線時間 (epoch 秒) 與恢復耗時；裝置重新上電時 ts 會從頭計數"""
+        gaps_filename = os.path.splitext(filename)[0] + "_gaps.csv"
+        fields = ['lost_ts', 'resumed_ts', 'lost_time', 'recovery_ms', 'device']
+        with open(gaps_filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.connection_gaps)
+        return gaps_filename
+
+    def open_library(self):
+        if self.library is None:
+            self.library = CaptureLibrary()
+        return self.library
+
+    def record_session(self, filename, recorder, kind=KIND_IMU):
+        """把匯出的擷取與目前的連線設定加入擷取庫；失敗不影響已寫好的檔案"""
+        started = None
+        clock = self.host_clock()
+        if clock is not None and len(self.collected_data):
+            started = float(clock(self.collected_data.read(0, 1)[:, 0])[0])
+        port, baud = self.connection
+        try:
+            recorder.finish(self.open_library(), filename, kind, started=started,
+                            baud=baud, port=port, device=self.device_key,
+                            calibration=self.calibration.to_dict() if self.calibration else None,
+                            notes=f"掉線 {len(self.connection_gaps)} 次" if self.connection_gaps else None)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.status_label.setText(f"狀態: 擷取庫更新失敗 ({e})")
+
+    def show_library(self):
+        """列出擷取庫中的 IMU 擷取，雙擊開啟"""
+        try:
+            library = self.open_library()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "錯誤", f"無法開啟擷取庫：\n{e}")
+            return
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"擷取庫 - {library.path}")
+        dialog.resize(900, 500)
+        layout = QVBoxLayout(dialog)
+        headers = ["開始時間", "長度 (s)", "筆數", "頻率 (Hz)", "掉資料", "串口", "裝置", "檔案"]
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(table)
+        buttons = QHBoxLayout()
+        scan_btn = QPushButton("掃描資料夾...")
+        open_btn = QPushButton("開啟")
+        buttons.addWidget(scan_btn)
+        buttons.addStretch()
+        buttons.addWidget(open_btn)
+        layout.addLayout(buttons)
+        sessions = []
+
+        def fill():
+            sessions[:] = library.sessions(kind=KIND_IMU)
+            table.setRowCount(len(sessions))
+            for row, session in enumerate(sessions):
+                started = (datetime.fromtimestamp(session['started']).strftime('%Y-%m-%d %H:%M:%S')
+                           if session['started'] else "")
+                values = [started,
+                          f"{session['duration']:.1f}" if session['duration'] is not None else "",
+                          str(session['samples']),
+                          f"{session['rate']:g}" if session['rate'] else "",
+                          f"{session['missing']} ({session['gaps']} 段)" if session['gaps'] else "0",
+                          session['port'] or "", session['device'] or "", session['path']]
+                for col, value in enumerate(values):
+                    table.setItem(row, col, QTableWidgetItem(value))
+
+        def scan():
+            directory = QFileDialog.getExistingDirectory(dialog, "選擇擷取資料夾")
+            if directory:
+                added, failed = library.scan(directory)
+                fill()
+                if failed:
+                    QMessageBox.warning(dialog, "掃描", f"新增 {len(added)} 筆，{len(failed)} 個檔案無法讀取")
+
+        def open_selected(*args):
+            row = table.currentRow()
+            if row < 0:
+                return
+            dialog.accept()
+            self.load_file(sessions[row]['path'])
+
+        scan_btn.clicked.connect(scan)
+        open_btn.clicked.connect(open_selected)
+        table.cellDoubleClicked.connect(open_selected)
+        fill()
+        dialog.exec_()
+
     def closeEvent(self, event):
         """程式關閉時的清理工作"""
-        self.stop_reader = True
         self.collecting = False
         
         if self.update_timer:
             self.update_timer.stop()
             
-        time.sleep(0.2)  # 等待線程結束
+        if self.stream_server is not None:
+            self.stream_server.stop()
         
+        # 取消讀取任務並等待事件迴圈線程結束，再關閉串口與儲存
+        self.cancel_reconnect()
+        self.stop_device()
+        self.acquisition.stop()
+        self.plugins.stop()
+        
+        if isinstance(self.collected_data, SpillingColumnStore):
+            self.collected_data.close()
+        
+        if self.library is not None:
+            self.library.close()
+            
         if self.serial_port and self.serial_port.is_open:
             try:
                 self.serial_port.close()
@@ -510,6 +1796,15 @@ class IMUGUI(QWidget):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = IMUGUI()
+    # python imu_gui.py --fields accel,gyro  只訂閱部分欄位
+    fields = None
+    if '--fields' in sys.argv[1:-1]:
+        fields = sys.argv[sys.argv.index('--fields') + 1].split(',')
+    window = IMUGUI(fields)
+    # python imu_gui.py --plugin mymodule:analyze  對每批數據執行 analyze(batch, columns)
+    for i, arg in enumerate(sys.argv[1:-1], 1):
+        if arg == '--plugin':
+            module_name, _, func_name = sys.argv[i + 1].partition(':')
+            window.add_batch_hook(getattr(importlib.import_module(module_name), func_name or 'analyze'))
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""
+HiPNUC 二進位封包解析（HI91 / HI92 / HI81）
+封包格式與欄位定義見 test/hipnuc_dec.h：5A A5 len(2) crc(2) payload。
+同一串流可混合多種封包，依 tag 分派：HI91、HI92 轉成與文字格式相同的 IMU 欄位，
+HI81 (INS) 放入獨立的欄位式數據。同步碼搜尋與解碼以 numpy 整批計算（結構 dtype 直接檢視、
+整數欄位整批乘上比例係數）；CRC16（CRC-CCITT/XMODEM）以 binascii.crc_hqx 逐幀驗證。
+"""
+
+import binascii
+import time
+
+import numpy as np
+
+from imu_buffer import CHANNELS, channel_layout, select_columns
+
+SYNC1, SYNC2 = 0x5A, 0xA5
+HEADER_SIZE = 6
+MAX_PAYLOAD = 256 - HEADER_SIZE
+
+TAG_HI91 = 0x91
+TAG_HI92 = 0x92
+TAG_HI81 = 0x81
+PACKET_NAMES = {TAG_HI91: 'HI91', TAG_HI92: 'HI92', TAG_HI81: 'HI81'}
+
+GRAVITY = 9.8
+R2D = 57.2957795130823
+
+# 與 hipnuc_dec.h 相同的緊密排列結構（little-endian）
+HI91_DTYPE = np.dtype([
+    ('tag', 'u1'), ('status', '<u2'), ('temp', 'i1'), ('air_pressure', '<f4'), ('system_time', '<u4'),
+    ('acc', '<f4', 3), ('gyr', '<f4', 3), ('mag', '<f4', 3),
+    ('roll', '<f4'), ('pitch', '<f4'), ('yaw', '<f4'), ('quat', '<f4', 4)])
+
+HI92_DTYPE = np.dtype([
+    ('tag', 'u1'), ('status', '<u2'), ('temperature', 'i1'), ('rev', '<u2'),
+    ('air_pressure', '<i2'), ('reserved', '<i2'),
+    ('gyr_b', '<i2', 3), ('acc_b', '<i2', 3), ('mag_b', '<i2', 3),
+    ('roll', '<i4'), ('pitch', '<i4'), ('yaw', '<i4'), ('quat', '<i2', 4)])
+
+HI81_DTYPE = np.dtype([
+    ('tag', 'u1'), ('status', '<u2'), ('ins_status', 'u1'), ('gpst_wn', '<u2'), ('gpst_tow', '<u4'),
+    ('reserved', '<u2'), ('gyr_b', '<i2', 3), ('acc_b', '<i2', 3), ('mag_b', '<i2', 3),
+    ('air_pressure', '<i2'), ('reserved1', '<i2'), ('temperature', 'i1'),
+    ('utc_year', 'u1'), ('utc_month', 'u1'), ('utc_day', 'u1'), ('utc_hour', 'u1'), ('utc_min', 'u1'),
+    ('utc_msec', '<u2'), ('roll', '<i2'), ('pitch', '<i2'), ('yaw', '<u2'), ('quat', '<i2', 4),
+    ('ins_lon', '<i4'), ('ins_lat', '<i4'), ('ins_msl', '<i4'),
+    ('pdop', 'u1'), ('hdop', 'u1'), ('solq_pos', 'u1'), ('nv_pos', 'u1'),
+    ('solq_heading', 'u1'), ('nv_heading', 'u1'), ('diff_age', 'u1'), ('undulation', '<i2'),
+    ('ant_status', 'u1'), ('vel_enu', '<i2', 3), ('acc_enu', '<i2', 3),
+    ('gnss_lon', '<i4'), ('gnss_lat', '<i4'), ('gnss_msl', '<i4'), ('reserved2', 'u1', 2)])
+
+PACKET_DTYPES = {TAG_HI91: HI91_DTYPE, TAG_HI92: HI92_DTYPE, TAG_HI81: HI81_DTYPE}
+
+# HI92 整數 -> 物理量（與 hipnuc_dump_packet 相同）；加速度再換算成 g，與 HI91 一致
+HI92_ACC_SCALE = 0.0048828 / GRAVITY
+HI92_GYR_SCALE = 0.001 * R2D
+HI92_MAG_SCALE = 0.030517
+HI92_EULER_SCALE = 0.001
+
+# HI81 (INS) 欄位
+INS_CHANNELS = ['timestamp', 'ins_status', 'lat', 'lon', 'msl',
+                'vel_e', 'vel_n', 'vel_u', 'roll', 'pitch', 'yaw',
+                'solq_pos', 'nv_pos', 'pdop', 'hdop']
+
+
+def find_frames(data, a, start=0):
+    """從 start 起找出 CRC 正確的完整幀，回傳 (起點列表, payload 長度列表, 已處理到的位置, CRC 錯誤數)
+
+    同步碼以 numpy 一次找出；長度不合理或 CRC 錯誤的同步碼略過，從下一個同步碼重新對齊
+    （與 hipnuc_dec.c 逐位元組重新同步的結果相同）。最後不完整的幀從其起點保留到下次。
+    """
+    n = len(a)
+    sync = np.flatnonzero((a[start:n - 1] == SYNC1) & (a[start + 1:] == SYNC2)) + start
+    starts, lengths = [], []
+    errors = 0
+    pos = start
+    for s in sync.tolist():
+        if s < pos:
+            continue   # 位於上一幀內容中
+        if s + HEADER_SIZE > n:
+            return starts, lengths, s, errors
+        length = data[s + 2] | (data[s + 3] << 8)
+        if length > MAX_PAYLOAD:
+            continue
+        stop = s + HEADER_SIZE + length
+        if stop > n:
+            return starts, lengths, s, errors
+        crc = binascii.crc_hqx(data[s + HEADER_SIZE:stop], binascii.crc_hqx(data[s:s + 4], 0))
+        if crc != data[s + 4] | (data[s + 5] << 8):
+            errors += 1
+            continue
+        starts.append(s)
+        lengths.append(length)
+        pos = stop
+    # 結尾的 5A 可能是下一個同步碼的開頭
+    end = n - 1 if n > pos and a[n - 1] == SYNC1 else n
+    return starts, lengths, max(end, pos), errors
+
+
+def hi91_to_channels(rec):
+    """HI91 結構陣列 -> (N, len(CHANNELS))，單位與文字格式相同（g、dps、uT、deg）"""
+    out = np.zeros((len(rec), len(CHANNELS)))
+    out[:, 0] = rec['system_time']
+    out[:, 1] = rec['temp']
+    out[:, 2] = rec['air_pressure']
+    out[:, 4:7] = rec['acc']
+    out[:, 7:10] = rec['gyr']
+    out[:, 10:13] = rec['mag']
+    out[:, 13] = rec['roll']
+    out[:, 14] = rec['pitch']
+    out[:, 15] = rec['yaw']
+    return out
+
+
+def hi92_to_channels(rec, timestamps):
+    """HI92 結構陣列 -> (N, len(CHANNELS))；整數欄位整批乘上比例係數
+
+    HI92 沒有時間戳，由呼叫端提供（依主機收到的時間重建）。
+    """
+    out = np.empty((len(rec), len(CHANNELS)))
+    out[:, 0] = timestamps
+    out[:, 1] = rec['temperature']
+    out[:, 2] = rec['air_pressure']      # 原始值，韌體未定義比例
+    out[:, 3] = 0.0
+    np.multiply(rec['acc_b'], HI92_ACC_SCALE, out=out[:, 4:7])
+    np.multiply(rec['gyr_b'], HI92_GYR_SCALE, out=out[:, 7:10])
+    np.multiply(rec['mag_b'], HI92_MAG_SCALE, out=out[:, 10:13])
+    np.multiply(rec['roll'], HI92_EULER_SCALE, out=out[:, 13])
+    np.multiply(rec['pitch'], HI92_EULER_SCALE, out=out[:, 14])
+    np.multiply(rec['yaw'], HI92_EULER_SCALE, out=out[:, 15])
+    return out
+
+
+def hi81_to_channels(rec):
+    """HI81 結構陣列 -> (N, len(INS_CHANNELS))；timestamp 為 GPS 週內時間 (ms)"""
+    out = np.empty((len(rec), len(INS_CHANNELS)))
+    out[:, 0] = rec['gpst_tow']
+    out[:, 1] = rec['ins_status']
+    out[:, 2] = rec['ins_lat'] * 1e-7
+    out[:, 3] = rec['ins_lon'] * 1e-7
+    out[:, 4] = rec['ins_msl'] * 1e-3
+    out[:, 5:8] = rec['vel_enu'] * 0.01
+    out[:, 8] = rec['roll'] * 0.01
+    out[:, 9] = rec['pitch'] * 0.01
+    out[:, 10] = rec['yaw'] * 0.01
+    out[:, 11] = rec['solq_pos']
+    out[:, 12] = rec['nv_pos']
+    out[:, 13] = rec['pdop'] * 0.1
+    out[:, 14] = rec['hdop'] * 0.1
+    return out
+
+
+def split_payload(payload):
+    """一個 payload 中依序排列的多個封包 -> [(tag, bytes)]（與 hipnuc_dec.c parse_data 相同，未知位元組略過）"""
+    packets = []
+    ofs = 0
+    while ofs < len(payload):
+        dtype = PACKET_DTYPES.get(payload[ofs])
+        if dtype is None:
+            ofs += 1
+            continue
+        packets.append((payload[ofs], payload[ofs:ofs + dtype.itemsize]))
+        ofs += dtype.itemsize
+    return [(tag, data) for tag, data in packets if len(data) == PACKET_DTYPES[tag].itemsize]
+
+
+class HiPNUCParser:
+    """HiPNUC 二進位串流解析器，介面與 IMUDataParser 相同（feed() 回傳 IMU 批次）
+
+    HI81 解出的 INS 數據累積在一旁，以 take_ins() 取出。
+    HI91 與 HI92 各有自己的時間基準，不混在同一批：feed() 只回傳第一個出現的 IMU 封包種類（同時出現時為 HI91），
+    另一種累積在一旁，以 take_secondary() 取出。
+    HI92 沒有時間戳：以主機收到的時間重建（見 _hi92_timestamps），interval_ms 只用於第一批。
+    """
+
+    def __init__(self, metrics=None, fields=None, interval_ms=1.0):
+        self.metrics = metrics
+        self.interval_ms = interval_ms
+        self.set_fields(fields)
+        # HI92 時鐘（重新連線時不歸零，ts 延續並反映掉線時間）
+        self._hi92_origin = None    # ts 0 對應的主機時間 (ms)
+        self._hi92_last = None      # 上一批最後一筆的 ts
+        self._hi92_step = None      # 量測的樣本間隔 (ms)
+        self.imu_tag = None         # feed() 回傳的 IMU 封包種類
+        self.reset()
+
+    def reset(self):
+        self.pending = b""
+        self._ins = []
+        self._secondary = []
+        self.counts = {'HI91': 0, 'HI92': 0, 'HI81': 0, 'crc_errors': 0, 'unknown': 0}
+
+    def set_fields(self, fields=None):
+        self._columns = channel_layout(fields)
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def take_ins(self):
+        """取出累積的 INS 數據 (N, len(INS_CHANNELS))，沒有時回傳 None"""
+        if not self._ins:
+            return None
+        ins, self._ins = self._ins, []
+        return np.vstack(ins)
+
+    def take_secondary(self):
+        """取出累積的另一種 IMU 封包數據，回傳 (封包名稱, (N, 欄位數))，沒有時回傳 None"""
+        if not self._secondary:
+            return None
+        blocks, self._secondary = self._secondary, []
+        tag = TAG_HI92 if self.imu_tag == TAG_HI91 else TAG_HI91
+        return PACKET_NAMES[tag], np.vstack(blocks)
+
+    def _decode(self, a, starts, lengths):
+        """依 tag 分組並以結構 dtype 一次解碼，回傳 {tag: 結構陣列}"""
+        by_tag = {}
+        mixed = []
+        if starts:
+            starts = np.array(starts) + HEADER_SIZE
+            lengths = np.array(lengths)
+            tags = a[starts]
+            for tag, dtype in PACKET_DTYPES.items():
+                # 一幀一個封包（韌體的一般設定）：直接以結構 dtype 檢視
+                sel = (tags == tag) & (lengths == dtype.itemsize)
+                if sel.any():
+                    rows = a[starts[sel, None] + np.arange(dtype.itemsize)]
+                    by_tag[tag] = [np.ascontiguousarray(rows).view(dtype).ravel()]
+                    lengths[sel] = -1
+            mixed = [(s, n) for s, n in zip(starts.tolist(), lengths.tolist()) if n >= 0]
+        for s, n in mixed:
+            packets = split_payload(a[s:s + n].tobytes())
+            if not packets:
+                self.counts['unknown'] += 1
+            for tag, data in packets:
+                by_tag.setdefault(tag, []).append(np.frombuffer(data, PACKET_DTYPES[tag]))
+        return {tag: np.concatenate(parts) if len(parts) > 1 else parts[0]
+                for tag, parts in by_tag.items()}
+
+    def _hi92_timestamps(self, n, host_ns):
+        """HI92 的 ts (ms)：這批最後一筆為主機收到的時間，往前依樣本間隔排列
+
+        樣本間隔由相鄰兩批之間經過的時間與筆數量測（不採用設定的 ONTIME），實際頻率與掉幀都反映在 ts 上；
+        超過估計間隔 4 倍的停頓視為沒有數據，這批以估計間隔排在停頓之後，停頓顯示為 ts 跳號。
+        """
+        now = host_ns / 1e6
+        if self._hi92_origin is None:
+            step = self.interval_ms
+            self._hi92_origin = now - step * (n - 1)
+        else:
+            measured = (now - self._hi92_origin - self._hi92_last) / n
+            estimate = self._hi92_step
+            if estimate is None:
+                estimate = measured
+            elif measured <= estimate * 4:
+                estimate += 0.1 * (measured - estimate)
+            self._hi92_step = estimate
+            step = min(estimate, measured)   # 第一筆不早於上一批的最後一筆
+        ts = now - self._hi92_origin - step * np.arange(n - 1, -1, -1)
+        self._hi92_last = ts[-1]
+        return ts
+
+    def feed(self, raw_data, host_ns=None):
+        """處理串口讀到的位元組，回傳 IMU 批次 (N, 欄位數)，沒有 HI91/HI92 時回傳 None
+
+        host_ns 為讀到這批的 time.monotonic_ns()（預設為現在），用來重建 HI92 的 ts。
+        """
+        metrics = self.metrics
+        data = self.pending + raw_data if self.pending else raw_data
+        a = np.frombuffer(data, dtype=np.uint8)
+        starts, lengths, end, errors = find_frames(data, a)
+        self.pending = data[end:]
+        self.counts['crc_errors'] += errors
+        if metrics is not None and metrics.enabled:
+            metrics.count('bytes_in', len(raw_data))
+            metrics.count('lines_framed', len(starts))
+        packets = self._decode(a, starts, lengths)
+
+        blocks = {}
+        rec = packets.get(TAG_HI91)
+        if rec is not None:
+            blocks[TAG_HI91] = hi91_to_channels(rec)
+        rec = packets.get(TAG_HI92)
+        if rec is not None:
+            ts = self._hi92_timestamps(len(rec), time.monotonic_ns() if host_ns is None else host_ns)
+            blocks[TAG_HI92] = hi92_to_channels(rec, ts)
+        if self.imu_tag is None and blocks:
+            self.imu_tag = TAG_HI91 if TAG_HI91 in blocks else TAG_HI92
+        rec = packets.get(TAG_HI81)
+        if rec is not None:
+            self._ins.append(hi81_to_channels(rec))
+        for tag, rec in packets.items():
+            self.counts[PACKET_NAMES[tag]] += len(rec)
+
+        batch = blocks.pop(self.imu_tag, None)
+        for block in blocks.values():
+            self._secondary.append(select_columns(block, CHANNELS, self._columns))
+        if batch is None:
+            return None
+        if metrics is not None and metrics.enabled:
+            metrics.count('samples_parsed', len(batch))
+        if self._columns != CHANNELS:
+            batch = select_columns(batch, CHANNELS, self._columns)
+        return batch
+
+    def format_counts(self):
+        counts = self.counts
+        text = "  ".join(f"{name} {counts[name]}" for name in ('HI91', 'HI92', 'HI81') if counts[name])
+        return f"封包: {text or '-'}  CRC錯誤 {counts['crc_errors']}"
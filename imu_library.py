@@ -0,0 +1,355 @@
+"""
+擷取庫
+以本機 SQLite 索引每次擷取（一列一個 session）：檔案、種類、開始時間、長度、樣本數、
+採樣頻率、鮑率、串口、裝置、校正係數、掉資料統計與各欄位統計。
+統計在寫檔時順便算好，查詢與開啟不需重新掃描 CSV；舊的擷取檔可用 scan 補建索引。
+
+    python imu_library.py scan <資料夾>      索引資料夾內尚未索引的擷取檔
+    python imu_library.py list [種類]        列出已索引的擷取
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from imu_buffer import ColumnStats
+from imu_loader import VOLTAGE_COLUMNS, iter_csv_chunks, load_capture
+
+DEFAULT_LIBRARY_FILE = "imu_library.sqlite"
+SCHEMA_VERSION = 1
+
+KIND_IMU = 'imu'
+KIND_VOLTAGE = 'voltage'
+KIND_INS = 'ins'
+
+# 匯出檔名前綴 -> 種類（scan 時辨識用）
+FILE_PREFIXES = [('imu_data_', KIND_IMU), ('AD9106_data_', KIND_VOLTAGE)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    started REAL,
+    duration REAL,
+    samples INTEGER NOT NULL,
+    rate REAL,
+    baud INTEGER,
+    port TEXT,
+    device TEXT,
+    calibration TEXT,
+    columns TEXT NOT NULL,
+    gaps INTEGER NOT NULL DEFAULT 0,
+    missing INTEGER NOT NULL DEFAULT 0,
+    file_size INTEGER,
+    file_mtime_ns INTEGER,
+    notes TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_started ON sessions (started);
+CREATE INDEX IF NOT EXISTS sessions_kind ON sessions (kind, started);
+CREATE INDEX IF NOT EXISTS sessions_port ON sessions (port);
+CREATE TABLE IF NOT EXISTS channel_stats (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    channel TEXT NOT NULL,
+    mean REAL, std REAL, min REAL, max REAL,
+    PRIMARY KEY (session_id, channel)
+) WITHOUT ROWID;
+"""
+
+# 可用於 sessions() 篩選的欄位
+_FILTERS = {
+    'kind': 'kind = ?',
+    'port': 'port = ?',
+    'device': 'device = ?',
+    'since': 'started >= ?',
+    'until': 'started < ?',
+    'min_rate': 'rate >= ?',
+    'max_rate': 'rate <= ?',
+    'min_duration': 'duration >= ?',
+}
+
+
+class GapCounter:
+    """逐區塊統計時間戳 (ms) 跳號：間隔超過標稱間隔 1.5 倍視為掉資料
+
+    rate 未知時以第一段的間隔中位數作為標稱間隔。
+    """
+
+    def __init__(self, rate=None):
+        self.step = 1000.0 / rate if rate else None
+        self.first = None
+        self.last = None
+        self.gaps = 0
+        self.missing = 0
+
+    def update(self, ts):
+        if not len(ts):
+            return
+        if self.first is None:
+            self.first = float(ts[0])
+        if self.last is not None:
+            ts = np.concatenate(([self.last], ts))
+        self.last = float(ts[-1])
+        if len(ts) < 2:
+            return
+        dt = np.diff(ts)
+        if self.step is None:
+            step = np.median(dt)
+            if step <= 0:
+                return
+            self.step = float(step)
+        jumps = dt[dt > self.step * 1.5]
+        self.gaps += len(jumps)
+        self.missing += int(np.sum(np.round(jumps / self.step) - 1))
+
+    @property
+    def duration(self):
+        """首末時間戳相差的秒數"""
+        if self.first is None:
+            return None
+        return (self.last - self.first) / 1000.0
+
+    @property
+    def rate(self):
+        return 1000.0 / self.step if self.step else None
+
+
+class SessionRecorder:
+    """寫檔時逐區塊累計統計，寫完後以 finish() 加入擷取庫"""
+
+    def __init__(self, columns, rate=None, ts_column=0):
+        self.columns = list(columns)
+        self.ts_column = ts_column
+        self.stats = ColumnStats()
+        self.gap_counter = GapCounter(rate)
+
+    def update(self, block):
+        self.stats.update(block)
+        self.gap_counter.update(block[:, self.ts_column])
+
+    def finish(self, library, path, kind, started=None, **meta):
+        """寫入擷取庫，回傳 session id"""
+        counter = self.gap_counter
+        meta.setdefault('rate', counter.rate)
+        return library.add(path, kind, self.columns, self.stats.result(),
+                           started=started, duration=counter.duration,
+                           gaps=counter.gaps, missing=counter.missing, **meta)
+
+
+def guess_kind(path, columns=None):
+    """由欄位或檔名判斷擷取種類"""
+    if columns is not None:
+        if list(columns) == VOLTAGE_COLUMNS:
+            return KIND_VOLTAGE
+        if 'lat' in columns:
+            return KIND_INS
+        if 'timestamp' in columns:
+            return KIND_IMU
+    name = os.path.basename(path)
+    for prefix, kind in FILE_PREFIXES:
+        if name.startswith(prefix):
+            return kind
+    return None
+
+
+def started_from_name(path):
+    """由 ..._YYYYmmdd_HHMMSS.csv 檔名取出開始時間 (epoch 秒)，無法判斷時用檔案修改時間"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return time.mktime(time.strptime("_".join(stem.split("_")[-2:]), "%Y%m%d_%H%M%S"))
+    except ValueError:
+        return os.path.getmtime(path)
+
+
+class CaptureLibrary:
+    """擷取索引（SQLite）
+
+    每個 session 一列，各欄位統計放在 channel_stats，可直接用 SQL 依統計值查詢。
+    只在 GUI 線程使用；sqlite3 連線不在線程間共用。
+    """
+
+    def __init__(self, path=DEFAULT_LIBRARY_FILE):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"擷取庫版本 {version} 比程式新")
+        with self.db:
+            self.db.executescript(_SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def add(self, path, kind, columns, stats, started=None, duration=None, rate=None,
+            baud=None, port=None, device=None, calibration=None, gaps=0, missing=0, notes=None):
+        """加入（或以同一路徑取代）一個 session，回傳 id
+
+        stats 為 column_stats()/ColumnStats.result() 的結果；calibration 為可 JSON 化的 dict。
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        if started is None:
+            started = started_from_name(path)
+        samples = stats['count'] if stats else 0
+        with self.db:
+            self.db.execute("DELETE FROM sessions WHERE path = ?", (path,))
+            cur = self.db.execute(
+                "INSERT INTO sessions (path, kind, started, duration, samples, rate, baud, port, device,"
+                " calibration, columns, gaps, missing, file_size, file_mtime_ns, notes, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, kind, started, duration, samples, rate, baud, port, device,
+                 json.dumps(calibration) if calibration else None, json.dumps(list(columns)),
+                 gaps, missing, st.st_size, st.st_mtime_ns, notes, time.time()))
+            session_id = cur.lastrowid
+            if stats:
+                self.db.executemany(
+                    "INSERT INTO channel_stats VALUES (?, ?, ?, ?, ?, ?)",
+                    [(session_id, name, float(stats['mean'][i]), float(stats['std'][i]),
+                      float(stats['min'][i]), float(stats['max'][i])) for i, name in enumerate(columns)])
+        return session_id
+
+    def index_file(self, path, kind=None, chunk_rows=100000, **meta):
+        """逐段讀取既有的擷取檔並加入索引（記憶體只需容納一段），回傳 session id"""
+        header, chunks = iter_csv_chunks(path, chunk_rows)
+        kind = kind or guess_kind(path, header)
+        if kind is None:
+            raise ValueError(f"無法判斷擷取種類: {path}")
+        recorder = SessionRecorder(header, meta.pop('rate', None))
+        for block in chunks:
+            recorder.update(block)
+        return recorder.finish(self, path, kind, **meta)
+
+    def scan(self, directory, prefixes=FILE_PREFIXES):
+        """索引資料夾內新的或已變更的擷取檔，回傳 (新增的 id 列表, 失敗的 (路徑, 錯誤) 列表)"""
+        known = {row['path']: (row['file_size'], row['file_mtime_ns'])
+                 for row in self.db.execute("SELECT path, file_size, file_mtime_ns FROM sessions")}
+        added, failed = [], []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.csv') or not any(name.startswith(p) for p, _ in prefixes):
+                continue
+            path = os.path.abspath(os.path.join(directory, name))
+            st = os.stat(path)
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                continue
+            try:
+                added.append(self.index_file(path))
+            except (OSError, ValueError) as e:
+                failed.append((path, str(e)))
+        return added, failed
+
+    def sessions(self, order='started DESC', limit=None, **filters):
+        """依條件查詢 session（kind、port、device、since、until、min_rate、max_rate、min_duration），
+        回傳 dict 列表"""
+        clauses, params = [], []
+        for key, value in filters.items():
+            if key not in _FILTERS:
+                raise ValueError(f"未知的篩選條件: {key}")
+            if value is not None:
+                clauses.append(_FILTERS[key])
+                params.append(value)
+        if order not in ('started DESC', 'started', 'duration DESC', 'samples DESC'):
+            raise ValueError(f"不支援的排序: {order}")
+        sql = "SELECT * FROM sessions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [self._row(row) for row in self.db.execute(sql, params)]
+
+    def where_stat(self, channel, min_std=None, max_std=None, min_value=None, max_value=None):
+        """依單一欄位統計篩選，例如 where_stat('gyr_z', min_std=5) 找出有明顯轉動的 session"""
+        clauses, params = ["channel = ?"], [channel]
+        for clause, value in (("std >= ?", min_std), ("std <= ?", max_std),
+                              ("max >= ?", min_value), ("min <= ?", max_value)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = ("SELECT s.* FROM sessions s JOIN channel_stats c ON c.session_id = s.id WHERE "
+               + " AND ".join("c." + c for c in clauses) + " ORDER BY s.started DESC")
+        return [self._row(row) for row in self.db.execute(sql, params)]
+
+    def get(self, session_id):
+        row = self.db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        return self._row(row)
+
+    def channel_stats(self, session_id):
+        """回傳 {欄位: {'mean', 'std', 'min', 'max'}}"""
+        rows = self.db.execute("SELECT channel, mean, std, min, max FROM channel_stats WHERE session_id = ?",
+                               (session_id,))
+        return {row['channel']: {'mean': row['mean'], 'std': row['std'], 'min': row['min'], 'max': row['max']}
+                for row in rows}
+
+    def open(self, session_id, use_cache=True):
+        """載入 session 的數據，回傳 (欄位名稱, 陣列)；與 imu_loader.load_capture 相同（可用快取）"""
+        return load_capture(self.get(session_id)['path'], use_cache)
+
+    def remove(self, session_id):
+        with self.db:
+            self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def prune(self):
+        """移除檔案已不存在的 session，回傳移除的數量"""
+        missing = [(row['id'],) for row in self.db.execute("SELECT id, path FROM sessions")
+                   if not os.path.exists(row['path'])]
+        with self.db:
+            self.db.executemany("DELETE FROM sessions WHERE id = ?", missing)
+        return len(missing)
+
+    @staticmethod
+    def _row(row):
+        session = dict(row)
+        session['columns'] = json.loads(session['columns'])
+        if session['calibration']:
+            session['calibration'] = json.loads(session['calibration'])
+        return session
+
+
+def format_session(session):
+    """一行摘要"""
+    started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session['started'])) if session['started'] else '-'
+    duration = f"{session['duration']:.1f}s" if session['duration'] is not None else '-'
+    rate = f"{session['rate']:g}Hz" if session['rate'] else '-'
+    return (f"{session['id']:>5}  {started}  {session['kind']:<7} {duration:>9} {session['samples']:>10} "
+            f"{rate:>9}  掉 {session['missing']:<6} {session['port'] or '-':<12} {os.path.basename(session['path'])}")
+
+
+def main(argv):
+    if not argv or argv[0] not in ('scan', 'list'):
+        print(__doc__)
+        return 1
+    with CaptureLibrary() as library:
+        if argv[0] == 'scan':
+            added, failed = library.scan(argv[1] if len(argv) > 1 else '.')
+            print(f"新增 {len(added)} 筆，共 {len(library)} 筆")
+            for path, error in failed:
+                print(f"略過 {path}: {error}")
+        else:
+            for session in library.sessions(kind=argv[1] if len(argv) > 1 else None):
+                print(format_session(session))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,124 @@
+"""
+擷取檔載入
+把 imu_gui 匯出的 IMU CSV 與 signal_monitor 的 Timestamp_ms,Voltage_V CSV 讀成欄位式陣列。
+以分段向量化解析，並可在旁邊存一份二進位快取（.imucache.npy），第二次開啟幾乎不需時間。
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+from imu_buffer import CHANNELS
+
+VOLTAGE_COLUMNS = ['Timestamp_ms', 'Voltage_V']
+CACHE_VERSION = 1
+_EMPTY_FIELD = re.compile(r'(?<=,)(?=,|$)|^(?=,)', re.MULTILINE)
+
+
+def cache_paths(filename):
+    return filename + ".imucache.npy", filename + ".imucache.json"
+
+
+def _source_signature(filename):
+    st = os.stat(filename)
+    return {'version': CACHE_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _parse_chunk(lines, n_columns):
+    """向量化解析一段 CSV 行；舊版匯出中的空欄位視為 NaN"""
+    try:
+        return np.loadtxt(lines, delimiter=',', ndmin=2).reshape(-1, n_columns)
+    except ValueError:
+        text = _EMPTY_FIELD.sub('nan', "".join(lines))
+        return np.loadtxt(text.splitlines(), delimiter=',', ndmin=2).reshape(-1, n_columns)
+
+
+def iter_csv_chunks(filename, chunk_rows=100000):
+    """逐段讀取 CSV，回傳 (欄位名稱, 區塊產生器)；記憶體只需容納一段"""
+    f = open(filename, 'r', encoding='utf-8')
+    header = f.readline().strip().split(',')
+
+    def chunks():
+        with f:
+            while True:
+                lines = f.readlines(chunk_rows * 128)   # 依位元組數提示，約 chunk_rows 行
+                if not lines:
+                    break
+                lines = [line for line in lines if line.strip()]
+                if lines:
+                    yield _parse_chunk(lines, len(header))
+
+    return header, chunks()
+
+
+def load_capture(filename, use_cache=True, chunk_rows=100000):
+    """載入擷取檔，回傳 (欄位名稱, (N, 欄位數) 陣列)
+
+    有效的快取以唯讀 memmap 開啟，不複製數據。
+    """
+    npy_path, meta_path = cache_paths(filename)
+    signature = _source_signature(filename)
+    if use_cache and os.path.exists(npy_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('source') == signature:
+                return meta['columns'], np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+
+    header, chunks = iter_csv_chunks(filename, chunk_rows)
+    blocks = list(chunks)
+    data = np.vstack(blocks) if blocks else np.empty((0, len(header)))
+
+    if use_cache:
+        try:
+            np.save(npy_path, data)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'source': signature, 'columns': header}, f)
+        except OSError:
+            pass   # 唯讀目錄等情況不影響載入
+    return header, data
+
+
+def load_imu_capture(filename, use_cache=True):
+    """載入 IMU CSV，欄位依 CHANNELS 排列（缺少的欄位與空欄位為 NaN）"""
+    header, data = load_capture(filename, use_cache)
+    return imu_channels(header, data, filename)
+
+
+def imu_channels(header, data, filename=''):
+    """把 load_capture 的結果依 CHANNELS 排列（缺少的欄位為 NaN）"""
+    if header == CHANNELS:
+        return data
+    missing = [name for name in header if name not in CHANNELS]
+    if 'timestamp' not in header or len(missing) == len(header):
+        raise ValueError(f"不是 IMU 擷取檔: {filename}")
+    out = np.full((len(data), len(CHANNELS)), np.nan)
+    for i, name in enumerate(header):
+        if name in CHANNELS:
+            out[:, CHANNELS.index(name)] = data[:, i]
+    return out
+
+
+def host_clock(header, data):
+    """匯出時附加的 host_time 欄位：回傳 (ts, host_time 秒)；沒有該欄位或 ts 不遞增時回傳 None"""
+    if 'timestamp' not in header or 'host_time' not in header or len(data) < 2:
+        return None
+    ts = np.array(data[:, header.index('timestamp')])
+    host = np.array(data[:, header.index('host_time')])
+    valid = np.isfinite(ts) & np.isfinite(host)
+    ts, host = ts[valid], host[valid]
+    if len(ts) < 2 or np.any(np.diff(ts) <= 0):
+        return None
+    return ts, host
+
+
+def load_voltage_capture(filename, use_cache=True):
+    """載入 signal_monitor 的電壓 CSV，回傳 (timestamps_ms, voltages)"""
+    header, data = load_capture(filename, use_cache)
+    if header != VOLTAGE_COLUMNS:
+        raise ValueError(f"不是電壓擷取檔: {filename}")
+    return data[:, 0], data[:, 1]
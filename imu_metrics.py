@@ -0,0 +1,133 @@
+"""
+數據管線量測
+各階段的計數器與單調時鐘計時（串口位元組、分行、解析、佇列深度、儲存、繪圖）
+停用時呼叫端以 `if metrics.enabled:` 略過，不產生任何額外成本
+"""
+
+import csv
+import json
+import time
+
+# 計數器：(名稱, 說明)
+COUNTERS = [
+    ('bytes_in', '串口讀入位元組'),
+    ('lines_framed', '分出的完整行'),
+    ('samples_parsed', '解析成功樣本'),
+    ('parse_failures', '解析失敗行'),
+    ('batches_emitted', '送出批次'),
+    ('batches_received', '主線程收到批次'),
+    ('samples_stored', '儲存樣本'),
+    ('ts_gaps', '時間戳跳號'),
+    ('frames_rendered', '繪圖幀'),
+    ('serial_errors', '串口錯誤'),
+]
+
+# 計時器（累計奈秒）：(名稱, 顯示單位)
+TIMERS = [
+    ('frame', 'us'),     # decode + split
+    ('parse', 'us'),     # 正則解析 + 轉陣列
+    ('store', 'us'),     # on_data_received
+    ('render', 'ms'),    # update_plot
+]
+
+_UNIT_NS = {'us': 1e3, 'ms': 1e6}
+
+
+class PipelineMetrics:
+    """管線計數器與計時器
+
+    各計數器只由單一線程寫入（讀取線程或 GUI 線程），因此不需要加鎖。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.counts = {name: 0 for name, _ in COUNTERS}
+        self.time_ns = {name: 0 for name, _ in TIMERS}
+        self.time_calls = {name: 0 for name, _ in TIMERS}
+        self.time_max_ns = {name: 0 for name, _ in TIMERS}
+        self.serial_peak = 0     # in_waiting 峰值，接近 OS 緩衝上限代表可能溢位
+        self._last = None
+
+    def count(self, name, value=1):
+        self.counts[name] += value
+
+    def add_time(self, name, elapsed_ns):
+        self.time_ns[name] += elapsed_ns
+        self.time_calls[name] += 1
+        if elapsed_ns > self.time_max_ns[name]:
+            self.time_max_ns[name] = elapsed_ns
+
+    def observe_serial(self, in_waiting):
+        if in_waiting > self.serial_peak:
+            self.serial_peak = in_waiting
+
+    @property
+    def queue_depth(self):
+        """已送出但主線程尚未處理的批次數"""
+        return self.counts['batches_emitted'] - self.counts['batches_received']
+
+    def snapshot(self):
+        """目前數值與自上次快照以來的每秒速率"""
+        now = time.monotonic()
+        snap = {'time': round(time.time(), 3)}
+        snap.update(self.counts)
+        snap['queue_depth'] = self.queue_depth
+        snap['serial_peak'] = self.serial_peak
+        for name, unit in TIMERS:
+            calls = self.time_calls[name]
+            scale = _UNIT_NS[unit]
+            snap[f'{name}_avg_{unit}'] = round(self.time_ns[name] / calls / scale, 2) if calls else 0.0
+            snap[f'{name}_max_{unit}'] = round(self.time_max_ns[name] / scale, 2)
+        if self._last is not None:
+            last_time, last_counts = self._last
+            dt = max(now - last_time, 1e-9)
+            for name in ('bytes_in', 'lines_framed', 'samples_stored', 'frames_rendered'):
+                snap[f'{name}_per_s'] = round((self.counts[name] - last_counts[name]) / dt, 1)
+        else:
+            for name in ('bytes_in', 'lines_framed', 'samples_stored', 'frames_rendered'):
+                snap[f'{name}_per_s'] = 0.0
+        self._last = (now, dict(self.counts))
+        return snap
+
+
+def format_snapshot(snap):
+    """除錯面板用的多行文字"""
+    return "\n".join([
+        f"串口: {snap['bytes_in']} B ({snap['bytes_in_per_s']:.0f} B/s)  "
+        f"in_waiting 峰值 {snap['serial_peak']} B  錯誤 {snap['serial_errors']}",
+        f"分行: {snap['lines_framed']} ({snap['lines_framed_per_s']:.0f} 行/s)  "
+        f"frame {snap['frame_avg_us']:.0f}/{snap['frame_max_us']:.0f} us",
+        f"解析: {snap['samples_parsed']} 成功 / {snap['parse_failures']} 失敗  "
+        f"parse {snap['parse_avg_us']:.0f}/{snap['parse_max_us']:.0f} us",
+        f"佇列: 深度 {snap['queue_depth']}  送出 {snap['batches_emitted']}  收到 {snap['batches_received']}",
+        f"儲存: {snap['samples_stored']} ({snap['samples_stored_per_s']:.0f}/s)  "
+        f"store {snap['store_avg_us']:.0f}/{snap['store_max_us']:.0f} us  ts 跳號 {snap['ts_gaps']}",
+        f"繪圖: {snap['frames_rendered']} 幀 ({snap['frames_rendered_per_s']:.1f} FPS)  "
+        f"render {snap['render_avg_ms']:.1f}/{snap['render_max_ms']:.1f} ms",
+    ])
+
+
+class MetricsLogger:
+    """定期把快照寫入檔案：.csv 為表格，其他副檔名為每行一個 JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self._csv = path.lower().endswith('.csv')
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = None
+
+    def write(self, snap):
+        if self._csv:
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._file, fieldnames=list(snap.keys()))
+                self._writer.writeheader()
+            self._writer.writerow(snap)
+        else:
+            self._file.write(json.dumps(snap) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,276 @@
+"""
+可替換的曲線繪圖後端
+imu_gui.py / test.py 透過同一介面畫多個面板的時序曲線：
+    set_panels(panels)   版面改變時才呼叫（建立座標軸、曲線與圖例）
+    draw(x, series)      每次更新只換曲線數據
+後端：
+    matplotlib  沿用 FigureCanvasQTAgg，重用 Line2D 只更新數據，點數超過畫布寬度時先做峰值降取樣；
+                座標範圍留有餘量，數據仍在範圍內時以 blitting 只重畫曲線，超出時才重畫整個座標軸
+    pyqtgraph   Qt 點陣繪圖（CPU），setData 前同樣先峰值降取樣到繪圖區像素寬度；未安裝時不可選
+兩個後端都在建立繪圖器時才匯入繪圖套件，匯入本模組不會載入 matplotlib / pyqtgraph。
+"""
+
+import importlib.util
+import time
+
+import numpy as np
+
+RAW_COLORS = ('r', 'g', 'b')
+OVERLAY_COLORS = ('darkred', 'darkgreen', 'darkblue')
+
+
+class Panel:
+    """一個面板：標題、主要曲線名稱與顏色，以及疊加曲線（如濾波結果）的名稱"""
+
+    def __init__(self, title, labels, colors=RAW_COLORS, overlay_labels=(), overlay_colors=OVERLAY_COLORS):
+        self.title = title
+        self.labels = list(labels)
+        self.colors = list(colors)
+        self.overlay_labels = list(overlay_labels)
+        self.overlay_colors = list(overlay_colors)
+
+    def key(self):
+        return (self.title, tuple(self.labels), tuple(self.overlay_labels))
+
+
+def peak_decimate(x, y, bins):
+    """把 y 分成 bins 段，每段只留最小與最大值（依原順序），畫成線時外觀與原數據相同"""
+    n = len(y)
+    if bins <= 0 or n <= 2 * bins:
+        return x, y
+    step = -(-n // bins)              # 無條件進位：最多 bins 段
+    bins = n // step
+    start = n - step * bins           # 對齊最新一筆，開頭不足一段的樣本原樣保留
+    yb = y[start:].reshape(bins, step)
+    imin, imax = yb.argmin(axis=1), yb.argmax(axis=1)
+    offset = start + np.arange(bins) * step
+    idx = np.column_stack((np.minimum(imin, imax) + offset, np.maximum(imin, imax) + offset)).ravel()
+    # 保留首尾兩筆，曲線的範圍與最新值不變
+    idx = np.concatenate((np.arange(start) if start else [0], idx, [n - 1]))
+    return x[idx], y[idx]
+
+
+def available_backends():
+    # 只檢查是否安裝，不實際匯入
+    return ['matplotlib'] + (['pyqtgraph'] if importlib.util.find_spec('pyqtgraph') is not None else [])
+
+
+def preload_backend(name='matplotlib'):
+    """匯入後端需要的繪圖套件（可在背景線程呼叫），之後建立繪圖器不必再等待匯入"""
+    if name == 'pyqtgraph':
+        import pyqtgraph
+    else:
+        import matplotlib.figure
+        import matplotlib.backends.backend_qt5agg
+
+
+class FrameTimer:
+    """繪圖耗時的指數平均，用於比較後端"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.mean_ms = None
+
+    def measure(self, t0):
+        ms = (time.perf_counter() - t0) * 1000.0
+        self.mean_ms = ms if self.mean_ms is None else self.mean_ms + self.alpha * (ms - self.mean_ms)
+        return ms
+
+    def text(self):
+        if self.mean_ms is None:
+            return ""
+        return f"繪圖: {self.mean_ms:.1f} ms ({1000.0 / max(self.mean_ms, 1e-3):.0f} FPS)"
+
+
+def _fit_limits(lo, hi, current, pad, headroom=0.0):
+    """數據範圍 [lo, hi] 仍在 current 內且佔其一半以上時回傳 None（沿用原範圍），否則回傳加上餘量的新範圍"""
+    span = hi - lo
+    if current is not None:
+        c_lo, c_hi = current
+        if c_lo <= lo and hi <= c_hi and span >= 0.5 * (c_hi - c_lo):
+            return None
+    if span <= 0:
+        span = max(abs(lo), 1.0) * 0.1
+    return lo - pad * span, hi + (pad + headroom) * span
+
+
+def _finite_range(arrays):
+    lo, hi = np.inf, -np.inf
+    for a in arrays:
+        a = a[np.isfinite(a)]    # 缺值 NaN 在曲線上是斷點
+        if len(a):
+            lo = min(lo, a.min())
+            hi = max(hi, a.max())
+    return (lo, hi) if np.isfinite(lo) and np.isfinite(hi) else None
+
+
+class MatplotlibRenderer:
+    name = 'matplotlib'
+
+    def __init__(self, figsize=(12, 8)):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        self.figure = Figure(figsize=figsize)
+        self.widget = FigureCanvas(self.figure)
+        self._panels = []
+        self._axes = []
+        self._lines = []       # 每個面板：[主要曲線..., 疊加曲線...]
+        self._legends = []
+        self._legend_pixels = []
+        self._limits = []      # 每個面板目前的 (xlim, ylim)
+        self._backgrounds = None
+        # 整張圖重畫（含視窗縮放）後重新擷取不含曲線的背景
+        self.widget.mpl_connect('draw_event', self._on_draw)
+
+    def set_panels(self, panels):
+        if [p.key() for p in panels] == [p.key() for p in self._panels]:
+            return
+        self.figure.clear()
+        self._panels = list(panels)
+        self._axes, self._lines, self._legends, self._limits = [], [], [], []
+        self._backgrounds = None
+        for i, panel in enumerate(panels):
+            ax = self.figure.add_subplot(len(panels), 1, i + 1)
+            # animated：整張圖重畫時不畫曲線，由 blitting 疊在背景上
+            lines = [ax.plot([], [], color=color, label=label, linewidth=1, animated=True)[0]
+                     for label, color in zip(panel.labels, panel.colors)]
+            lines += [ax.plot([], [], color=color, label=label, linewidth=1.5, animated=True)[0]
+                      for label, color in zip(panel.overlay_labels, panel.overlay_colors)]
+            legend = ax.legend(loc='upper right')  # 固定在右上角
+            ax.set_title(panel.title)
+            ax.grid(True, alpha=0.3)
+            self._axes.append(ax)
+            self._lines.append(lines)
+            self._legends.append(legend)
+            self._limits.append((None, None))
+        if panels:
+            self.figure.tight_layout()
+        self.widget.draw()
+
+    def _on_draw(self, event):
+        self._backgrounds = [self.widget.copy_from_bbox(ax.bbox) for ax in self._axes]
+        # 圖例已畫在背景中；存下其像素，畫完曲線後貼回，圖例仍蓋在曲線上方而不必每幀重排文字
+        renderer = self.widget.get_renderer()
+        self._legend_pixels = [self.widget.copy_from_bbox(legend.get_window_extent(renderer))
+                               for legend in self._legends]
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for ax, lines, legend_pixels in zip(self._axes, self._lines, self._legend_pixels):
+            for line in lines:
+                ax.draw_artist(line)
+            self.widget.restore_region(legend_pixels)
+
+    def _update_limits(self, i, xs, ys):
+        """依數據調整第 i 個面板的範圍；有改變時回傳 True（需要重畫整個座標軸）"""
+        ax = self._axes[i]
+        xlim, ylim = self._limits[i]
+        changed = False
+        x_range, y_range = _finite_range(xs), _finite_range(ys)
+        if x_range is not None:
+            new = _fit_limits(*x_range, xlim, pad=0.0, headroom=0.1)
+            if new is not None:
+                xlim, changed = new, True
+                ax.set_xlim(new)
+        if y_range is not None:
+            new = _fit_limits(*y_range, ylim, pad=0.1)
+            if new is not None:
+                ylim, changed = new, True
+                ax.set_ylim(new)
+        self._limits[i] = (xlim, ylim)
+        return changed
+
+    def draw(self, x, series, overlays=None):
+        """series[i] 為第 i 個面板的主要曲線 y 陣列列表；overlays[i] 為 (x, [y...]) 或 None"""
+        # 降取樣到座標軸的像素寬度
+        bins = max(int(self._axes[0].bbox.width), 1) if self._axes else 1
+        full_redraw = self._backgrounds is None
+        for i, (lines, ys) in enumerate(zip(self._lines, series)):
+            xs, yvals = [], []
+            for line, y in zip(lines, ys):
+                px, py = peak_decimate(x, y, bins)
+                line.set_data(px, py)
+                xs.append(px[[0, -1]] if len(px) else px)
+                yvals.append(py)
+            overlay = overlays[i] if overlays else None
+            for line in lines[len(ys):]:
+                line.set_data([], [])
+            if overlay is not None:
+                ox, oys = overlay
+                for line, y in zip(lines[len(ys):], oys):
+                    px, py = peak_decimate(ox, y, bins)
+                    line.set_data(px, py)
+                    xs.append(px[[0, -1]] if len(px) else px)
+                    yvals.append(py)
+            full_redraw |= self._update_limits(i, xs, yvals)
+        if full_redraw:
+            self.widget.draw()   # draw_event 會擷取背景並畫上曲線
+            return
+        for ax, background in zip(self._axes, self._backgrounds):
+            self.widget.restore_region(background)
+        self._draw_artists()
+        for ax in self._axes:
+            self.widget.blit(ax.bbox)
+
+    def clear(self):
+        self.set_panels([])
+
+
+class PyQtGraphRenderer:
+    name = 'pyqtgraph'
+
+    def __init__(self):
+        try:
+            import pyqtgraph
+        except ImportError:  # 選用套件
+            raise RuntimeError("未安裝 pyqtgraph（pip install pyqtgraph）")
+        self.pg = pyqtgraph
+        pyqtgraph.setConfigOptions(antialias=False, background='w', foreground='k')
+        self.widget = pyqtgraph.GraphicsLayoutWidget()
+        self._panels = []
+        self._plots = []
+        self._curves = []
+
+    def set_panels(self, panels):
+        if [p.key() for p in panels] == [p.key() for p in self._panels]:
+            return
+        self.widget.clear()
+        self._panels = list(panels)
+        self._plots = []
+        self._curves = []
+        for i, panel in enumerate(panels):
+            plot = self.widget.addPlot(row=i, col=0, title=panel.title)
+            plot.showGrid(x=True, y=True, alpha=0.3)
+            plot.addLegend(offset=(-10, 10))
+            # 降取樣在 draw() 中先做；內建的自動降取樣每次重繪都要掃過全部數據
+            curves = [plot.plot(pen=self.pg.mkPen(color, width=1), name=label)
+                      for label, color in zip(panel.labels, panel.colors)]
+            curves += [plot.plot(pen=self.pg.mkPen(color, width=2), name=label)
+                       for label, color in zip(panel.overlay_labels, panel.overlay_colors)]
+            self._plots.append(plot)
+            self._curves.append(curves)
+
+    def draw(self, x, series, overlays=None):
+        # 降取樣到繪圖區的像素寬度
+        bins = max(int(self._plots[0].getViewBox().width()), 1) if self._plots else 1
+        for i, (curves, ys) in enumerate(zip(self._curves, series)):
+            for curve, y in zip(curves, ys):
+                curve.setData(*peak_decimate(x, y, bins))   # numpy 視圖或索引結果，不轉成 list
+            overlay = overlays[i] if overlays else None
+            extra = curves[len(ys):]
+            if overlay is None:
+                for curve in extra:
+                    curve.setData([], [])
+            else:
+                ox, oys = overlay
+                for curve, y in zip(extra, oys):
+                    curve.setData(*peak_decimate(ox, y, bins))
+
+    def clear(self):
+        self.set_panels([])
+
+
+def make_renderer(name='matplotlib', **kwargs):
+    if name == 'pyqtgraph':
+        return PyQtGraphRenderer()
+    return MatplotlibRenderer(**kwargs)
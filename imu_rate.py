@@ -0,0 +1,171 @@
+"""
+採樣頻率規劃
+韌體以 LOG HI91 ONTIME <秒> 設定任意輸出間隔（1 ms 解析度）。
+顯示分頻、繪圖更新間隔、頻譜 FFT 長度、顯示點數與佇列長度由實際量測到的輸入頻率推導，
+量測頻率改變（例如裝置自行切換、掉資料）時自動重新規劃，各頻率下的 CPU 成本隨之調整。
+"""
+
+import re
+
+import numpy as np
+
+MIN_ONTIME_MS = 1          # 韌體最短輸出間隔（1000 Hz）
+MAX_ONTIME_MS = 10000
+DISPLAY_RATE = 50.0        # 顯示取樣頻率目標 (Hz)
+REFRESH_RATE = 10.0        # 繪圖更新頻率上限 (Hz)
+FFT_SECONDS = 0.5          # 頻譜每幀涵蓋的時間（決定頻率解析度）
+SPECTRUM_SECONDS = 10.0    # 頻譜圖顯示的時間範圍
+DISPLAY_SECONDS = 200.0    # 顯示緩衝涵蓋的時間（100 Hz 輸入時為 10000 點）
+MAX_BATCH_RATE = 500.0     # 每秒最多讀取批次數（擷取迴圈約每 2 ms 讀一次）
+RECORD_QUEUE_SECONDS = 0.5  # 記錄佇列可容納的讀取時間
+
+
+def parse_rate(text):
+    """從 "250Hz"、"333.3 Hz (預設)"、"250" 等文字取出頻率 (Hz)"""
+    m = re.search(r'\d+(?:\.\d+)?', text)
+    if not m:
+        raise ValueError(f"無法解析頻率: {text}")
+    return float(m.group())
+
+
+def ontime_ms(rate):
+    """頻率 -> 韌體輸出間隔（整數毫秒）"""
+    if rate <= 0:
+        raise ValueError("頻率須大於 0")
+    ms = int(round(1000.0 / rate))
+    if not MIN_ONTIME_MS <= ms <= MAX_ONTIME_MS:
+        raise ValueError(f"頻率須介於 {1000.0 / MAX_ONTIME_MS:g} 與 {1000.0 / MIN_ONTIME_MS:g} Hz")
+    return ms
+
+
+def ontime_command(rate, packets=('HI91',), ins_rate=None):
+    """回傳 (指令, 實際頻率)；間隔取整到毫秒，實際頻率可能與要求的略有不同
+
+    packets 為要輸出的封包（例如 ('HI92', 'HI81')）；HI81 以 ins_rate 輸出（None 為與 IMU 相同）。
+    """
+    ms = ontime_ms(rate)
+    lines = ["UNLOGALL"]
+    for packet in packets:
+        interval = ms if packet != 'HI81' or ins_rate is None else ontime_ms(ins_rate)
+        lines.append(f"LOG {packet} ONTIME {interval / 1000.0:g}")
+    return "".join(line + "\r\n" for line in lines), 1000.0 / ms
+
+
+def _pow2_clip(n, lo, hi):
+    return int(min(max(2 ** int(np.ceil(np.log2(max(n, 1)))), lo), hi))
+
+
+class RatePlan:
+    """某個輸入頻率下的處理參數"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        # 每 display_divider 筆取一筆顯示，顯示頻率約 DISPLAY_RATE
+        self.display_divider = max(int(round(self.rate / DISPLAY_RATE)), 1)
+        display_rate = self.rate / self.display_divider
+        # 顯示數據更新得比 REFRESH_RATE 慢時，不需要更頻繁地重畫
+        self.refresh_ms = int(min(max(1000.0 / min(display_rate, REFRESH_RATE), 33), 1000))
+        # FFT 長度對應約 FFT_SECONDS，75% 重疊；頻譜圖保留約 SPECTRUM_SECONDS
+        self.nfft = _pow2_clip(self.rate * FFT_SECONDS, 32, 4096)
+        self.hop = self.nfft // 4
+        self.spectrum_history = int(min(max(self.rate * SPECTRUM_SECONDS / self.hop, 50), 1000))
+        # 顯示與濾波緩衝的點數：顯示頻率下約 DISPLAY_SECONDS
+        self.max_points = int(min(max(display_rate * DISPLAY_SECONDS, 100), 100000))
+        # 佇列以批次計；每次讀取最多一批，低頻時每筆樣本就是一批
+        batch_rate = min(self.rate, MAX_BATCH_RATE)
+        self.record_queue = int(min(max(np.ceil(batch_rate * RECORD_QUEUE_SECONDS), 16), 1024))
+        # 顯示佇列容納約一個繪圖更新間隔內的批次
+        self.display_queue = int(min(max(np.ceil(batch_rate * self.refresh_ms / 1000.0), 4), 256))
+
+    def __eq__(self, other):
+        return isinstance(other, RatePlan) and self.rate == other.rate
+
+    def __repr__(self):
+        return (f"RatePlan(rate={self.rate:g}, divider={self.display_divider}, refresh_ms={self.refresh_ms}, "
+                f"nfft={self.nfft}, hop={self.hop}, history={self.spectrum_history}, max_points={self.max_points}, "
+                f"queues={self.record_queue}/{self.display_queue})")
+
+
+class RateMeter:
+    """由感測器 ts（已展開的毫秒）量測輸入頻率
+
+    每 window_ms 以時間戳間隔的中位數估計一次，不受批次大小、傳輸抖動與偶爾掉資料影響。
+    """
+
+    def __init__(self, window_ms=1000.0):
+        self.window_ms = window_ms
+        self.reset()
+
+    def reset(self):
+        self.rate = None
+        self._last = None
+        self._start = None
+        self._steps = []
+
+    def update(self, ts):
+        """加入一批 ts，完成一個量測窗時回傳該窗的頻率，否則回傳 None"""
+        if not len(ts):
+            return None
+        if self._last is not None:
+            ts = np.concatenate(([self._last], ts))
+        self._last = ts[-1]
+        if self._start is None:
+            self._start = ts[0]
+        if len(ts) > 1:
+            self._steps.append(np.diff(ts))
+        if ts[-1] - self._start < self.window_ms or not self._steps:
+            return None
+        steps = np.concatenate(self._steps)
+        self._steps = []
+        self._start = ts[-1]
+        step = np.median(steps[steps > 0]) if np.any(steps > 0) else 0.0
+        if step <= 0:
+            return None
+        self.rate = 1000.0 / step
+        return self.rate
+
+
+class RatePlanner:
+    """量測頻率與目前規劃相差超過 tolerance 時產生新的 RatePlan
+
+    量測值接近要求的頻率（套用 ONTIME 時設定）時採用要求值，避免時脈誤差造成無意義的重新規劃。
+    量測與 plan 只由擷取線程寫入：其他線程的 request/adopt/reset 須排程到擷取事件迴圈執行。
+    """
+
+    def __init__(self, tolerance=0.03, window_ms=1000.0):
+        self.tolerance = tolerance
+        self.meter = RateMeter(window_ms)
+        self.requested = None
+        self.plan = None
+
+    def reset(self):
+        self.meter.reset()
+
+    def adopt(self, plan):
+        """改用外部決定的規劃（例如開啟檔案、切換欄位），之後的量測與它比較"""
+        self.plan = plan
+
+    def request(self, rate):
+        """記錄要求的頻率；實際規劃仍等量測結果"""
+        self.requested = rate
+        self.meter.reset()
+
+    def nominal(self, measured):
+        requested = self.requested
+        if requested and abs(measured / requested - 1) <= self.tolerance:
+            return requested
+        # 取整到 1 ms 間隔對應的頻率（韌體解析度）；低於 1 Hz 時保留三位有效數字
+        if measured >= 1.0:
+            return 1000.0 / max(round(1000.0 / measured), MIN_ONTIME_MS)
+        return float(f"{measured:.3g}")
+
+    def update(self, ts):
+        """加入一批 ts，需要重新規劃時回傳新的 RatePlan，否則回傳 None"""
+        measured = self.meter.update(ts)
+        if measured is None:
+            return None
+        plan = self.plan
+        if plan is not None and abs(measured / plan.rate - 1) <= self.tolerance:
+            return None
+        self.plan = RatePlan(self.nominal(measured))
+        return self.plan
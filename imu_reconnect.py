@@ -0,0 +1,94 @@
+"""
+串口掉線後自動重新連線
+USB 線接觸不良或重新插拔時，裝置節點會消失再出現，名稱也可能改變（例如 ttyUSB0 -> ttyUSB1、COM3 -> COM5）。
+連線時記下裝置的 USB VID/PID/序號，掉線後在擷取事件迴圈上輪詢 comports() 找回同一個裝置，
+以原本的鮑率重新開啟；沒有 USB 資訊的串口（pty 模擬器、符號連結）則等原路徑重新出現。
+"""
+
+import asyncio
+import os
+import time
+
+import serial
+import serial.tools.list_ports
+
+
+class PortIdentity:
+    """用來在重新列舉時認出同一個裝置的資訊"""
+
+    def __init__(self, device, vid=None, pid=None, serial_number=None, location=None):
+        self.device = device
+        self.vid = vid
+        self.pid = pid
+        self.serial_number = serial_number
+        self.location = location
+
+    @classmethod
+    def of(cls, device, ports=None):
+        """由目前的串口列表取得 device 的 USB 資訊；不在列表中（pty、符號連結）時只記路徑"""
+        if ports is None:
+            ports = serial.tools.list_ports.comports()
+        real = os.path.realpath(device)
+        for p in ports:
+            if p.device in (device, real) and p.vid is not None:
+                return cls(device, p.vid, p.pid, p.serial_number, p.location)
+        return cls(device)
+
+    def matches(self, info):
+        """同一顆裝置：VID/PID 相同，且序號相同（沒有序號時比較 USB 插槽位置）"""
+        if self.vid is None or (info.vid, info.pid) != (self.vid, self.pid):
+            return False
+        if self.serial_number:
+            return info.serial_number == self.serial_number
+        return self.location is None or info.location == self.location
+
+    def find(self, ports=None):
+        """回傳目前可開啟的串口路徑，裝置不在時回傳 None"""
+        if ports is None:
+            ports = serial.tools.list_ports.comports()
+        if self.vid is not None:
+            for p in ports:
+                if self.matches(p):
+                    return p.device
+            return None
+        if os.path.exists(self.device) or any(p.device == self.device for p in ports):
+            return self.device
+        return None
+
+    def __str__(self):
+        if self.vid is None:
+            return self.device
+        text = f"{self.vid:04X}:{self.pid:04X}"
+        return f"{text} SN:{self.serial_number}" if self.serial_number else text
+
+
+class ReconnectSupervisor:
+    """掉線後找回並重新開啟同一個裝置
+
+    recover() 在事件迴圈上執行：每 poll_interval 秒列舉一次串口（列舉與開啟在工作線程，不阻塞讀取其他裝置），
+    找到後以 open_port(device) 開啟並回傳；掉線後 timeout 秒內沒有恢復時回傳 None。
+    """
+
+    def __init__(self, identity, open_port, timeout=30.0, poll_interval=0.05):
+        self.identity = identity
+        self.open_port = open_port
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.last_error = None
+
+    async def recover(self, lost_at=None):
+        """lost_at 為偵測到掉線時的 time.monotonic()（預設為現在）"""
+        lost_at = time.monotonic() if lost_at is None else lost_at
+        while True:
+            device = await asyncio.to_thread(self.identity.find)
+            if device is not None:
+                try:
+                    port = await asyncio.to_thread(self.open_port, device)
+                except (serial.SerialException, OSError) as e:
+                    self.last_error = e    # 節點剛出現時可能還無法開啟，下次再試
+                else:
+                    self.identity.device = device
+                    return port
+            if time.monotonic() - lost_at > self.timeout:
+                return None
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,106 @@
+"""
+串流重新取樣
+把時間間隔不均勻的樣本（抖動、重複 ts）轉成精確的目標採樣率，供 FFT/濾波與匯出使用。
+每批以向量化線性或三次（Hermite）內插計算，批次之間保留最後幾筆，
+分批推入的結果與一次推入完全相同。
+"""
+
+import numpy as np
+
+# 批次間保留的樣本數：線性只需前一筆，三次還需要計算區段端點斜率的前一筆
+_CARRY = {'linear': 1, 'cubic': 3}
+
+
+def _hermite_slopes(t, y):
+    """非均勻間隔的有限差分斜率；兩端用單側差分"""
+    m = np.empty_like(y)
+    if len(t) < 2:
+        m[:] = 0.0
+        return m
+    m[1:-1] = (y[2:] - y[:-2]) / (t[2:] - t[:-2])[:, None]
+    m[0] = (y[1] - y[0]) / (t[1] - t[0])
+    m[-1] = (y[-1] - y[-2]) / (t[-1] - t[-2])
+    return m
+
+
+class StreamingResampler:
+    """把 (N, 欄位數) 區塊重新取樣到 rate Hz 的均勻時間網格
+
+    time_column 欄為時間，time_unit 為其單位（秒），預設毫秒。
+    輸出的時間欄為網格時間，其餘欄位為內插值；時間不遞增的樣本會被略過。
+    """
+
+    def __init__(self, rate, kind='linear', time_column=0, time_unit=1e-3):
+        if kind not in _CARRY:
+            raise ValueError(f"未知的內插方式: {kind}")
+        self.rate = float(rate)
+        self.kind = kind
+        self.time_column = time_column
+        self.period = 1.0 / (self.rate * time_unit)   # 以時間欄單位表示的取樣間隔
+        self.reset()
+
+    def reset(self):
+        self._tail = None         # 上一批保留的最後幾筆
+        self._origin = None       # 網格起點
+        self._next = 0            # 下一個網格點的編號
+
+    def push(self, block):
+        """推入一批樣本，回傳這批可確定的網格樣本（可能為 0 筆）"""
+        block = np.asarray(block, dtype=float)
+        tc = self.time_column
+        if self._tail is not None:
+            block = np.vstack((self._tail, block))
+        if not len(block):
+            return block
+        # 去除時間不遞增的樣本（重複 ts、亂序）
+        t = block[:, tc]
+        running = np.maximum.accumulate(t)
+        keep = np.ones(len(t), dtype=bool)
+        keep[1:] = t[1:] > running[:-1]
+        if not keep.all():
+            block = block[keep]
+            t = block[:, tc]
+        if self._origin is None:
+            self._origin = t[0]
+
+        # 可確定的最後時間：三次內插需要區段後一筆的斜率
+        usable = len(t) - 1 if self.kind == 'cubic' else len(t)
+        if usable < 1:
+            self._tail = block
+            return block[:0]
+        t_end = t[usable - 1]
+        last = int(np.floor((t_end - self._origin) / self.period + 1e-9))
+        grid = self._origin + np.arange(self._next, last + 1) * self.period
+        out = self._interpolate(t, block, grid) if len(grid) else block[:0]
+        self._next = max(self._next, last + 1)
+
+        self._tail = block[-_CARRY[self.kind]:].copy()
+        return out
+
+    def _interpolate(self, t, block, grid):
+        tc = self.time_column
+        idx = np.clip(np.searchsorted(t, grid, side='right') - 1, 0, len(t) - 2) \
+            if len(t) > 1 else np.zeros(len(grid), dtype=int)
+        if len(t) == 1:
+            out = np.repeat(block[:1], len(grid), axis=0)
+        elif self.kind == 'linear':
+            t0, t1 = t[idx], t[idx + 1]
+            w = ((grid - t0) / (t1 - t0))[:, None]
+            out = block[idx] + (block[idx + 1] - block[idx]) * w
+        else:
+            m = _hermite_slopes(t, block)
+            h = (t[idx + 1] - t[idx])[:, None]
+            s = (grid - t[idx])[:, None] / h
+            s2, s3 = s * s, s * s * s
+            out = ((2 * s3 - 3 * s2 + 1) * block[idx] + (s3 - 2 * s2 + s) * h * m[idx]
+                   + (-2 * s3 + 3 * s2) * block[idx + 1] + (s3 - s2) * h * m[idx + 1])
+        out[:, tc] = grid
+        return out
+
+
+def resample_series(times, values, rate, kind='linear', time_unit=1e-3):
+    """一次重新取樣 (times, values)，回傳均勻網格上的 (times, values)"""
+    block = np.column_stack((np.asarray(times, dtype=float), np.asarray(values, dtype=float)))
+    resampler = StreamingResampler(rate, kind, time_unit=time_unit)
+    out = resampler.push(block)
+    return out[:, 0], out[:, 1]
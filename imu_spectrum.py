@@ -0,0 +1,138 @@
+"""
+IMU 多通道滾動頻譜圖 (STFT)
+新數據區塊到達時只計算新增的重疊 FFT 幀，視窗與工作緩衝區皆預先配置
+"""
+
+import numpy as np
+
+
+class RollingSpectrogram:
+    """多通道增量式 STFT
+
+    push() 接收 (N, 通道數) 的數據區塊，所有通道一次向量化計算，
+    結果寫入環狀的 dB 影像 (通道, 頻率, 時間幀)。
+    """
+
+    def __init__(self, n_channels, sample_rate, nfft=256, hop=64, history=200):
+        self.n_channels = n_channels
+        self.nfft = nfft
+        self.hop = hop
+        self.history = history
+        self.window = np.hanning(nfft)
+        # 視窗能量正規化，讓不同 nfft 的 dB 值可比較
+        self._scale = 1.0 / (sample_rate * np.sum(self.window ** 2))
+        self.sample_rate = sample_rate
+        self.freqs = np.fft.rfftfreq(nfft, 1.0 / sample_rate)
+        self._image = np.full((n_channels, len(self.freqs), history), -120.0)
+        self._column = 0       # 下一個要寫入的時間幀位置
+        self.frame_count = 0
+        # 尚未湊成完整幀的樣本，放在工作緩衝區開頭
+        self._work = np.empty((n_channels, nfft + 4096))
+        self._pending = 0
+
+    def reset(self):
+        self._image.fill(-120.0)
+        self._column = 0
+        self.frame_count = 0
+        self._pending = 0
+
+    def push(self, block):
+        """加入新的數據區塊 (N, n_channels)，回傳新增的幀數"""
+        n = len(block)
+        if n == 0:
+            return 0
+        total = self._pending + n
+        if total > self._work.shape[1]:
+            work = np.empty((self.n_channels, total * 2))
+            work[:, :self._pending] = self._work[:, :self._pending]
+            self._work = work
+        self._work[:, self._pending:total] = block.T
+
+        if total < self.nfft:
+            self._pending = total
+            return 0
+
+        n_frames = (total - self.nfft) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(
+            self._work[:, :total], self.nfft, axis=1)[:, :n_frames * self.hop:self.hop]
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2) * self._scale
+        db = 10.0 * np.log10(power + 1e-12)          # (通道, 幀, 頻率)
+        self._write_frames(db.transpose(0, 2, 1))
+
+        consumed = n_frames * self.hop
+        remain = total - consumed
+        self._work[:, :remain] = self._work[:, consumed:total]
+        self._pending = remain
+        self.frame_count += n_frames
+        return n_frames
+
+    def _write_frames(self, db):
+        n_frames = db.shape[2]
+        if n_frames >= self.history:
+            self._image[:] = db[:, :, -self.history:]
+            self._column = 0
+            return
+        end = self._column + n_frames
+        if end <= self.history:
+            self._image[:, :, self._column:end] = db
+        else:
+            first = self.history - self._column
+            self._image[:, :, self._column:] = db[:, :, :first]
+            self._image[:, :, :end - self.history] = db[:, :, first:]
+        self._column = end % self.history
+
+    def image(self, channel):
+        """回傳某通道的頻譜影像 (頻率, 時間)，由舊到新排列"""
+        img = self._image[channel]
+        return np.concatenate((img[:, self._column:], img[:, :self._column]), axis=1)
+
+    @property
+    def time_span(self):
+        """影像涵蓋的時間長度（秒）"""
+        return self.history * self.hop / self.sample_rate
+
+
+class WelchPSD:
+    """多通道 Welch 平均功率譜，逐區塊累加（記憶體與數據長度無關）
+
+    幀長 nfft、50% 重疊、Hann 視窗；result() 回傳 (freqs, psd[通道, 頻率])，單位為 值²/Hz。
+    """
+
+    def __init__(self, n_channels, sample_rate, nfft=1024):
+        self.n_channels = n_channels
+        self.nfft = nfft
+        self.hop = nfft // 2
+        self.sample_rate = sample_rate
+        self.window = np.hanning(nfft)
+        self._scale = 1.0 / (sample_rate * np.sum(self.window ** 2))
+        self.freqs = np.fft.rfftfreq(nfft, 1.0 / sample_rate)
+        self._sum = np.zeros((n_channels, len(self.freqs)))
+        self.frame_count = 0
+        self._pending = np.empty((n_channels, 0))
+
+    def push(self, block):
+        """加入新的數據區塊 (N, n_channels)，回傳新增的幀數"""
+        work = np.concatenate((self._pending, block.T), axis=1) if self._pending.shape[1] else block.T
+        total = work.shape[1]
+        if total < self.nfft:
+            self._pending = np.array(work)
+            return 0
+        n_frames = (total - self.nfft) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(
+            work, self.nfft, axis=1)[:, :n_frames * self.hop:self.hop]
+        # 去除每幀平均，避免直流成分洩漏到低頻
+        frames = frames - frames.mean(axis=-1, keepdims=True)
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        self._sum += (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=1) * self._scale
+        self._pending = np.array(work[:, n_frames * self.hop:])
+        self.frame_count += n_frames
+        return n_frames
+
+    def result(self):
+        """回傳 (freqs, 平均功率譜)；數據不足一幀時回傳 None"""
+        if self.frame_count == 0:
+            return None
+        psd = self._sum / self.frame_count
+        psd[:, 1:-1] *= 2.0     # 單邊譜
+        return self.freqs, psd
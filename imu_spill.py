@@ -0,0 +1,233 @@
+"""
+長時間擷取的記憶體上限儲存
+最近的數據留在記憶體，較舊的數據以區塊壓縮後寫入磁碟暫存檔。
+匯出、歷史讀取與統計透過 read()/iter_blocks() 同時讀取兩層，記憶體用量維持固定。
+"""
+
+import io
+import os
+import tempfile
+import zlib
+
+import numpy as np
+
+from imu_buffer import IMUColumnBuffer, CHANNELS, readonly, time_slice, to_dataframe, ts_increasing
+
+try:
+    import zstandard
+except ImportError:  # 沒有安裝時使用標準庫 zlib
+    zstandard = None
+
+
+def encode_block(block):
+    """無損壓縮：相鄰列的 float64 位元做 XOR（差分），再依位元組平面重排後壓縮"""
+    bits = np.ascontiguousarray(block, dtype='<f8').view('<u8')
+    delta = bits.copy()
+    delta[1:] ^= bits[:-1]
+    # 欄優先 + 位元組平面：高位元組大多為 0，壓縮率高
+    planes = delta.T.copy().view(np.uint8).reshape(-1, 8).T.tobytes()
+    if zstandard is not None:
+        return b'Z' + zstandard.ZstdCompressor(level=3).compress(planes)
+    return b'z' + zlib.compress(planes, 1)
+
+
+def decode_block(data, n_rows, n_channels):
+    if data[:1] == b'Z':
+        planes = zstandard.ZstdDecompressor().decompress(data[1:])
+    else:
+        planes = zlib.decompress(data[1:])
+    delta = np.frombuffer(planes, dtype=np.uint8).reshape(8, -1).T.copy()
+    delta = delta.view('<u8').reshape(n_channels, n_rows).T
+    bits = np.bitwise_xor.accumulate(delta, axis=0)
+    return bits.view('<f8')
+
+
+class SpillingColumnStore:
+    """兩層式欄位儲存：記憶體環狀緩衝 + 磁碟壓縮區塊
+
+    memory_budget 為記憶體層的位元組上限；超過時最舊的數據以 block_rows 為單位寫入磁碟。
+    in_memory=True 時壓縮區塊改存在記憶體（搭配 imu_codec.CompactCodec 作為緊湊的擷取儲存）。
+    columns 不為 None 時只儲存這些欄位（n_channels 由其長度決定）。
+    """
+
+    def __init__(self, memory_budget=256 * 1024 * 1024, block_rows=16384, spill_dir=None,
+                 n_channels=len(CHANNELS), encoder=encode_block, decoder=decode_block,
+                 in_memory=False, columns=None):
+        if columns is not None:
+            n_channels = len(columns)
+        self.n_channels = n_channels
+        self.block_rows = block_rows
+        row_bytes = n_channels * 8
+        # 底層陣列預留一半空間給搬移壓縮，避免 IMUColumnBuffer 再擴充
+        capacity = max(memory_budget // row_bytes, block_rows * 4)
+        self.memory_rows = capacity // 2 - block_rows
+        self._hot = IMUColumnBuffer(capacity=capacity, n_channels=n_channels, columns=columns)
+        self.columns = self._hot.columns
+        self._encode = encoder
+        self._decode = decoder
+        if in_memory:
+            self.path = None
+            self._file = io.BytesIO()
+        else:
+            fd, self.path = tempfile.mkstemp(prefix='imu_spill_', suffix='.bin', dir=spill_dir)
+            self._file = os.fdopen(fd, 'w+b')
+        # 磁碟區塊索引：起始列、列數、檔案位移、位元組數
+        self._block_start = []
+        self._block_rows = []
+        self._block_offset = []
+        self._block_bytes = []
+        self._block_ts = []             # 各區塊第一筆的時間戳，依時間查詢時不必解碼
+        self._disk_rows = 0
+        self._cache = (None, None)      # 最近解碼的區塊
+        self.disk_bytes = 0
+        # 依時間查詢的二分搜尋需要時間戳不遞減；否則改為逐區塊掃描
+        self.ts_increasing = True
+        self._last_ts = None
+
+    def __len__(self):
+        return self._disk_rows + len(self._hot)
+
+    @property
+    def memory_bytes(self):
+        if self.path is None:
+            return self._hot._data.nbytes + self.disk_bytes
+        return self._hot._data.nbytes
+
+    def append(self, block):
+        """附加一批樣本；大批次以 block_rows 分段，每段放入前先把最舊的數據寫出，記憶體層不超過預算"""
+        if not len(block):
+            return
+        if self.ts_increasing:
+            self.ts_increasing = ts_increasing(block[:, 0], self._last_ts)
+        self._last_ts = block[-1, 0]
+        step = self.block_rows
+        for i in range(0, len(block), step):
+            chunk = block[i:i + step]
+            while len(self._hot) + len(chunk) > self.memory_rows:
+                self._spill(self._hot.view()[:step])
+                self._hot.discard(step)
+            self._hot.append(chunk)
+
+    def _spill(self, block):
+        data = self._encode(block)
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(data)
+        self._block_start.append(self._disk_rows)
+        self._block_rows.append(len(block))
+        self._block_offset.append(offset)
+        self._block_bytes.append(len(data))
+        self._block_ts.append(float(block[0, 0]))
+        self._disk_rows += len(block)
+        self.disk_bytes += len(data)
+
+    def _load_block(self, i):
+        if self._cache[0] == i:
+            return self._cache[1]
+        self._file.seek(self._block_offset[i])
+        data = self._file.read(self._block_bytes[i])
+        block = self._decode(data, self._block_rows[i], self.n_channels)
+        self._cache = (i, block)
+        return block
+
+    def read(self, start, stop):
+        """讀取 [start, stop) 範圍的樣本，跨越磁碟與記憶體兩層"""
+        stop = min(stop, len(self))
+        start = max(start, 0)
+        if start >= stop:
+            return np.empty((0, self.n_channels))
+        if start >= self._disk_rows:
+            return self._hot.view()[start - self._disk_rows:stop - self._disk_rows]
+        parts = []
+        i = int(np.searchsorted(self._block_start, start, side='right')) - 1
+        pos = start
+        while pos < stop and i < len(self._block_start):
+            block = self._load_block(i)
+            first = self._block_start[i]
+            parts.append(block[pos - first:min(stop - first, len(block))])
+            pos = first + len(block)
+            i += 1
+        if pos < stop:
+            parts.append(self._hot.view()[:stop - self._disk_rows])
+        return np.vstack(parts)
+
+    def tail(self, n):
+        return self.read(len(self) - n, len(self))
+
+    def snapshot(self, start=None, stop=None):
+        """[start, stop) 範圍的唯讀陣列（與 IMUColumnBuffer.snapshot 相同的介面）
+
+        範圍全在記憶體層時為不複製的視圖，只在下一次 append() / clear() 之前有效；
+        涵蓋磁碟區塊時需解碼，回傳的是複本。
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= self._disk_rows:
+            return readonly(self._hot.view()[start - self._disk_rows:stop - self._disk_rows])
+        return readonly(self.read(start, stop))
+
+    def row_at_time(self, t):
+        """第一筆時間戳 >= t (ms) 的列號；以區塊起始時間戳定位，最多解碼一個區塊
+        時間戳不遞減時才能定位，否則依序掃描全部區塊"""
+        if not self.ts_increasing:
+            pos = 0
+            for block in self.iter_blocks():
+                hit = np.flatnonzero(block[:, 0] >= t)
+                if len(hit):
+                    return pos + int(hit[0])
+                pos += len(block)
+            return pos
+        hot = self._hot.view()
+        if not self._block_ts or (len(hot) and t >= hot[0, 0]):
+            return self._disk_rows + int(np.searchsorted(hot[:, 0], t, side='left'))
+        i = max(int(np.searchsorted(self._block_ts, t, side='right')) - 1, 0)
+        block = self._load_block(i)
+        return self._block_start[i] + int(np.searchsorted(block[:, 0], t, side='left'))
+
+    def select_time(self, t0=None, t1=None):
+        """時間戳在 [t0, t1) (ms) 的唯讀陣列，複製與否同 snapshot()；
+        時間戳不遞減時為連續範圍，否則逐區塊依原順序選取（複本）"""
+        if not self.ts_increasing:
+            parts = [time_slice(block, t0, t1, increasing=False) for block in self.iter_blocks()]
+            return readonly(np.vstack(parts) if parts else np.empty((0, self.n_channels)))
+        start = 0 if t0 is None else self.row_at_time(t0)
+        stop = len(self) if t1 is None else self.row_at_time(t1)
+        return self.snapshot(start, max(start, stop))
+
+    def dataframe(self, start=None, stop=None):
+        """以 pandas.DataFrame 包裝 snapshot(start, stop)"""
+        return to_dataframe(self.snapshot(start, stop), self.columns or range(self.n_channels))
+
+    def view(self):
+        """記憶體層（最近的數據）的視圖"""
+        return self._hot.view()
+
+    def iter_blocks(self, block_rows=None):
+        """依序回傳全部數據：先磁碟區塊，再記憶體層"""
+        for i in range(len(self._block_start)):
+            self._file.seek(self._block_offset[i])
+            data = self._file.read(self._block_bytes[i])
+            yield self._decode(data, self._block_rows[i], self.n_channels)
+        hot = self._hot.view()
+        step = block_rows or self.block_rows
+        for i in range(0, len(hot), step):
+            yield hot[i:i + step]
+
+    def clear(self):
+        self._hot.clear()
+        self._file.seek(0)
+        self._file.truncate()
+        self._block_start, self._block_rows = [], []
+        self._block_offset, self._block_bytes = [], []
+        self._block_ts = []
+        self.ts_increasing = True
+        self._last_ts = None
+        self._disk_rows = 0
+        self.disk_bytes = 0
+        self._cache = (None, None)
+
+    def close(self):
+        """關閉並刪除磁碟暫存檔"""
+        if not self._file.closed:
+            self._file.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
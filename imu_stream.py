@@ -0,0 +1,337 @@
+"""
+IMU 本機串流服務
+讓其他程式（控制器、記錄器）經由 localhost TCP 取得 imu_gui 收到的數據，不必自己開串口
+
+封包格式（little-endian）：
+    標頭 24 bytes: magic 'IMUB', seq uint32, first_index uint64, n uint32, channels uint16, layout uint16
+    內容: timestamp uint32[n]，接著其餘欄位 float32[n, channels-1]
+seq 對每個批次遞增；消費者看到 seq 跳號即表示有批次因限速或來不及送出而被丟棄。
+
+欄位配置：訂閱後先送一個配置封包，欄位訂閱改變時再送一次（之前排隊、舊配置的批次捨棄）
+    標頭同上但 magic 為 'IMUL'，seq 與 layout 為配置編號，n 為內容位元組數，channels 為欄位數
+    內容: 以逗號分隔的欄位名稱 (ASCII)
+批次標頭的 layout 對應最近的配置封包。
+
+訂閱：客戶端連線後送出一行 "SUB <每秒最大樣本數>\\n"（0 表示不限速），處理訂閱行之後才開始送出批次
+
+用法（回環測試客戶端）：python imu_stream.py [port] [max_rate]
+"""
+
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from imu_buffer import CHANNELS
+
+DEFAULT_PORT = 5760
+MAGIC = b'IMUB'
+LAYOUT_MAGIC = b'IMUL'
+HEADER = struct.Struct('<4sIQIHH')
+
+
+def encode_layout(layout_id, columns):
+    """欄位配置封包"""
+    names = ",".join(columns).encode('ascii')
+    return HEADER.pack(LAYOUT_MAGIC, layout_id, 0, len(names), len(columns), layout_id & 0xFFFF) + names
+
+
+def decode_layout(header_bytes, payload):
+    """解碼配置封包，回傳 (配置編號, 欄位名稱列表)"""
+    _, layout_id, _, _, channels, _ = HEADER.unpack(header_bytes)
+    columns = payload.decode('ascii').split(',')
+    if len(columns) != channels:
+        raise ValueError("串流配置封包欄位數不符")
+    return layout_id, columns
+
+
+def encode_batch(seq, first_index, batch, layout_id=0):
+    """把 (N, 欄位數) 批次編碼為二進位封包"""
+    n, channels = batch.shape
+    header = HEADER.pack(MAGIC, seq & 0xFFFFFFFF, first_index, n, channels, layout_id & 0xFFFF)
+    ts = np.mod(batch[:, 0], 2 ** 32).astype('<u4')   # 已展開的 ts 還原為韌體的 uint32
+    values = np.ascontiguousarray(batch[:, 1:], dtype='<f4')
+    return b''.join((header, ts.tobytes(), values.tobytes()))
+
+
+def decode_payload(header_bytes, payload):
+    """解碼批次封包內容，回傳 (seq, first_index, (N, channels) float64 陣列)"""
+    magic, seq, first_index, n, channels, _ = HEADER.unpack(header_bytes)
+    if magic != MAGIC:
+        raise ValueError("串流封包標頭錯誤")
+    batch = np.empty((n, channels))
+    batch[:, 0] = np.frombuffer(payload, dtype='<u4', count=n)
+    batch[:, 1:] = np.frombuffer(payload, dtype='<f4', offset=4 * n).reshape(n, channels - 1)
+    return seq, first_index, batch
+
+
+def is_layout(header_bytes):
+    return header_bytes[:4] == LAYOUT_MAGIC
+
+
+def payload_size(header_bytes):
+    _, _, _, n, channels, _ = HEADER.unpack(header_bytes)
+    return n if is_layout(header_bytes) else 4 * n * channels
+
+
+class _Subscriber:
+    """單一消費者：獨立的發送線程、佇列與限速"""
+
+    def __init__(self, conn, addr, layout, max_queue=64):
+        self.conn = conn
+        self.addr = addr
+        self._layout = layout       # 尚未送出的配置封包
+        self.max_rate = 0.0         # 每秒最大樣本數，0 表示不限速
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self._queue = deque(maxlen=max_queue)   # 滿了就丟最舊的批次
+        self._cond = threading.Condition()
+        self.alive = True
+        self.subscribed = False     # 讀到訂閱行（或逾時）之前不排入批次，限速不會被繞過
+        self.sent_batches = 0
+        self.dropped_batches = 0
+
+    def allow(self, n):
+        """令牌桶限速：允許一秒的突發量；容量至少一批，超過每秒上限的大批次累積足夠令牌後仍會送出"""
+        if self.max_rate <= 0:
+            return True
+        now = time.monotonic()
+        capacity = max(self.max_rate, n)
+        self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.max_rate)
+        self._last_refill = now
+        if self._tokens >= n:
+            self._tokens -= n
+            return True
+        return False
+
+    def set_layout(self, packet):
+        """欄位配置改變：捨棄排隊中的舊配置批次，下一個批次之前先送配置封包"""
+        with self._cond:
+            self.dropped_batches += len(self._queue)
+            self._queue.clear()
+            self._layout = packet
+
+    def offer(self, packet, n):
+        if not self.subscribed:
+            return
+        if not self.allow(n):
+            self.dropped_batches += 1
+            return
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped_batches += 1
+            self._queue.append(packet)
+            self._cond.notify()
+
+    def read_subscription(self):
+        """讀取訂閱行（最多等 0.5 秒，沒有就視為不限速）"""
+        self.conn.settimeout(0.5)
+        try:
+            line = b''
+            while not line.endswith(b'\n') and len(line) < 64:
+                chunk = self.conn.recv(1)
+                if not chunk:
+                    break
+                line += chunk
+            parts = line.decode('ascii', errors='ignore').split()
+            if len(parts) == 2 and parts[0] == 'SUB':
+                self.max_rate = float(parts[1])
+                self._tokens = self.max_rate
+        except (socket.timeout, ValueError):
+            pass
+        self.conn.settimeout(None)
+
+    def run(self):
+        self.read_subscription()
+        self.subscribed = True
+        try:
+            while self.alive:
+                with self._cond:
+                    while self.alive and not self._queue:
+                        self._cond.wait(0.5)
+                    if not self.alive:
+                        break
+                    layout, self._layout = self._layout, None
+                    packet = self._queue.popleft()
+                if layout is not None:
+                    self.conn.sendall(layout)
+                self.conn.sendall(packet)
+                self.sent_batches += 1
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.alive = False
+        with self._cond:
+            self._cond.notify()
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class IMUStreamServer:
+    """本機 TCP 發佈服務，publish() 可由讀取線程直接呼叫
+
+    columns 為發佈的欄位名稱；publish() 帶入不同的欄位時送出新的配置封包。
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, columns=CHANNELS):
+        self.host = host
+        self.port = port
+        self.columns = list(columns)
+        self._layout_id = 0
+        self._layout = encode_layout(0, self.columns)
+        self._sock = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._sample_index = 0
+        self._running = False
+        self._accept_thread = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self.port = self._sock.getsockname()[1]  # port=0 時取得系統分配的埠號
+        self._sock.listen()
+        self._sock.settimeout(0.5)
+        self._running = True
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, addr = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                subscriber = _Subscriber(conn, addr, self._layout)
+                self._subscribers.append(subscriber)
+            threading.Thread(target=subscriber.run, daemon=True).start()
+
+    def publish(self, batch, columns=None):
+        """發佈一批 (N, 欄位數) 數據，編碼一次後分送給所有消費者；columns 為這批的欄位名稱（預設不變）"""
+        n = len(batch)
+        if n == 0:
+            return
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s.alive]
+            subscribers = list(self._subscribers)
+            if columns is not None and list(columns) != self.columns:
+                self.columns = list(columns)
+                self._layout_id = (self._layout_id + 1) & 0xFFFF
+                self._layout = encode_layout(self._layout_id, self.columns)
+                for subscriber in subscribers:
+                    subscriber.set_layout(self._layout)
+            layout_id = self._layout_id
+        seq = self._seq
+        first_index = self._sample_index
+        self._seq += 1
+        self._sample_index += n
+        if not subscribers:
+            return
+        packet = encode_batch(seq, first_index, batch, layout_id)
+        for subscriber in subscribers:
+            subscriber.offer(packet, n)
+
+    @property
+    def client_count(self):
+        """已完成訂閱的消費者數"""
+        with self._lock:
+            return sum(1 for s in self._subscribers if s.alive and s.subscribed)
+
+    def stop(self):
+        self._running = False
+        if self._sock is not None:
+            self._sock.close()
+        if self._accept_thread is not None:
+            self._accept_thread.join(timeout=1.0)
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.close()
+            self._subscribers = []
+
+
+class IMUStreamClient:
+    """串流消費端，用 seq 追蹤遺失的批次；columns 為最近收到的欄位配置"""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, max_rate=0, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.sendall(f"SUB {max_rate}\n".encode('ascii'))
+        self._expected_seq = None
+        self.lost_batches = 0
+        self.columns = None
+        self.layout_id = None
+
+    def _recv_exact(self, size):
+        buf = bytearray(size)
+        view = memoryview(buf)
+        got = 0
+        while got < size:
+            n = self.sock.recv_into(view[got:])
+            if n == 0:
+                raise ConnectionError("串流伺服器已關閉連線")
+            got += n
+        return bytes(buf)
+
+    def recv_batch(self):
+        """阻塞接收一批數據，回傳 (seq, first_index, (N, 欄位數) 陣列)；欄位名稱見 columns"""
+        header = self._recv_exact(HEADER.size)
+        payload = self._recv_exact(payload_size(header))
+        while is_layout(header):
+            self.layout_id, self.columns = decode_layout(header, payload)
+            header = self._recv_exact(HEADER.size)
+            payload = self._recv_exact(payload_size(header))
+        seq, first_index, batch = decode_payload(header, payload)
+        if HEADER.unpack(header)[5] != self.layout_id or batch.shape[1] != len(self.columns or ()):
+            raise ValueError("串流批次與欄位配置不符")
+        if self._expected_seq is not None and seq != self._expected_seq:
+            self.lost_batches += (seq - self._expected_seq) & 0xFFFFFFFF
+        self._expected_seq = (seq + 1) & 0xFFFFFFFF
+        return seq, first_index, batch
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    max_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    client = IMUStreamClient(port=port, max_rate=max_rate, timeout=None)
+    print(f"已連線 127.0.0.1:{port}")
+    samples = 0
+    columns = None
+    t0 = time.monotonic()
+    try:
+        while True:
+            seq, first_index, batch = client.recv_batch()
+            if client.columns != columns:
+                columns = client.columns
+                print(f"欄位: {','.join(columns)}")
+            samples += len(batch)
+            now = time.monotonic()
+            if now - t0 >= 1.0:
+                print(f"seq={seq} 樣本/秒={samples / (now - t0):.0f} 遺失批次={client.lost_batches} "
+                      f"最新 ts={batch[-1, 0]:.0f}")
+                samples = 0
+                t0 = now
+    except (KeyboardInterrupt, ConnectionError) as e:
+        print(f"結束: {e}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
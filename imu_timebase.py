@@ -0,0 +1,113 @@
+"""
+感測器時間戳與主機時間對齊
+每批數據以最後一筆的 ts（ms）與主機收到的 time.monotonic_ns() 配對，
+線上擬合 主機時間 = ts + offset + drift * ts，並處理 32 位元 ts 溢位。
+主機時間包含傳輸延遲（只會比實際晚），因此每個時間區間只保留延遲最小的配對，
+擬合後再把直線移到下緣，逐批成本與樣本數無關。
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+TS_WRAP = 2 ** 32   # 韌體 ts 為 uint32 毫秒計數
+
+
+class TimeBase:
+    """感測器 ts -> 主機時間的線上換算
+
+    bucket_ms  每個區間保留一個延遲最小的配對
+    window     擬合使用的區間數（預設 10 分鐘）
+    """
+
+    def __init__(self, bucket_ms=1000, window=600):
+        self.bucket_ms = bucket_ms
+        self._x = deque(maxlen=window)     # 相對 ts (ms)
+        self._y = deque(maxlen=window)     # 相對主機時間 (ms)
+        self.reset()
+
+    def reset(self):
+        self._x.clear()
+        self._y.clear()
+        self._wraps = 0
+        self._last_raw = None
+        self._origin = None            # (ts0, host0_ns)
+        self._bucket = None            # [區間編號, x, y]
+        # (ts0, host0_ns, offset_ms, drift)：單一指派，其他線程讀取時一致
+        self._params = None
+        self._wall_offset_ns = time.time_ns() - time.monotonic_ns()
+
+    @property
+    def ready(self):
+        return self._params is not None
+
+    @property
+    def drift_ppm(self):
+        return self._params[3] * 1e6 if self._params else 0.0
+
+    def unwrap(self, ts):
+        """把 uint32 ts 陣列展開成單調遞增的毫秒值（跨批次保留溢位次數）"""
+        ts = np.asarray(ts, dtype=float)
+        if not len(ts):
+            return ts
+        prev = ts[0] if self._last_raw is None else self._last_raw
+        self._last_raw = ts[-1]
+        if ts.min() >= max(prev, ts.max()) - TS_WRAP / 2:
+            # 常見情況：本批內不可能有溢位
+            return ts + self._wraps * float(TS_WRAP) if self._wraps else ts
+        step = np.diff(ts, prepend=prev)
+        wraps = self._wraps + np.cumsum(step < -TS_WRAP / 2)
+        self._wraps = int(wraps[-1])
+        return ts + wraps * float(TS_WRAP)
+
+    def observe(self, ts, host_ns):
+        """加入一個配對：已展開的 ts (ms) 與收到該筆時的 time.monotonic_ns()"""
+        if self._origin is None:
+            self._origin = (ts, host_ns)
+            self._params = (ts, host_ns, 0.0, 0.0)
+        x = ts - self._origin[0]
+        y = (host_ns - self._origin[1]) / 1e6
+        bucket = int(y // self.bucket_ms)
+        current = self._bucket
+        if current is None or bucket != current[0]:
+            if current is not None:
+                self._x.append(current[1])
+                self._y.append(current[2])
+                self._fit()
+            self._bucket = [bucket, x, y]
+        elif y - x < current[2] - current[1]:
+            current[1], current[2] = x, y
+        if len(self._x) < 2:
+            # 尚未累積足夠區間：只估計偏移（目前最小延遲）
+            params = self._params
+            self._params = (params[0], params[1], min(params[2], y - x), 0.0)
+
+    def _fit(self):
+        """以穩健直線擬合 offset 與 drift：去掉延遲較大的一半後重擬合，再移到下緣"""
+        x = np.array(self._x)
+        r = np.array(self._y) - x
+        if len(x) < 2 or x[-1] == x[0]:
+            return
+        keep = np.ones(len(x), dtype=bool)
+        for _ in range(2):
+            xk, rk = x[keep], r[keep]
+            xm, rm = xk.mean(), rk.mean()
+            drift = np.dot(xk - xm, rk - rm) / max(np.dot(xk - xm, xk - xm), 1e-12)
+            offset = rm - drift * xm
+            resid = r - (offset + drift * x)
+            keep = resid <= np.median(resid[keep])
+            if keep.sum() < 2:
+                break
+        offset += resid[keep].min() if keep.any() else 0.0
+        self._params = (self._origin[0], self._origin[1], offset, drift)
+
+    def to_monotonic(self, ts):
+        """已展開的 ts (ms) -> 主機 monotonic 時間 (秒)"""
+        ts0, host0, offset, drift = self._params
+        x = np.asarray(ts, dtype=float) - ts0
+        return host0 / 1e9 + (x + offset + drift * x) / 1000.0
+
+    def to_wall(self, ts):
+        """已展開的 ts (ms) -> 牆上時間（Unix epoch 秒），可與其他記錄器對齊"""
+        return self.to_monotonic(ts) + self._wall_offset_ns / 1e9
@@ -0,0 +1,186 @@
+"""
+IMU 觸發與事件擷取
+門檻、斜率、加速度/角速度幅值觸發；保留觸發前 N ms 的環狀緩衝，
+觸發後擷取固定長度視窗成為獨立事件。每批數據以向量化方式偵測。
+"""
+
+import csv
+import math
+
+import numpy as np
+
+from imu_buffer import IMUColumnBuffer, CHANNELS, CHANNEL_INDEX, csv_rows
+
+
+class Trigger:
+    """單一觸發條件
+
+    kind:
+        'threshold'  channel 數值
+        'slope'      channel 變化率絕對值（單位/秒，以 ts 計算）
+        'magnitude'  group ('acc' 或 'gyr') 三軸向量長度
+    direction 為 'above' 時條件是數值 >= level，'below' 時為 <= level。
+    條件由假變真的那一筆樣本視為觸發點。columns 為數據的欄位名稱。
+    """
+
+    def __init__(self, kind, level, channel=None, group=None, columns=CHANNELS, direction='above'):
+        if kind not in ('threshold', 'slope', 'magnitude'):
+            raise ValueError(f"未知的觸發類型: {kind}")
+        if direction not in ('above', 'below'):
+            raise ValueError(f"未知的觸發方向: {direction}")
+        self.kind = kind
+        self.level = level
+        self.direction = direction
+        index = CHANNEL_INDEX if columns is CHANNELS else {name: i for i, name in enumerate(columns)}
+        needed = {'magnitude': [f"{group}_x"], 'slope': [channel, 'timestamp']}.get(kind, [channel])
+        missing = [name for name in needed if name not in index]
+        if missing:
+            raise ValueError(f"數據中沒有欄位: {', '.join(missing)}")
+        self._ts_column = index.get('timestamp')
+        op = '>=' if direction == 'above' else '<='
+        if kind == 'magnitude':
+            start = index[f"{group}_x"]
+            self._columns = slice(start, start + 3)
+            self.name = f"|{group}|{op}{level}"
+        else:
+            self._column = index[channel]
+            self.name = f"{channel} {kind} {op} {level}"
+        self._last_row = None      # 上一批最後一筆（斜率用）
+        self._last_state = False   # 上一批最後的條件狀態（邊緣偵測用）
+
+    def condition(self, block):
+        if self.kind == 'threshold':
+            return self._compare(block[:, self._column], self.level)
+        if self.kind == 'magnitude':
+            v = block[:, self._columns]
+            return self._compare(np.einsum('ij,ij->i', v, v), self.level * abs(self.level))
+        # 斜率：與前一筆的差分 / 時間差；無法計算的（第一筆、時間差 <= 0）為 NaN，條件不成立
+        if self._last_row is None:
+            rows = block
+        else:
+            rows = np.vstack((self._last_row, block))
+        dx = np.diff(rows[:, self._column])
+        dt = np.diff(rows[:, self._ts_column]) / 1000.0
+        slope = np.divide(np.abs(dx), dt, out=np.full(len(dx), np.nan), where=dt > 0)
+        if self._last_row is None:
+            slope = np.concatenate(([np.nan], slope))
+        return self._compare(slope, self.level)
+
+    def _compare(self, x, level):
+        return x >= level if self.direction == 'above' else x <= level
+
+    def edges(self, block):
+        """回傳本批中觸發（條件上升緣）的樣本索引"""
+        state = self.condition(block)
+        prev = np.concatenate(([self._last_state], state[:-1]))
+        self._last_state = bool(state[-1])
+        self._last_row = block[-1:].copy()
+        return np.flatnonzero(state & ~prev)
+
+    def reset(self):
+        self._last_row = None
+        self._last_state = False
+
+
+class EventRecord:
+    """一次觸發事件：觸發前 pre_samples 筆 + 觸發後的數據"""
+
+    def __init__(self, trigger_name, sample_index, pre_samples, columns=CHANNELS):
+        self.trigger_name = trigger_name
+        self.columns = list(columns)
+        self.sample_index = sample_index    # 觸發點在整個數據流中的索引
+        self.pre_samples = pre_samples
+        self._parts = []
+        self.data = None
+
+    @property
+    def trigger_timestamp(self):
+        return self.data[self.pre_samples, self.columns.index('timestamp')]
+
+    def save_csv(self, filename):
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            writer.writerows(csv_rows(self.data))
+
+
+class TriggerEngine:
+    """在即時數據流上執行觸發並擷取事件"""
+
+    def __init__(self, triggers, sample_rate, pre_ms=200, post_ms=800, columns=CHANNELS):
+        self.triggers = list(triggers)
+        self.columns = list(columns)
+        self.pre_samples = max(int(math.ceil(pre_ms * sample_rate / 1000.0)), 0)
+        self.post_samples = max(int(math.ceil(post_ms * sample_rate / 1000.0)), 1)
+        self._pre_ring = IMUColumnBuffer(capacity=self.pre_samples * 2 + 1,
+                                         max_len=max(self.pre_samples, 1), columns=columns)
+        self._current = None       # 正在擷取中的事件
+        self._remaining = 0
+        self._sample_count = 0
+        self.events = []
+
+    def reset(self):
+        self._pre_ring.clear()
+        self._current = None
+        self._remaining = 0
+        self._sample_count = 0
+        self.events = []
+        for trigger in self.triggers:
+            trigger.reset()
+
+    def _edges(self, block):
+        """合併所有觸發條件的觸發點，回傳 (索引陣列, 觸發名稱陣列)"""
+        indices, names = [], []
+        for trigger in self.triggers:
+            idx = trigger.edges(block)
+            indices.append(idx)
+            names.extend([trigger.name] * len(idx))
+        if not names:
+            return np.empty(0, dtype=int), []
+        indices = np.concatenate(indices)
+        order = np.argsort(indices, kind='stable')
+        return indices[order], [names[i] for i in order]
+
+    def process(self, block):
+        """處理一批數據，回傳本批完成的事件列表"""
+        n = len(block)
+        if n == 0:
+            return []
+        edge_idx, edge_names = self._edges(block)
+        finished = []
+        pos = 0
+        while pos < n:
+            if self._current is not None:
+                take = min(self._remaining, n - pos)
+                self._current._parts.append(block[pos:pos + take].copy())
+                self._remaining -= take
+                pos += take
+                if self._remaining == 0:
+                    event = self._current
+                    event.data = np.vstack(event._parts)
+                    event._parts = []
+                    self._current = None
+                    finished.append(event)
+                continue
+            # 擷取期間的觸發會被忽略，從目前位置找下一個觸發點
+            k = np.searchsorted(edge_idx, pos)
+            if k >= len(edge_idx):
+                break
+            idx = int(edge_idx[k])
+            pre = np.vstack((self._pre_ring.view(), block[:idx]))[-self.pre_samples:] \
+                if self.pre_samples else block[:0]
+            self._current = EventRecord(edge_names[k], self._sample_count + idx, len(pre),
+                                        self.columns)
+            self._current._parts.append(pre.copy())
+            self._remaining = self.post_samples
+            pos = idx
+
+        if self.pre_samples:
+            self._pre_ring.append(block)
+        self._sample_count += n
+        self.events.extend(finished)
+        return finished
+
+    @property
+    def capturing(self):
+        return self._current is not None
@@ -4,16 +4,15 @@ AD9106 + Teensy ADC Signal Monitor with GUI
 帶圖形界面的監控程式
 """
 
+import asyncio
+import concurrent.futures
 import serial
-import matplotlib.pyplot as plt
-import numpy as np
 import time
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
 from datetime import datetime
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from imu_acquire import AcquisitionLoop, AsyncSerial, TkSink
 
 class TeensyADCGUIMonitor:
     def __init__(self):
@@ -32,8 +31,19 @@ class TeensyADCGUIMonitor:
         self.num_samples = 0
         self.adc_ref_voltage = 0
         
+        # 串口讀取在共用的 asyncio 事件迴圈執行，結果經 TkSink 回到 Tk 主迴圈
+        self.acquisition = AcquisitionLoop(name='teensy-acquire')
+        self.async_port = None
+        self._port_lock = None    # (事件迴圈, asyncio.Lock)：指令與其回應、量測依序使用串口
+        self._tasks = set()       # 此裝置在事件迴圈上的任務（只在事件迴圈線程存取）
+        self.measurement = None   # 進行中的量測 (concurrent.futures.Future)
+        
         # 創建GUI
         self.create_widgets()
+        self.ui = TkSink(self.root)
+        
+        # numpy / matplotlib 匯入約需 0.8 秒：視窗先顯示，在事件迴圈的工作線程匯入後再建立圖表
+        self.acquisition.start().submit(self.preload_plotting())
         
     def create_widgets(self):
         """創建GUI元件"""
@@ -76,7 +86,11 @@ class TeensyADCGUIMonitor:
         # 保存數據按鈕
         self.save_btn = ttk.Button(operation_frame, text="保存數據", 
                                   command=self.save_data, state=tk.DISABLED)
-        self.save_btn.pack(side=tk.LEFT)
+        self.save_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        # 載入數據按鈕（不需連線）
+        self.load_btn = ttk.Button(operation_frame, text="載入數據", command=self.load_data)
+        self.load_btn.pack(side=tk.LEFT)
         
         # 進度條
         self.progress_var = tk.DoubleVar()
@@ -98,10 +112,33 @@ class TeensyADCGUIMonitor:
         # 圖表框架
         plot_frame = ttk.LabelFrame(main_frame, text="signal monitor", padding=5)
         plot_frame.pack(fill=tk.BOTH, expand=True)
+        self.plot_frame = plot_frame
+        self.fig = None
+        self.plot_placeholder = ttk.Label(plot_frame, text="載入繪圖元件...", anchor=tk.CENTER)
+        self.plot_placeholder.pack(fill=tk.BOTH, expand=True)
+        
+        # 狀態變數
+        self.wave_started = False
+    
+    async def preload_plotting(self):
+        def preload():
+            import numpy
+            import matplotlib.figure
+            import matplotlib.backends.backend_tkagg
+        await asyncio.to_thread(preload)
+        self.ui.post(self.init_plot)
+    
+    def init_plot(self):
+        """建立matplotlib圖表並替換佔位標籤（只做一次；背景匯入完成或第一次繪圖時呼叫）"""
+        if self.fig is not None:
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.plot_placeholder.destroy()
         
         # 創建matplotlib圖表
         self.fig = Figure(figsize=(10, 6), dpi=100)
-        self.canvas = FigureCanvasTkAgg(self.fig, plot_frame)
+        self.canvas = FigureCanvasTkAgg(self.fig, self.plot_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
         # 初始化空圖表
@@ -120,11 +157,11 @@ class TeensyADCGUIMonitor:
         self.fig.tight_layout()
         self.canvas.draw()
         
-        # 狀態變數
-        self.wave_started = False
-        
     def log_info(self, message):
-        """在資訊區域顯示訊息"""
+        """在資訊區域顯示訊息（其他線程呼叫時排入 Tk 主迴圈）"""
+        if threading.current_thread() is not threading.main_thread():
+            self.ui.post(self.log_info, message)
+            return
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.info_text.insert(tk.END, f"[{timestamp}] {message}\n")
         self.info_text.see(tk.END)
@@ -158,6 +195,8 @@ class TeensyADCGUIMonitor:
     
     def disconnect_from_teensy(self):
         """斷開Teensy連接"""
+        # 取消這個裝置進行中的讀取並等待結束，再關閉串口；共用的事件迴圈留給 on_closing 停止
+        self.cancel_tasks()
         if self.ser and self.ser.is_open:
             self.ser.close()
             
@@ -176,27 +215,76 @@ class TeensyADCGUIMonitor:
             self.ser.write(command.encode())
             self.log_info(f"發送命令: {command}")
     
-    def read_serial_line(self):
-        """讀取一行串列數據"""
-        if self.ser and self.ser.is_open:
+    def run_task(self, coro):
+        """在擷取事件迴圈執行這個裝置的協程，回傳 concurrent.futures.Future；斷開連接時取消"""
+        async def run():
+            task = asyncio.current_task()
+            self._tasks.add(task)
             try:
-                line = self.ser.readline().decode('utf-8').strip()
-                return line
-            except UnicodeDecodeError:
-                return ""
-        return ""
+                return await coro
+            finally:
+                self._tasks.discard(task)
+        return self.acquisition.start().submit(run())
+    
+    def cancel_tasks(self, timeout=2.0):
+        """取消 run_task 建立的任務並等待結束（於事件迴圈以外的線程呼叫）"""
+        if not self.acquisition.running:
+            return
+        
+        async def cancel():
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        try:
+            self.acquisition.submit(cancel()).result(timeout)
+        except concurrent.futures.TimeoutError:
+            pass
+    
+    def serial_lines(self):
+        """目前串口的非阻塞讀取器（self.ser 換成新串口時重建）"""
+        if self.async_port is None or self.async_port.port is not self.ser:
+            self.async_port = AsyncSerial(self.ser)
+        return self.async_port
+    
+    def port_lock(self):
+        """串口讀取的互斥鎖（於事件迴圈呼叫；事件迴圈停止後重新啟動時重建）"""
+        loop = asyncio.get_running_loop()
+        if self._port_lock is None or self._port_lock[0] is not loop:
+            self._port_lock = (loop, asyncio.Lock())
+        return self._port_lock[1]
+    
+    @staticmethod
+    def decode_line(raw):
+        try:
+            return raw.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            return ""
+    
+    async def read_serial_line(self, timeout=None):
+        """讀取一行串列數據；逾時回傳空字串"""
+        try:
+            raw = await asyncio.wait_for(self.serial_lines().readline(), timeout)
+        except asyncio.TimeoutError:
+            return ""
+        return self.decode_line(raw)
+    
+    async def command_response(self, command):
+        """送出指令並讀取回應顯示；與量測共用串口鎖，回應不會被量測讀走（反之亦然）"""
+        async with self.port_lock():
+            self.send_command(command)
+            response = await self.read_serial_line(timeout=self.ser.timeout)
+        if response:
+            self.log_info(f"Teensy回應: {response}")
     
     def toggle_wave_generation(self):
         """切換波形產生狀態"""
         if not self.connected:
             return
             
-        self.send_command('s')
-        
-        # 讀取回應
-        response = self.read_serial_line()
-        if response:
-            self.log_info(f"Teensy回應: {response}")
+        # 在背景送出並讀取回應，不阻塞介面
+        self.run_task(self.command_response('s'))
             
         # 切換按鈕狀態
         self.wave_started = not self.wave_started
@@ -206,41 +294,55 @@ class TeensyADCGUIMonitor:
             self.wave_btn.config(text="開始波形產生")
     
     def start_measurement(self):
-        """開始測量（在背景執行緒中）"""
+        """開始測量（在擷取事件迴圈中執行）"""
         if not self.connected:
             return
             
-        # 在背景執行緒中執行測量
         self.measure_btn.config(state=tk.DISABLED, text="測量中...")
         self.progress_var.set(0)
         
-        measurement_thread = threading.Thread(target=self.measure_data_thread)
-        measurement_thread.daemon = True
-        measurement_thread.start()
+        self.measurement = self.run_task(self.measure())
+        self.measurement.add_done_callback(lambda f: self.ui.post(self.measurement_done, f))
     
-    def measure_data_thread(self):
-        """在背景執行緒中執行數據收集"""
-        try:
-            if self.collect_data():
-                self.root.after(0, self.update_plot)  # 在主執行緒中更新UI
-                self.root.after(0, lambda: self.save_btn.config(state=tk.NORMAL))
-            
-        finally:
-            self.root.after(0, lambda: self.measure_btn.config(state=tk.NORMAL, text="測量並繪圖"))
-            self.root.after(0, lambda: self.progress_var.set(0))
+    def measurement_done(self, future):
+        """量測結束（Tk 主迴圈）：更新圖表並恢復按鈕"""
+        if self.measurement is future:
+            self.measurement = None
+        if not future.cancelled():
+            error = future.exception()
+            if error is not None:
+                self.log_info(f"測量失敗: {error}")
+            elif future.result():
+                self.update_plot()
+                self.save_btn.config(state=tk.NORMAL)
+        self.measure_btn.config(state=tk.NORMAL, text="測量並繪圖")
+        self.progress_var.set(0)
     
     def collect_data(self):
-        """收集ADC數據"""
+        """收集ADC數據（阻塞直到完成）"""
+        return self.run_task(self.measure()).result()
+    
+    async def measure(self):
+        """量測協程：送出 'm' 並讀取 START_DATA ... DATA_END（持有串口鎖）"""
+        async with self.port_lock():
+            return await self._measure()
+    
+    async def _measure(self):
         self.log_info("開始測量...")
         self.send_command('m')
+        port = self.serial_lines()
         
-        # 清空緩存
-        self.timestamps = []
-        self.voltages = []
-        
-        # 等待數據開始標記
+        # 等待數據開始標記；串口逾時內沒有出現時放棄（TimeoutError 交給 measurement_done 顯示）
+        deadline = time.monotonic() + self.ser.timeout
         while True:
-            line = self.read_serial_line()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{self.ser.timeout:g} 秒內沒有收到 START_DATA")
+            try:
+                raw = await asyncio.wait_for(port.readline(), remaining)
+            except asyncio.TimeoutError:
+                continue
+            line = self.decode_line(raw)
             self.log_info(f"接收: {line}")
             
             if line == "START_DATA":
@@ -248,12 +350,14 @@ class TeensyADCGUIMonitor:
             elif line.startswith("Error:"):
                 self.log_info(line)
                 return False
-            elif not line:
-                continue
         
-        # 讀取參數
+        # 讀取參數；Teensy 在參數區塊中途停止輸出時同樣以串口逾時放棄
         while True:
-            line = self.read_serial_line()
+            try:
+                raw = await asyncio.wait_for(port.readline(), self.ser.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{self.ser.timeout:g} 秒內沒有收到 DATA_BEGIN")
+            line = self.decode_line(raw)
             self.log_info(f"參數: {line}")
             
             if line.startswith("SAMPLE_RATE:"):
@@ -267,33 +371,43 @@ class TeensyADCGUIMonitor:
         
         self.log_info(f"Sampling rate: {self.sample_rate}Hz, Samples: {self.num_samples}")
         
-        # 收集數據點
-        data_count = 0
-        while data_count < self.num_samples:
-            line = self.read_serial_line()
-            
-            if line == "DATA_END":
-                break
-            elif not line:
-                continue
-            
+        # 收集數據點：每次取出已到達的所有行
+        timestamps = []
+        voltages = []
+        progress_step = max(self.num_samples // 100, 1)  # 每 1% 更新一次進度條
+        next_progress = progress_step
+        done = False
+        while not done and len(timestamps) < self.num_samples:
             try:
-                # 解析時間戳和電壓
-                timestamp_us, voltage = line.split(',')
-                timestamp_ms = float(timestamp_us) / 1000.0
-                voltage = float(voltage)
-                
-                self.timestamps.append(timestamp_ms)
-                self.voltages.append(voltage)
-                data_count += 1
-                
-                # 更新進度條
-                progress = (data_count / self.num_samples) * 100
-                self.root.after(0, lambda p=progress: self.progress_var.set(p))
+                lines = await asyncio.wait_for(port.readlines(), self.ser.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{self.ser.timeout:g} 秒內沒有收到數據"
+                                   f"（已收到 {len(timestamps)}/{self.num_samples} 個樣本）")
+            for raw in lines:
+                line = self.decode_line(raw)
+                if line == "DATA_END":
+                    done = True
+                    break
+                elif not line:
+                    continue
                 
-            except ValueError:
-                continue
+                try:
+                    # 解析時間戳和電壓
+                    timestamp_us, voltage = line.split(',')
+                    timestamps.append(float(timestamp_us) / 1000.0)
+                    voltages.append(float(voltage))
+                except ValueError:
+                    continue
+                if len(timestamps) >= self.num_samples:
+                    break
+            
+            # 更新進度條
+            if len(timestamps) >= next_progress:
+                next_progress = (len(timestamps) // progress_step + 1) * progress_step
+                self.ui.post(self.progress_var.set, len(timestamps) / self.num_samples * 100)
         
+        self.timestamps = timestamps
+        self.voltages = voltages
         self.log_info(f"數據收集完成! 共收集 {len(self.timestamps)} 個樣本")
         return True
     
@@ -301,6 +415,9 @@ class TeensyADCGUIMonitor:
         """更新圖表顯示"""
         if not self.timestamps or not self.voltages:
             return
+        import numpy as np
+        from imu_resample import resample_series
+        self.init_plot()
         
         # 清除舊圖表
         self.ax1.clear()
@@ -321,9 +438,15 @@ class TeensyADCGUIMonitor:
         
         # FFT頻譜圖
         if len(self.voltages) > 1:
-            dt = (self.timestamps[-1] - self.timestamps[0]) / (len(self.timestamps) - 1) / 1000.0
-            freqs = np.fft.fftfreq(len(self.voltages), dt)
-            fft_vals = np.fft.fft(self.voltages)
+            if self.sample_rate > 0:
+                # 時間戳有抖動：先重新取樣到 SAMPLE_RATE 的均勻網格再做 FFT
+                _, voltages = resample_series(self.timestamps, self.voltages, self.sample_rate)
+                dt = 1.0 / self.sample_rate
+            else:
+                voltages = self.voltages
+                dt = (self.timestamps[-1] - self.timestamps[0]) / (len(self.timestamps) - 1) / 1000.0
+            freqs = np.fft.fftfreq(len(voltages), dt)
+            fft_vals = np.fft.fft(voltages)
             
             positive_freq_idx = freqs > 0
             freqs_positive = freqs[positive_freq_idx]
@@ -359,11 +482,48 @@ class TeensyADCGUIMonitor:
                         f.write(f"{t:.3f},{v:.4f}\n")
                 
                 self.log_info(f"數據已保存至: {filename}")
+                self.record_session(filename)
                 messagebox.showinfo("成功", f"數據已保存至:\n{filename}")
                 
             except Exception as e:
                 messagebox.showerror("錯誤", f"保存失敗:\n{e}")
     
+    def record_session(self, filename):
+        """把保存的擷取加入擷取庫（與 imu_gui 共用）；失敗只記錄在日誌"""
+        import numpy as np
+        from imu_library import CaptureLibrary, SessionRecorder, KIND_VOLTAGE
+        from imu_loader import VOLTAGE_COLUMNS
+        recorder = SessionRecorder(VOLTAGE_COLUMNS, self.sample_rate or None)
+        recorder.update(np.column_stack((self.timestamps, self.voltages)))
+        try:
+            with CaptureLibrary() as library:
+                recorder.finish(library, filename, KIND_VOLTAGE,
+                                baud=self.ser.baudrate if self.ser else None,
+                                port=self.port_var.get())
+        except Exception as e:
+            self.log_info(f"擷取庫更新失敗: {e}")
+    
+    def load_data(self):
+        """載入先前保存的CSV文件並繪圖"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        from imu_loader import load_voltage_capture
+        try:
+            timestamps, voltages = load_voltage_capture(filename)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("錯誤", f"載入失敗:\n{e}")
+            return
+        
+        self.timestamps = timestamps.tolist()
+        self.voltages = voltages.tolist()
+        if len(timestamps) > 1 and timestamps[-1] > timestamps[0]:
+            self.sample_rate = round(1000.0 * (len(timestamps) - 1) / (timestamps[-1] - timestamps[0]))
+        self.log_info(f"已載入 {filename}: {len(self.timestamps)} 個樣本")
+        self.update_plot()
+    
     def run(self):
         """執行GUI主迴圈"""
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -373,6 +533,8 @@ class TeensyADCGUIMonitor:
         """程式關閉時的清理工作"""
         if self.connected:
             self.disconnect_from_teensy()
+        self.acquisition.stop()
+        self.ui.close()
         self.root.destroy()
 
 def main():
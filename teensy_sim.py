@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Teensy + AD9106 ADC 模擬器（Linux pty）
+模擬 signal_monitor.py 使用的串列協定，不接開發板也能測試擷取與 FFT 效能：
+    's'  切換波形產生
+    'm'  量測，回傳
+         START_DATA
+         SAMPLE_RATE:<Hz>
+         NUM_SAMPLES:<N>
+         ADC_REF_VOLTAGE:<V>
+         DATA_BEGIN
+         <timestamp_us>,<voltage>   x N
+         DATA_END
+
+用法：
+    python teensy_sim.py --samples 1000000 --rate 500000 --freq 50000 --noise 0.01
+signal_monitor.py 的 COM Port 欄位輸入印出的 /dev/pts/N 即可連線。
+"""
+
+import argparse
+import os
+import sys
+import threading
+import tty
+
+import numpy as np
+
+
+class TeensyADCSimulator:
+    """在 pty 主端模擬 Teensy；port_name 是給 signal_monitor 開啟的從端路徑"""
+
+    def __init__(self, num_samples=10000, sample_rate=100000, tones=((50000.0, 1.0),),
+                 offset=1.65, noise=0.0, adc_ref=3.3, require_wave=False, chunk=20000, seed=0):
+        self.num_samples = num_samples
+        self.sample_rate = sample_rate
+        self.tones = list(tones)      # [(頻率 Hz, 振幅 V), ...]
+        self.offset = offset
+        self.noise = noise
+        self.adc_ref = adc_ref
+        self.require_wave = require_wave
+        self.chunk = chunk
+        self.wave_started = False
+        self.measurements = 0
+        self._rng = np.random.default_rng(seed)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self._running = False
+        self._thread = None
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            n = os.write(self.master, view)   # 阻塞寫入：主機讀多慢都不丟數據
+            view = view[n:]
+
+    def _println(self, text):
+        self._write((text + "\r\n").encode('utf-8'))
+
+    def waveform(self, start, count):
+        """產生第 start 筆開始的 count 筆樣本 (時間 us, 電壓 V)"""
+        n = np.arange(start, start + count)
+        t = n / self.sample_rate
+        v = np.full(count, self.offset)
+        for freq, amp in self.tones:
+            v += amp * np.sin(2 * np.pi * freq * t)
+        if self.noise:
+            v += self._rng.normal(0, self.noise, count)
+        np.clip(v, 0.0, self.adc_ref, out=v)
+        return t * 1e6, v
+
+    def measure(self):
+        if self.require_wave and not self.wave_started:
+            self._println("Error: waveform not started")
+            return
+        self.measurements += 1
+        self._println("START_DATA")
+        self._println(f"SAMPLE_RATE:{self.sample_rate}")
+        self._println(f"NUM_SAMPLES:{self.num_samples}")
+        self._println(f"ADC_REF_VOLTAGE:{self.adc_ref}")
+        self._println("DATA_BEGIN")
+        for start in range(0, self.num_samples, self.chunk):
+            count = min(self.chunk, self.num_samples - start)
+            t_us, v = self.waveform(start, count)
+            lines = "".join(f"{t:.0f},{x:.4f}\r\n" for t, x in zip(t_us.tolist(), v.tolist()))
+            self._write(lines.encode('ascii'))
+        self._println("DATA_END")
+
+    def handle(self, ch):
+        if ch == 's':
+            self.wave_started = not self.wave_started
+            self._println("Waveform started" if self.wave_started else "Waveform stopped")
+        elif ch == 'm':
+            self.measure()
+
+    def run(self):
+        self._running = True
+        while self._running:
+            try:
+                data = os.read(self.master, 64)
+            except OSError:
+                break
+            for ch in data.decode('ascii', errors='ignore'):
+                self.handle(ch)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Teensy/AD9106 ADC pty 模擬器")
+    ap.add_argument('--samples', type=int, default=10000, help="每次量測的樣本數")
+    ap.add_argument('--rate', type=int, default=100000, help="ADC 採樣率 Hz")
+    ap.add_argument('--freq', type=float, action='append', default=None,
+                    help="正弦波頻率 Hz（可重複指定多個）")
+    ap.add_argument('--amp', type=float, default=1.0, help="各正弦波振幅 V")
+    ap.add_argument('--offset', type=float, default=1.65, help="直流偏壓 V")
+    ap.add_argument('--noise', type=float, default=0.0, help="高斯雜訊標準差 V")
+    ap.add_argument('--require-wave', action='store_true', help="未送 's' 時量測回傳 Error")
+    ap.add_argument('--link', default=None, help="建立指向 pty 的符號連結")
+    args = ap.parse_args()
+
+    tones = [(f, args.amp) for f in (args.freq or [5000.0])]
+    sim = TeensyADCSimulator(args.samples, args.rate, tones, args.offset, args.noise,
+                             require_wave=args.require_wave)
+    port = sim.port_name
+    if args.link:
+        if os.path.lexists(args.link):
+            os.remove(args.link)
+        os.symlink(sim.port_name, args.link)
+        port = args.link
+    print(f"Teensy ADC 模擬器已就緒: {port}  {args.samples} 點 @ {args.rate} Hz")
+    try:
+        sim.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,8 +11,11 @@ from PyQt5.QtWidgets import (
     QLabel, QMessageBox, QFileDialog, QSpinBox
 )
 from PyQt5.QtCore import QTimer, pyqtSignal, QObject
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import numpy as np
+from imu_plot import Panel, FrameTimer, available_backends, make_renderer
+
+# matplotlib 預設色循環的前三色（兩個後端都接受十六進位色碼）
+LINE_COLORS = ('#1f77b4', '#ff7f0e', '#2ca02c')
 
 # =========================
 # 數據解析類（保留不變）
@@ -89,6 +92,7 @@ class IMUGUI(QWidget):
         # Top：Port / Refresh / Baud / Connect / Disconnect
         top = QHBoxLayout()
         self.port_cb = QComboBox()
+        self.port_cb.setEditable(True)  # 可直接輸入路徑，例如模擬器的 /dev/pts/N
         self.refresh_ports()
         btn_refresh = QPushButton("刷新")
         btn_refresh.clicked.connect(self.refresh_ports)
@@ -126,7 +130,7 @@ class IMUGUI(QWidget):
 
         # 為了保持原緩衝限制邏輯，保留「最大點數」但縮小處理
         self.max_points_spin = QSpinBox()
-        self.max_points_spin.setRange(100, 10000)
+        self.max_points_spin.setRange(100, 100000)
         self.max_points_spin.setValue(1000)
 
         ctrl.addWidget(self.start_btn)
@@ -136,24 +140,32 @@ class IMUGUI(QWidget):
         ctrl.addWidget(QLabel("最大點數"))
         ctrl.addWidget(self.max_points_spin)
 
+        # 繪圖後端（pyqtgraph 為選用套件）
+        self.backend_cb = QComboBox()
+        self.backend_cb.addItems(available_backends())
+        self.backend_cb.currentTextChanged.connect(self.set_backend)
+        ctrl.addWidget(self.backend_cb)
+
         # 狀態列
         status = QHBoxLayout()
         self.status_label = QLabel("狀態：未連線")
         self.data_count_label = QLabel("數據點：0")
         status.addWidget(self.status_label)
+        self.frame_label = QLabel("")
         status.addStretch(1)
+        status.addWidget(self.frame_label)
         status.addWidget(self.data_count_label)
 
         # 繪圖區：兩張圖（Acc & Gyro）
-        self.figure = Figure(figsize=(10, 7))
-        self.canvas = FigureCanvas(self.figure)
+        self.renderer = make_renderer(self.backend_cb.currentText(), figsize=(10, 7))
+        self.frame_timer = FrameTimer()
 
         # 主版面
         main = QVBoxLayout()
         main.addLayout(top)
         main.addLayout(ctrl)
         main.addLayout(status)
-        main.addWidget(self.canvas)
+        main.addWidget(self.renderer.widget, 1)
         self.setLayout(main)
 
         # 初始圖面
@@ -265,46 +277,41 @@ class IMUGUI(QWidget):
 
     # -------- 繪圖（簡化為固定兩張圖） --------
     def init_plot(self):
-        self.figure.clear()
-        self.canvas.draw()
+        self.renderer.clear()
+
+    def set_backend(self, name):
+        if name == self.renderer.name:
+            return
+        try:
+            renderer = make_renderer(name, figsize=(10, 7))
+        except RuntimeError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
+        self.layout().replaceWidget(self.renderer.widget, renderer.widget)
+        self.renderer.widget.deleteLater()
+        self.renderer = renderer
+        self.frame_timer = FrameTimer()
+        self.update_plot()
 
     def update_plot(self):
         if not self.data_buffer:
             return
-        self.figure.clear()
-
-        subplot_idx = 1
-        x = list(range(len(self.data_buffer)))
-
-        # Acceleration
-        if any('accel' in d for d in self.data_buffer):
-            ax1 = self.figure.add_subplot(2, 1, subplot_idx)
-            acc_x = [d.get('accel', [0,0,0])[0] for d in self.data_buffer]
-            acc_y = [d.get('accel', [0,0,0])[1] for d in self.data_buffer]
-            acc_z = [d.get('accel', [0,0,0])[2] for d in self.data_buffer]
-            ax1.plot(x, acc_x, label='Acc X', linewidth=1)
-            ax1.plot(x, acc_y, label='Acc Y', linewidth=1)
-            ax1.plot(x, acc_z, label='Acc Z', linewidth=1)
-            ax1.set_title("Acceleration (g)")
-            ax1.grid(True, alpha=0.3)
-            ax1.legend(loc='upper right')
-            subplot_idx += 1
-
-        # Gyroscope
-        if any('gyro' in d for d in self.data_buffer):
-            ax2 = self.figure.add_subplot(2, 1, subplot_idx)
-            gyr_x = [d.get('gyro', [0,0,0])[0] for d in self.data_buffer]
-            gyr_y = [d.get('gyro', [0,0,0])[1] for d in self.data_buffer]
-            gyr_z = [d.get('gyro', [0,0,0])[2] for d in self.data_buffer]
-            ax2.plot(x, gyr_x, label='Gyr X', linewidth=1)
-            ax2.plot(x, gyr_y, label='Gyr Y', linewidth=1)
-            ax2.plot(x, gyr_z, label='Gyr Z', linewidth=1)
-            ax2.set_title("Angular Velocity (°/s)")
-            ax2.grid(True, alpha=0.3)
-            ax2.legend(loc='upper right')
-
-        self.figure.tight_layout()
-        self.canvas.draw()
+        t0 = time.perf_counter()
+        x = np.arange(len(self.data_buffer))
+        panels, series = [], []
+
+        # Acceleration / Gyroscope：轉成 (N, 3) 陣列後把各軸視圖交給繪圖後端
+        for key, title, labels in (('accel', "Acceleration (g)", ('Acc X', 'Acc Y', 'Acc Z')),
+                                   ('gyro', "Angular Velocity (°/s)", ('Gyr X', 'Gyr Y', 'Gyr Z'))):
+            if any(key in d for d in self.data_buffer):
+                values = np.array([d.get(key, (0, 0, 0)) for d in self.data_buffer], dtype=float)
+                panels.append(Panel(title, labels, colors=LINE_COLORS))
+                series.append([values[:, 0], values[:, 1], values[:, 2]])
+
+        self.renderer.set_panels(panels)
+        self.renderer.draw(x, series)
+        self.frame_timer.measure(t0)
+        self.frame_label.setText(self.frame_timer.text())
 
     # -------- 匯出 CSV（保留邏輯與欄位） --------
     def export_data(self):
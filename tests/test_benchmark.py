@@ -0,0 +1,66 @@
+"""
+效能基準：--compare 依方向計算改善倍數；benchmark.py 的各項目以 pytest 執行
+（pytest tests/test_benchmark.py --benchmark，規模同 --quick，結果寫入 bench_results_pytest.json）
+"""
+
+import json
+import os
+
+import pytest
+
+import benchmark
+from benchmark import BENCHMARKS, BenchmarkSuite, compare, improvement
+
+
+def result(name, value, unit, **params):
+    return {'name': name, 'params': params, 'value': value, 'unit': unit,
+            'higher_is_better': unit not in benchmark.LOWER_IS_BETTER}
+
+
+def test_improvement_follows_direction():
+    assert improvement(result('parse', 200.0, 'lines/s'), result('parse', 100.0, 'lines/s')) == 2.0
+    # 大小與時間變大是退步
+    assert improvement(result('codec', 12.0, 'bytes/sample'), result('codec', 6.0, 'bytes/sample')) == 0.5
+    assert improvement(result('startup', 50.0, 'ms'), result('startup', 200.0, 'ms')) == 4.0
+    assert improvement(result('parse', 1.0, 'lines/s'), result('parse', 0.0, 'lines/s')) is None
+    assert improvement(result('startup', 0.0, 'ms'), result('startup', 10.0, 'ms')) is None
+
+
+def test_compare_with_baseline_without_direction(tmp_path):
+    old = [result('binary', 40.0, 'bytes/sample', packet='hi91'),
+           result('reconnect', 300.0, 'ms', stage='resume'),
+           result('store', 1e6, 'samples/s', rate=1000)]
+    for r in old:
+        del r['higher_is_better']       # 加入方向欄位之前的結果檔
+    baseline = tmp_path / 'old.json'
+    baseline.write_text(json.dumps({'results': old}), encoding='utf-8')
+    new = [result('binary', 80.0, 'bytes/sample', packet='hi91'),
+           result('reconnect', 150.0, 'ms', stage='resume'),
+           result('store', 5e5, 'samples/s', rate=1000),
+           result('store', 5e5, 'samples/s', rate=500)]
+    ratios = compare(new, str(baseline))
+    assert [(r['name'], ratio) for r, ratio in ratios] == [('binary', 0.5), ('reconnect', 2.0), ('store', 0.5)]
+
+
+@pytest.fixture(scope='module')
+def suite():
+    suite = BenchmarkSuite(quick=True)
+    yield suite
+    suite.close()
+    if suite.results:
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'bench_results_pytest.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'meta': {'quick': True}, 'results': suite.results}, f, indent=2)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('name', BENCHMARKS)
+def test_benchmark(suite, name):
+    before = len(suite.results)
+    getattr(suite, f"bench_{name}")()
+    recorded = suite.results[before:]
+    if not recorded:
+        pytest.skip(f"{name} 在此環境無法執行")
+    for r in recorded:
+        assert r['name'] == name and r['value'] >= 0
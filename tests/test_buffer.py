@@ -0,0 +1,65 @@
+"""
+IMUColumnBuffer / time_slice：依時間戳選取，時間戳不遞增時改以遮罩選取
+"""
+
+import numpy as np
+import pytest
+
+from imu_buffer import IMUColumnBuffer, time_slice, ts_increasing
+
+
+def capture(ts):
+    data = np.zeros((len(ts), 3))
+    data[:, 0] = ts
+    data[:, 1] = np.arange(len(ts))
+    return data
+
+
+def expected_rows(data, t0, t1):
+    ts = data[:, 0]
+    return data[(ts >= t0) & (ts < t1)]
+
+
+def test_ts_increasing():
+    assert ts_increasing(np.array([1.0, 1.0, 2.0]))
+    assert not ts_increasing(np.array([1.0, 3.0, 2.0]))
+    assert not ts_increasing(np.array([5.0, 6.0]), previous=7.0)
+    assert ts_increasing(np.array([]), previous=7.0)
+
+
+def test_time_slice_monotonic_is_view():
+    data = capture(np.arange(1000.0))
+    part = time_slice(data, 100, 200)
+    np.testing.assert_array_equal(part, expected_rows(data, 100, 200))
+    assert np.shares_memory(part, data)
+
+
+@pytest.mark.parametrize('t0, t1', [(10, 20), (95, 105), (None, 5), (50, None)])
+def test_time_slice_non_monotonic(t0, t1):
+    # 32 位元 ts 溢位未展開 / 兩段擷取：ts 回到 0
+    data = capture(np.concatenate((np.arange(100.0), np.arange(60.0))))
+    lo = -np.inf if t0 is None else t0
+    hi = np.inf if t1 is None else t1
+    np.testing.assert_array_equal(time_slice(data, t0, t1), expected_rows(data, lo, hi))
+
+
+def test_buffer_tracks_monotonicity_across_appends():
+    buf = IMUColumnBuffer(n_channels=3)
+    buf.append(capture(np.arange(100.0)))
+    buf.append(capture(np.arange(100.0, 200.0)))
+    assert buf.ts_increasing
+    view = buf.select_time(150, 160)
+    assert np.shares_memory(view, buf._data) and len(view) == 10
+    buf.append(capture(np.arange(50.0)))   # 新的一段從 0 開始
+    assert not buf.ts_increasing
+    np.testing.assert_array_equal(buf.select_time(10, 20), expected_rows(buf.view(), 10, 20))
+    assert len(buf.select_time(10, 20)) == 20
+    buf.clear()
+    assert buf.ts_increasing
+
+
+def test_from_array_checks_monotonicity():
+    data = capture(np.concatenate((np.arange(10.0), np.arange(5.0))))
+    buf = IMUColumnBuffer.from_array(data)
+    assert not buf.ts_increasing
+    assert len(buf.select_time(0, 5)) == 10
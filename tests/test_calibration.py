@@ -0,0 +1,155 @@
+"""
+感測器校正：由合成數據估計零偏/橢球/加速度係數、apply/remove 往返、
+缺值群組互不影響，以及 CalibrationStore 的保存與讀回
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from imu_buffer import CHANNELS, CHANNEL_INDEX, samples_to_array
+from imu_calibration import (SENSOR_START, SENSOR_STOP, CalibrationStore, SensorCalibration,
+                             estimate_gyro_bias, fit_accel, fit_ellipsoid)
+
+
+def unit_vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, 3))
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def rotation(seed):
+    q, r = np.linalg.qr(np.random.default_rng(seed).standard_normal((3, 3)))
+    return q * np.sign(np.diag(r))
+
+
+def test_gyro_bias_from_still_data():
+    rng = np.random.default_rng(0)
+    bias = np.array([0.5, -1.2, 0.03])
+    gyro = bias + rng.normal(0, 0.05, (2000, 3))
+    np.testing.assert_allclose(estimate_gyro_bias(gyro), bias, atol=0.01)
+
+
+def test_gyro_bias_rejects_motion_and_short_data():
+    rng = np.random.default_rng(1)
+    with pytest.raises(ValueError):
+        estimate_gyro_bias(rng.normal(0, 5.0, (500, 3)))
+    with pytest.raises(ValueError):
+        estimate_gyro_bias(np.zeros((5, 3)))
+
+
+def test_fit_ellipsoid_recovers_hard_and_soft_iron():
+    field = 48.0
+    true = field * unit_vectors(500)
+    # 軟鐵：對稱的縮放矩陣；硬鐵：固定偏移
+    soft = rotation(2) @ np.diag([1.3, 0.8, 1.05]) @ rotation(2).T
+    hard = np.array([12.0, -30.0, 5.5])
+    raw = true @ np.linalg.inv(soft).T + hard
+    offset, matrix = fit_ellipsoid(raw, radius=field)
+    np.testing.assert_allclose(offset, hard, atol=1e-6)
+    corrected = (raw - offset) @ matrix.T
+    np.testing.assert_allclose(np.linalg.norm(corrected, axis=1), field, rtol=1e-6)
+    # 對稱平方根：校正後與真實磁場同向
+    np.testing.assert_allclose(corrected, true, atol=1e-5)
+
+
+def test_fit_ellipsoid_needs_enough_points():
+    with pytest.raises(ValueError):
+        fit_ellipsoid(unit_vectors(8))
+
+
+def test_fit_accel_from_six_poses():
+    scale = np.array([1.02, 0.97, 1.01])
+    offset = np.array([0.03, -0.02, 0.05])
+    rng = np.random.default_rng(3)
+    poses = np.vstack((np.eye(3), -np.eye(3), unit_vectors(6, seed=4)))
+    raw = poses / scale + offset + rng.normal(0, 1e-5, poses.shape)
+    fitted_offset, matrix = fit_accel(raw)
+    np.testing.assert_allclose(fitted_offset, offset, atol=1e-4)
+    np.testing.assert_allclose(np.diag(matrix), scale, atol=1e-4)
+    corrected = (raw - fitted_offset) @ matrix.T
+    np.testing.assert_allclose(np.linalg.norm(corrected, axis=1), 1.0, atol=1e-4)
+    with pytest.raises(ValueError):
+        fit_accel(raw[:5])
+
+
+def calibration():
+    return SensorCalibration(gyro_bias=[0.5, -0.2, 0.1],
+                             accel_offset=[0.01, -0.02, 0.03],
+                             accel_matrix=np.diag([1.01, 0.99, 1.02]),
+                             mag_offset=[10.0, -5.0, 2.0],
+                             mag_matrix=rotation(5) @ np.diag([1.2, 0.9, 1.0]) @ rotation(5).T)
+
+
+def test_apply_matches_definition_and_remove_restores():
+    cal = calibration()
+    rng = np.random.default_rng(6)
+    batch = rng.normal(0, 10, (100, len(CHANNELS)))
+    raw = batch.copy()
+    cal.apply(batch)
+    sensor = raw[:, SENSOR_START:SENSOR_STOP]
+    c = CHANNEL_INDEX
+    np.testing.assert_allclose(batch[:, c['acc_x']:c['acc_z'] + 1],
+                               (sensor[:, 0:3] - cal.accel_offset) @ cal.accel_matrix.T)
+    np.testing.assert_allclose(batch[:, c['gyr_x']:c['gyr_z'] + 1], sensor[:, 3:6] - cal.gyro_bias)
+    np.testing.assert_allclose(batch[:, c['mag_x']:c['mag_z'] + 1],
+                               (sensor[:, 6:9] - cal.mag_offset) @ cal.mag_matrix.T)
+    # 其他欄位不變
+    np.testing.assert_array_equal(batch[:, :SENSOR_START], raw[:, :SENSOR_START])
+    np.testing.assert_array_equal(batch[:, SENSOR_STOP:], raw[:, SENSOR_STOP:])
+    np.testing.assert_allclose(cal.remove(batch[:, SENSOR_START:SENSOR_STOP]), sensor, atol=1e-9)
+
+
+def test_apply_subset_columns_matches_full_layout():
+    cal = calibration()
+    rng = np.random.default_rng(7)
+    full = rng.normal(0, 10, (50, len(CHANNELS)))
+    columns = ['timestamp', 'gyr_x', 'gyr_y', 'gyr_z', 'acc_x', 'acc_y', 'acc_z']
+    subset = full[:, [CHANNEL_INDEX[name] for name in columns]]
+    cal.apply(full)
+    cal.apply(subset, columns)
+    np.testing.assert_allclose(subset, full[:, [CHANNEL_INDEX[name] for name in columns]])
+
+
+@pytest.mark.parametrize('columns', [None, CHANNELS], ids=['full', 'named'])
+def test_missing_group_does_not_spread(columns):
+    cal = calibration()
+    block = samples_to_array([{'timestamp': 1, 'accel': [1, 2, 3], 'gyro': [4, 5, 6]},
+                              {'timestamp': 2, 'mag': [30, 20, 10]}])
+    expected = block.copy()
+    cal.apply(block, columns)
+    c = CHANNEL_INDEX
+    np.testing.assert_allclose(block[0, c['acc_x']:c['acc_z'] + 1],
+                               (np.array([1, 2, 3]) - cal.accel_offset) @ cal.accel_matrix.T)
+    np.testing.assert_allclose(block[0, c['gyr_x']:c['gyr_z'] + 1], np.array([4, 5, 6]) - cal.gyro_bias)
+    assert np.isnan(block[0, c['mag_x']:c['mag_z'] + 1]).all()
+    assert np.isnan(block[1, c['acc_x']:c['gyr_z'] + 1]).all()
+    assert np.isfinite(block[1, c['mag_x']:c['mag_z'] + 1]).all()
+    # remove 同樣逐組還原
+    restored = cal.remove(block[:, SENSOR_START:SENSOR_STOP])
+    np.testing.assert_allclose(restored, expected[:, SENSOR_START:SENSOR_STOP])
+
+
+def test_store_persists_per_device(tmp_path):
+    path = str(tmp_path / 'calibration.json')
+    store = CalibrationStore(path)
+    assert store.get('SN:123') is None
+    cal = calibration()
+    store.put('SN:123', cal)
+    store.put('/dev/ttyUSB1', SensorCalibration(gyro_bias=[1.0, 2.0, 3.0]))
+
+    reloaded = CalibrationStore(path)
+    again = reloaded.get('SN:123')
+    for key, value in cal.to_dict().items():
+        np.testing.assert_allclose(getattr(again, key), value)
+    np.testing.assert_array_equal(reloaded.get('/dev/ttyUSB1').gyro_bias, [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(reloaded.get('/dev/ttyUSB1').mag_matrix, np.eye(3))
+    assert not (tmp_path / 'calibration.json.tmp').exists()
+
+
+def test_device_key_prefers_serial_number():
+    ports = [SimpleNamespace(device='/dev/ttyUSB0', serial_number='A1B2'),
+             SimpleNamespace(device='/dev/ttyUSB1', serial_number=None)]
+    assert CalibrationStore.device_key('/dev/ttyUSB0', ports) == 'SN:A1B2'
+    assert CalibrationStore.device_key('/dev/ttyUSB1', ports) == '/dev/ttyUSB1'
@@ -0,0 +1,171 @@
+"""
+CompactCodec 往返：韌體精度格點上的欄位量化、不在格點上的欄位原樣保存（往返一律無損），
+run-length 固定欄位、delta-of-delta 時間戳與欄位子集
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from imu_buffer import CHANNELS, CHANNEL_INDEX
+from imu_codec import (CompactCodec, KIND_CONST, KIND_DOD, KIND_QUANT, KIND_RAW, KIND_RLE,
+                       PRECISION)
+
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'imu_data_20250813_143629.csv')
+
+
+def roundtrip(codec, block):
+    return codec.decode(codec.encode(block), *block.shape)
+
+
+def column_kind(codec, block, name):
+    """單一欄位實際採用的編碼方式"""
+    i = codec.channels.index(name)
+    return codec._encode_column(block[:, i], codec.scales[i], i == codec._ts_column)[0]
+
+
+def imu_rows(n, rate=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.zeros((n, len(CHANNELS)))
+    c = CHANNEL_INDEX
+    rows[:, c['timestamp']] = np.arange(n) * (1000.0 / rate)
+    rows[:, c['temperature']] = 30.0
+    rows[:, c['fps']] = rate
+    rows[:, c['acc_x']:c['yaw'] + 1] = np.cumsum(rng.normal(0, 0.01, (n, 12)), axis=0)
+    rows[:, c['acc_z']] += 1.0
+    return rows
+
+
+@pytest.mark.parametrize('compress', [True, False], ids=['zlib', 'raw'])
+def test_values_at_precision_are_quantised_and_exact(compress):
+    codec = CompactCodec(compress=compress)
+    rows = codec.quantize(imu_rows(5000))
+    assert np.array_equal(roundtrip(codec, rows), rows)
+    for name in ('acc_x', 'gyr_y', 'mag_z', 'yaw'):
+        assert column_kind(codec, rows, name) == KIND_QUANT
+    assert len(codec.encode(rows)) < rows.nbytes / 3
+
+
+@pytest.mark.parametrize('compress', [True, False], ids=['zlib', 'raw'])
+def test_values_off_precision_are_stored_raw(compress):
+    """校正後、主機時間推算的 ts 等不在韌體精度上的數據不能被量化"""
+    codec = CompactCodec(compress=compress)
+    rows = imu_rows(5000)
+    rows[:, CHANNEL_INDEX['timestamp']] = 1000.0 + np.arange(5000) * 1.37
+    assert np.array_equal(roundtrip(codec, rows), rows)
+    for name in ('timestamp', 'acc_x', 'gyr_y', 'mag_z', 'yaw'):
+        assert column_kind(codec, rows, name) == KIND_RAW
+
+
+def test_single_off_grid_value_keeps_column_raw():
+    codec = CompactCodec(channels=['timestamp', 'acc_x'])
+    block = np.column_stack((np.arange(100) * 10.0, np.round(np.linspace(-1, 1, 100), 3)))
+    assert column_kind(codec, block, 'acc_x') == KIND_QUANT
+    block[50, 0] += 0.5
+    block[70, 1] += 1e-4
+    assert column_kind(codec, block, 'timestamp') == KIND_RAW
+    assert column_kind(codec, block, 'acc_x') == KIND_RAW
+    assert np.array_equal(roundtrip(codec, block), block)
+
+
+def test_recorded_data_is_lossless():
+    """錄製數據本身就是韌體精度，編碼不應損失任何數值"""
+    rows = np.loadtxt(SAMPLE_CSV, delimiter=',', skiprows=1)
+    codec = CompactCodec()
+    assert np.array_equal(codec.quantize(rows), rows)
+    assert np.array_equal(roundtrip(codec, rows), rows)
+
+
+def test_quantisation_limits():
+    codec = CompactCodec(channels=['acc_x'])
+    step = 10.0 ** -PRECISION['acc_x']
+    # int16 邊界兩側、負值與半個量化間隔
+    values = np.array([32767 * step, -32768 * step, 32768 * step, -32769 * step,
+                       0.0, step, -step, 1.0005, -1.0005, 2e9 * step])
+    block = codec.quantize(values[:, None])
+    assert column_kind(codec, block, 'acc_x') == KIND_QUANT
+    assert np.array_equal(roundtrip(codec, block), block)
+
+
+@pytest.mark.parametrize('value', [np.nan, np.inf, 2.0 ** 62])
+def test_unrepresentable_values_are_stored_raw(value):
+    codec = CompactCodec(channels=['gyr_x'])
+    block = np.array([[0.12], [value], [-3.45]])
+    assert column_kind(codec, block, 'gyr_x') == KIND_RAW
+    np.testing.assert_array_equal(roundtrip(codec, block), block)
+
+
+def test_constant_channels_use_const_and_rle():
+    codec = CompactCodec()
+    rows = imu_rows(4096)
+    c = CHANNEL_INDEX
+    rows[:, c['pressure']] = 0.0
+    # 溫度只變化兩次：三段 run
+    rows[:1000, c['temperature']] = 29.0
+    rows[3000:, c['temperature']] = 31.0
+    assert column_kind(codec, rows, 'pressure') == KIND_CONST
+    assert column_kind(codec, rows, 'fps') == KIND_CONST
+    assert column_kind(codec, rows, 'temperature') == KIND_RLE
+    assert np.array_equal(roundtrip(codec, rows), rows)
+    # 固定欄位幾乎不佔空間：與全部欄位都在變化的區塊相比
+    noisy = rows.copy()
+    noisy[:, c['temperature']] = np.arange(len(rows)) % 50
+    assert len(codec.encode(rows)) < len(codec.encode(noisy))
+
+
+def test_rle_not_used_for_frequently_changing_columns():
+    codec = CompactCodec(channels=['temperature'])
+    block = (np.arange(64) // 4)[:, None].astype(float)   # 16 段，每段 4 筆
+    assert column_kind(codec, block, 'temperature') == KIND_QUANT
+    assert np.array_equal(roundtrip(codec, block), block)
+
+
+@pytest.mark.parametrize('jitter', [0, 1, 200, 70000], ids=['regular', 'int8', 'int16', 'int32'])
+def test_timestamp_delta_of_delta(jitter):
+    codec = CompactCodec(channels=['timestamp', 'acc_x'])
+    rng = np.random.default_rng(jitter)
+    ts = 123456.0 + np.arange(3000) * 2.0
+    if jitter:
+        ts += rng.integers(-jitter, jitter + 1, len(ts))
+    block = np.column_stack((ts, rng.normal(0, 1, len(ts))))
+    assert column_kind(codec, block, 'timestamp') == KIND_DOD
+    decoded = roundtrip(codec, block)
+    assert np.array_equal(decoded[:, 0], ts)
+
+
+def test_timestamp_wraparound_and_short_blocks():
+    codec = CompactCodec(channels=['timestamp'])
+    wrapped = np.concatenate((np.arange(4294967290, 4294967296), np.arange(0, 6)))[:, None].astype(float)
+    assert np.array_equal(roundtrip(codec, wrapped), wrapped)
+    for n in (1, 2, 3):
+        block = (1000.0 + np.arange(n) * 5)[:, None]
+        assert np.array_equal(roundtrip(codec, block), block)
+
+
+def test_empty_block():
+    codec = CompactCodec()
+    block = np.empty((0, len(CHANNELS)))
+    assert roundtrip(codec, block).shape == (0, len(CHANNELS))
+
+
+def test_subset_column_layout():
+    channels = ['yaw', 'timestamp', 'acc_z']
+    codec = CompactCodec(channels=channels)
+    full = CompactCodec().quantize(imu_rows(3000, seed=2))
+    block = full[:, [CHANNEL_INDEX[name] for name in channels]]
+    assert np.array_equal(roundtrip(codec, block), block)
+    # 欄位順序不同時，精度跟著欄位名稱走：acc_z 的 3 位小數若套用 yaw 的 2 位就會退回原樣保存
+    assert column_kind(codec, block, 'acc_z') == KIND_QUANT
+    assert column_kind(codec, block, 'yaw') == KIND_QUANT
+    assert column_kind(codec, block, 'timestamp') == KIND_DOD
+
+
+def test_unknown_columns_are_lossless():
+    codec = CompactCodec(channels=['timestamp', 'acc_x_filtered', 'acc_x'])
+    rng = np.random.default_rng(3)
+    block = np.column_stack((np.arange(500) * 1.0, rng.normal(0, 1, 500), rng.normal(0, 1, 500)))
+    assert np.array_equal(roundtrip(codec, block), block)
+    assert column_kind(codec, block, 'acc_x_filtered') == KIND_RAW
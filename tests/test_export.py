@@ -0,0 +1,121 @@
+"""
+缺值：文字行缺少的三軸群組在陣列中為 NaN、匯出為空欄位（與原本逐筆寫 CSV 相同），
+缺少的單值欄位仍為 0；統計與濾波不受缺值影響
+"""
+
+import csv
+import re
+
+import numpy as np
+import pytest
+
+from imu_buffer import (CHANNELS, CHANNEL_INDEX, ColumnStats, csv_rows, samples_to_array,
+                        select_columns)
+from imu_filter import FilterBank, make_filter
+from imu_loader import load_imu_capture
+
+
+def test_samples_to_array_missing_fields():
+    samples = [{'timestamp': 1.0, 'accel': [0.1, 0.2, 0.3], 'gyro': [1.0, 2.0, 3.0]},
+               {'timestamp': 2.0, 'temperature': 30.0, 'mag': [4.0, 5.0, 6.0]}]
+    block = samples_to_array(samples)
+    c = CHANNEL_INDEX
+    # 單值欄位缺少時為 0（與原本 data.get(key, 0) 相同）
+    assert block[0, c['temperature']] == 0 and block[0, c['pressure']] == 0 and block[0, c['fps']] == 0
+    # 三軸群組缺少時為缺值
+    assert np.isnan(block[0, c['mag_x']:c['mag_z'] + 1]).all()
+    assert np.isnan(block[0, c['roll']:c['yaw'] + 1]).all()
+    assert np.isnan(block[1, c['acc_x']:c['gyr_z'] + 1]).all()
+    np.testing.assert_array_equal(block[1, c['mag_x']:c['mag_z'] + 1], [4.0, 5.0, 6.0])
+
+
+def test_samples_to_array_subset_columns():
+    columns = ['timestamp', 'gyr_x', 'gyr_y', 'gyr_z']
+    block = samples_to_array([{'timestamp': 1.0}, {'timestamp': 2.0, 'gyro': [1.0, 2.0, 3.0]}], columns)
+    assert np.isnan(block[0, 1:]).all()
+    np.testing.assert_array_equal(block[1], [2.0, 1.0, 2.0, 3.0])
+
+
+def test_csv_rows_writes_blank_for_missing():
+    block = np.array([[1.0, np.nan, 2.5], [2.0, 3.0, 4.0]])
+    assert csv_rows(block) == [[1.0, '', 2.5], [2.0, 3.0, 4.0]]
+    assert csv_rows(block[1:]) == [[2.0, 3.0, 4.0]]
+
+
+def test_select_columns_missing_is_nan():
+    block = np.array([[1.0, 2.0]])
+    out = select_columns(block, ['timestamp', 'acc_x'], ['timestamp', 'acc_x', 'acc_y'])
+    np.testing.assert_array_equal(out[:, :2], block)
+    assert np.isnan(out[0, 2])
+
+
+def test_column_stats_ignores_missing():
+    block = np.array([[1.0, np.nan, np.nan], [3.0, 5.0, np.nan], [5.0, 7.0, np.nan]])
+    stats = ColumnStats()
+    stats.update(block[:1])
+    stats.update(block[1:])
+    result = stats.result()
+    assert result['count'] == 3
+    np.testing.assert_allclose(result['mean'][:2], [3.0, 6.0])
+    np.testing.assert_allclose(result['std'][:2], [np.std([1, 3, 5]), 1.0])
+    np.testing.assert_array_equal(result['min'][:2], [1.0, 5.0])
+    np.testing.assert_array_equal(result['max'][:2], [5.0, 7.0])
+    assert np.isnan(result['mean'][2]) and np.isnan(result['min'][2])
+
+
+def test_filter_bank_not_poisoned_by_missing_samples():
+    bank = FilterBank()
+    bank.set('lp', [1], make_filter('lowpass', 1, 100.0, fc=10.0))
+    reference = FilterBank()
+    reference.set('lp', [1], make_filter('lowpass', 1, 100.0, fc=10.0))
+    x = np.column_stack((np.arange(200.0), np.sin(np.arange(200) / 10.0)))
+    held = x.copy()
+    x[50:53, 1] = np.nan
+    held[50:53, 1] = held[49, 1]
+    out = np.vstack([bank.process(x[i:i + 25]) for i in range(0, 200, 25)])
+    expected = np.vstack([reference.process(held[i:i + 25]) for i in range(0, 200, 25)])
+    assert np.isnan(out[50:53, 1]).all()
+    keep = np.ones(200, dtype=bool)
+    keep[50:53] = False
+    np.testing.assert_allclose(out[keep], expected[keep])
+
+
+@pytest.fixture
+def gui():
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtWidgets import QApplication
+    import imu_gui
+    app = QApplication.instance() or QApplication([])
+    window = imu_gui.IMUGUI()
+    yield window
+    window.close()
+    del app
+
+
+def test_export_writes_blank_for_missing_groups(gui, tmp_path):
+    from hi04m3_sim import MotionSource, format_arduino_line
+    source = MotionSource()
+    rows = [source.row(i / 100.0) for i in range(5)]
+    for i, row in enumerate(rows):
+        row[CHANNEL_INDEX['timestamp']] = 1000 + 10 * i
+    lines = [format_arduino_line(row) for row in rows]
+    lines[2] = re.sub(r'MAG\(uT\)=\S+', '', lines[2])   # 這一行沒有磁力計
+    lines[3] = re.sub(r'P=\S+', '', lines[3])            # 這一行沒有氣壓
+    batch = gui.parser.feed(("\n".join(lines) + "\n").encode())
+    gui.collected_data.append(batch)
+    filename = str(tmp_path / 'export.csv')
+    gui.resample_cb.setCurrentIndex(0)
+    gui.write_csv(filename)
+
+    with open(filename, newline='', encoding='utf-8') as f:
+        exported = list(csv.reader(f))
+    assert exported[0] == CHANNELS
+    c = CHANNEL_INDEX
+    assert exported[3][c['mag_x']:c['mag_z'] + 1] == ['', '', '']
+    assert exported[3][c['acc_x']] != ''
+    assert float(exported[4][c['pressure']]) == 0.0
+    assert '' not in exported[1] and 'nan' not in sum(exported, [])
+
+    loaded = load_imu_capture(filename, use_cache=False)
+    assert np.isnan(loaded[2, c['mag_x']:c['mag_z'] + 1]).all()
+    np.testing.assert_allclose(loaded[[0, 1, 3, 4], c['mag_x']], batch[[0, 1, 3, 4], c['mag_x']])
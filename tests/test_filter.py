@@ -0,0 +1,131 @@
+"""
+串流濾波：分批處理與一次處理結果相同、numpy 逐樣本實作與 scipy.signal.sosfilt 一致、
+巴特沃斯設計的頻率響應，以及 FilterBank 缺值 (NaN) 以前一筆代入
+"""
+
+import numpy as np
+import pytest
+
+import imu_filter
+from imu_filter import FilterBank, MovingAverage, SOSFilter, design_sos, make_filter
+
+FS = 1000.0
+
+
+def noisy(n, channels=3, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / FS
+    tone = np.sin(2 * np.pi * 5 * t)[:, None] * np.arange(1, channels + 1)
+    return tone + 0.5 * rng.standard_normal((n, channels)) + 2.0
+
+
+@pytest.fixture(params=['scipy', 'numpy'])
+def backend(request, monkeypatch):
+    """分別以 scipy sosfilt 與 numpy 逐樣本實作執行"""
+    if request.param == 'scipy':
+        pytest.importorskip('scipy.signal')
+        monkeypatch.setattr(imu_filter, 'sosfilt', imu_filter._NOT_LOADED)
+    else:
+        monkeypatch.setattr(imu_filter, 'sosfilt', None)
+    return request.param
+
+
+def in_batches(filt, x, cuts):
+    return np.vstack([filt.process(part) for part in np.split(x, cuts)])
+
+
+@pytest.mark.parametrize('kind, fc', [('lowpass', 50.0), ('highpass', 20.0),
+                                      ('bandpass', (10.0, 100.0)), ('notch', 60.0)])
+def test_sos_batched_matches_one_shot(backend, kind, fc):
+    x = noisy(2000)
+    sos = design_sos(kind, fc, FS, order=4)
+    whole = SOSFilter(sos, 3).process(x)
+    cuts = [1, 2, 100, 101, 777, 1500]
+    np.testing.assert_allclose(in_batches(SOSFilter(sos, 3), x, cuts), whole, rtol=1e-12, atol=1e-12)
+
+
+def test_numpy_path_matches_scipy_sosfilt(monkeypatch):
+    signal = pytest.importorskip('scipy.signal')
+    monkeypatch.setattr(imu_filter, 'sosfilt', None)
+    x = noisy(1500)
+    sos = design_sos('bandpass', (5.0, 80.0), FS, order=4)
+    # 與 SOSFilter 相同的起始狀態：以第一筆為直流輸入的穩態
+    zi = signal.sosfilt_zi(sos)[:, :, None] * x[0]
+    expected, _ = signal.sosfilt(sos, x, axis=0, zi=zi)
+    np.testing.assert_allclose(in_batches(SOSFilter(sos, 3), x, [400, 401, 1000]), expected,
+                               rtol=1e-10, atol=1e-10)
+
+
+def test_constant_input_has_no_start_transient(backend):
+    x = np.tile([1.5, -3.0, 250.0], (200, 1))
+    for kind, fc in (('lowpass', 40.0), ('notch', 50.0)):
+        np.testing.assert_allclose(SOSFilter(design_sos(kind, fc, FS, order=4), 3).process(x), x)
+    np.testing.assert_allclose(SOSFilter(design_sos('highpass', 40.0, FS), 3).process(x), 0,
+                               atol=1e-9)
+
+
+def test_lowpass_matches_butterworth_response():
+    signal = pytest.importorskip('scipy.signal')
+    sos = design_sos('lowpass', 100.0, FS, order=4)
+    reference = signal.butter(4, 100.0, fs=FS, output='sos')
+    freqs = np.linspace(1, 499, 200)
+    _, h = signal.sosfreqz(sos, freqs, fs=FS)
+    _, h_ref = signal.sosfreqz(reference, freqs, fs=FS)
+    np.testing.assert_allclose(np.abs(h), np.abs(h_ref), atol=1e-9)
+
+
+def test_design_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        design_sos('lowpass', 600.0, FS)
+    with pytest.raises(ValueError):
+        design_sos('lowpass', 50.0, FS, order=3)
+    with pytest.raises(ValueError):
+        design_sos('bandpass', (100.0, 10.0), FS)
+    with pytest.raises(ValueError):
+        design_sos('comb', 50.0, FS)
+
+
+def test_moving_average_batched_matches_convolution():
+    x = noisy(500)
+    whole = MovingAverage(7, 3).process(x)
+    np.testing.assert_allclose(in_batches(MovingAverage(7, 3), x, [1, 3, 250]), whole)
+    # 補滿開頭之後即為一般的移動平均
+    kernel = np.ones(7) / 7
+    for c in range(3):
+        np.testing.assert_allclose(whole[6:, c], np.convolve(x[:, c], kernel, mode='valid'))
+    assert isinstance(make_filter('moving_average', 3, FS, fc=100.0), MovingAverage)
+    assert make_filter('moving_average', 3, FS, fc=100.0).n == 10
+
+
+def test_filter_bank_holds_last_value_over_nan(backend):
+    x = noisy(600, channels=4)
+    gaps = x.copy()
+    gaps[100:130, 1] = np.nan          # 第二批開頭也缺值：需要上一批最後一筆
+    gaps[200:260, 1:3] = np.nan
+    held = x.copy()
+    held[100:130, 1] = held[99, 1]
+    held[200:260, 1:3] = held[199, 1:3]
+
+    bank = FilterBank()
+    bank.set('lp', [1, 2], make_filter('lowpass', 2, FS, fc=30.0))
+    out = in_batches(bank, gaps, [100, 400])
+
+    reference = make_filter('lowpass', 2, FS, fc=30.0).process(held[:, 1:3])
+    filtered = ~np.isnan(gaps[:, 1:3])
+    np.testing.assert_allclose(out[:, 1:3][filtered], reference[filtered], rtol=1e-12)
+    # 缺值處仍為缺值，狀態沒有被 NaN 污染
+    assert np.isnan(out[:, 1:3][~filtered]).all()
+    assert np.isfinite(out[260:, 1:3]).all()
+    # 未設定濾波的欄位為原值
+    np.testing.assert_array_equal(out[:, [0, 3]], x[:, [0, 3]])
+    assert bank.columns == [1, 2]
+
+
+def test_filter_bank_leading_nan_uses_zero():
+    bank = FilterBank()
+    bank.set('ma', [0], MovingAverage(2, 1))
+    out = bank.process(np.array([[np.nan], [4.0], [6.0]]))
+    np.testing.assert_allclose(out[1:, 0], [2.0, 5.0])
+    assert np.isnan(out[0, 0])
+    bank.remove('ma')
+    assert len(bank) == 0
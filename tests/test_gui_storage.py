@@ -0,0 +1,74 @@
+"""
+GUI 數據儲存：讀取線程送來的 (N, 16) 批次存入 IMUColumnBuffer，
+顯示緩衝每 divider 筆取一筆，匯出的 CSV 與收集的數據逐筆相同
+"""
+
+import csv
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+
+import imu_gui
+from imu_buffer import CHANNELS
+
+
+@pytest.fixture
+def gui(monkeypatch):
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(QMessageBox, 'information', lambda *args, **kwargs: None)
+    window = imu_gui.IMUGUI()
+    window.collecting = True
+    yield window
+    window.close()
+    del app
+
+
+def imu_batches(sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    batches = []
+    start = 0
+    for n in sizes:
+        rows = np.round(rng.normal(0, 1, (n, len(CHANNELS))), 3)
+        rows[:, 0] = 1000.0 + np.arange(start, start + n) * 10.0
+        batches.append(rows)
+        start += n
+    return batches
+
+
+def test_display_buffer_takes_every_divider_sample(gui):
+    gui.current_display_divider = 2
+    batches = imu_batches([3, 5, 4, 1, 7])
+    for batch in batches:
+        gui.on_data_received(batch)
+    collected = np.vstack(batches)
+    np.testing.assert_array_equal(gui.collected_data.view(), collected)
+    np.testing.assert_array_equal(gui.data_buffer.view(), collected[1::2])
+
+
+def test_display_buffer_keeps_latest_max_points(gui):
+    gui.current_display_divider = 1
+    gui.max_points_spin.setValue(100)
+    batches = imu_batches([64] * 4)
+    for batch in batches:
+        gui.on_data_received(batch)
+    assert len(gui.collected_data) == 256
+    np.testing.assert_array_equal(gui.data_buffer.view(), np.vstack(batches)[-100:])
+
+
+def test_export_writes_collected_rows(gui, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # 匯出時更新的擷取庫寫在暫存目錄
+    filename = str(tmp_path / 'export.csv')
+    monkeypatch.setattr(QFileDialog, 'getSaveFileName', lambda *args, **kwargs: (filename, ''))
+    batches = imu_batches([10, 25])
+    for batch in batches:
+        gui.on_data_received(batch)
+    gui.export_data()
+
+    with open(filename, newline='', encoding='utf-8') as f:
+        exported = list(csv.reader(f))
+    assert exported[0] == CHANNELS
+    np.testing.assert_array_equal(np.array(exported[1:], dtype=float), np.vstack(batches))
@@ -0,0 +1,82 @@
+"""
+HiPNUC 二進位解析：HI92 的 ts 由主機收到的時間重建，HI91 與 HI92 分開記錄
+"""
+
+import numpy as np
+
+from hi04m3_sim import MotionSource, format_hi91_frame, format_hi92_frame
+from imu_buffer import CHANNEL_INDEX
+from imu_hipnuc import HiPNUCParser, TAG_HI91
+from imu_library import GapCounter
+from imu_rate import RatePlanner
+
+
+def hi92_stream(n, rate=500.0):
+    source = MotionSource()
+    frames = []
+    for i in range(n):
+        row = source.row(i / rate)
+        row[CHANNEL_INDEX['timestamp']] = i * 1000.0 / rate
+        frames.append(format_hi92_frame(row))
+    return frames
+
+
+def feed_reads(parser, frames, per_read, read_ms, stall_after=None, stall_ms=0.0):
+    """每 read_ms 讀到 per_read 幀；回傳所有批次串接的 ts"""
+    host_ns = 1_000_000_000
+    out = []
+    for k, i in enumerate(range(0, len(frames), per_read)):
+        host_ns += int(read_ms * 1e6)
+        if k == stall_after:
+            host_ns += int(stall_ms * 1e6)
+        batch = parser.feed(b''.join(frames[i:i + per_read]), host_ns)
+        out.append(batch[:, 0])
+    return np.concatenate(out)
+
+
+def test_hi92_rate_measured_from_arrival():
+    # 設定的 ONTIME 間隔 (10 ms) 與實際 500 Hz 不符：規劃仍依量測
+    parser = HiPNUCParser(interval_ms=10.0)
+    ts = feed_reads(parser, hi92_stream(2500), per_read=5, read_ms=10.0)
+    assert np.all(np.diff(ts) > 0)
+    planner = RatePlanner()
+    plans = [planner.update(ts[i:i + 5]) for i in range(0, len(ts), 5)]
+    plans = [plan for plan in plans if plan is not None]
+    assert plans and abs(plans[-1].rate - 500.0) < 10
+
+
+def test_hi92_stall_shows_as_gap():
+    parser = HiPNUCParser(interval_ms=2.0)
+    ts = feed_reads(parser, hi92_stream(1000), per_read=5, read_ms=10.0, stall_after=100, stall_ms=200.0)
+    assert np.all(np.diff(ts) > 0)
+    counter = GapCounter(500.0)
+    counter.update(ts)
+    assert counter.gaps == 1
+    assert 90 <= counter.missing <= 110
+
+
+def test_hi92_ts_continue_across_reset():
+    parser = HiPNUCParser(interval_ms=2.0)
+    frames = hi92_stream(100)
+    first = feed_reads(parser, frames, per_read=5, read_ms=10.0)
+    parser.reset()
+    batch = parser.feed(b''.join(frames[:5]), 10_000_000_000)
+    assert batch[0, 0] > first[-1]
+
+
+def test_mixed_hi91_hi92_kept_separate():
+    source = MotionSource()
+    frames = []
+    for i in range(200):
+        row = source.row(i / 500.0)
+        row[CHANNEL_INDEX['timestamp']] = 100000 + 2 * i
+        frames.append(format_hi91_frame(row) + format_hi92_frame(row))
+    parser = HiPNUCParser(interval_ms=2.0)
+    batch = parser.feed(b''.join(frames[:100]), 1_000_000_000)
+    batch = np.vstack((batch, parser.feed(b''.join(frames[100:]), 1_200_000_000)))
+    assert parser.imu_tag == TAG_HI91
+    np.testing.assert_array_equal(batch[:, 0], 100000 + 2 * np.arange(200))
+    name, secondary = parser.take_secondary()
+    assert name == 'HI92' and len(secondary) == 200
+    assert np.all(np.diff(secondary[:, 0]) > 0)
+    assert parser.take_secondary() is None
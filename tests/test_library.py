@@ -0,0 +1,155 @@
+"""
+擷取庫：寫檔時記錄的 session 與讀回的索引一致（統計、掉資料、中繼資料），
+依條件/統計查詢，以及 scan、open、prune
+"""
+
+import csv
+import os
+import time
+
+import numpy as np
+import pytest
+
+from imu_buffer import csv_rows
+from imu_library import (KIND_IMU, KIND_VOLTAGE, CaptureLibrary, SessionRecorder,
+                         format_session, guess_kind)
+
+COLUMNS = ['timestamp', 'acc_x', 'gyr_z']
+
+
+def capture(n=1000, rate=100.0, drop=(), seed=0, spin=1.0):
+    """ts 間隔 1000/rate ms 的 (N, 3) 數據；drop 為要移除的樣本編號"""
+    rng = np.random.default_rng(seed)
+    ts = np.arange(n) * (1000.0 / rate) + 5000.0
+    data = np.column_stack((ts, rng.normal(0.0, 0.01, n), rng.normal(0.0, spin, n)))
+    return np.delete(data, list(drop), axis=0)
+
+
+def write_csv(path, data, columns=COLUMNS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(csv_rows(data))
+    return str(path)
+
+
+def record(library, path, data, rate=100.0, chunk=128, **meta):
+    """與 GUI 匯出相同：寫檔時逐區塊累計，寫完加入擷取庫"""
+    recorder = SessionRecorder(COLUMNS, rate)
+    for i in range(0, len(data), chunk):
+        recorder.update(data[i:i + chunk])
+    write_csv(path, data)
+    return recorder.finish(library, path, KIND_IMU, **meta)
+
+
+@pytest.fixture
+def library(tmp_path):
+    library = CaptureLibrary(str(tmp_path / 'library.sqlite'))
+    yield library
+    library.close()
+
+
+def test_recorded_session_round_trip(tmp_path, library):
+    data = capture(drop=[100, 101, 102, 500])
+    path = tmp_path / 'imu_data_20240102_030405.csv'
+    calibration = {'gyro_bias': [0.1, 0.2, 0.3]}
+    session_id = record(library, path, data, port='/dev/ttyUSB0', baud=921600,
+                        device='SN:A1', calibration=calibration, notes='bench')
+
+    session = library.get(session_id)
+    assert session['path'] == os.path.abspath(path)
+    assert session['kind'] == KIND_IMU
+    assert session['started'] == time.mktime(time.strptime('20240102_030405', '%Y%m%d_%H%M%S'))
+    assert session['samples'] == len(data)
+    assert session['duration'] == pytest.approx((data[-1, 0] - data[0, 0]) / 1000.0)
+    assert session['rate'] == 100.0
+    assert (session['gaps'], session['missing']) == (2, 4)
+    assert (session['port'], session['baud'], session['device']) == ('/dev/ttyUSB0', 921600, 'SN:A1')
+    assert session['calibration'] == calibration
+    assert session['columns'] == COLUMNS
+    assert session['file_size'] == os.path.getsize(path)
+
+    stats = library.channel_stats(session_id)
+    assert set(stats) == set(COLUMNS)
+    for i, name in enumerate(COLUMNS):
+        assert stats[name]['mean'] == pytest.approx(data[:, i].mean())
+        assert stats[name]['std'] == pytest.approx(data[:, i].std(), rel=1e-6)
+        assert stats[name]['min'] == data[:, i].min()
+        assert stats[name]['max'] == data[:, i].max()
+    assert "imu_data_20240102_030405.csv" in format_session(session)
+
+    # 重新開啟資料庫仍在；由檔案補建的索引與寫檔時記錄的一致
+    reopened = CaptureLibrary(library.path)
+    try:
+        assert reopened.get(session_id) == session
+    finally:
+        reopened.close()
+    indexed = library.get(library.index_file(str(path)))
+    for key in ('path', 'kind', 'started', 'samples', 'gaps', 'missing', 'columns'):
+        assert indexed[key] == session[key]
+    assert indexed['rate'] == pytest.approx(100.0)
+    assert len(library) == 1                    # 同一路徑取代舊的 session
+
+
+def test_query_filters_and_stats(tmp_path, library):
+    ids = {}
+    for name, rate, port, spin in (('imu_data_20240101_000000.csv', 100.0, 'COM3', 0.01),
+                                   ('imu_data_20240201_000000.csv', 200.0, 'COM3', 20.0),
+                                   ('imu_data_20240301_000000.csv', 200.0, 'COM4', 0.02)):
+        ids[name[9:15]] = record(library, tmp_path / name, capture(rate=rate, spin=spin),
+                                 rate=rate, port=port)
+    feb = time.mktime(time.strptime('20240201', '%Y%m%d'))
+
+    def found(sessions):
+        return [s['id'] for s in sessions]
+
+    assert found(library.sessions()) == [ids['202403'], ids['202402'], ids['202401']]
+    assert found(library.sessions(order='started', limit=2)) == [ids['202401'], ids['202402']]
+    assert found(library.sessions(port='COM3', min_rate=150)) == [ids['202402']]
+    assert found(library.sessions(since=feb)) == [ids['202403'], ids['202402']]
+    assert found(library.sessions(until=feb, kind=KIND_IMU)) == [ids['202401']]
+    assert found(library.sessions(kind=KIND_VOLTAGE)) == []
+    assert found(library.sessions(port=None)) == found(library.sessions())
+    # 依欄位統計：只有二月那次有明顯轉動
+    assert found(library.where_stat('gyr_z', min_std=5)) == [ids['202402']]
+    assert found(library.where_stat('gyr_z', max_std=5)) == [ids['202403'], ids['202401']]
+    with pytest.raises(ValueError):
+        library.sessions(channel='gyr_z')
+    with pytest.raises(ValueError):
+        library.sessions(order='path; DROP TABLE sessions')
+    with pytest.raises(KeyError):
+        library.get(999)
+
+
+def test_scan_open_and_prune(tmp_path, library):
+    data = capture(n=300)
+    imu_path = write_csv(tmp_path / 'imu_data_20240102_030405.csv', data)
+    voltage = np.column_stack((np.arange(50) * 0.01, np.sin(np.arange(50))))
+    volt_path = write_csv(tmp_path / 'AD9106_data_20240102_030406.csv', voltage,
+                          ['Timestamp_ms', 'Voltage_V'])
+    write_csv(tmp_path / 'notes.csv', data)                  # 不是擷取檔
+    (tmp_path / 'imu_data_broken.csv').write_text('timestamp,acc_x\n1,abc\n')   # 無法解析
+
+    added, failed = library.scan(str(tmp_path))
+    assert len(added) == 2 and [os.path.basename(p) for p, _ in failed] == ['imu_data_broken.csv']
+    kinds = {os.path.basename(s['path']): s['kind'] for s in library.sessions()}
+    assert kinds == {'imu_data_20240102_030405.csv': KIND_IMU,
+                     'AD9106_data_20240102_030406.csv': KIND_VOLTAGE}
+    # 沒有變更的檔案不再索引
+    assert library.scan(str(tmp_path))[0] == []
+
+    imu_id = library.sessions(kind=KIND_IMU)[0]['id']
+    columns, loaded = library.open(imu_id, use_cache=False)
+    assert columns == COLUMNS
+    np.testing.assert_allclose(loaded, data)
+
+    os.remove(volt_path)
+    assert library.prune() == 1
+    assert [s['path'] for s in library.sessions()] == [os.path.abspath(imu_path)]
+
+
+def test_guess_kind():
+    assert guess_kind('x.csv', ['Timestamp_ms', 'Voltage_V']) == KIND_VOLTAGE
+    assert guess_kind('x.csv', COLUMNS) == KIND_IMU
+    assert guess_kind('AD9106_data_1.csv') == KIND_VOLTAGE
+    assert guess_kind('other.csv', ['a', 'b']) is None
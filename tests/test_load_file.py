@@ -0,0 +1,101 @@
+"""
+開啟已匯出的檔案：主機時間橫軸與匯出使用檔案的 host_time 欄位，而不是即時的 timebase
+"""
+
+import csv
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+import imu_gui
+from imu_buffer import CHANNELS
+
+
+@pytest.fixture
+def gui(monkeypatch):
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(QMessageBox, 'information', lambda *args, **kwargs: None)
+    monkeypatch.setattr(QMessageBox, 'critical', lambda *args, **kwargs: None)
+    window = imu_gui.IMUGUI()
+    window.init_plot()
+    # 即時的 timebase 已就緒（之前連線過裝置），其換算與檔案無關
+    host_ns = time.monotonic_ns()
+    for k in range(5):
+        window.timebase.observe(k * 1000.0, host_ns + k * 2_000_000_000)
+    assert window.timebase.ready
+    yield window
+    window.close()
+    del app
+
+
+def write_capture(path, n=400, host_time=True):
+    ts = 1000.0 + np.arange(n) * 10.0
+    # 中途主機時間多了 3 秒（例如掉線重連），與任何線性換算都不同
+    host = 1.7e9 + ts / 1000.0 + np.where(np.arange(n) >= n // 2, 3.0, 0.0)
+    rows = np.zeros((n, len(CHANNELS)))
+    rows[:, 0] = ts
+    rows[:, CHANNELS.index('acc_x')] = np.sin(np.arange(n) / 20.0)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CHANNELS + (['host_time'] if host_time else []))
+        for row, h in zip(rows.tolist(), host):
+            writer.writerow(row + ([h] if host_time else []))
+    return ts, host
+
+
+def plotted_x(window):
+    window.host_time_cb.setChecked(True)
+    assert window.draw_plots()
+    return np.asarray(window.renderer._lines[0][0].get_xdata())
+
+
+def test_host_time_axis_uses_file_column(gui, tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    ts, host = write_capture(path)
+    gui.max_points_spin.setValue(len(ts))
+    gui.load_file(path)
+    assert gui.loaded_file == path and gui.file_clock is not None
+    shown = gui.data_buffer.view()[:, 0]
+    expected = np.interp(shown, ts, host)
+    np.testing.assert_allclose(plotted_x(gui), expected - expected[-1], atol=1e-6)
+
+
+def test_file_without_host_time_uses_sensor_time(gui, tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_capture(path, host_time=False)
+    gui.load_file(path)
+    assert gui.file_clock is None
+    shown = gui.data_buffer.view()[:, 0]
+    np.testing.assert_allclose(plotted_x(gui), (shown - shown[-1]) / 1000.0)
+    # 匯出也不能用即時的 timebase 捏造 host_time
+    gui.host_time_cb.setChecked(True)
+    out = str(tmp_path / 'export.csv')
+    gui.write_csv(out)
+    with open(out, encoding='utf-8') as f:
+        assert 'host_time' not in f.readline()
+
+
+def test_export_keeps_file_host_time(gui, tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    ts, host = write_capture(path)
+    gui.load_file(path)
+    gui.host_time_cb.setChecked(True)
+    gui.resample_cb.setCurrentIndex(0)
+    out = str(tmp_path / 'export.csv')
+    gui.write_csv(out)
+    exported = np.loadtxt(out, delimiter=',', skiprows=1)
+    np.testing.assert_allclose(exported[:, -1], host, atol=1e-6)
+
+
+def test_clear_returns_to_live_timebase(gui, tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_capture(path)
+    gui.load_file(path)
+    gui.clear_data()
+    assert gui.loaded_file is None
+    assert gui.host_clock() == gui.timebase.to_wall
@@ -0,0 +1,112 @@
+"""
+管線量測：一次短暫解析後的計數器，以及串口 in_waiting 峰值取自讀取前的 OS 緩衝（不是每次讀到的位元組數）
+"""
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from hi04m3_sim import MotionSource, format_arduino_line
+from imu_acquire import AcquisitionLoop, AsyncSerial, SerialDevice
+from imu_gui import IMUDataParser
+from imu_metrics import PipelineMetrics, format_snapshot
+
+
+def text_lines(n):
+    source = MotionSource()
+    lines = []
+    for i in range(n):
+        row = source.row(i / 100.0)
+        row[0] = i * 10
+        lines.append(format_arduino_line(row) + "\n")
+    return lines
+
+
+def test_parse_run_counters():
+    metrics = PipelineMetrics(enabled=True)
+    parser = IMUDataParser(metrics)
+    lines = text_lines(30)
+    lines.insert(10, "ts=garbled\n")            # 有 ts= 但無法解析
+    lines.insert(20, "\n")                      # 空行：分行但不解析
+    raw = "".join(lines).encode('ascii')
+    chunks = [raw[i:i + 700] for i in range(0, len(raw), 700)]
+    rows = sum(len(batch) for batch in map(parser.feed, chunks) if batch is not None)
+
+    snap = metrics.snapshot()
+    assert rows == 30
+    assert snap['bytes_in'] == len(raw)
+    assert snap['lines_framed'] == len(lines)
+    assert snap['samples_parsed'] == 30
+    assert snap['parse_failures'] == 1
+    assert metrics.time_calls['frame'] == len(chunks)
+    assert 0 < metrics.time_calls['parse'] <= len(chunks)
+    assert snap['frame_max_us'] >= snap['frame_avg_us'] > 0
+    assert "30 成功 / 1 失敗" in format_snapshot(snap)
+
+
+def test_disabled_metrics_count_nothing():
+    metrics = PipelineMetrics()
+    IMUDataParser(metrics).feed("".join(text_lines(5)).encode('ascii'))
+    assert not any(metrics.counts.values()) and not any(metrics.time_calls.values())
+
+
+class BackloggedPort:
+    """in_waiting 回報 OS 緩衝中累積的量，但每次 read 最多取回 chunk 位元組（例如驅動限制）"""
+
+    def __init__(self, backlog, chunk):
+        self.backlog = backlog
+        self.chunk = chunk
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return self.backlog
+
+    def read(self, size):
+        n = min(size, self.chunk, self.backlog)
+        self.backlog -= n
+        if not self.backlog:
+            self.is_open = False
+        return b'x' * n
+
+
+def test_async_serial_reports_in_waiting_before_read():
+    seen = []
+    port = BackloggedPort(5000, 1024)
+    reader = AsyncSerial(port, observe=seen.append)
+
+    async def drain():
+        return [len(await reader.read()) for _ in range(5)]
+
+    sizes = asyncio.run(drain())
+    assert sizes == [1024, 1024, 1024, 1024, 904]
+    assert seen == [5000, 3976, 2952, 1928, 904]
+
+
+class Sink:
+    def __init__(self):
+        self.delivered = []
+
+    async def deliver(self, args):
+        self.delivered.append(args)
+
+
+def test_serial_device_feeds_backlog_peak():
+    metrics = PipelineMetrics(enabled=True)
+    acquisition = AcquisitionLoop(name='test-metrics').start()
+    sink = Sink()
+    try:
+        device = SerialDevice(BackloggedPort(3000, 256), lambda raw, host_ns: (len(raw),), sink,
+                              observe_serial=metrics.observe_serial).start(acquisition)
+        deadline = time.monotonic() + 2.0
+        while sum(n for n, in sink.delivered) < 3000 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        device.stop()
+    finally:
+        acquisition.stop()
+    assert sum(n for n, in sink.delivered) == 3000
+    # 峰值是積壓量而不是單次讀取的 256 位元組
+    assert metrics.snapshot()['serial_peak'] == 3000
@@ -0,0 +1,41 @@
+"""
+文字格式解析器 IMUDataParser
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from hi04m3_sim import MotionSource, format_arduino_line
+from imu_gui import IMUDataParser
+from imu_metrics import PipelineMetrics
+
+
+class TogglingMetrics(PipelineMetrics):
+    """每次讀取 enabled 都切換一次（第一次為關閉），模擬處理途中打開除錯面板"""
+
+    def __init__(self):
+        super().__init__()
+        self._reads = 0
+
+    @property
+    def enabled(self):
+        self._reads += 1
+        return self._reads % 2 == 0
+
+    @enabled.setter
+    def enabled(self, value):
+        pass
+
+
+def test_feed_survives_metrics_toggle():
+    source = MotionSource()
+    lines = []
+    for i in range(20):
+        row = source.row(i / 100.0)
+        row[0] = i * 10
+        lines.append(format_arduino_line(row) + "\n")
+    parser = IMUDataParser(TogglingMetrics())
+    batch = parser.feed("".join(lines).encode('ascii'))
+    np.testing.assert_array_equal(batch[:, 0], np.arange(20) * 10)
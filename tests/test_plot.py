@@ -0,0 +1,114 @@
+"""
+繪圖後端：峰值降取樣與 MatplotlibRenderer 的 blitting（只在範圍改變時重畫座標軸）
+"""
+
+import numpy as np
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+from imu_plot import MatplotlibRenderer, Panel, peak_decimate
+
+
+@pytest.mark.parametrize('n', [50000, 50001, 1999, 120])
+def test_peak_decimate_keeps_extremes(n):
+    rng = np.random.default_rng(n)
+    x = np.arange(n, dtype=float)
+    y = np.cumsum(rng.standard_normal(n))
+    bins = 1000
+    dx, dy = peak_decimate(x, y, bins)
+    assert len(dx) <= 2 * bins + 2 * max(n // bins, 1) + 2
+    assert dy.min() == y.min() and dy.max() == y.max()
+    assert dx[0] == x[0] and dx[-1] == x[-1] and dy[-1] == y[-1]
+    assert np.all(np.diff(dx) >= 0)
+
+
+@pytest.fixture
+def renderer():
+    app = QApplication.instance() or QApplication([])
+    renderer = MatplotlibRenderer(figsize=(8, 6))
+    renderer.widget.resize(800, 600)
+    renderer.widget.show()
+    app.processEvents()
+    full_draws = []
+    renderer.widget.mpl_connect('draw_event', lambda event: full_draws.append(event))
+    renderer.set_panels([Panel("Acc", ('X', 'Y', 'Z')), Panel("Gyr", ('X', 'Y', 'Z'))])
+    yield renderer, full_draws
+    renderer.widget.close()
+
+
+def series(n, offset=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return [[np.sin(np.arange(n) / 50.0 + k) + offset + 0.01 * rng.standard_normal(n) for k in range(3)]
+            for _ in range(2)]
+
+
+def test_redraws_axes_only_when_limits_change(renderer):
+    renderer, full_draws = renderer
+    x = np.arange(50000)
+    renderer.draw(x, series(50000))
+    after_first = len(full_draws)
+    for seed in range(1, 10):
+        renderer.draw(x, series(50000, seed=seed))   # 仍在範圍內：只 blit
+    assert len(full_draws) == after_first
+    renderer.draw(x, series(50000, offset=5.0))      # 超出 y 範圍：重畫座標軸
+    assert len(full_draws) == after_first + 1
+    for ax in renderer._axes:
+        lo, hi = ax.get_ylim()
+        assert lo <= 4.0 and hi >= 6.0
+        assert ax.get_xlim()[0] <= 0 and ax.get_xlim()[1] >= 49999
+
+
+def test_limits_shrink_when_data_range_collapses(renderer):
+    renderer, full_draws = renderer
+    x = np.arange(1000)
+    renderer.draw(x, series(1000))
+    flat = [[np.full(1000, 0.5) + 0.001 * k for k in range(3)] for _ in range(2)]
+    renderer.draw(x, flat)
+    lo, hi = renderer._axes[0].get_ylim()
+    assert hi - lo < 0.5
+
+
+def test_resize_recaptures_background(renderer):
+    renderer, full_draws = renderer
+    x = np.arange(1000)
+    renderer.draw(x, series(1000))
+    old = renderer._backgrounds
+    renderer.widget.resize(600, 400)
+    QApplication.processEvents()
+    renderer.widget.draw()
+    assert renderer._backgrounds is not old
+    renderer.draw(x, series(1000, seed=3))
+
+
+def test_line_data_follows_input(renderer):
+    renderer, _ = renderer
+    x = np.arange(100)
+    data = series(100)
+    renderer.draw(x, data)
+    for lines, ys in zip(renderer._lines, data):
+        for line, y in zip(lines, ys):
+            np.testing.assert_array_equal(line.get_ydata(), y)
+
+
+def test_pyqtgraph_decimates_to_pixel_width():
+    pytest.importorskip('pyqtgraph')
+    from imu_plot import PyQtGraphRenderer
+    app = QApplication.instance() or QApplication([])
+    renderer = PyQtGraphRenderer()
+    renderer.widget.resize(800, 600)
+    renderer.widget.show()
+    try:
+        renderer.set_panels([Panel("Acc", ('X', 'Y', 'Z'), overlay_labels=('X lp',))])
+        app.processEvents()
+        width = int(renderer._plots[0].getViewBox().width())
+        assert 100 < width <= 800
+        x = np.arange(50000)
+        data = series(50000)
+        renderer.draw(x, data[:1], [(x, [data[0][0] * 0.5])])
+        for curve, y in zip(renderer._curves[0], data[0] + [data[0][0] * 0.5]):
+            cx, cy = curve.getData()
+            assert len(cx) <= 2 * width + 2 * (50000 // width + 1) + 2
+            assert cy.min() == y.min() and cy.max() == y.max()
+            assert cx[-1] == x[-1] and cy[-1] == y[-1]
+    finally:
+        renderer.widget.close()
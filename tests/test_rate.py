@@ -0,0 +1,112 @@
+"""
+採樣頻率規劃：由頻率推導的顯示點數與佇列長度，以及 RatePlanner.plan 只由擷取線程寫入
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from imu_rate import DISPLAY_SECONDS, RatePlan, RatePlanner
+
+RATES = [0.5, 10, 50, 100, 250, 500, 1000]
+
+
+@pytest.mark.parametrize('rate', RATES)
+def test_plan_sizes_follow_rate(rate):
+    plan = RatePlan(rate)
+    display_rate = rate / plan.display_divider
+    assert 100 <= plan.max_points <= 100000
+    if 100 < display_rate * DISPLAY_SECONDS < 100000:
+        assert plan.max_points == int(display_rate * DISPLAY_SECONDS)
+    # 記錄佇列至少容納半秒的讀取批次（每次讀取最多一批）
+    assert plan.record_queue >= min(rate, 500) * 0.5
+    assert plan.display_queue >= 4
+
+
+def test_default_plan_keeps_previous_sizes():
+    plan = RatePlan(100.0)
+    assert plan.max_points == 10000
+    assert plan.record_queue == 50
+
+
+def test_queues_grow_with_rate():
+    plans = [RatePlan(rate) for rate in RATES]
+    assert [p.record_queue for p in plans] == sorted(p.record_queue for p in plans)
+    assert [p.display_queue for p in plans] == sorted(p.display_queue for p in plans)
+
+
+def ts_batches(rate, seconds, batch=10, start=0.0):
+    ts = start + np.arange(int(rate * seconds)) * (1000.0 / rate)
+    return [ts[i:i + batch] for i in range(0, len(ts), batch)]
+
+
+def test_adopted_plan_is_compared_with_measurements():
+    planner = RatePlanner()
+    planner.adopt(RatePlan(200.0))
+    assert all(planner.update(ts) is None for ts in ts_batches(200.0, 3))
+    plans = [plan for plan in map(planner.update, ts_batches(1000.0, 3, start=3000.0)) if plan is not None]
+    assert plans and plans[-1].rate == 1000.0 and planner.plan is plans[-1]
+
+
+class RecordingPlanner(RatePlanner):
+    """記錄寫入 plan 的線程"""
+
+    def __setattr__(self, name, value):
+        if name == 'plan':
+            self.__dict__.setdefault('writers', []).append(threading.current_thread().name)
+        super().__setattr__(name, value)
+
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason="需要 pty")
+def test_gui_plan_written_only_on_acquisition_thread(monkeypatch, tmp_path):
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    import imu_gui
+    from hi04m3_sim import HI04M3Simulator
+
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(QMessageBox, 'information', lambda *args, **kwargs: None)
+    sim = HI04M3Simulator(link=str(tmp_path / 'ttyIMU')).start()
+    window = imu_gui.IMUGUI()
+    try:
+        planner = RecordingPlanner()
+        planner.plan = window.rate_plan
+        planner.writers.clear()
+        window.rate_planner = planner
+
+        def spin(until, timeout=5.0):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                app.processEvents()
+                if until():
+                    return True
+                time.sleep(0.005)
+            return False
+
+        window.port_cb.setEditText(sim.link)
+        window.connect_serial()
+        window.freq_cb.setEditText("500")
+        window.apply_sampling_frequency()
+        window.start_collecting()
+        assert spin(lambda: window.rate_plan.rate == 500.0)
+        plan = window.rate_plan
+        assert window.max_points_spin.value() == plan.max_points
+        assert window.record_queue.maxlen == plan.record_queue
+        assert window.display_queue.maxlen == plan.display_queue
+
+        # GUI 決定的頻率：GUI 立即套用，planner 在擷取線程採用
+        window.set_sample_rate(200.0)
+        assert window.rate_plan.rate == 200.0
+        window.acquisition.submit(_noop()).result(2.0)
+        assert planner.writers
+        assert set(planner.writers) == {window.acquisition.name}
+    finally:
+        window.close()
+        sim.stop()
+
+
+async def _noop():
+    pass
@@ -0,0 +1,97 @@
+"""
+串流重新取樣：分批推入與一次推入結果相同、均勻網格不重複不遺漏，
+以及重複與亂序時間戳（含跨批次邊界）被略過
+"""
+
+import numpy as np
+import pytest
+
+from imu_resample import StreamingResampler, resample_series
+
+RATE = 100.0      # Hz，網格間隔 10 ms
+
+
+def jittered(n, seed=0):
+    """約 9 ms 間隔、帶抖動的 (ts, 兩個通道) 區塊"""
+    rng = np.random.default_rng(seed)
+    ts = 1000.0 + np.cumsum(rng.uniform(6.0, 12.0, n))
+    return np.column_stack((ts, np.sin(ts / 50.0), np.cos(ts / 80.0) * 3.0))
+
+
+def push_all(resampler, block, cuts):
+    return np.vstack([resampler.push(part) for part in np.split(block, cuts)])
+
+
+@pytest.mark.parametrize('kind', ['linear', 'cubic'])
+def test_batched_matches_one_shot(kind):
+    block = jittered(500)
+    whole = StreamingResampler(RATE, kind).push(block)
+    for cuts in ([1], [1, 2, 3], [100, 101, 250, 499], list(range(7, 500, 7))):
+        batched = push_all(StreamingResampler(RATE, kind), block, cuts)
+        np.testing.assert_allclose(batched, whole, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('kind', ['linear', 'cubic'])
+def test_uniform_grid_within_input_span(kind):
+    block = jittered(300)
+    out = push_all(StreamingResampler(RATE, kind), block, [50, 51, 200])
+    t = out[:, 0]
+    assert t[0] == block[0, 0]
+    np.testing.assert_allclose(np.diff(t), 1000.0 / RATE)
+    assert t[-1] <= block[-1, 0]
+    # 線性內插對線性訊號是精確的（三次 Hermite 的有限差分斜率亦然）
+    line = block.copy()
+    line[:, 1] = 0.25 * line[:, 0] - 7.0
+    out = StreamingResampler(RATE, kind).push(line)
+    np.testing.assert_allclose(out[:, 1], 0.25 * out[:, 0] - 7.0)
+
+
+def test_linear_interpolates_between_neighbours():
+    block = np.array([[0.0, 0.0], [15.0, 3.0], [20.0, -2.0], [40.0, 2.0]])
+    out = StreamingResampler(RATE).push(block)
+    np.testing.assert_allclose(out, [[0.0, 0.0], [10.0, 2.0], [20.0, -2.0], [30.0, 0.0],
+                                     [40.0, 2.0]])
+
+
+@pytest.mark.parametrize('kind', ['linear', 'cubic'])
+def test_duplicate_and_out_of_order_timestamps_skipped(kind):
+    block = jittered(200)
+    messy = list(block)
+    messy.insert(50, block[49] + [0.0, 99.0, 99.0])       # 重複 ts
+    messy.insert(120, block[100])                         # 亂序：回到較早的時間
+    messy.insert(121, block[118] + [-0.5, 99.0, 99.0])    # 早於前一筆的最大值
+    messy = np.array(messy)
+    expected = StreamingResampler(RATE, kind).push(block)
+    np.testing.assert_allclose(StreamingResampler(RATE, kind).push(messy), expected)
+    np.testing.assert_allclose(push_all(StreamingResampler(RATE, kind), messy, [50, 120, 121]),
+                               expected, rtol=1e-12, atol=1e-12)
+
+
+def test_duplicate_across_batch_boundary():
+    block = jittered(100)
+    resampler = StreamingResampler(RATE)
+    first = resampler.push(block[:40])
+    # 下一批重複上一批的最後一筆（重送）
+    second = resampler.push(np.vstack((block[39] + [0.0, 5.0, 5.0], block[40:])))
+    np.testing.assert_allclose(np.vstack((first, second)), StreamingResampler(RATE).push(block))
+
+
+def test_cubic_waits_for_next_sample():
+    resampler = StreamingResampler(RATE, 'cubic')
+    assert len(resampler.push(np.array([[0.0, 1.0]]))) == 0
+    out = resampler.push(np.array([[10.0, 2.0], [20.0, 3.0]]))
+    np.testing.assert_allclose(out[:, 0], [0.0, 10.0])
+
+
+def test_reset_and_series_helper():
+    block = jittered(100)
+    resampler = StreamingResampler(RATE)
+    resampler.push(block[:50])
+    resampler.reset()
+    np.testing.assert_allclose(resampler.push(block[50:]), StreamingResampler(RATE).push(block[50:]))
+    # 時間單位為秒
+    times, values = resample_series(block[:, 0] / 1000.0, block[:, 1], RATE, time_unit=1.0)
+    np.testing.assert_allclose(np.diff(times), 1.0 / RATE)
+    assert len(values) == len(times)
+    with pytest.raises(ValueError):
+        StreamingResampler(RATE, 'nearest')
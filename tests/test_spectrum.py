@@ -0,0 +1,91 @@
+"""
+頻譜：RollingSpectrogram 與 WelchPSD 的峰值頻率，以及分批加入與一次加入結果相同
+"""
+
+import numpy as np
+import pytest
+
+from imu_spectrum import RollingSpectrogram, WelchPSD
+
+RATE = 512.0
+
+
+def tones(n, freqs, noise=0.0, seed=0):
+    """每個通道一個正弦波 (n, 通道數)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / RATE
+    block = np.column_stack([np.sin(2 * np.pi * f * t + k) for k, f in enumerate(freqs)])
+    return block + noise * rng.standard_normal(block.shape)
+
+
+def split(block, seed):
+    """把區塊切成隨機長度的批次（含空批次與大於工作緩衝區的批次）"""
+    rng = np.random.default_rng(seed)
+    cuts = np.sort(rng.integers(0, len(block), 12))
+    cuts = np.concatenate((cuts, [cuts[-1]], [len(block)]))
+    return np.split(block, cuts)
+
+
+def test_spectrogram_peak_at_tone_frequency():
+    freqs = [50.0, 122.0, 8.0]
+    spec = RollingSpectrogram(3, RATE)
+    spec.push(tones(4096, freqs))
+    for channel, f in enumerate(freqs):
+        latest = spec.image(channel)[:, -1]
+        assert spec.freqs[np.argmax(latest)] == f
+        # 其他頻率遠低於峰值
+        assert latest.max() - np.median(latest) > 60
+
+
+@pytest.mark.parametrize('n', [200, 5000, 30000], ids=['partial', 'frames', 'wraps-history'])
+def test_spectrogram_batches_match_single_push(n):
+    block = tones(n, [20.0, 70.0], noise=0.1)
+    whole = RollingSpectrogram(2, RATE, history=100)
+    whole.push(block)
+    batched = RollingSpectrogram(2, RATE, history=100)
+    pushed = sum(batched.push(part) for part in split(block, n))
+    assert pushed == batched.frame_count == whole.frame_count == max((n - 256) // 64 + 1, 0)
+    for channel in range(2):
+        np.testing.assert_allclose(batched.image(channel), whole.image(channel), atol=1e-9)
+
+
+def test_spectrogram_reset():
+    spec = RollingSpectrogram(1, RATE)
+    spec.push(tones(1000, [30.0]))
+    spec.reset()
+    assert spec.frame_count == 0
+    assert spec.push(tones(255, [30.0])) == 0
+    assert (spec.image(0) == -120.0).all()
+
+
+def test_welch_peak_and_power():
+    freqs = [32.0, 100.0]
+    psd = WelchPSD(2, RATE, nfft=512)
+    assert psd.result() is None
+    psd.push(tones(20000, freqs))
+    f, power = psd.result()
+    df = f[1] - f[0]
+    for channel, tone in enumerate(freqs):
+        assert f[np.argmax(power[channel])] == tone
+        # 單位振幅正弦波的功率為 1/2
+        assert np.sum(power[channel]) * df == pytest.approx(0.5, rel=0.02)
+
+
+def test_welch_white_noise_level():
+    rng = np.random.default_rng(1)
+    psd = WelchPSD(1, RATE, nfft=256)
+    psd.push(rng.normal(0, 2.0, (100000, 1)))
+    f, power = psd.result()
+    # 白雜訊：單邊功率譜密度為 2σ²/fs
+    assert np.median(power[0, 1:-1]) == pytest.approx(2 * 4.0 / RATE, rel=0.1)
+
+
+def test_welch_batches_match_single_push():
+    block = tones(9000, [12.0, 60.0], noise=0.3)
+    whole = WelchPSD(2, RATE, nfft=512)
+    whole.push(block)
+    batched = WelchPSD(2, RATE, nfft=512)
+    for part in split(block, 3):
+        batched.push(part)
+    assert batched.frame_count == whole.frame_count
+    np.testing.assert_allclose(batched.result()[1], whole.result()[1], rtol=1e-9)
@@ -0,0 +1,115 @@
+"""
+兩層式儲存 SpillingColumnStore：記憶體預算與跨越磁碟/記憶體兩層的讀取
+"""
+
+import numpy as np
+import pytest
+
+from imu_spill import SpillingColumnStore
+
+N_CHANNELS = 4
+
+
+def rows(n, start=0):
+    rng = np.random.default_rng(start)
+    data = rng.standard_normal((n, N_CHANNELS))
+    data[:, 0] = np.arange(start, start + n, dtype=float)
+    return data
+
+
+@pytest.fixture(params=[False, True], ids=['disk', 'in_memory'])
+def store(request, tmp_path):
+    store = SpillingColumnStore(memory_budget=64 * 1024, block_rows=256, spill_dir=tmp_path,
+                                n_channels=N_CHANNELS, in_memory=request.param)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def filled(store):
+    data = rows(10000)
+    for i in range(0, len(data), 777):
+        store.append(data[i:i + 777])
+    assert store._disk_rows > 0 and len(store._hot) > 0
+    return store, data
+
+
+def test_large_appends_stay_within_budget(tmp_path):
+    budget = 8 * 1024 * 1024
+    store = SpillingColumnStore(memory_budget=budget, spill_dir=tmp_path)
+    try:
+        for k in range(8):
+            store.append(np.zeros((65536, store.n_channels)) + k)
+            assert store._hot._data.nbytes <= budget
+        assert len(store) == 8 * 65536
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize('start, stop', [(0, 10000), (100, 300), (5000, 9999), (9000, 10000), (250, 260)])
+def test_read_spans_tiers(filled, start, stop):
+    store, data = filled
+    np.testing.assert_array_equal(store.read(start, stop), data[start:stop])
+
+
+def test_read_across_boundary(filled):
+    store, data = filled
+    boundary = store._disk_rows
+    np.testing.assert_array_equal(store.read(boundary - 5, boundary + 5), data[boundary - 5:boundary + 5])
+    np.testing.assert_array_equal(store.tail(20), data[-20:])
+
+
+def test_iter_blocks_covers_both_tiers(filled):
+    store, data = filled
+    np.testing.assert_array_equal(np.vstack(list(store.iter_blocks())), data)
+
+
+def test_snapshot_spans_tiers(filled):
+    store, data = filled
+    boundary = store._disk_rows
+    for start, stop in [(None, None), (boundary - 10, boundary + 10), (boundary + 1, None), (-50, None)]:
+        view = store.snapshot(start, stop)
+        np.testing.assert_array_equal(view, data[start:stop])
+        assert not view.flags.writeable
+    # 只在記憶體層的範圍不複製
+    assert np.shares_memory(store.snapshot(boundary, None), store._hot._data)
+
+
+def test_clear(filled):
+    store, _ = filled
+    store.clear()
+    assert len(store) == 0 and store.disk_bytes == 0
+    data = rows(1000, start=5)
+    store.append(data)
+    np.testing.assert_array_equal(store.read(0, 1000), data)
+
+
+def expected_rows(data, t0, t1):
+    ts = data[:, 0]
+    return data[(ts >= t0) & (ts < t1)]
+
+
+def test_select_time_spans_tiers(filled):
+    store, data = filled
+    assert store.ts_increasing
+    boundary_ts = data[store._disk_rows, 0]
+    for t0, t1 in [(100.5, 200), (boundary_ts - 300, boundary_ts + 300), (9000, 20000), (-5, 3)]:
+        np.testing.assert_array_equal(store.select_time(t0, t1), expected_rows(data, t0, t1))
+    assert store.row_at_time(boundary_ts) == store._disk_rows
+
+
+def test_select_time_non_monotonic(store):
+    # 兩段擷取接在一起：第二段的 ts 從 0 重新開始，且跨越磁碟與記憶體兩層
+    first, second = rows(6000), rows(4000)
+    store.append(first)
+    store.append(second)
+    data = np.vstack((first, second))
+    assert not store.ts_increasing and store._disk_rows > len(first)
+    for t0, t1 in [(1000, 2000), (3500, 5000), (5990, 7000)]:
+        np.testing.assert_array_equal(store.select_time(t0, t1), expected_rows(data, t0, t1))
+    np.testing.assert_array_equal(store.select_time(), data)
+    assert store.row_at_time(5999) == 5999
+    assert store.row_at_time(6000) == len(data)
+    store.clear()
+    store.append(rows(100))
+    assert store.ts_increasing
@@ -0,0 +1,142 @@
+"""
+本機串流服務：以回環客戶端驗證 seq、遺失偵測、限速與欄位配置
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from imu_buffer import CHANNELS
+from imu_stream import IMUStreamServer, IMUStreamClient
+
+
+def batch(n, start=0):
+    data = np.zeros((n, len(CHANNELS)))
+    data[:, 0] = np.arange(start, start + n)
+    data[:, 1:] = 0.5
+    return data
+
+
+@pytest.fixture
+def server():
+    server = IMUStreamServer(port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def subscribe(server, max_rate=0):
+    client = IMUStreamClient(port=server.port, max_rate=max_rate)
+    deadline = time.monotonic() + 5.0
+    while server.client_count < 1:
+        assert time.monotonic() < deadline, "訂閱逾時"
+        time.sleep(0.005)
+    return client
+
+
+def test_sequence_and_content(server):
+    client = subscribe(server)
+    try:
+        for k in range(20):
+            server.publish(batch(10, k * 10))
+        for k in range(20):
+            seq, first_index, data = client.recv_batch()
+            assert seq == k and first_index == k * 10
+            np.testing.assert_array_equal(data[:, 0], np.arange(k * 10, k * 10 + 10))
+            np.testing.assert_allclose(data[:, 1:], 0.5)
+        assert client.lost_batches == 0
+    finally:
+        client.close()
+
+
+def test_lost_batches_detected(server):
+    client = subscribe(server)
+    try:
+        # 客戶端暫時不讀：批次大於 socket 緩衝區，發送佇列滿了丟棄最舊的
+        total = 200
+        for k in range(total):
+            server.publish(batch(4000, k * 4000))
+        received = 0
+        seq = None
+        while seq != total - 1:
+            seq, first_index, data = client.recv_batch()
+            assert first_index == seq * 4000
+            received += 1
+        assert client.lost_batches > 0
+        assert received + client.lost_batches == total
+    finally:
+        client.close()
+
+
+def test_rate_limit(server):
+    client = subscribe(server, max_rate=1000)
+    client.sock.settimeout(0.2)
+    try:
+        # 約 10000 樣本/秒發佈 1 秒；令牌桶初始一秒的量 + 1 秒補充
+        start = time.monotonic()
+        k = 0
+        while time.monotonic() - start < 1.0:
+            server.publish(batch(100, k * 100))
+            k += 1
+            time.sleep(0.01)
+        samples = 0
+        try:
+            while True:
+                samples += len(client.recv_batch()[2])
+        except OSError:
+            pass
+        assert 900 <= samples <= 2200
+        assert client.lost_batches > 0
+    finally:
+        client.close()
+
+
+def test_oversized_batches_not_starved(server):
+    # 每批 1500 筆大於每秒上限 1000：累積足夠令牌後仍會送出
+    client = subscribe(server, max_rate=1000)
+    client.sock.settimeout(0.2)
+    try:
+        start = time.monotonic()
+        k = 0
+        while time.monotonic() - start < 2.0:
+            server.publish(batch(1500, k * 1500))
+            k += 1
+            time.sleep(0.1)
+        received = 0
+        try:
+            while True:
+                client.recv_batch()
+                received += 1
+        except OSError:
+            pass
+        assert 1 <= received <= 3
+    finally:
+        client.close()
+
+
+def test_layout_sent_and_updated(server):
+    client = subscribe(server)
+    try:
+        server.publish(batch(5))
+        client.recv_batch()
+        assert client.columns == CHANNELS
+        subset = ['timestamp', 'acc_x', 'acc_y', 'acc_z']
+        server.publish(batch(5)[:, [0, 4, 5, 6]], subset)
+        seq, first_index, data = client.recv_batch()
+        assert client.columns == subset and data.shape == (5, 4)
+        assert client.layout_id == 1
+    finally:
+        client.close()
+
+
+def test_late_subscriber_gets_current_layout(server):
+    subset = ['timestamp', 'gyr_x', 'gyr_y', 'gyr_z']
+    server.publish(batch(5)[:, [0, 7, 8, 9]], subset)
+    client = subscribe(server)
+    try:
+        server.publish(batch(5)[:, [0, 7, 8, 9]], subset)
+        client.recv_batch()
+        assert client.columns == subset
+    finally:
+        client.close()
@@ -0,0 +1,90 @@
+"""
+時間基準：uint32 ts 跨批次溢位的展開，以及由只會偏晚（單側抖動）的合成配對
+估計偏移與漂移
+"""
+
+import numpy as np
+import pytest
+
+from imu_timebase import TS_WRAP, TimeBase
+
+
+def test_unwrap_across_batches():
+    tb = TimeBase()
+    before = np.arange(TS_WRAP - 50, TS_WRAP, 10, dtype=float)
+    after = np.arange(4, 60, 10, dtype=float)        # 溢位發生在兩批之間
+    np.testing.assert_array_equal(tb.unwrap(before), before)
+    np.testing.assert_array_equal(tb.unwrap(after), after + TS_WRAP)
+    # 之後的批次維持展開
+    np.testing.assert_array_equal(tb.unwrap(after + 100), after + 100 + TS_WRAP)
+
+
+def test_unwrap_within_batch_and_twice():
+    tb = TimeBase()
+    ts = (np.arange(0, 200, 10, dtype=float) + TS_WRAP - 95) % TS_WRAP
+    unwrapped = tb.unwrap(ts)
+    np.testing.assert_array_equal(unwrapped, np.arange(0, 200, 10) + TS_WRAP - 95.0)
+    assert np.all(np.diff(unwrapped) > 0)
+    # 第二次溢位
+    tb.unwrap(np.array([TS_WRAP - 10.0]))
+    np.testing.assert_array_equal(tb.unwrap(np.array([5.0, 15.0])), [5.0 + 2 * TS_WRAP, 15.0 + 2 * TS_WRAP])
+    tb.reset()
+    np.testing.assert_array_equal(tb.unwrap(np.array([5.0])), [5.0])
+
+
+def test_unwrap_empty_batch_keeps_state():
+    tb = TimeBase()
+    tb.unwrap(np.array([TS_WRAP - 1.0]))
+    assert len(tb.unwrap(np.array([]))) == 0
+    np.testing.assert_array_equal(tb.unwrap(np.array([3.0])), [3.0 + TS_WRAP])
+
+
+HOST0_NS = 5_000_000_000_000
+MIN_LATENCY_MS = 1.0
+
+
+def synthetic_pairs(drift_ppm, minutes, seed=0):
+    """每 50 ms 一批：主機時間 = 真實時鐘 + 最小延遲 + 只會偏晚的抖動（偶有大延遲）"""
+    rng = np.random.default_rng(seed)
+    ts = np.arange(0.0, minutes * 60_000.0, 50.0) + 123_456.0
+    delay = MIN_LATENCY_MS + rng.exponential(2.0, len(ts))
+    spikes = rng.random(len(ts)) < 0.02
+    delay[spikes] += rng.uniform(20.0, 200.0, spikes.sum())    # USB/排程造成的偶發延遲
+    host_ms = (ts - ts[0]) * (1 + drift_ppm * 1e-6) + delay
+    return ts, (HOST0_NS + host_ms * 1e6).astype(np.int64)
+
+
+def ideal_monotonic(ts, drift_ppm):
+    """沒有抖動時的主機時間（只含最小延遲）"""
+    return (HOST0_NS + ((ts - 123_456.0) * (1 + drift_ppm * 1e-6) + MIN_LATENCY_MS) * 1e6) / 1e9
+
+
+@pytest.mark.parametrize('drift_ppm', [-80.0, 0.0, 35.0])
+def test_drift_recovered_from_one_sided_jitter(drift_ppm):
+    tb = TimeBase()
+    ts, host_ns = synthetic_pairs(drift_ppm, minutes=5)
+    for t, h in zip(ts, host_ns):
+        tb.observe(t, int(h))
+    assert tb.ready
+    assert tb.drift_ppm == pytest.approx(drift_ppm, abs=2.0)
+    # 換算落在延遲的下緣，而不是平均延遲
+    check = ts[-1000:]
+    error_ms = (tb.to_monotonic(check) - ideal_monotonic(check, drift_ppm)) * 1000
+    assert np.abs(error_ms).max() < 0.5
+
+
+def test_offset_before_fit_tracks_minimum_latency():
+    tb = TimeBase()
+    ts, host_ns = synthetic_pairs(0.0, minutes=0.01)    # 12 筆，不到兩個區間
+    for t, h in zip(ts, host_ns):
+        tb.observe(t, int(h))
+    assert tb.drift_ppm == 0.0
+    delays = (host_ns - HOST0_NS) / 1e6 - (ts - ts[0])
+    # 偏移取目前為止的最小延遲
+    assert tb.to_monotonic(ts[0]) * 1e9 == pytest.approx(HOST0_NS + delays.min() * 1e6, abs=1e3)
+
+
+def test_wall_time_follows_monotonic():
+    tb = TimeBase()
+    tb.observe(0.0, HOST0_NS)
+    assert tb.to_wall(100.0) - tb.to_monotonic(100.0) == pytest.approx(tb._wall_offset_ns / 1e9)
@@ -0,0 +1,179 @@
+"""
+觸發：跨批次的上升緣與斜率、觸發方向、觸發前環狀緩衝與當批數據組成的前段、
+擷取期間忽略觸發，以及跨多批的觸發後視窗；分批處理與一次處理結果相同
+"""
+
+import numpy as np
+import pytest
+
+from imu_buffer import CHANNELS, CHANNEL_INDEX
+from imu_trigger import Trigger, TriggerEngine
+
+RATE = 1000.0
+
+
+def stream(values, channel='acc_z'):
+    """1 kHz 的數據流，指定通道為 values，其餘為 0"""
+    rows = np.zeros((len(values), len(CHANNELS)))
+    rows[:, 0] = np.arange(len(values)) * (1000.0 / RATE)
+    rows[:, CHANNEL_INDEX[channel]] = values
+    return rows
+
+
+def edges_in_batches(trigger, block, cuts):
+    found = []
+    for start, part in zip([0] + list(cuts), np.split(block, cuts)):
+        if len(part):
+            found.extend(start + trigger.edges(part))
+    return found
+
+
+def test_threshold_edge_counted_once_across_batches():
+    values = np.zeros(100)
+    values[48:60] = 3.0
+    values[80] = 3.0
+    block = stream(values)
+    for cuts in ([], [49], [48], [50, 51, 52], [81]):
+        trigger = Trigger('threshold', 2.0, channel='acc_z')
+        assert edges_in_batches(trigger, block, cuts) == [48, 80]
+
+
+@pytest.mark.parametrize('level, direction, expected', [
+    (-5.0, 'below', [10]),
+    (-5.0, 'above', [0, 20]),
+    (2.0, 'below', [0, 20]),
+    (2.0, 'above', [10]),
+])
+def test_threshold_direction(level, direction, expected):
+    values = np.full(30, -1.0)
+    values[10:20] = np.where(level < 0, -8.0, 4.0)
+    trigger = Trigger('threshold', level, channel='acc_z', direction=direction)
+    assert list(trigger.edges(stream(values))) == expected
+
+
+def test_unknown_direction_rejected():
+    with pytest.raises(ValueError):
+        Trigger('threshold', 1.0, channel='acc_z', direction='up')
+
+
+def test_magnitude_below_detects_free_fall():
+    values = np.ones(50)
+    values[25:35] = 0.05
+    trigger = Trigger('magnitude', 0.2, group='acc', direction='below')
+    assert list(trigger.edges(stream(values))) == [25]
+
+
+def test_slope_carries_last_row_across_batches():
+    values = np.zeros(40)
+    values[20:] = 1.0            # 1 ms 內跳 1.0：斜率 1000/s
+    block = stream(values)
+    whole = Trigger('slope', 500.0, channel='acc_z')
+    assert list(whole.edges(block)) == [20]
+    # 跳變正好在批次開頭：需要上一批最後一筆才算得出斜率
+    split = Trigger('slope', 500.0, channel='acc_z')
+    assert edges_in_batches(split, block, [20]) == [20]
+
+
+def test_slope_below_ignores_first_sample_and_bad_dt():
+    block = stream(np.arange(10) * 0.01)     # 斜率 10/s
+    block[5, 0] = block[4, 0]                 # 時間戳重複
+    trigger = Trigger('slope', 100.0, channel='acc_z', direction='below')
+    # 第一筆沒有斜率、重複時間戳那筆也不算，之後重新成立
+    assert list(trigger.edges(block)) == [1, 6]
+
+
+def engine(pre_ms=10, post_ms=20):
+    trigger = Trigger('threshold', 2.0, channel='acc_z')
+    return TriggerEngine([trigger], RATE, pre_ms=pre_ms, post_ms=post_ms)
+
+
+def spikes(n, at):
+    values = np.zeros(n)
+    values[at] = 3.0
+    return stream(values)
+
+
+def run(eng, block, cuts):
+    events = []
+    for part in np.split(block, cuts):
+        events.extend(eng.process(part))
+    return events
+
+
+def test_pre_trigger_from_ring_and_current_batch():
+    block = spikes(200, [103])
+    eng = engine()
+    events = run(eng, block, [100])           # 觸發點在第二批的第 3 筆
+    assert len(events) == 1
+    event = events[0]
+    assert event.sample_index == 103 and event.pre_samples == 10
+    np.testing.assert_array_equal(event.data, block[93:123])
+    assert event.trigger_timestamp == block[103, 0]
+
+
+def test_pre_trigger_shorter_at_stream_start():
+    block = spikes(100, [4])
+    event = run(engine(), block, [])[0]
+    assert event.pre_samples == 4
+    np.testing.assert_array_equal(event.data, block[:24])
+
+
+def test_triggers_during_capture_are_ignored():
+    block = spikes(300, [50, 55, 68, 70, 150])
+    events = run(engine(), block, [60])
+    # 55、68 在 50 的擷取視窗 [50, 70) 內；70 是視窗結束後的第一筆
+    assert [e.sample_index for e in events] == [50, 70, 150]
+    for event in events:
+        start = event.sample_index
+        np.testing.assert_array_equal(event.data, block[start - 10:start + 20])
+
+
+def test_post_window_spans_batches():
+    block = spikes(400, [95])
+    eng = engine(post_ms=250)
+    finished = [eng.process(part) for part in np.split(block, [100, 150, 200, 300])]
+    # 視窗 [95, 345) 橫跨五批，在最後一批完成
+    assert [len(f) for f in finished] == [0, 0, 0, 0, 1]
+    assert eng.capturing is False
+    np.testing.assert_array_equal(finished[4][0].data, block[85:345])
+
+
+def test_capturing_until_window_complete():
+    eng = engine()
+    eng.process(spikes(50, [45]))
+    assert eng.capturing
+    eng.process(spikes(20, []))
+    assert not eng.capturing and len(eng.events) == 1
+
+
+def test_batched_matches_single_pass():
+    rng = np.random.default_rng(0)
+    block = spikes(3000, rng.choice(3000, 40, replace=False))
+    whole = run(engine(), block, [])
+    cuts = np.sort(rng.integers(1, 3000, 60))
+    batched = run(engine(), block, cuts)
+    assert [e.sample_index for e in batched] == [e.sample_index for e in whole]
+    for a, b in zip(batched, whole):
+        assert a.pre_samples == b.pre_samples
+        np.testing.assert_array_equal(a.data, b.data)
+
+
+def test_reset_clears_ring_and_state():
+    eng = engine()
+    eng.process(spikes(50, [45]))
+    eng.reset()
+    assert not eng.capturing and eng.events == []
+    event = run(eng, spikes(50, [5]), [])[0]
+    assert event.sample_index == 5 and event.pre_samples == 5
+
+
+def test_subset_columns():
+    columns = ['timestamp', 'acc_z']
+    block = spikes(100, [30])[:, [0, CHANNEL_INDEX['acc_z']]]
+    trigger = Trigger('threshold', 2.0, channel='acc_z', columns=columns)
+    eng = TriggerEngine([trigger], RATE, pre_ms=5, post_ms=5, columns=columns)
+    event = run(eng, block, [])[0]
+    assert event.columns == columns
+    np.testing.assert_array_equal(event.data, block[25:35])
+    with pytest.raises(ValueError):
+        Trigger('magnitude', 1.0, group='gyr', columns=columns)